@@ -17,6 +17,14 @@ VENV_PATH=".venv/bin/activate"
 TRAINER="src/kbot/analysis/trainer.py"
 THRESHOLD_FINDER="src/kbot/analysis/find_best_threshold.py"
 OPTIMIZER="src/kbot/analysis/optimizer.py"
+PREFETCH="src/kbot/analysis/prefetch.py"
+PIPELINE="src/kbot/analysis/pipeline.py"
+
+# Trials pro Optuna-Generation (gebündelter Backtest); 1 = klassisches study.optimize
+# Eine Generation wird komplett angefragt, bevor Ergebnisse zurückkommen: TPE lernt nur zwischen Generationen
+OPTIM_BATCH_SIZE=${OPTIM_BATCH_SIZE:-32}
+# thread = study.optimize mit n_jobs-Threads; process = Worker-Prozesse mit gemeinsamen Memory-Map-Daten
+OPTIM_PARALLEL=${OPTIM_PARALLEL:-process}
 
 # --- Umgebung aktivieren ---
 source "$VENV_PATH"
@@ -84,10 +92,38 @@ fi
 run_optimization() {
     local symbol=$1; local timeframe=$2;
     echo -e "\n${GREEN}>>> STUFE 3/3: Starte Optimierung für $symbol ($timeframe)...${NC}"
-    python3 "$OPTIMIZER" --symbols "$symbol" --timeframes "$timeframe" --start_date "$CURRENT_START_DATE" --end_date "$CURRENT_END_DATE" --jobs "$N_CORES" --max_drawdown "$MAX_DD" --start_capital "$START_CAPITAL" --min_win_rate "$MIN_WR" --trials "$N_TRIALS" --min_pnl "$MIN_PNL" --mode "$OPTIM_MODE_ARG" --threshold "$BEST_THRESHOLD"
+    python3 "$OPTIMIZER" --symbols "$symbol" --timeframes "$timeframe" --start_date "$CURRENT_START_DATE" --end_date "$CURRENT_END_DATE" --jobs "$N_CORES" --max_drawdown "$MAX_DD" --start_capital "$START_CAPITAL" --min_win_rate "$MIN_WR" --trials "$N_TRIALS" --min_pnl "$MIN_PNL" --mode "$OPTIM_MODE_ARG" --threshold "$BEST_THRESHOLD" --batch_size "$OPTIM_BATCH_SIZE" --parallel "$OPTIM_PARALLEL"
     if [ $? -ne 0 ]; then echo -e "${RED}Fehler im Optimierer für $symbol ($timeframe). Überspringe...${NC}"; fi
 }
 
+# --- Paralleler Scheduler: alle Aufgaben als DAG mit Stufen-Limits, setzt nach Abbruch fort ---
+# PIPELINE_SCHEDULER=0 nutzt die bisherige serielle Schleife unten.
+if [ "${PIPELINE_SCHEDULER:-1}" == "1" ]; then
+    if [ "$N_CORES" -gt 0 ] 2>/dev/null; then OPTIMIZE_JOBS=$N_CORES; else OPTIMIZE_JOBS=0; fi
+    python3 "$PIPELINE" --symbols "$SYMBOLS" --timeframes "$TIMEFRAMES" --start_date "$START_DATE_INPUT" --end_date "$END_DATE" --start_capital "$START_CAPITAL" --trials "$N_TRIALS" --min_accuracy "$MIN_ACCURACY" --mode "$OPTIM_MODE_ARG" --max_drawdown "$MAX_DD" --min_win_rate "$MIN_WR" --min_pnl "$MIN_PNL" --batch_size "$OPTIM_BATCH_SIZE" --optimize_jobs "$OPTIMIZE_JOBS"
+    PIPELINE_EXIT=$?
+    deactivate
+    if [ $PIPELINE_EXIT -ne 0 ]; then echo -e "\n${YELLOW}Nicht alle Aufgaben konnten optimiert werden (siehe Ausgabe oben).${NC}"; exit 1; fi
+    echo -e "\n${BLUE}✔ Alle Pipeline-Aufgaben erfolgreich abgeschlossen!${NC}"
+    exit 0
+fi
+
+# --- Historische Daten für alle Aufgaben vorab parallel laden (Zeitraum des ersten Versuchs) ---
+PREFETCH_TASKS=""
+for symbol in $SYMBOLS; do
+    for timeframe in $TIMEFRAMES; do
+        if [ "$START_DATE_INPUT" == "a" ]; then
+            lookback_days=365; case "$timeframe" in 1m|5m|15m) lookback_days=60 ;; 30m|1h) lookback_days=365 ;; 2h|4h) lookback_days=730 ;; 6h|12h|1d) lookback_days=1095 ;; 1w|1M) lookback_days=1825 ;; esac
+            PREFETCH_TASKS="$PREFETCH_TASKS $symbol:$timeframe:$(date -d "$lookback_days days ago" +%F):$(date +%F)"
+        else
+            PREFETCH_TASKS="$PREFETCH_TASKS $symbol:$timeframe:$START_DATE_INPUT:$END_DATE"
+        fi
+    done
+done
+echo -e "\n${GREEN}>>> Lade historische Daten vorab (parallel)...${NC}"
+python3 "$PREFETCH" --tasks "$PREFETCH_TASKS"
+if [ $? -ne 0 ]; then echo -e "${YELLOW}Vorab-Download unvollständig, fehlende Daten werden in den einzelnen Stufen nachgeladen.${NC}"; fi
+
 for symbol in $SYMBOLS; do
     for timeframe in $TIMEFRAMES; do
         pipeline_success=false
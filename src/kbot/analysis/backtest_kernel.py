@@ -0,0 +1,458 @@
+# src/kbot/analysis/backtest_kernel.py
+"""
+Array-basierter Trade-Simulations-Kernel für run_ann_backtest.
+
+Statt pro Kerze eine pandas-Series über data_with_features.iloc[i] zu erzeugen,
+arbeitet der Kernel auf reinen NumPy-Arrays. Alle Einstiegs-Filter (SuperTrend, ADX,
+Volume, Volatilität, Fibonacci-Bänder) werden vorab als boolesche Masken berechnet;
+die Schleife selbst verwaltet nur noch die offene Position und springt zwischen
+Positionen direkt zur nächsten Kerze mit erlaubtem Einstieg.
+
+Die Ergebnisse (Trailing Stop, Take Profit, PnL-Cap) sind identisch mit der
+bisherigen Zeilen-Schleife.
+"""
+import os
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Spalten aus data_with_features, die der Kernel benötigt
+KERNEL_COLUMNS = ['high', 'low', 'close', 'prediction', 'supertrend_direction',
+                  'adx', 'volume_ratio', 'atr_normalized']
+RAW_COLUMNS = ['high', 'low', 'close', 'volume']
+
+FEE_PCT = 0.05 / 100
+VOLATILITY_WINDOW = 50
+# Bei jeder Änderung an extract_backtest_arrays (Spalten, vorab berechnete Filter) erhöhen:
+# macht die Backtest-Arrays im Artefakt-Cache ungültig
+BACKTEST_KERNEL_VERSION = 1
+
+
+def volatility_filter_mask(atr_normalized, window=VOLATILITY_WINDOW):
+    """
+    True, wo der Volatilitäts-Filter einen Einstieg erlaubt.
+    Entspricht 'atr_normalized[i] > mean(atr_normalized[i-50:i]) * 2.0' -> blockiert (ab i >= 50).
+    """
+    allowed = np.ones(len(atr_normalized), dtype=bool)
+    if len(atr_normalized) > window:
+        avg_atr = sliding_window_view(atr_normalized[:-1], window).mean(axis=1)
+        allowed[window:] = ~(atr_normalized[window:] > avg_atr * 2.0)
+    return allowed
+
+
+def extract_backtest_arrays(data, data_with_features):
+    """
+    Wandelt die vorbereiteten Backtest-Daten in zusammenhängende float64-Arrays um und
+    berechnet die parameterunabhängigen Filter (SuperTrend, ADX, Volume, Volatilität) vorab.
+    """
+    arrays = {col: np.ascontiguousarray(data_with_features[col].to_numpy(dtype=np.float64))
+              if col in data_with_features.columns else np.empty(0)
+              for col in KERNEL_COLUMNS}
+    arrays['index'] = data_with_features.index
+    for col in RAW_COLUMNS:
+        arrays[f'raw_{col}'] = np.ascontiguousarray(data[col].to_numpy(dtype=np.float64))
+    # Grundlagen der Fibonacci Bollinger Bands (unabhängig von fib_length/fib_mult)
+    arrays['raw_typical_price'] = (arrays['raw_high'] + arrays['raw_low'] + arrays['raw_close']) / 3
+    arrays['raw_price_volume'] = arrays['raw_typical_price'] * arrays['raw_volume']
+    # Zwischenspeicher für (basis, std) pro fib_length, wird von allen Trials geteilt
+    arrays['fib_components'] = {}
+
+    st_direction = arrays['supertrend_direction']
+    # NaN-Werte blockieren wie in der Zeilen-Schleife nicht (Vergleiche mit NaN sind False)
+    common = ~(arrays['adx'] < 20) & ~(arrays['volume_ratio'] < 0.8) & volatility_filter_mask(arrays['atr_normalized'])
+    arrays['long_filter'] = common & (st_direction != -1.0)
+    arrays['short_filter'] = common & (st_direction != 1.0)
+    return arrays
+
+
+def save_backtest_arrays(arrays, directory):
+    """
+    Schreibt die vorbereiteten Arrays als .npy-Dateien nach 'directory', damit Worker-Prozesse
+    sie per Memory-Map einbinden können, statt DataFrames zu pickeln. Der Index wird als UTC-ns gespeichert.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        if name == 'fib_components':
+            continue
+        if name == 'index':
+            values = pd.DatetimeIndex(values).as_unit('ns').asi8
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(values))
+
+
+def load_backtest_arrays(directory):
+    """
+    Bindet mit save_backtest_arrays geschriebene Arrays schreibgeschützt per Memory-Map ein.
+    Alle Prozesse teilen sich so die Seiten im Page-Cache; der Fib-Band-Zwischenspeicher ist pro Prozess.
+    """
+    arrays = {}
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext == '.npy':
+            arrays[name] = np.load(os.path.join(directory, filename), mmap_mode='r')
+    if 'index' in arrays:
+        arrays['index'] = pd.DatetimeIndex(pd.to_datetime(np.asarray(arrays['index']), unit='ns', utc=True))
+    arrays['fib_components'] = {}
+    return arrays
+
+
+def fib_band_components(arrays, length):
+    """
+    Liefert (basis, std) der Fibonacci Bollinger Bands für eine Fensterlänge.
+    Beide hängen nicht von fib_mult ab und werden pro fib_length in arrays['fib_components'] zwischengespeichert.
+    """
+    cache = arrays.setdefault('fib_components', {})
+    components = cache.get(length)
+    if components is None:
+        volume = pd.Series(arrays['raw_volume'])
+        basis = pd.Series(arrays['raw_price_volume']).rolling(window=length).sum() / volume.rolling(window=length).sum()
+        std = pd.Series(arrays['raw_typical_price']).rolling(window=length).std()
+        components = (basis.to_numpy(), std.to_numpy())
+        cache[length] = components
+    return components
+
+
+def fib_entry_bands(arrays, length, mult):
+    """
+    Berechnet lower_6/upper_6 der Fibonacci Bollinger Bands (wie fibonacci_bollinger_bands,
+    aber nur die beiden Einstiegs-Level) auf den Rohdaten.
+    """
+    basis, std = fib_band_components(arrays, length)
+    dev = mult * std
+    return basis - (1.0 * dev), basis + (1.0 * dev)
+
+
+def build_entry_masks(arrays, lower_6, upper_6, pred_threshold):
+    """
+    Kombiniert ANN-Signal, vorberechnete Filter und Fibonacci-Band-Filter zu Long/Short-Einstiegsmasken.
+
+    Hinweis: Die Bänder werden (wie bisher) positionsgleich zu data_with_features indiziert,
+    d.h. bands.iloc[i] für die i-te Zeile nach dropna.
+    """
+    n = len(arrays['close'])
+    lower = np.full(n, np.nan)
+    upper = np.full(n, np.nan)
+    m = min(n, len(lower_6))
+    lower[:m] = lower_6[:m]
+    upper[:m] = upper_6[:m]
+
+    prediction = arrays['prediction']
+    close = arrays['close']
+    is_long = prediction >= pred_threshold
+    is_short = ~is_long & (prediction <= (1 - pred_threshold))
+
+    band_valid = ~np.isnan(lower) & ~np.isnan(upper)
+    long_entry = is_long & arrays['long_filter'] & ~(band_valid & (close > lower * 1.005))
+    short_entry = is_short & arrays['short_filter'] & ~(band_valid & (close < upper * 0.995))
+    return long_entry, short_entry
+
+
+def simulate_trades(high, low, close, long_entry, short_entry, start_capital, risk_per_trade_pct,
+                    risk_reward_ratio, activation_rr, callback_rate, initial_sl_pct, leverage, fee_pct=FEE_PCT,
+                    trade_log=None):
+    """
+    Sequenzielle Trade-Simulation auf Arrays.
+    Mit einer Liste als trade_log wird pro geschlossenem Trade (Kerzen-Position, Kapital danach) angehängt.
+
+    Returns:
+        (end_capital, trades_count, wins_count, max_drawdown_pct)
+    """
+    high = high.tolist()
+    low = low.tolist()
+    close = close.tolist()
+    is_long = long_entry.tolist()
+    entries = np.flatnonzero(long_entry | short_entry).tolist()
+    n = len(close)
+
+    current_capital, trades_count, wins_count = start_capital, 0, 0
+    peak_capital, max_drawdown_pct = start_capital, 0.0
+    max_loss_usd = start_capital * risk_per_trade_pct
+
+    in_position = False
+    side_long = True
+    entry_price = stop_loss = take_profit = activation_price = peak_price = margin_used = 0.0
+    trailing_active = False
+
+    i = entries[0] if entries else n
+    while i < n:
+        if in_position:
+            exit_price = None
+            if side_long:
+                if not trailing_active and high[i] >= activation_price:
+                    trailing_active = True
+                if trailing_active:
+                    if high[i] > peak_price: peak_price = high[i]
+                    trailing_sl = peak_price * (1 - callback_rate)
+                    if trailing_sl > stop_loss: stop_loss = trailing_sl
+                if low[i] <= stop_loss: exit_price = stop_loss
+                elif not trailing_active and high[i] >= take_profit: exit_price = take_profit
+            else:
+                if not trailing_active and low[i] <= activation_price:
+                    trailing_active = True
+                if trailing_active:
+                    if low[i] < peak_price: peak_price = low[i]
+                    trailing_sl = peak_price * (1 + callback_rate)
+                    if trailing_sl < stop_loss: stop_loss = trailing_sl
+                if high[i] >= stop_loss: exit_price = stop_loss
+                elif not trailing_active and low[i] <= take_profit: exit_price = take_profit
+
+            if exit_price:
+                pnl_pct = (exit_price / entry_price - 1) if side_long else (1 - exit_price / entry_price)
+                notional_value = margin_used * leverage
+                net_pnl = notional_value * pnl_pct - notional_value * fee_pct * 2
+                # Begrenze Verlust auf den riskierten Betrag (Fix gegen Overflow)
+                if net_pnl < -max_loss_usd:
+                    net_pnl = -max_loss_usd
+
+                current_capital += net_pnl
+                if net_pnl > 0: wins_count += 1
+                trades_count += 1
+                in_position = False
+                if trade_log is not None: trade_log.append((i, current_capital))
+                if current_capital > peak_capital: peak_capital = current_capital
+                if peak_capital > 0:
+                    drawdown = (peak_capital - current_capital) / peak_capital
+                    if drawdown > max_drawdown_pct: max_drawdown_pct = drawdown
+                if current_capital <= 0: break
+
+        if not in_position and (is_long[i] or short_entry[i]):
+            entry = close[i]
+            risk_amount_usd = current_capital * risk_per_trade_pct
+            sl_distance = entry * initial_sl_pct
+            if sl_distance != 0:
+                notional_value = risk_amount_usd / initial_sl_pct
+                if notional_value / leverage <= current_capital:
+                    side_long = is_long[i]
+                    entry_price = entry
+                    margin_used = notional_value / leverage
+                    if side_long:
+                        stop_loss = entry - sl_distance
+                        take_profit = entry + (entry - stop_loss) * risk_reward_ratio
+                        activation_price = entry + sl_distance * activation_rr
+                    else:
+                        stop_loss = entry + sl_distance
+                        take_profit = entry - (stop_loss - entry) * risk_reward_ratio
+                        activation_price = entry - sl_distance * activation_rr
+                    peak_price = entry
+                    trailing_active = False
+                    in_position = True
+
+        i += 1
+        if not in_position:
+            # Ohne Position direkt zur nächsten Kerze mit erlaubtem Einstieg springen
+            k = bisect_left(entries, i)
+            i = entries[k] if k < len(entries) else n
+
+    return current_capital, trades_count, wins_count, max_drawdown_pct
+
+
+def run_backtest_arrays(arrays, params, start_capital=1000):
+    """Führt den ANN-Backtest für einen Parametersatz auf vorbereiteten Arrays aus."""
+    lower_6, upper_6 = fib_entry_bands(arrays, params.get('fib_length', 200), params.get('fib_mult', 3.0))
+    if len(arrays['close']) == 0 or len(lower_6) == 0:
+        return {"total_pnl_pct": 0, "trades_count": 0, "win_rate": 0, "max_drawdown_pct": 1.0, "end_capital": start_capital}
+
+    long_entry, short_entry = build_entry_masks(arrays, lower_6, upper_6, params.get('prediction_threshold', 0.6))
+
+    current_capital, trades_count, wins_count, max_drawdown_pct = simulate_trades(
+        arrays['high'], arrays['low'], arrays['close'], long_entry, short_entry,
+        start_capital=start_capital,
+        risk_per_trade_pct=params.get('risk_per_trade_pct', 1.0) / 100,
+        risk_reward_ratio=params.get('risk_reward_ratio', 1.5),
+        activation_rr=params.get('trailing_stop_activation_rr', 2.0),
+        callback_rate=params.get('trailing_stop_callback_rate_pct', 1.0) / 100,
+        initial_sl_pct=params.get('initial_sl_pct', 1.0) / 100.0,
+        leverage=params.get('leverage', 10)
+    )
+
+    win_rate = (wins_count / trades_count * 100) if trades_count > 0 else 0
+    final_pnl_pct = ((current_capital - start_capital) / start_capital) * 100 if start_capital > 0 else 0
+    return {"total_pnl_pct": final_pnl_pct, "trades_count": trades_count, "win_rate": win_rate, "max_drawdown_pct": max_drawdown_pct, "end_capital": current_capital}
+
+
+def backtest_equity_curve(arrays, params, start_capital=1000):
+    """
+    Kapitalverlauf eines Parametersatzes: pd.Series mit dem Kapital nach jedem geschlossenen Trade,
+    indiziert mit dem Zeitstempel der Ausstiegs-Kerze (leer ohne Trades).
+    """
+    trade_log = []
+    lower_6, upper_6 = fib_entry_bands(arrays, params.get('fib_length', 200), params.get('fib_mult', 3.0))
+    if len(arrays['close']) > 0 and len(lower_6) > 0:
+        long_entry, short_entry = build_entry_masks(arrays, lower_6, upper_6, params.get('prediction_threshold', 0.6))
+        simulate_trades(
+            arrays['high'], arrays['low'], arrays['close'], long_entry, short_entry,
+            start_capital=start_capital,
+            risk_per_trade_pct=params.get('risk_per_trade_pct', 1.0) / 100,
+            risk_reward_ratio=params.get('risk_reward_ratio', 1.5),
+            activation_rr=params.get('trailing_stop_activation_rr', 2.0),
+            callback_rate=params.get('trailing_stop_callback_rate_pct', 1.0) / 100,
+            initial_sl_pct=params.get('initial_sl_pct', 1.0) / 100.0,
+            leverage=params.get('leverage', 10),
+            trade_log=trade_log
+        )
+    positions = [i for i, _ in trade_log]
+    return pd.Series([capital for _, capital in trade_log], index=arrays['index'][positions], dtype=np.float64, name='capital')
+
+
+def _batch_param_arrays(param_list):
+    """Extrahiert die Exit-/Risiko-Parameter aller Konfigurationen als Arrays (eine Zeile pro Konfiguration)."""
+    def column(key, default, scale=1.0):
+        return np.array([p.get(key, default) / scale for p in param_list], dtype=np.float64)
+
+    return {
+        'risk_per_trade_pct': column('risk_per_trade_pct', 1.0, 100),
+        'risk_reward_ratio': column('risk_reward_ratio', 1.5),
+        'activation_rr': column('trailing_stop_activation_rr', 2.0),
+        'callback_rate': column('trailing_stop_callback_rate_pct', 1.0, 100),
+        'initial_sl_pct': column('initial_sl_pct', 1.0, 100.0),
+        'leverage': column('leverage', 10),
+    }
+
+
+def simulate_trades_batch(high, low, close, long_entry, short_entry, start_capital, risk_per_trade_pct,
+                          risk_reward_ratio, activation_rr, callback_rate, initial_sl_pct, leverage, fee_pct=FEE_PCT):
+    """
+    Simuliert N Parametersätze gleichzeitig über dieselbe Kerzen-Serie.
+
+    long_entry/short_entry haben die Form (N, Kerzen), alle Parameter die Form (N,).
+    Der Zustand jeder Konfiguration (Seite, Stop, Peak, Kapital, ...) liegt in NumPy-Arrays,
+    sodass pro Kerze nur wenige vektorisierte Operationen für alle Konfigurationen anfallen.
+    Kerzen, auf denen keine Konfiguration eine Position hält oder einsteigen darf, werden übersprungen.
+
+    Returns:
+        (end_capital, trades_count, wins_count, max_drawdown_pct) als Arrays der Länge N
+    """
+    n_configs, n = long_entry.shape
+    capital = np.full(n_configs, float(start_capital))
+    peak_capital = capital.copy()
+    max_drawdown_pct = np.zeros(n_configs)
+    trades_count = np.zeros(n_configs, dtype=np.int64)
+    wins_count = np.zeros(n_configs, dtype=np.int64)
+    max_loss_usd = start_capital * risk_per_trade_pct
+
+    alive = np.ones(n_configs, dtype=bool)  # False nach Totalverlust (entspricht 'break')
+    in_position = np.zeros(n_configs, dtype=bool)
+    side_long = np.zeros(n_configs, dtype=bool)
+    trailing_active = np.zeros(n_configs, dtype=bool)
+    entry_price = np.zeros(n_configs)
+    stop_loss = np.zeros(n_configs)
+    take_profit = np.zeros(n_configs)
+    activation_price = np.zeros(n_configs)
+    peak_price = np.zeros(n_configs)
+    margin_used = np.zeros(n_configs)
+
+    any_entry = long_entry | short_entry
+    entries = np.flatnonzero(any_entry.any(axis=0)).tolist()
+    trail_down = 1 - callback_rate
+    trail_up = 1 + callback_rate
+
+    i = entries[0] if entries else n
+    while i < n:
+        if in_position.any():
+            h, l = high[i], low[i]
+            longs = in_position & side_long
+            shorts = in_position & ~side_long
+
+            trailing_active |= (longs & (h >= activation_price)) | (shorts & (l <= activation_price))
+            trail_long = trailing_active & longs
+            trail_short = trailing_active & shorts
+            peak_price = np.where(trail_long, np.maximum(peak_price, h), np.where(trail_short, np.minimum(peak_price, l), peak_price))
+            stop_loss = np.where(trail_long, np.maximum(stop_loss, peak_price * trail_down),
+                                 np.where(trail_short, np.minimum(stop_loss, peak_price * trail_up), stop_loss))
+
+            sl_hit = (longs & (l <= stop_loss)) | (shorts & (h >= stop_loss))
+            tp_hit = ~sl_hit & ~trailing_active & ((longs & (h >= take_profit)) | (shorts & (l <= take_profit)))
+            exit_price = np.where(sl_hit, stop_loss, np.where(tp_hit, take_profit, 0.0))
+            # Wie in der Einzel-Schleife: ein Exit-Preis von 0 gilt nicht als Exit
+            exiting = (sl_hit | tp_hit) & (exit_price != 0)
+
+            if exiting.any():
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    pnl_pct = np.where(side_long, exit_price / entry_price - 1, 1 - exit_price / entry_price)
+                notional_value = margin_used * leverage
+                net_pnl = notional_value * pnl_pct - notional_value * fee_pct * 2
+                # Begrenze Verlust auf den riskierten Betrag (Fix gegen Overflow)
+                net_pnl = np.where(net_pnl < -max_loss_usd, -max_loss_usd, net_pnl)
+
+                capital = np.where(exiting, capital + net_pnl, capital)
+                wins_count += exiting & (net_pnl > 0)
+                trades_count += exiting
+                in_position &= ~exiting
+                peak_capital = np.where(exiting, np.maximum(peak_capital, capital), peak_capital)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    drawdown = (peak_capital - capital) / peak_capital
+                update_dd = exiting & (peak_capital > 0) & (drawdown > max_drawdown_pct)
+                max_drawdown_pct = np.where(update_dd, drawdown, max_drawdown_pct)
+                alive &= ~(exiting & (capital <= 0))
+
+        candidates = ~in_position & alive & any_entry[:, i]
+        if candidates.any():
+            entry = close[i]
+            sl_distance = entry * initial_sl_pct
+            with np.errstate(divide='ignore', invalid='ignore'):
+                notional_value = capital * risk_per_trade_pct / initial_sl_pct
+            new_margin = notional_value / leverage
+            opening = candidates & (sl_distance != 0) & (new_margin <= capital)
+            if opening.any():
+                new_long = long_entry[:, i]
+                side_long = np.where(opening, new_long, side_long)
+                entry_price = np.where(opening, entry, entry_price)
+                margin_used = np.where(opening, new_margin, margin_used)
+                new_stop = np.where(new_long, entry - sl_distance, entry + sl_distance)
+                stop_loss = np.where(opening, new_stop, stop_loss)
+                take_profit = np.where(opening, np.where(new_long, entry + (entry - new_stop) * risk_reward_ratio,
+                                                         entry - (new_stop - entry) * risk_reward_ratio), take_profit)
+                activation_price = np.where(opening, np.where(new_long, entry + sl_distance * activation_rr,
+                                                              entry - sl_distance * activation_rr), activation_price)
+                peak_price = np.where(opening, entry, peak_price)
+                trailing_active &= ~opening
+                in_position |= opening
+
+        i += 1
+        if not in_position.any():
+            # Ohne offene Positionen direkt zur nächsten Kerze mit möglichem Einstieg springen
+            k = bisect_left(entries, i)
+            i = entries[k] if k < len(entries) else n
+
+    return capital, trades_count, wins_count, max_drawdown_pct
+
+
+def run_backtest_batch_arrays(arrays, param_list, start_capital=1000):
+    """
+    Führt den ANN-Backtest für viele Parametersätze in einem Durchlauf aus.
+    Liefert eine Ergebnis-Liste in derselben Reihenfolge und im selben Format wie run_backtest_arrays.
+    """
+    empty_result = {"total_pnl_pct": 0, "trades_count": 0, "win_rate": 0, "max_drawdown_pct": 1.0, "end_capital": start_capital}
+    if not param_list:
+        return []
+    if len(arrays['close']) == 0:
+        return [dict(empty_result) for _ in param_list]
+
+    long_entries, short_entries = [], []
+    for params in param_list:
+        lower_6, upper_6 = fib_entry_bands(arrays, params.get('fib_length', 200), params.get('fib_mult', 3.0))
+        long_entry, short_entry = build_entry_masks(arrays, lower_6, upper_6, params.get('prediction_threshold', 0.6))
+        long_entries.append(long_entry)
+        short_entries.append(short_entry)
+
+    config = _batch_param_arrays(param_list)
+    capital, trades, wins, max_dd = simulate_trades_batch(
+        arrays['high'], arrays['low'], arrays['close'], np.vstack(long_entries), np.vstack(short_entries),
+        start_capital=start_capital,
+        risk_per_trade_pct=config['risk_per_trade_pct'],
+        risk_reward_ratio=config['risk_reward_ratio'],
+        activation_rr=config['activation_rr'],
+        callback_rate=config['callback_rate'],
+        initial_sl_pct=config['initial_sl_pct'],
+        leverage=config['leverage']
+    )
+
+    results = []
+    for k in range(len(param_list)):
+        trades_count, wins_count, current_capital = int(trades[k]), int(wins[k]), float(capital[k])
+        win_rate = (wins_count / trades_count * 100) if trades_count > 0 else 0
+        final_pnl_pct = ((current_capital - start_capital) / start_capital) * 100 if start_capital > 0 else 0
+        results.append({"total_pnl_pct": final_pnl_pct, "trades_count": trades_count, "win_rate": win_rate,
+                        "max_drawdown_pct": float(max_dd[k]), "end_capital": current_capital})
+    return results
@@ -1,51 +1,50 @@
 # src/jaegerbot/analysis/backtester.py
 import os
 import pandas as pd
-import numpy as np
 from datetime import timedelta
 import json
 import sys
 import ta # Import für ATR/ADX benötigt
 import math # Import für math.ceil
+import threading
 
 # Import für Fibonacci Bollinger Bands
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
-from kbot.strategy.run import fibonacci_bollinger_bands, fib_backtest
+from kbot.strategy.run import fib_backtest
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
 from kbot.utils.exchange import Exchange
-from kbot.utils.ann_model import prepare_data_for_ann, load_model_and_scaler, create_ann_features
-from kbot.utils.supertrend_indicator import SuperTrendLocal
+from kbot.utils.ann_model import prepare_data_for_ann, create_ann_features, predict_with_cache
+from kbot.utils.feature_engine import FEATURE_CODE_VERSION, FEATURE_COLUMNS
+from kbot.utils.artifact_cache import get_artifact_cache, make_key, candles_hash, file_hash
+from kbot.utils.supertrend_indicator import SuperTrendLocal, SUPERTREND_CODE_VERSION
+from kbot.analysis.backtest_kernel import (extract_backtest_arrays, run_backtest_arrays, run_backtest_batch_arrays,
+                                           save_backtest_arrays, load_backtest_arrays, BACKTEST_KERNEL_VERSION)
+from kbot.utils.data_store import get_data_store, to_ms
+from kbot.utils.ohlcv_sync import plan_sync, sync_ohlcv
 
-# --- load_data und get_higher_timeframe sind unverändert ---
 def load_data(symbol, timeframe, start_date_str, end_date_str):
-    cache_dir = os.path.join(PROJECT_ROOT, 'data', 'cache')
-    os.makedirs(cache_dir, exist_ok=True)
-    symbol_filename = symbol.replace('/', '-').replace(':', '-')
-    cache_file = os.path.join(cache_dir, f"{symbol_filename}_{timeframe}.csv")
-    if os.path.exists(cache_file):
-        data = pd.read_csv(cache_file, index_col='timestamp', parse_dates=True)
+    # Kerzen liegen im spaltenbasierten Speicher unter data/store (alter CSV-Cache wird einmalig importiert).
+    # Von der Börse werden nur fehlende Abschnitte und Lücken nachgeladen.
+    store = get_data_store()
+    start_ts, end_ts = to_ms(start_date_str), to_ms(end_date_str)
+    if plan_sync(store, symbol, timeframe, start_ts, end_ts):
+        print(f"Starte Download für {symbol} ({timeframe}) von der Börse (nur fehlende Abschnitte)...")
         try:
-            if data.index.min() <= pd.to_datetime(start_date_str, utc=True) and data.index.max() >= pd.to_datetime(end_date_str, utc=True):
-                return data.loc[start_date_str:end_date_str]
-        except Exception:
-            pass
-    print(f"Starte Download für {symbol} ({timeframe}) von der Börse...")
-    try:
-        with open(os.path.join(PROJECT_ROOT, 'secret.json'), "r") as f: secrets = json.load(f)
-        api_setup = secrets.get('kbot')[0]
-        exchange = Exchange(api_setup)
-        exchange.validate_timeframe(timeframe)
-        full_data = exchange.fetch_historical_ohlcv(symbol, timeframe, start_date_str, end_date_str)
-        if not full_data.empty:
-            full_data.to_csv(cache_file)
-            return full_data
-    except Exception as e:
-        print(f"Fehler beim Daten-Download: {e}")
-    return pd.DataFrame()
+            with open(os.path.join(PROJECT_ROOT, 'secret.json'), "r") as f: secrets = json.load(f)
+            api_setup = secrets.get('kbot')[0]
+            exchange = Exchange(api_setup, symbols=[symbol])
+            exchange.validate_timeframe(timeframe)
+            stats = sync_ohlcv(store, exchange.exchange, symbol, timeframe, start_ts, end_ts)
+            print(f"Download abgeschlossen: {stats['candles']} Kerzen in {stats['pages']} Seiten.")
+        except Exception as e:
+            print(f"Fehler beim Daten-Download: {e}")
+            if not store.covers(symbol, timeframe, start_ts, end_ts):
+                return pd.DataFrame()
+    return store.read(symbol, timeframe, start_date_str, end_date_str)
 
 def get_higher_timeframe(tf):
     """Wählt einen passenden höheren Zeitrahmen für den Filter."""
@@ -64,226 +63,103 @@ def calculate_supertrend_direction(data):
     # 1.0 für Long-Trend, -1.0 für Short-Trend
     return st_indicator.get_supertrend_direction().shift(1) # Shift, um den ST der VORHERIGEN Kerze zu verwenden
 
-# *** KORRIGIERTE BACKTESTER FUNKTION (SuperTrend-Filter) ***
-def run_ann_backtest(data, params, model_paths, start_capital=1000, use_macd_filter=False, htf_data=None, timeframe=None, verbose=False, params_for_htf_load=None):
-
-    model, scaler = load_model_and_scaler(model_paths['model'], model_paths['scaler'])
-    if not model or not scaler: raise Exception("Modell/Scaler nicht gefunden!")
-
-    if not timeframe:
-        raise ValueError("Backtester benötigt ein 'timeframe' Argument für die Daten-Vorbereitung!")
-
-    # Fibonacci Bollinger Bands Parameter
-    fib_length = params.get('fib_length', 200)
-    fib_mult = params.get('fib_mult', 3.0)
-
+# --- Vorhersage-Cache ---
+# Features, SuperTrend-Richtung und Modell-Vorhersagen hängen nicht von den Risiko-Parametern
+# eines Optuna-Trials ab. Sie werden daher pro (Symbol, Timeframe, Datenbereich, Modell-Hash)
+# einmalig berechnet und von allen Trials (auch über n_jobs-Threads hinweg) geteilt.
+# Zusätzlich liegen die Arrays im Artefakt-Cache (artifacts/cache), sodass ein erneuter Lauf
+# über denselben Datenbereich mit demselben Modell sie nur noch per Memory-Map einbindet.
+_PREDICTION_CACHE = {}
+_PREDICTION_CACHE_LOCK = threading.Lock()
+
+def get_prediction_cache_key(symbol, timeframe, data, model_paths):
+    """Schlüssel für den Vorhersage-Cache: Symbol, Timeframe, Datenbereich und Modell/Scaler-Hash."""
+    data_range = (str(data.index[0]), str(data.index[-1]), len(data)) if not data.empty else (None, None, 0)
+    return (symbol, timeframe) + data_range + (file_hash(model_paths['model']), file_hash(model_paths['scaler']))
+
+def clear_prediction_cache():
+    """Leert den Vorhersage-Cache (z.B. nach Abschluss einer Optimierungs-Aufgabe)."""
+    with _PREDICTION_CACHE_LOCK:
+        _PREDICTION_CACHE.clear()
+
+def _build_ann_backtest_data(data, model_paths):
+    if not (os.path.exists(model_paths['model']) and os.path.exists(model_paths['scaler'])):
+        raise Exception("Modell/Scaler nicht gefunden!")
+
+    key = make_key(kind='backtest_arrays', candles=candles_hash(data), feature_version=FEATURE_CODE_VERSION,
+                   kernel_version=BACKTEST_KERNEL_VERSION, supertrend_version=SUPERTREND_CODE_VERSION,
+                   model=file_hash(model_paths['model']), scaler=file_hash(model_paths['scaler']))
+    cache = get_artifact_cache()
+    arrays = cache.read(key, load_backtest_arrays)
+    if arrays is None:
+        arrays = _compute_ann_backtest_data(data, model_paths)
+        cache.store(key, lambda directory: save_backtest_arrays(arrays, directory))
+        # Als Memory-Map wie bei einem Treffer; wurde der Eintrag sofort verdrängt, die berechneten Arrays
+        arrays = cache.read(key, load_backtest_arrays) or arrays
+    return arrays
+
+def _compute_ann_backtest_data(data, model_paths):
     data_with_features = create_ann_features(data.copy())
     data_with_features.dropna(inplace=True)
-    
-    # --- Berechne Fibonacci Bollinger Bands ---
-    bands = fibonacci_bollinger_bands(data.copy(), length=fib_length, mult=fib_mult)
-    # ---
-    
+
     # --- NEU: SuperTrend Richtung hinzufügen (ST-Richtung der VORHERIGEN Kerze) ---
     data_with_features['supertrend_direction'] = calculate_supertrend_direction(data_with_features)
     data_with_features.dropna(inplace=True)
     # ---
 
-    if data_with_features.empty or bands.empty:
-        return {"total_pnl_pct": 0, "trades_count": 0, "win_rate": 0, "max_drawdown_pct": 1.0, "end_capital": start_capital}
+    if data_with_features.empty:
+        return extract_backtest_arrays(data, data_with_features)
 
-    # *** ERWEITERTE FEATURE-LISTE FÜR BACKTEST ***
     # Muss exakt mit ann_model.py übereinstimmen (Scaler-Feature-Reihenfolge!)
-    feature_cols = [
-        # Basis-Features
-        'bb_width', 'bb_pband', 'obv', 'rsi', 'macd_diff', 'macd',
-        'atr_normalized', 'adx', 'adx_pos', 'adx_neg',
+    feature_cols = FEATURE_COLUMNS
 
-        # Volume-Features
-        'volume_ratio', 'mfi', 'cmf',
-
-        # Trend-Features
-        'price_to_ema20', 'price_to_ema50',
-
-        # Momentum-Features
-        'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
-
-        # Support/Resistance
-        'price_to_resistance', 'price_to_support',
-
-        # Price Action
-        'high_low_range', 'close_to_high', 'close_to_low',
-
-        # Zeitliche Features
-        'day_of_week', 'hour_of_day',
-
-        # Returns & Volatilität
-        'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility',
-
-        # Adaptive Trend Finder
-        'atf_pearson_r', 'atf_trend_strength', 'atf_slope',
-        'atf_std_dev', 'atf_upper_channel_dist', 'atf_lower_channel_dist',
-        'atf_price_to_trend'
-    ]
-    # ---
-    
     missing_cols = [col for col in feature_cols if col not in data_with_features.columns]
     if missing_cols:
         raise ValueError(f"Fehlende Spalten in data_with_features: {missing_cols}")
 
     data_for_scaling = data_with_features[feature_cols]
 
-    features_scaled = scaler.transform(data_for_scaling)
-    predictions = model.predict(features_scaled, verbose=0).flatten()
+    predictions = predict_with_cache(model_paths['model'], model_paths['scaler'], data_for_scaling)
     data_with_features['prediction'] = pd.Series(predictions, index=data_with_features.index)
+    return extract_backtest_arrays(data, data_with_features)
+
+def prepare_ann_backtest_data(data, model_paths, timeframe, symbol=None):
+    """
+    Berechnet Features, SuperTrend-Richtung und Modell-Vorhersagen für run_ann_backtest
+    und liefert sie als Array-Dictionary für den Backtest-Kernel (siehe backtest_kernel.py).
+    Mit 'symbol' wird das Ergebnis im Vorhersage-Cache abgelegt bzw. von dort geladen.
+    Die zurückgegebenen Arrays werden geteilt und dürfen nicht verändert werden
+    (einzige Ausnahme: der Fib-Band-Zwischenspeicher arrays['fib_components']).
+    """
+    if not timeframe:
+        raise ValueError("Backtester benötigt ein 'timeframe' Argument für die Daten-Vorbereitung!")
+    if symbol is None:
+        return _build_ann_backtest_data(data, model_paths)
+
+    cache_key = get_prediction_cache_key(symbol, timeframe, data, model_paths)
+    # Der Lock wird während der Berechnung gehalten, damit parallele Trials nicht doppelt rechnen
+    with _PREDICTION_CACHE_LOCK:
+        prepared = _PREDICTION_CACHE.get(cache_key)
+        if prepared is None:
+            prepared = _build_ann_backtest_data(data, model_paths)
+            _PREDICTION_CACHE[cache_key] = prepared
+    return prepared
 
-    pred_threshold = params.get('prediction_threshold', 0.6)
-    risk_reward_ratio = params.get('risk_reward_ratio', 1.5)
-    risk_per_trade_pct = params.get('risk_per_trade_pct', 1.0) / 100
-
-    # TSL-Parameter aus Configs
-    activation_rr = params.get('trailing_stop_activation_rr', 2.0)
-    callback_rate = params.get('trailing_stop_callback_rate_pct', 1.0) / 100
-
-    initial_sl_pct = params.get('initial_sl_pct', 1.0) / 100.0 # Der initiale SL ist noch prozentbasiert
-    leverage = params.get('leverage', 10)
-    fee_pct = 0.05 / 100
-
-    current_capital, trades_count, wins_count = start_capital, 0, 0
-    peak_capital, max_drawdown_pct = start_capital, 0.0
-    position = None
-
-    # --- KORREKTUR: ADX / HTF-Filter-Initialisierung entfernt ---
-    # Entferne die Lade-Logik für HTF-Daten, da der ADX-Filter entfernt wurde
-    # ---
-
-    for i in range(len(data_with_features)):
-        current = data_with_features.iloc[i]
-
-        if position:
-            exit_price, reason = None, None
-
-            # *** TSL-Logik (unverändert) ***
-            if position['side'] == 'long':
-                if not position['trailing_active'] and current['high'] >= position['activation_price']:
-                    position['trailing_active'] = True
-                if position['trailing_active']:
-                    position['peak_price'] = max(position['peak_price'], current['high'])
-                    trailing_sl = position['peak_price'] * (1 - callback_rate)
-                    position['stop_loss'] = max(position['stop_loss'], trailing_sl)
-                if current['low'] <= position['stop_loss']: exit_price = position['stop_loss']
-                elif not position['trailing_active'] and current['high'] >= position['take_profit']: exit_price = position['take_profit']
-
-            elif position['side'] == 'short':
-                if not position['trailing_active'] and current['low'] <= position['activation_price']:
-                    position['trailing_active'] = True
-                if position['trailing_active']:
-                    position['peak_price'] = min(position['peak_price'], current['low'])
-                    trailing_sl = position['peak_price'] * (1 + callback_rate)
-                    position['stop_loss'] = min(position['stop_loss'], trailing_sl)
-                if current['high'] >= position['stop_loss']: exit_price = position['stop_loss']
-                elif not position['trailing_active'] and current['low'] <= position['take_profit']: exit_price = position['take_profit']
-            # *** Ende TSL-Logik ***
-
-            if exit_price:
-                pnl_pct = (exit_price / position['entry_price'] - 1) if position['side'] == 'long' else (1 - exit_price / position['entry_price'])
-                notional_value = position['margin_used'] * leverage
-                pnl_usd = notional_value * pnl_pct
-                total_fees = notional_value * fee_pct * 2
-                
-                # Begrenze Verlust auf den riskierten Betrag (Fix gegen Overflow)
-                risk_amount_usd = start_capital * risk_per_trade_pct
-                
-                net_pnl = pnl_usd - total_fees
-                
-                if net_pnl < -risk_amount_usd:
-                    net_pnl = -risk_amount_usd
-                    
-                current_capital += net_pnl
-                
-                if net_pnl > 0: wins_count += 1
-                trades_count += 1
-                position = None
-                peak_capital = max(peak_capital, current_capital)
-                if peak_capital > 0:
-                    drawdown = (peak_capital - current_capital) / peak_capital
-                    max_drawdown_pct = max(max_drawdown_pct, drawdown)
-                if current_capital <= 0: break
-
-        if not position:
-            side = 'long' if current['prediction'] >= pred_threshold else 'short' if current['prediction'] <= (1 - pred_threshold) else None
-            trade_allowed = True # Wird für den SuperTrend-Filter verwendet
-
-            if side:
-                # --- NEUER SUPER TREND FILTER ---
-                st_direction = current['supertrend_direction']
-                
-                if st_direction == 1.0 and side == 'short':
-                    trade_allowed = False # Nur Longs bei Long-Trend
-                elif st_direction == -1.0 and side == 'long':
-                    trade_allowed = False # Nur Shorts bei Short-Trend
-                # Alle anderen Kombinationen werden erlaubt, wenn das ANN ein Signal gibt.
-                # --- ENDE NEUER SUPER TREND FILTER ---
-                
-                # *** NEUE FILTER: ADX & VOLUME (wie in trade_manager) ***
-                if trade_allowed:
-                    # ADX-Filter
-                    current_adx = current.get('adx', 0)
-                    if current_adx < 20:
-                        trade_allowed = False
-                    
-                    # Volume-Filter (wenn vorhanden)
-                    if 'volume_ratio' in current.index:
-                        if current['volume_ratio'] < 0.8:
-                            trade_allowed = False
-                    
-                    # Volatilitäts-Filter
-                    if i >= 50:  # Genug Daten für Rolling Mean
-                        avg_atr = data_with_features['atr_normalized'].iloc[i-50:i].mean()
-                        if current['atr_normalized'] > avg_atr * 2.0:
-                            trade_allowed = False
-                    
-                    # Fibonacci Bands Entry-Filter: Nur Long nahe lower_6, nur Short nahe upper_6
-                    if not bands.empty and i < len(bands):
-                        band_row = bands.iloc[i]
-                        lower_6 = band_row.get('lower_6', np.nan)
-                        upper_6 = band_row.get('upper_6', np.nan)
-                        close_price = current['close']
-                        
-                        if not pd.isna(lower_6) and not pd.isna(upper_6):
-                            if side == 'long' and close_price > lower_6 * 1.005:  # 0.5% tolerance
-                                trade_allowed = False  # Long nur nahe lower_6
-                            elif side == 'short' and close_price < upper_6 * 0.995:  # 0.5% tolerance
-                                trade_allowed = False  # Short nur nahe upper_6
-                # *** ENDE NEUE FILTER ***
-
-                if side and trade_allowed:
-                    entry_price = current['close']
-                    risk_amount_usd = current_capital * risk_per_trade_pct
-
-                    sl_distance = entry_price * initial_sl_pct
-                    if sl_distance == 0: continue
-
-                    notional_value = risk_amount_usd / initial_sl_pct
-                    margin_used = notional_value / leverage
-                    if margin_used > current_capital: continue
-
-                    stop_loss_distance = entry_price * initial_sl_pct
-                    stop_loss = entry_price - stop_loss_distance if side == 'long' else entry_price + stop_loss_distance
+# *** KORRIGIERTE BACKTESTER FUNKTION (SuperTrend-Filter) ***
+def run_ann_backtest(data, params, model_paths, start_capital=1000, use_macd_filter=False, htf_data=None, timeframe=None, verbose=False, params_for_htf_load=None, prepared_data=None):
 
-                    take_profit = entry_price + (entry_price - stop_loss) * risk_reward_ratio if side == 'long' else entry_price - (stop_loss - entry_price) * risk_reward_ratio
+    if prepared_data is None:
+        prepared_data = prepare_ann_backtest_data(data, model_paths, timeframe)
 
-                    # TSL-Aktivierungspreis basierend auf Activation RR
-                    activation_price = entry_price + stop_loss_distance * activation_rr if side == 'long' else entry_price - stop_loss_distance * activation_rr
+    # Die Trade-Schleife (TSL, TP, PnL-Cap) und alle Einstiegs-Filter laufen im Array-Kernel
+    return run_backtest_arrays(prepared_data, params, start_capital)
 
-                    position = {'side': side, 'entry_price': entry_price, 'stop_loss': stop_loss,
-                                'take_profit': take_profit, 'margin_used': margin_used,
-                                'notional_value': notional_value,
-                                'trailing_active': False,
-                                'activation_price': activation_price,
-                                'peak_price': entry_price,
-                                'callback_rate': callback_rate} # Speichern der Callback Rate für den TSL-Update
+def run_ann_backtest_batch(data, param_grid, model_paths, start_capital=1000, timeframe=None, prepared_data=None):
+    """
+    Simuliert viele Parametersätze über dieselbe Vorhersage-Serie in einem Durchlauf.
+    Liefert eine Liste von Ergebnissen (Format wie run_ann_backtest) in der Reihenfolge von param_grid.
+    """
+    if prepared_data is None:
+        prepared_data = prepare_ann_backtest_data(data, model_paths, timeframe)
 
-    win_rate = (wins_count / trades_count * 100) if trades_count > 0 else 0
-    final_pnl_pct = ((current_capital - start_capital) / start_capital) * 100 if start_capital > 0 else 0
-    return {"total_pnl_pct": final_pnl_pct, "trades_count": trades_count, "win_rate": win_rate, "max_drawdown_pct": max_drawdown_pct, "end_capital": current_capital}
+    return run_backtest_batch_arrays(prepared_data, list(param_grid), start_capital)
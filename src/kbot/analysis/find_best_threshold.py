@@ -1,6 +1,8 @@
 # src/jaegerbot/analysis/find_best_threshold.py
 import os
 import sys
+import json
+import math
 import argparse
 import numpy as np
 import pandas as pd
@@ -9,23 +11,114 @@ import pandas as pd
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-from kbot.analysis.backtester import load_data
-from kbot.utils.ann_model import load_model_and_scaler, prepare_data_for_ann
+from kbot.analysis.backtester import load_data, prepare_ann_backtest_data
+from kbot.analysis.backtest_kernel import run_backtest_batch_arrays
+from kbot.utils.ann_model import prepare_data_for_ann, predict_with_cache
 
-def find_best_threshold(symbol: str, timeframe: str, start_date: str, end_date: str):
+MIN_THRESHOLD = 0.60
+MAX_THRESHOLD = 0.95
+MIN_SIGNALS = 50  # Mindestanzahl an Signalen
+MIN_TRADES = 20  # Mindestanzahl an Trades für das PnL-Ziel
+MAX_PNL_CANDIDATES = 500  # Backtests pro PnL-Kurve (gleichmäßig über die Kandidaten verteilt)
+PNL_BATCH_SIZE = 128
+
+def threshold_candidates(predictions, min_threshold=MIN_THRESHOLD, max_threshold=MAX_THRESHOLD):
+    """
+    Alle Thresholds, an denen sich die Signalmenge ändert: Long ab prediction >= t, Short ab prediction <= 1 - t.
+    Zwischen zwei Kandidaten sind die Signale identisch, die Kurve ist damit exakt.
+    """
+    p = np.asarray(predictions, dtype=np.float64)
+    candidates = np.unique(np.concatenate((p[p > 0.5], 1.0 - p[p < 0.5])))
+    return candidates[(candidates >= min_threshold) & (candidates <= max_threshold)]
+
+def threshold_curve(predictions, y_true, thresholds):
+    """
+    Trefferquote, Recall, Erwartungswert und Score für viele Thresholds in einem sortierten Durchlauf:
+    kumulierte Long-/Short-Treffer über die sortierten Vorhersagen, Signalmengen per Binärsuche.
+    """
+    p = np.asarray(predictions, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    order = np.argsort(p, kind='stable')
+    p_sorted = p[order]
+    is_up = np.asarray(y_true)[order] == 1
+    cum_up = np.concatenate(([0], np.cumsum(is_up)))
+    cum_down = np.concatenate(([0], np.cumsum(~is_up)))
+    n = len(p)
+
+    first_long = np.searchsorted(p_sorted, thresholds, side='left')  # prediction >= t
+    end_short = np.searchsorted(p_sorted, 1.0 - thresholds, side='right')  # prediction <= 1 - t
+    long_signals, short_signals = n - first_long, end_short
+    correct = (cum_up[n] - cum_up[first_long]) + cum_down[end_short]
+    signals = long_signals + short_signals
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(signals > 0, correct / signals, np.nan)
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'long_signals': long_signals,
+        'short_signals': short_signals,
+        'signals': signals,
+        'correct': correct,
+        'win_rate': win_rate,
+        'recall': correct / n if n else np.nan,
+        # Jedes Label steht für eine Bewegung über die Volatilitäts-Schwelle: +1 bei Treffer, -1 sonst
+        'expectancy': 2 * win_rate - 1,
+        # "Sweet Spot"-Score = (Edge über 50%) * Wurzel(Anzahl der Signale)
+        'score': (win_rate - 0.5) * np.sqrt(signals),
+    })
+
+def pnl_curve(arrays, thresholds, params=None, start_capital=1000):
+    """Realisierter Backtest pro Threshold über den Batch-Kernel (Risiko-Parameter aus params bzw. Standardwerte)."""
+    base = {key: value for key, value in (params or {}).items() if key != 'prediction_threshold'}
+    results = []
+    for start in range(0, len(thresholds), PNL_BATCH_SIZE):
+        param_list = [dict(base, prediction_threshold=float(t)) for t in thresholds[start:start + PNL_BATCH_SIZE]]
+        results.extend(run_backtest_batch_arrays(arrays, param_list, start_capital))
+    curve = pd.DataFrame(results, columns=['total_pnl_pct', 'trades_count', 'win_rate', 'max_drawdown_pct'])
+    curve.columns = ['pnl_total_pct', 'pnl_trades', 'pnl_win_rate', 'pnl_max_drawdown_pct']
+    curve.insert(0, 'threshold', np.asarray(thresholds, dtype=np.float64))
+    return curve
+
+def simplest_threshold(predictions, threshold, max_decimals=6):
+    """Kürzeste Dezimalzahl <= threshold, die auf 'predictions' genau dieselben Long-/Short-Signale erzeugt."""
+    p_sorted = np.sort(np.asarray(predictions, dtype=np.float64))
+
+    def signal_counts(t):
+        return int(np.searchsorted(p_sorted, t, side='left')), int(np.searchsorted(p_sorted, 1.0 - t, side='right'))
+
+    target = signal_counts(threshold)
+    for decimals in range(2, max_decimals + 1):
+        value = math.floor(threshold * 10 ** decimals) / 10 ** decimals
+        if signal_counts(value) == target:
+            return value
+    return float(threshold)
+
+def load_strategy_params(safe_filename):
+    """Risiko-/Fib-Parameter einer vorhandenen Konfiguration (für das PnL-Ziel), sonst {}."""
+    config_path = os.path.join(PROJECT_ROOT, 'src', 'kbot', 'strategy', 'configs', f'config_{safe_filename}.json')
+    try:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {**config.get('strategy', {}), **config.get('risk', {})}
+
+def find_best_threshold(symbol: str, timeframe: str, start_date: str, end_date: str, objective: str = 'score'):
     """
-    Analysiert ein trainiertes Modell, um den besten prediction_threshold zu finden,
-    der die Balance zwischen Signalqualität (Trefferquote) und Quantität (Anzahl) optimiert.
+    Analysiert ein trainiertes Modell, um den besten prediction_threshold zu finden.
+    objective 'score': Balance zwischen Signalqualität (Trefferquote) und Quantität (Anzahl) auf den klaren Signalen.
+    objective 'pnl': realisierter Backtest-PnL (Trade-Kernel) über den gesamten Zeitraum.
+    Die vollständige Threshold-Kurve wird neben dem Modell als CSV gespeichert.
     """
     print(f"--- Starte Threshold-Analyse für {symbol} ({timeframe}) ---")
-    
+
     # 1. Modell und Daten laden
     safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
     model_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_predictor_{safe_filename}.h5')
     scaler_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_scaler_{safe_filename}.joblib')
-    
-    model, scaler = load_model_and_scaler(model_path, scaler_path)
-    if not model or not scaler:
+    curve_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_threshold_curve_{safe_filename}.csv')
+
+    # Das Modell selbst wird nur geladen, wenn die Vorhersagen nicht im Artefakt-Cache liegen
+    if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
         print("❌ Fehler: Modell/Scaler nicht gefunden. Training muss zuerst laufen.")
         return None
 
@@ -39,59 +132,52 @@ def find_best_threshold(symbol: str, timeframe: str, start_date: str, end_date:
     if X.empty:
         print("❌ Fehler: Keine Handelssignale im Datensatz gefunden.")
         return None
-        
-    predictions = model.predict(scaler.transform(X), verbose=0).flatten()
-    
-    results = []
-    best_score = -1
-    best_threshold = 0.65 # Fallback-Wert
-
-    # 3. Alle möglichen Thresholds durchgehen und bewerten
-    for threshold in np.arange(0.60, 0.96, 0.01):
-        threshold = round(threshold, 2)
-        
-        # Signale basierend auf dem aktuellen Threshold filtern
-        long_signals = predictions >= threshold
-        short_signals = predictions <= (1 - threshold)
-        total_signals = np.sum(long_signals) + np.sum(short_signals)
-
-        if total_signals < 50: # Mindestanzahl an Signalen
-            continue
-
-        # Korrekte Vorhersagen zählen
-        correct_longs = np.sum(y_true[long_signals] == 1)
-        correct_shorts = np.sum(y_true[short_signals] == 0)
-        total_correct = correct_longs + correct_shorts
-        
-        win_rate = total_correct / total_signals
-        
-        # 4. Den "Sweet Spot"-Score berechnen
-        # Score = (Edge über 50%) * Wurzel(Anzahl der Signale)
-        score = (win_rate - 0.5) * np.sqrt(total_signals)
-        
-        results.append({
-            "Threshold": threshold,
-            "Signale": total_signals,
-            "Trefferquote": f"{win_rate:.2%}",
-            "Score": score
-        })
-        
-        if score > best_score:
-            best_score = score
-            best_threshold = threshold
-
-    # 5. Ergebnisse anzeigen
-    if not results:
+
+    try:
+        predictions = predict_with_cache(model_path, scaler_path, X)
+    except Exception as e:
+        print(f"❌ Fehler beim Erstellen der Vorhersagen: {e}")
+        return None
+
+    # 3. Exakte Kurve über alle Thresholds, an denen sich die Signale ändern
+    thresholds = threshold_candidates(predictions)
+    arrays = None
+    if objective == 'pnl':
+        arrays = prepare_ann_backtest_data(data, {'model': model_path, 'scaler': scaler_path}, timeframe)
+        thresholds = np.union1d(thresholds, threshold_candidates(arrays['prediction']))
+    curve = threshold_curve(predictions, y_true.to_numpy(), thresholds)
+
+    if objective == 'pnl':
+        eligible = curve.loc[curve['signals'] >= MIN_SIGNALS, 'threshold'].to_numpy()
+        if len(eligible) > MAX_PNL_CANDIDATES:
+            eligible = eligible[np.unique(np.linspace(0, len(eligible) - 1, MAX_PNL_CANDIDATES).round().astype(int))]
+        pnl = pnl_curve(arrays, eligible, load_strategy_params(safe_filename))
+        curve = curve.merge(pnl, on='threshold', how='left')
+        ranking = curve[curve['pnl_trades'] >= MIN_TRADES].sort_values('pnl_total_pct', ascending=False, kind='stable')
+        reference_predictions = arrays['prediction']
+    else:
+        ranking = curve[curve['signals'] >= MIN_SIGNALS].sort_values('score', ascending=False, kind='stable')
+        reference_predictions = predictions
+
+    os.makedirs(os.path.dirname(curve_path), exist_ok=True)
+    curve.to_csv(curve_path, index=False)
+
+    # 4. Ergebnisse anzeigen
+    if ranking.empty:
         print("❌ Konnte keinen geeigneten Threshold mit genügend Signalen finden.")
         return None
-        
-    results_df = pd.DataFrame(results)
-    print("\n--- Threshold-Analyse-Ergebnisse ---")
-    print(results_df.to_string(index=False))
-    
-    print(f"\n✅ Bester gefundener Threshold: {best_threshold} (Score: {best_score:.2f})")
-    
-    # 6. Den besten Wert für das Pipeline-Skript ausgeben
+
+    best = ranking.iloc[0]
+    best_threshold = simplest_threshold(reference_predictions, best['threshold'])
+    print(f"\n--- Threshold-Analyse-Ergebnisse ({len(curve)} Kandidaten, Top 10) ---")
+    print(ranking.head(10).to_string(index=False))
+    print(f"Kurve gespeichert: {curve_path}")
+    if objective == 'pnl':
+        print(f"\n✅ Bester gefundener Threshold: {best_threshold} (PnL: {best['pnl_total_pct']:.2f}%, Trades: {int(best['pnl_trades'])})")
+    else:
+        print(f"\n✅ Bester gefundener Threshold: {best_threshold} (Score: {best['score']:.2f})")
+
+    # 5. Den besten Wert für das Pipeline-Skript ausgeben
     return best_threshold
 
 if __name__ == "__main__":
@@ -100,11 +186,11 @@ if __name__ == "__main__":
     parser.add_argument('--timeframe', required=True, type=str)
     parser.add_argument('--start_date', required=True, type=str)
     parser.add_argument('--end_date', required=True, type=str)
+    parser.add_argument('--objective', choices=['score', 'pnl'], default='score', help="'pnl' = realisierter Backtest-PnL pro Threshold")
     args = parser.parse_args()
-    
+
     # Der finale print-Befehl gibt den Wert an das aufrufende Shell-Skript zurück
-    best_value = find_best_threshold(f"{args.symbol}/USDT:USDT", args.timeframe, args.start_date, args.end_date)
+    best_value = find_best_threshold(f"{args.symbol}/USDT:USDT", args.timeframe, args.start_date, args.end_date, args.objective)
     if best_value:
         print(f"\n--- Output für Pipeline ---")
         print(best_value)
-
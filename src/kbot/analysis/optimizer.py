@@ -2,9 +2,13 @@
 import os
 import sys
 import json
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
 import optuna
 import numpy as np
 import argparse
+from tqdm import tqdm
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 import logging
@@ -16,12 +20,14 @@ warnings.filterwarnings('ignore', category=UserWarning, module='keras')
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-from kbot.analysis.backtester import load_data, run_ann_backtest
+from kbot.analysis.backtester import load_data, run_ann_backtest, run_ann_backtest_batch, prepare_ann_backtest_data, clear_prediction_cache
+from kbot.analysis.backtest_kernel import save_backtest_arrays, load_backtest_arrays
 from kbot.utils.telegram import send_message
 from kbot.analysis.evaluator import evaluate_dataset
 
 optuna.logging.set_verbosity(optuna.logging.WARNING)
 HISTORICAL_DATA = None
+PREPARED_DATA = None
 CURRENT_MODEL_PATHS = {}
 CURRENT_TIMEFRAME = None
 FIXED_THRESHOLD = None
@@ -32,9 +38,9 @@ MIN_PNL_CONSTRAINT = 0.0
 START_CAPITAL = 1000
 OPTIM_MODE = "strict"
 
-def objective(trial, symbol):
+def suggest_params(trial):
     # --- KORRIGIERT: Entferne initial_sl_pct, füge ATR-basierte Parameter hinzu ---
-    params = {
+    return {
         'prediction_threshold': FIXED_THRESHOLD,
         'risk_reward_ratio': trial.suggest_float('risk_reward_ratio', 1.0, 5.0),
         'risk_per_trade_pct': trial.suggest_float('risk_per_trade_pct', 0.5, 2.0),
@@ -51,30 +57,118 @@ def objective(trial, symbol):
     }
     # --- ENDE KORRIGIERT ---
 
-    result = run_ann_backtest(
-        HISTORICAL_DATA.copy(),
-        params,
-        CURRENT_MODEL_PATHS,
-        START_CAPITAL,
-        timeframe=CURRENT_TIMEFRAME
-    )
-
+def score_result(result):
+    """Bewertet ein Backtest-Ergebnis. Gibt None zurück, wenn der Trial die Bedingungen verletzt (Pruning)."""
     pnl, drawdown, trades, win_rate = result.get('total_pnl_pct', -1000), result.get('max_drawdown_pct', 1.0), result.get('trades_count', 0), result.get('win_rate', 0)
 
     if OPTIM_MODE == "strict" and (drawdown > MAX_DRAWDOWN_CONSTRAINT or win_rate < MIN_WIN_RATE_CONSTRAINT or pnl < MIN_PNL_CONSTRAINT or trades < 20):
-        raise optuna.exceptions.TrialPruned()
+        return None
     elif OPTIM_MODE == "best_profit" and (drawdown > MAX_DRAWDOWN_CONSTRAINT or trades < 15):
-        raise optuna.exceptions.TrialPruned()
+        return None
 
     drawdown_safe = max(drawdown, 0.01)
     return pnl / drawdown_safe
 
+def objective(trial, symbol):
+    params = suggest_params(trial)
+
+    # Features & Vorhersagen kommen aus dem Cache (PREPARED_DATA), nur die Trade-Schleife läuft pro Trial
+    result = run_ann_backtest(
+        HISTORICAL_DATA,
+        params,
+        CURRENT_MODEL_PATHS,
+        START_CAPITAL,
+        timeframe=CURRENT_TIMEFRAME,
+        prepared_data=PREPARED_DATA
+    )
+
+    value = score_result(result)
+    if value is None:
+        raise optuna.exceptions.TrialPruned()
+    return value
+
+def optimize_in_batches(study, n_trials, batch_size, show_progress=True):
+    """
+    Optuna ask/tell-Schleife: pro Generation werden batch_size Trials angefragt und
+    gemeinsam mit run_ann_backtest_batch in einem Durchlauf simuliert.
+
+    Achtung Sampling: alle Trials einer Generation werden angefragt, bevor ein Ergebnis zurückgemeldet ist.
+    TPE zieht sie daher aus demselben Verlauf und lernt nur alle batch_size Trials dazu (wie bei n_jobs
+    parallelen Trials); die Zufalls-Startphase wird ebenfalls generationsweise durchlaufen.
+    Läuft in einem Prozess – für mehrere Kerne --parallel process verwenden.
+    """
+    with tqdm(total=n_trials, disable=not show_progress) as progress:
+        remaining = n_trials
+        while remaining > 0:
+            trials = [study.ask() for _ in range(min(batch_size, remaining))]
+            param_list = [suggest_params(trial) for trial in trials]
+            results = run_ann_backtest_batch(
+                HISTORICAL_DATA,
+                param_list,
+                CURRENT_MODEL_PATHS,
+                START_CAPITAL,
+                timeframe=CURRENT_TIMEFRAME,
+                prepared_data=PREPARED_DATA
+            )
+            for trial, result in zip(trials, results):
+                value = score_result(result)
+                if value is None:
+                    study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                else:
+                    study.tell(trial, value)
+            remaining -= len(trials)
+            progress.update(len(trials))
+
+# --- Prozess-Pool ---
+# study.optimize(n_jobs=...) nutzt Threads, die reine Python-Trade-Schleife wird dabei vom GIL serialisiert.
+# Im Prozess-Modus schreibt der Hauptprozess die vorbereiteten Arrays einmalig als .npy-Dateien;
+# jeder Worker bindet sie per Memory-Map ein und zieht seine Trials aus der gemeinsamen SQLite-Studie.
+WORKER_SETTINGS = ['CURRENT_TIMEFRAME', 'FIXED_THRESHOLD', 'MAX_DRAWDOWN_CONSTRAINT', 'MIN_WIN_RATE_CONSTRAINT',
+                   'MIN_PNL_CONSTRAINT', 'START_CAPITAL', 'OPTIM_MODE']
+
+def optimize_worker(arrays_dir, storage_url, study_name, n_trials, batch_size, settings):
+    """Läuft in einem Worker-Prozess: übernimmt die Aufgaben-Einstellungen und optimiert n_trials Trials."""
+    global HISTORICAL_DATA, PREPARED_DATA
+    globals().update({name: settings[name] for name in WORKER_SETTINGS})
+    HISTORICAL_DATA = None
+    PREPARED_DATA = load_backtest_arrays(arrays_dir)
+
+    study = optuna.load_study(study_name=study_name, storage=storage_url)
+    if batch_size > 1:
+        optimize_in_batches(study, n_trials, batch_size, show_progress=False)
+    else:
+        study.optimize(lambda trial: objective(trial, None), n_trials=n_trials)
+    return n_trials
+
+def optimize_in_processes(storage_url, study_name, n_trials, n_workers, batch_size):
+    """Verteilt n_trials auf n_workers Prozesse, die sich die Arrays von PREPARED_DATA per Memory-Map teilen."""
+    n_workers = max(1, min(n_workers, n_trials))
+    shares = [n_trials // n_workers + (1 if k < n_trials % n_workers else 0) for k in range(n_workers)]
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    # 'fork' vermeidet, dass jeder Worker TensorFlow erneut importiert; die Daten kommen trotzdem aus den .npy-Dateien
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    study = optuna.load_study(study_name=study_name, storage=storage_url)
+    finished_states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED, optuna.trial.TrialState.FAIL)
+    already_done = len(study.get_trials(deepcopy=False, states=finished_states))
+
+    with tempfile.TemporaryDirectory(prefix='kbot_arrays_') as arrays_dir:
+        save_backtest_arrays(PREPARED_DATA, arrays_dir)
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool, tqdm(total=n_trials) as progress:
+            futures = [pool.submit(optimize_worker, arrays_dir, storage_url, study_name, share, batch_size, settings) for share in shares]
+            pending = futures
+            while pending:
+                _, pending = wait(pending, timeout=2.0)
+                done = len(study.get_trials(deepcopy=False, states=finished_states)) - already_done
+                progress.update(min(done, n_trials) - progress.n)
+            for future in futures:
+                future.result()  # Fehler aus den Workern weiterreichen
+
 def create_safe_filename(symbol, timeframe):
     return f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
 
 
 def main():
-    global HISTORICAL_DATA, CURRENT_MODEL_PATHS, CURRENT_TIMEFRAME, FIXED_THRESHOLD, MAX_DRAWDOWN_CONSTRAINT, MIN_WIN_RATE_CONSTRAINT, MIN_PNL_CONSTRAINT, START_CAPITAL, OPTIM_MODE
+    global HISTORICAL_DATA, PREPARED_DATA, CURRENT_MODEL_PATHS, CURRENT_TIMEFRAME, FIXED_THRESHOLD, MAX_DRAWDOWN_CONSTRAINT, MIN_WIN_RATE_CONSTRAINT, MIN_PNL_CONSTRAINT, START_CAPITAL, OPTIM_MODE
 
     parser = argparse.ArgumentParser(description="Parameter-Optimierung für KBot")
     parser.add_argument('--symbols', required=True, type=str)
@@ -90,6 +184,8 @@ def main():
     parser.add_argument('--mode', required=True, type=str)
     parser.add_argument('--threshold', required=True, type=float)
     parser.add_argument('--top_n', type=int, default=0)
+    parser.add_argument('--batch_size', type=int, default=1, help="Trials pro Generation (>1 = gebündelter Backtest via ask/tell; TPE lernt nur zwischen Generationen)")
+    parser.add_argument('--parallel', choices=['thread', 'process'], default='thread', help="'process' = --jobs Worker-Prozesse mit gemeinsamen Memory-Map-Daten")
     args = parser.parse_args()
 
     FIXED_THRESHOLD = args.threshold
@@ -111,6 +207,13 @@ def main():
         HISTORICAL_DATA = load_data(symbol, timeframe, args.start_date, args.end_date)
         if HISTORICAL_DATA.empty: continue
 
+        # Features, SuperTrend und Modell-Vorhersagen einmalig pro Aufgabe berechnen
+        try:
+            PREPARED_DATA = prepare_ann_backtest_data(HISTORICAL_DATA, CURRENT_MODEL_PATHS, timeframe, symbol=symbol)
+        except Exception as e:
+            print(f"❌ Fehler bei der Vorbereitung der Vorhersagen für {symbol} ({timeframe}): {e}")
+            continue
+
         print("\n--- Bewertung der Datensatz-Qualität ---")
         evaluation = evaluate_dataset(HISTORICAL_DATA.copy(), timeframe)
         print(f"Note: {evaluation['score']} / 10\n" + "\n".join(evaluation['justification']) + "\n----------------------------------------")
@@ -123,8 +226,20 @@ def main():
 
         study = optuna.create_study(storage=STORAGE_URL, study_name=study_name, direction="maximize", load_if_exists=True)
 
-        objective_wrapper = lambda trial: objective(trial, symbol)
-        study.optimize(objective_wrapper, n_trials=N_TRIALS, n_jobs=args.jobs, show_progress_bar=True)
+        if args.parallel == 'process':
+            n_workers = os.cpu_count() if args.jobs < 1 else args.jobs
+            optimize_in_processes(STORAGE_URL, study_name, N_TRIALS, n_workers, args.batch_size)
+        elif args.batch_size > 1:
+            if args.jobs != 1:
+                print(f"⚠️  --jobs {args.jobs} wird mit --batch_size {args.batch_size} und --parallel thread ignoriert "
+                      f"(gebündelter Backtest in einem Prozess). Für mehrere Kerne --parallel process verwenden.")
+            optimize_in_batches(study, N_TRIALS, args.batch_size)
+        else:
+            objective_wrapper = lambda trial: objective(trial, symbol)
+            study.optimize(objective_wrapper, n_trials=N_TRIALS, n_jobs=args.jobs, show_progress_bar=True)
+
+        PREPARED_DATA = None
+        clear_prediction_cache()
 
         valid_trials = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
         if not valid_trials: 
@@ -0,0 +1,347 @@
+# src/kbot/analysis/pipeline.py
+"""
+Paralleler Pipeline-Scheduler: Download -> Training -> Threshold -> Optimierung (inkl. Config).
+
+Jede Aufgabe (Symbol/Timeframe) ist eine Kette von Stufen in einem DAG. Unabhängige Aufgaben
+laufen gleichzeitig; pro Stufe begrenzt ein Slot-Limit die parallelen Läufe (z.B. höchstens zwei
+TensorFlow-Trainings). Training, Threshold-Suche und Optimierung laufen wie in run_pipeline.sh als
+eigene Prozesse (trainer.py, find_best_threshold.py, optimizer.py), der Download über prefetch().
+Schlägt der Qualitätscheck fehl, wird wie im Shell-Skript ein weiterer Versuch mit einem um ein
+Jahr verschobenen Datenzeitraum eingeplant.
+
+Abgeschlossene Stufen stehen in artifacts/db/pipeline_state.json. Ein erneuter Start mit denselben
+Einstellungen überspringt sie und setzt nach der letzten abgeschlossenen Stufe fort.
+
+Beispiel:
+    python3 src/kbot/analysis/pipeline.py --symbols "BTC ETH" --timeframes "1h 4h" --start_date a --end_date 2025-01-01 \\
+        --start_capital 1000 --trials 200 --min_accuracy 50 --mode strict --max_drawdown 30 --min_win_rate 55 --min_pnl 0
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import logging
+import threading
+import subprocess
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.prefetch import prefetch
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'pipeline_state.json')
+LOG_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'pipeline_logs')
+TRAINER = os.path.join('src', 'kbot', 'analysis', 'trainer.py')
+THRESHOLD_FINDER = os.path.join('src', 'kbot', 'analysis', 'find_best_threshold.py')
+OPTIMIZER = os.path.join('src', 'kbot', 'analysis', 'optimizer.py')
+
+STAGES = ['fetch', 'train', 'threshold', 'optimize']
+DEFAULT_LIMITS = {'fetch': 1, 'train': 2, 'threshold': 2, 'optimize': 1}
+# Rückblick pro Timeframe bei automatischem Startdatum (wie run_pipeline.sh)
+LOOKBACK_DAYS = {'1m': 60, '5m': 60, '15m': 60, '30m': 365, '1h': 365, '2h': 730, '4h': 730,
+                 '6h': 1095, '12h': 1095, '1d': 1095, '1w': 1825, '1M': 1825}
+
+
+class StageFailed(Exception):
+    """Stufe nicht erfolgreich (z.B. Modell-Qualität unzureichend); abhängige Stufen werden übersprungen."""
+
+
+class DagScheduler:
+    """
+    Führt Knoten nach ihren Abhängigkeiten aus, höchstens limits[stage] Knoten einer Stufe gleichzeitig.
+    Knoten dürfen während run() weitere Knoten hinzufügen (z.B. einen neuen Versuch).
+    """
+
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self.nodes = {}
+        self.status = {}
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, stage, func, deps=()):
+        """Registriert einen Knoten; func erhält ein dict {Abhängigkeit: Ergebnis} und liefert das eigene Ergebnis."""
+        with self._lock:
+            if key in self.nodes:
+                raise ValueError(f"Knoten doppelt registriert: {key}")
+            unknown = [d for d in deps if d not in self.nodes]
+            if unknown:
+                raise ValueError(f"Unbekannte Abhängigkeiten für {key}: {unknown}")
+            self.nodes[key] = {'stage': stage, 'func': func, 'deps': tuple(deps)}
+            self.status[key] = 'pending'
+
+    def _launchable(self, running):
+        """Wartende Knoten mit erfüllten Abhängigkeiten und freiem Slot; blockierte Knoten werden übersprungen."""
+        busy = Counter(self.nodes[key]['stage'] for key in running.values())
+        ready = []
+        for key, node in self.nodes.items():
+            if self.status[key] != 'pending':
+                continue
+            dep_status = [self.status[d] for d in node['deps']]
+            if any(s in ('failed', 'skipped') for s in dep_status):
+                self.status[key] = 'skipped'
+            elif all(s == 'done' for s in dep_status) and busy[node['stage']] < self.limits.get(node['stage'], 1):
+                busy[node['stage']] += 1
+                self.status[key] = 'running'
+                ready.append(key)
+        return ready
+
+    def run(self):
+        """Läuft, bis kein Knoten mehr ausführbar ist. Returns: dict Knoten -> 'done' | 'failed' | 'skipped'."""
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, sum(self.limits.values()))) as pool:
+            while True:
+                with self._lock:
+                    for key in self._launchable(running):
+                        node = self.nodes[key]
+                        running[pool.submit(node['func'], {d: self.results[d] for d in node['deps']})] = key
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        result = future.result()
+                    except StageFailed as e:
+                        logger.warning(f"{key}: {e}")
+                        self.status[key] = 'failed'
+                    except Exception as e:
+                        logger.error(f"{key}: unerwarteter Fehler: {e}")
+                        self.status[key] = 'failed'
+                    else:
+                        self.results[key] = result
+                        self.status[key] = 'done'
+        return dict(self.status)
+
+
+class PipelineState:
+    """Ergebnisse abgeschlossener Stufen (JSON, thread-sicher, atomar geschrieben)."""
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self.records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.records = {}
+
+    def get(self, key):
+        """Gespeichertes Ergebnis oder None (auch, wenn eine der erzeugten Dateien fehlt)."""
+        with self._lock:
+            record = self.records.get(key)
+        if record is None or not all(os.path.exists(p) for p in record.get('outputs', [])):
+            return None
+        return record['result']
+
+    def put(self, key, result, outputs=()):
+        with self._lock:
+            self.records[key] = {'result': result, 'outputs': list(outputs)}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.records, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def create_safe_filename(symbol, timeframe):
+    return f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
+
+
+def attempt_window(timeframe, attempt, start_date, end_date, today=None):
+    """
+    Datenzeitraum eines Versuchs (1-basiert) wie in run_pipeline.sh: bei start_date 'a' ein
+    Timeframe-abhängiger Rückblick bis heute, jeder weitere Versuch ein Jahr (365 Tage) früher.
+    """
+    if start_date == 'a':
+        today = pd.Timestamp(today or pd.Timestamp.now().date())
+        offset = pd.Timedelta(days=(attempt - 1) * 365)
+        start = today - pd.Timedelta(days=LOOKBACK_DAYS.get(timeframe, 365)) - offset
+        end = today - offset
+    else:
+        shift = pd.DateOffset(years=attempt - 1)
+        start, end = pd.Timestamp(start_date) - shift, pd.Timestamp(end_date) - shift
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def run_script(script, args, log_path):
+    """
+    Startet ein Stufen-Skript als eigenen Prozess; stdout und stderr landen im Log.
+    Returns: (stdout, stderr) – ausgewertet wird nur stdout (wie in run_pipeline.sh), da TensorFlow/Keras
+    nach der letzten Ausgabe noch Warnungen auf stderr schreiben können.
+    """
+    cmd = [sys.executable, os.path.join(PROJECT_ROOT, script)] + [str(a) for a in args]
+    completed = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'w') as f:
+        f.write(completed.stdout)
+        if completed.stderr:
+            f.write("\n--- stderr ---\n" + completed.stderr)
+    if completed.returncode != 0:
+        raise StageFailed(f"{os.path.basename(script)} beendet mit Code {completed.returncode} (Log: {log_path})")
+    return completed.stdout, completed.stderr
+
+
+def parse_accuracy(output):
+    matches = re.findall(r'Test-Genauigkeit:\s*([0-9]+(?:\.[0-9]+)?)', output)
+    return float(matches[-1]) if matches else None
+
+
+def parse_threshold(output):
+    lines = output.strip().splitlines()
+    return float(lines[-1]) if lines and re.fullmatch(r'[0-9]+\.[0-9]+', lines[-1].strip()) else None
+
+
+def add_task(scheduler, state, task, settings, attempt=1):
+    """Plant die Stufen-Kette eines Versuchs für eine Aufgabe ein."""
+    symbol, timeframe = task['symbol'], task['timeframe']
+    coin = symbol.split('/')[0]
+    safe_filename = create_safe_filename(symbol, timeframe)
+    start, end = attempt_window(timeframe, attempt, settings['start_date'], settings['end_date'])
+    label = f"{symbol} ({timeframe}) Versuch {attempt}/{settings['attempts']}"
+    prefix = f"{safe_filename}|{start}|{end}"
+    keys = {stage: f"{prefix}|{stage}" for stage in STAGES}
+    model_paths = [os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_predictor_{safe_filename}.h5'),
+                   os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_scaler_{safe_filename}.joblib')]
+    config_path = os.path.join(PROJECT_ROOT, 'src', 'kbot', 'strategy', 'configs', f'config_{safe_filename}.json')
+
+    def log_path(stage):
+        return os.path.join(LOG_DIR, f"{safe_filename}_{start}_{end}_{stage}.log")
+
+    def cached(stage, compute, outputs=(), state_key=None, keep=None, upstream=None):
+        """
+        Ergebnis aus dem Pipeline-Zustand oder compute(); gespeichert wird nur, was keep() akzeptiert.
+        Jeder neue Lauf erhält eine 'run_id'; der Schlüssel enthält die run_id der Vorstufe, damit z.B.
+        ein neu trainiertes Modell auch Threshold-Suche und Optimierung erneut auslöst.
+        """
+        state_key = (state_key or keys[stage]) + (f"|{upstream['run_id']}" if upstream else '')
+        result = state.get(state_key)
+        if result is not None:
+            print(f"↷ {label}: {stage} bereits abgeschlossen, übersprungen")
+            return result
+        print(f"▶ {label}: {stage} gestartet")
+        result = dict(compute(), run_id=uuid.uuid4().hex[:12])
+        if keep is None or keep(result):
+            state.put(state_key, result, outputs)
+        return result
+
+    def retry_or_give_up(reason):
+        if attempt < settings['attempts']:
+            add_task(scheduler, state, task, settings, attempt + 1)
+        else:
+            print(f"❌ FINALER FEHLER: Konnte nach {settings['attempts']} Versuchen keine Strategie für {symbol} ({timeframe}) finden.")
+        raise StageFailed(f"{label}: {reason}")
+
+    def fetch(_):
+        # Fehlende Daten laden die späteren Stufen notfalls selbst nach; ein Fehler blockiert daher nicht
+        def compute():
+            try:
+                stats = prefetch([{'symbol': symbol, 'timeframe': timeframe, 'start': start, 'end': end}], verbose=False)
+                return {'candles': stats['candles'], 'failed': bool(stats['failed'])}
+            except Exception as e:
+                logger.warning(f"{label}: Vorab-Download fehlgeschlagen ({e})")
+                return {'candles': 0, 'failed': True}
+        return cached('fetch', compute, keep=lambda result: not result['failed'])
+
+    def train(_):
+        args = ['--symbols', coin, '--timeframes', timeframe, '--start_date', start, '--end_date', end]
+        result = cached('train', lambda: {'accuracy': parse_accuracy(run_script(TRAINER, args, log_path('train'))[0])}, model_paths)
+        if result['accuracy'] is None or result['accuracy'] < settings['min_accuracy']:
+            retry_or_give_up(f"Modell-Qualität unzureichend ({result['accuracy']}%)")
+        print(f"✔ {label}: Qualitätscheck bestanden ({result['accuracy']:.2f}%)")
+        return result
+
+    def threshold(deps):
+        args = ['--symbol', coin, '--timeframe', timeframe, '--start_date', start, '--end_date', end]
+        result = cached('threshold', lambda: {'threshold': parse_threshold(run_script(THRESHOLD_FINDER, args, log_path('threshold'))[0])},
+                        upstream=deps[keys['train']])
+        if result['threshold'] is None:
+            retry_or_give_up("Kein Threshold gefunden")
+        print(f"✔ {label}: Bester Threshold {result['threshold']}")
+        return result
+
+    def optimize(deps):
+        upstream = deps[keys['threshold']]
+        best_threshold = upstream['threshold']
+        args = ['--symbols', coin, '--timeframes', timeframe, '--start_date', start, '--end_date', end,
+                '--jobs', settings['optimize_jobs'], '--max_drawdown', settings['max_drawdown'],
+                '--start_capital', settings['start_capital'], '--min_win_rate', settings['min_win_rate'],
+                '--trials', settings['trials'], '--min_pnl', settings['min_pnl'], '--mode', settings['mode'],
+                '--threshold', best_threshold, '--batch_size', settings['batch_size'], '--parallel', 'process']
+        # Die Einstellungen gehören zum Schlüssel: andere Trials/Modi optimieren neu
+        state_key = f"{keys['optimize']}|{settings['mode']}|{settings['trials']}"
+
+        def compute():
+            run_script(OPTIMIZER, args, log_path('optimize'))
+            return {'config': config_path if os.path.exists(config_path) else None}
+        result = cached('optimize', compute, state_key=state_key, upstream=upstream)
+        print(f"✔ {label}: Optimierung abgeschlossen" + (f" -> {result['config']}" if result['config'] else " (keine profitable Konfiguration)"))
+        return result
+
+    scheduler.add(keys['fetch'], 'fetch', fetch)
+    scheduler.add(keys['train'], 'train', train, deps=[keys['fetch']])
+    scheduler.add(keys['threshold'], 'threshold', threshold, deps=[keys['train']])
+    scheduler.add(keys['optimize'], 'optimize', optimize, deps=[keys['threshold']])
+
+
+def run_pipeline(tasks, settings, limits=None, state=None):
+    """Plant alle Aufgaben ein und führt sie parallel aus. Returns: dict Knoten -> Status."""
+    scheduler = DagScheduler(limits or DEFAULT_LIMITS)
+    state = state or PipelineState()
+    for task in tasks:
+        add_task(scheduler, state, task, settings)
+    return scheduler.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paralleler Pipeline-Scheduler für KBot (Training, Threshold, Optimierung)")
+    parser.add_argument('--symbols', required=True, type=str)
+    parser.add_argument('--timeframes', required=True, type=str)
+    parser.add_argument('--start_date', required=True, type=str, help="JJJJ-MM-TT oder 'a' für Automatik")
+    parser.add_argument('--end_date', required=True, type=str)
+    parser.add_argument('--start_capital', type=float, default=1000)
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--min_accuracy', type=float, default=50)
+    parser.add_argument('--mode', type=str, default='strict')
+    parser.add_argument('--max_drawdown', type=float, default=30)
+    parser.add_argument('--min_win_rate', type=float, default=55)
+    parser.add_argument('--min_pnl', type=float, default=0)
+    parser.add_argument('--batch_size', type=int, default=32, help="Trials pro Optuna-Generation (TPE lernt nur zwischen Generationen; 1 = study.optimize)")
+    parser.add_argument('--attempts', type=int, default=3)
+    parser.add_argument('--train_slots', type=int, default=DEFAULT_LIMITS['train'], help="Max. gleichzeitige TensorFlow-Trainings")
+    parser.add_argument('--threshold_slots', type=int, default=DEFAULT_LIMITS['threshold'])
+    parser.add_argument('--optimize_slots', type=int, default=DEFAULT_LIMITS['optimize'], help="Max. gleichzeitige Optimierungen")
+    parser.add_argument('--optimize_jobs', type=int, default=0, help="Worker-Prozesse pro Optimierung (0 = Kerne / optimize_slots)")
+    parser.add_argument('--fresh', action='store_true', help="Gespeicherten Pipeline-Zustand ignorieren")
+    args = parser.parse_args()
+
+    limits = dict(DEFAULT_LIMITS, train=args.train_slots, threshold=args.threshold_slots, optimize=args.optimize_slots)
+    settings = {
+        'start_date': args.start_date, 'end_date': args.end_date, 'start_capital': args.start_capital,
+        'trials': args.trials, 'min_accuracy': args.min_accuracy, 'mode': args.mode, 'max_drawdown': args.max_drawdown,
+        'min_win_rate': args.min_win_rate, 'min_pnl': args.min_pnl, 'batch_size': args.batch_size, 'attempts': args.attempts,
+        'optimize_jobs': args.optimize_jobs or max(1, (os.cpu_count() or 1) // max(1, args.optimize_slots)),
+    }
+    tasks = [{'symbol': f"{s}/USDT:USDT", 'timeframe': tf} for s in args.symbols.split() for tf in args.timeframes.split()]
+
+    state = PipelineState()
+    if args.fresh:
+        state.records = {}
+    print(f"Pipeline: {len(tasks)} Aufgaben, Slots: " + ", ".join(f"{stage}={limits[stage]}" for stage in STAGES))
+    status = run_pipeline(tasks, settings, limits, state)
+
+    succeeded = {key.split('|')[0] for key, s in status.items() if key.endswith('|optimize') and s == 'done'}
+    print(f"\nPipeline abgeschlossen: {len(succeeded)}/{len(tasks)} Aufgaben mit Optimierung.")
+    sys.exit(0 if len(succeeded) == len(tasks) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,59 @@
 # src/jaegerbot/analysis/portfolio_optimizer.py (Version 2 - Mit Max-DD Filter)
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import itertools
 from tqdm import tqdm
 
-from kbot.analysis.portfolio_simulator import run_portfolio_simulation
+from kbot.analysis.portfolio_simulator import prepare_strategy_book, simulate_books
+from kbot.analysis.portfolio_search import search_portfolio, DEFAULT_BEAM_WIDTH
+
+# Anzahl der besten Beam-Teams, die am Ende exakt (mit geteilter Margin) nachsimuliert werden
+BEAM_VERIFY_TOP_N = 5
+
+# --- Parallele Team-Bewertung ---
+# Die Strategie-Bücher werden einmalig im Hauptprozess erzeugt und beim Start der Worker übergeben
+# ('fork': geteilte Seiten ohne Pickling). Jede Runde bewertet ihre Kandidaten-Teams parallel;
+# die Ergebnisse werden in Kandidaten-Reihenfolge ausgewertet, die Auswahl ist damit identisch zum seriellen Lauf.
+_TEAM_CONTEXT = {}
+
+def _init_team_worker(books, symbols, start_capital, start_date):
+    _TEAM_CONTEXT.update(books=books, symbols=symbols, start_capital=start_capital, start_date=start_date)
+
+def _evaluate_team(team_files):
+    """Simuliert ein Team (Liste von Dateinamen); die Bücher werden wie bisher nach Symbol zusammengestellt."""
+    books, symbols = _TEAM_CONTEXT['books'], _TEAM_CONTEXT['symbols']
+    team_books = {symbols[fname]: books[fname] for fname in team_files}
+    return simulate_books(_TEAM_CONTEXT['start_capital'], list(team_books.values()), _TEAM_CONTEXT['start_date'])
+
+def evaluate_teams(teams, pool=None, n_workers=1, desc=None):
+    """
+    Bewertet alle Teams (seriell oder im Prozess-Pool mit n_workers Prozessen).
+    Returns: Ergebnisse in derselben Reihenfolge.
+    """
+    if pool is None:
+        return [_evaluate_team(team) for team in tqdm(teams, desc=desc)]
+    chunksize = max(1, len(teams) // (4 * n_workers))
+    return list(tqdm(pool.map(_evaluate_team, teams, chunksize=chunksize), total=len(teams), desc=desc))
+
+def score_result(result, max_drawdown):
+    """Calmar-Score eines Ergebnisses oder None, wenn es liquidiert wurde bzw. max_drawdown überschreitet."""
+    if result and not result.get("liquidation_date") and result['max_drawdown_pct'] <= max_drawdown:
+        # Wir verwenden eine risikoadjustierte Rendite (Calmar Ratio) als Score
+        return result['total_pnl_pct'] / result['max_drawdown_pct'] if result['max_drawdown_pct'] > 0 else result['total_pnl_pct']
+    return None
 
 # --- NEU: max_drawdown Parameter hinzugefügt (Standard 100.0 = keine Beschränkung) ---
-def run_portfolio_optimizer(start_capital, strategies_data, start_date, end_date, max_drawdown=100.0):
+def run_portfolio_optimizer(start_capital, strategies_data, start_date, end_date, max_drawdown=100.0, n_jobs=-1,
+                            method='greedy', beam_width=DEFAULT_BEAM_WIDTH):
     """
     Findet die beste Kombination von Strategien, um den Profit zu maximieren,
     ohne dabei liquidiert zu werden ODER den maximalen Drawdown zu überschreiten,
     unter Verwendung eines Greedy-Algorithmus.
+    n_jobs: Worker-Prozesse für die Kandidaten-Bewertung (-1 = alle Kerne, 1 = seriell).
+    method: 'greedy' (ein Pfad, jedes Team exakt simuliert) oder 'beam' (Beam-Search + lokale Suche über
+            die Einzel-Equity-Kurven, die besten Teams werden anschließend exakt nachsimuliert).
     """
     print("\n--- Starte automatische Portfolio-Optimierung... ---")
 
@@ -18,25 +61,85 @@ def run_portfolio_optimizer(start_capital, strategies_data, start_date, end_date
         print("Keine Strategien zum Optimieren gefunden.")
         return None
 
+    # Signale (Features, SuperTrend, model.predict) pro Strategie genau einmal berechnen (bzw. aus dem Cache);
+    # jede Team-Bewertung ist danach nur noch der chronologische Merge in simulate_books
+    books = {filename: prepare_strategy_book(strat_data['symbol'], strat_data)
+             for filename, strat_data in tqdm(strategies_data.items(), desc="Generiere Signale")}
+    symbols = {filename: strat_data['symbol'] for filename, strat_data in strategies_data.items()}
+    _init_team_worker(books, symbols, start_capital, start_date)
+
+    n_workers = min(os.cpu_count() if n_jobs < 1 else n_jobs, len(strategies_data))
+    pool = None
+    if n_workers > 1:
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=_init_team_worker,
+                                   initargs=(books, symbols, start_capital, start_date))
+    try:
+        if method == 'beam':
+            return _beam_search(strategies_data, start_capital, max_drawdown, pool, n_workers, beam_width)
+        return _greedy_search(strategies_data, max_drawdown, pool, n_workers)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def _single_strategy_results(strategies_data, max_drawdown, pool, n_workers):
+    """Bewertet jede Strategie einzeln; Returns: Liste gültiger {'filename', 'score', 'result'} oder None."""
     print("1/3: Analysiere Einzel-Performance jeder Strategie...")
     single_strategy_results = []
 
     # Der Schlüssel im übergebenen strategies_data ist der Dateiname (z.B. config_...json)
-    for filename, strat_data in tqdm(strategies_data.items(), desc="Bewerte Einzelstrategien"):
-        # Übergebe dem Simulator die Daten für die eine Strategie, mit dem Symbol als Schlüssel
-        sim_data = {strat_data['symbol']: strat_data}
-        result = run_portfolio_simulation(start_capital, sim_data, start_date, end_date)
-
+    filenames = list(strategies_data)
+    for filename, result in zip(filenames, evaluate_teams([[f] for f in filenames], pool, n_workers, desc="Bewerte Einzelstrategien")):
         # --- NEU: Harter Filter für max_drawdown ---
-        if result and not result.get("liquidation_date") and result['max_drawdown_pct'] <= max_drawdown:
-            # Wir verwenden eine risikoadjustierte Rendite (Calmar Ratio) als Score
-            score = result['total_pnl_pct'] / result['max_drawdown_pct'] if result['max_drawdown_pct'] > 0 else result['total_pnl_pct']
+        score = score_result(result, max_drawdown)
+        if score is not None:
             single_strategy_results.append({'filename': filename, 'score': score, 'result': result})
         # --- ENDE DER ÄNDERUNG ---
 
     if not single_strategy_results:
         print(f"Keine einzige Strategie konnte die DD-Beschränkung von {max_drawdown:.2f}% einhalten. Portfolio-Optimierung nicht möglich.")
         return None
+    return single_strategy_results
+
+def _beam_search(strategies_data, start_capital, max_drawdown, pool, n_workers, beam_width):
+    single_strategy_results = _single_strategy_results(strategies_data, max_drawdown, pool, n_workers)
+    if not single_strategy_results:
+        return None
+
+    # Equity-Kurve jeder Einzelstrategie; Teams werden als Summe der PnL-Vektoren bewertet (O(T) pro Zug)
+    curves, groups = {}, {}
+    for res in single_strategy_results:
+        equity_curve = res['result']['equity_curve']
+        curves[res['filename']] = equity_curve['equity'] if res['result']['trade_count'] else pd.Series(dtype=float)
+        # Gleicher Coin/Timeframe schließt sich aus (wie im Greedy-Algorithmus)
+        strat_data = strategies_data[res['filename']]
+        groups[res['filename']] = strat_data['symbol'] + strat_data['timeframe']
+
+    print(f"2/3: Beam-Search (Breite {beam_width}) + lokale Suche über {len(curves)} Equity-Kurven...")
+    found = search_portfolio(curves, start_capital, max_drawdown, groups, beam_width, top_n=BEAM_VERIFY_TOP_N)
+
+    # Die Vektor-Summe kennt keine geteilte Margin: die besten Teams exakt nachsimulieren
+    print("3/3: Simuliere die besten Teams exakt nach...")
+    order = {filename: i for i, filename in enumerate(strategies_data)}
+    teams = [sorted(team['members'], key=order.get) for team in found]
+    best_files, best_score, best_result = None, None, None
+    for team_files, result in zip(teams, evaluate_teams(teams, pool, n_workers, desc="Verifiziere Teams")):
+        score = score_result(result, max_drawdown)
+        if score is not None and (best_score is None or score > best_score):
+            best_files, best_score, best_result = team_files, score, result
+
+    # Rückfall: der beste Einzel-Spieler ist immer ein gültiges Portfolio
+    star = max(single_strategy_results, key=lambda x: x['score'])
+    if best_score is None or star['score'] > best_score:
+        best_files, best_score, best_result = [star['filename']], star['score'], star['result']
+
+    print(f"-> Bestes Team: {', '.join(best_files)} (Score: {best_score:.2f})")
+    return {"optimal_portfolio": best_files, "final_result": best_result}
+
+def _greedy_search(strategies_data, max_drawdown, pool, n_workers):
+    single_strategy_results = _single_strategy_results(strategies_data, max_drawdown, pool, n_workers)
+    if not single_strategy_results:
+        return None
 
     # Sortiere nach dem besten Score, um den "Star-Spieler" zu finden
     single_strategy_results.sort(key=lambda x: x['score'], reverse=True)
@@ -56,8 +159,8 @@ def run_portfolio_optimizer(start_capital, strategies_data, start_date, end_date
         best_next_addition = None
         best_score_with_addition = best_portfolio_score
 
-        progress_bar = tqdm(candidate_pool, desc=f"Teste Team mit {len(best_portfolio_files)+1} Mitgliedern")
-        for candidate_file in progress_bar:
+        candidates, teams = [], []
+        for candidate_file in candidate_pool:
             current_team_files = best_portfolio_files + [candidate_file]
 
             # Stelle sicher, dass keine Duplikate (gleicher Coin/Timeframe) im Team sind
@@ -71,21 +174,19 @@ def run_portfolio_optimizer(start_capital, strategies_data, start_date, end_date
                     break
                 unique_check.add(key)
 
-            if not is_valid_team:
-                continue
-
-            # Stelle die Daten für den Simulator zusammen, nach Symbol geordnet
-            current_team_data = {strategies_data[fname]['symbol']: strategies_data[fname] for fname in current_team_files}
-
-            result = run_portfolio_simulation(start_capital, current_team_data, start_date, end_date)
+            if is_valid_team:
+                candidates.append(candidate_file)
+                teams.append(current_team_files)
 
+        results = evaluate_teams(teams, pool, n_workers, desc=f"Teste Team mit {len(best_portfolio_files)+1} Mitgliedern")
+        # Auswertung in Kandidaten-Reihenfolge: bei Gleichstand gewinnt wie bisher der erste Kandidat
+        for candidate_file, result in zip(candidates, results):
             # --- NEU: Harter Filter für max_drawdown auch hier ---
-            if result and not result.get("liquidation_date") and result['max_drawdown_pct'] <= max_drawdown:
-                score = result['total_pnl_pct'] / result['max_drawdown_pct'] if result['max_drawdown_pct'] > 0 else result['total_pnl_pct']
-                if score > best_score_with_addition:
-                    best_score_with_addition = score
-                    best_next_addition = candidate_file
-                    best_portfolio_result = result
+            score = score_result(result, max_drawdown)
+            if score is not None and score > best_score_with_addition:
+                best_score_with_addition = score
+                best_next_addition = candidate_file
+                best_portfolio_result = result
             # --- ENDE DER ÄNDERUNG ---
 
         if best_next_addition:
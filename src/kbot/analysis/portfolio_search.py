@@ -0,0 +1,183 @@
+# src/kbot/analysis/portfolio_search.py
+"""
+Portfolio-Suche über vorberechnete PnL-Vektoren (Beam-Search + Swap-basierte lokale Suche).
+
+Jede Strategie wird einmal einzeln simuliert; ihr Gewinn/Verlust (Equity - Startkapital) wird auf ein
+gemeinsames Zeitraster gelegt. Die Equity eines Teams ist Startkapital + Summe der PnL-Vektoren seiner
+Mitglieder, Hinzufügen oder Entfernen eines Mitglieds ist damit eine O(T)-Vektoroperation. Drawdown und
+Calmar-Score werden auf dieser kombinierten Kurve berechnet (echter Portfolio-Drawdown statt des
+schlechtesten Einzel-Drawdowns). Alle Erweiterungen eines Zustands werden als Matrix auf einmal bewertet.
+
+Gruppen (z.B. Coin) schließen sich gegenseitig aus: pro Gruppe höchstens ein Mitglied.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_BEAM_WIDTH = 8
+MAX_LOCAL_SEARCH_ROUNDS = 50
+
+
+def equity_from_trades(trades, start_capital):
+    """Equity-Stufenkurve aus einer Trade-Liste (Ausstiege mit 'date' und 'capital' nach dem Trade)."""
+    exits = [t for t in trades if 'capital' in t]
+    index = pd.DatetimeIndex([t['date'] for t in exits])
+    return pd.Series([float(t['capital']) for t in exits], index=index, name='equity', dtype=np.float64)
+
+
+def build_pnl_matrix(curves, start_capital):
+    """
+    Legt Equity-Kurven (dict Name -> pd.Series Equity über Zeitstempel) auf ein gemeinsames Zeitraster.
+    Vor dem ersten Wert ist der PnL 0, danach wird der letzte Wert fortgeschrieben.
+    Returns: (names, timestamps, matrix) mit matrix[k, t] = PnL von Strategie k zum Zeitpunkt t.
+    """
+    names = list(curves)
+    non_empty = [curve.index for curve in curves.values() if len(curve)]
+    timestamps = non_empty[0].append(non_empty[1:]).unique().sort_values() if non_empty else pd.DatetimeIndex([])
+    matrix = np.zeros((len(names), len(timestamps)))
+    for k, name in enumerate(names):
+        curve = curves[name]
+        if len(curve):
+            curve = curve[~curve.index.duplicated(keep='last')]
+            matrix[k] = curve.reindex(timestamps).ffill().fillna(start_capital).to_numpy(dtype=np.float64) - start_capital
+    return names, timestamps, matrix
+
+
+def combination_stats(pnl_sums, start_capital):
+    """
+    Kennzahlen für eine oder mehrere kombinierte PnL-Kurven (Zeilen von pnl_sums).
+    Returns: dict von Arrays total_pnl_pct, max_drawdown_pct, min_equity und score (Calmar wie im Optimizer).
+    """
+    pnl_sums = np.atleast_2d(pnl_sums)
+    equity = start_capital + np.concatenate((np.zeros((len(pnl_sums), 1)), pnl_sums), axis=1)
+    peaks = np.maximum.accumulate(equity, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peaks > 0, (peaks - equity) / peaks, 0.0)
+    max_drawdown_pct = drawdown.max(axis=1) * 100
+    total_pnl_pct = (equity[:, -1] / start_capital - 1) * 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(max_drawdown_pct > 0, total_pnl_pct / max_drawdown_pct, total_pnl_pct)
+    return {'total_pnl_pct': total_pnl_pct, 'max_drawdown_pct': max_drawdown_pct,
+            'min_equity': equity.min(axis=1), 'score': score}
+
+
+def _valid_scores(stats, max_drawdown):
+    """Score pro Zeile, -inf für liquidierte Kurven oder Drawdown über max_drawdown."""
+    valid = (stats['min_equity'] > 0) & (stats['max_drawdown_pct'] <= max_drawdown)
+    return np.where(valid, stats['score'], -np.inf)
+
+
+def _allowed(members, groups, n):
+    """Maske der Strategien, die zu 'members' hinzugefügt werden dürfen (nicht enthalten, Gruppe frei)."""
+    used = {groups[k] for k in members}
+    return np.array([k not in members and groups[k] not in used for k in range(n)], dtype=bool)
+
+
+def beam_search(matrix, start_capital, max_drawdown=100.0, groups=None, beam_width=DEFAULT_BEAM_WIDTH, max_size=None):
+    """
+    Beam-Search über Teams: jede Stufe erweitert die beam_width besten Teams um je ein Mitglied
+    (alle Erweiterungen eines Teams in einer Matrix-Operation) und behält die besten eindeutigen Teams.
+    Returns: Liste von (score, members-Tupel), absteigend nach Score (alle je erreichten Stufen).
+    """
+    n = len(matrix)
+    groups = list(range(n)) if groups is None else list(groups)
+    max_size = n if max_size is None else max_size
+    beam = [((), np.zeros(matrix.shape[1]))]
+    seen, ranked = set(), []
+    for _ in range(max_size):
+        expansions = []
+        for members, pnl_sum in beam:
+            candidates = np.flatnonzero(_allowed(members, groups, n))
+            if len(candidates) == 0:
+                continue
+            sums = pnl_sum + matrix[candidates]
+            scores = _valid_scores(combination_stats(sums, start_capital), max_drawdown)
+            for candidate, score, candidate_sum in zip(candidates.tolist(), scores.tolist(), sums):
+                team = tuple(sorted(members + (candidate,)))
+                if score == -np.inf or team in seen:
+                    continue
+                seen.add(team)
+                expansions.append((score, team, candidate_sum))
+        if not expansions:
+            break
+        # Stabile Sortierung: bei Gleichstand entscheidet die Reihenfolge der Erzeugung (deterministisch)
+        expansions.sort(key=lambda item: -item[0])
+        beam = [(team, candidate_sum) for _, team, candidate_sum in expansions[:beam_width]]
+        ranked.extend((score, team) for score, team, _ in expansions)
+    ranked.sort(key=lambda item: -item[0])
+    return ranked
+
+
+def local_search(matrix, members, start_capital, max_drawdown=100.0, groups=None, max_rounds=MAX_LOCAL_SEARCH_ROUNDS):
+    """
+    Verbessert ein Team durch Hinzufügen, Entfernen oder Tauschen eines Mitglieds (bester Zug pro Runde),
+    bis kein Zug den Score erhöht. Returns: (score, members-Tupel).
+    """
+    n = len(matrix)
+    groups = list(range(n)) if groups is None else list(groups)
+    members = tuple(sorted(members))
+    pnl_sum = matrix[list(members)].sum(axis=0) if members else np.zeros(matrix.shape[1])
+    best_score = _valid_scores(combination_stats(pnl_sum, start_capital), max_drawdown)[0] if members else -np.inf
+
+    for _ in range(max_rounds):
+        moves, sums = [], []
+        # Hinzufügen
+        for candidate in np.flatnonzero(_allowed(members, groups, n)).tolist():
+            moves.append(members + (candidate,))
+            sums.append(pnl_sum + matrix[candidate])
+        for removed in members:
+            rest = tuple(k for k in members if k != removed)
+            rest_sum = pnl_sum - matrix[removed]
+            # Entfernen
+            if rest:
+                moves.append(rest)
+                sums.append(rest_sum)
+            # Tauschen
+            for candidate in np.flatnonzero(_allowed(rest, groups, n)).tolist():
+                if candidate != removed:
+                    moves.append(rest + (candidate,))
+                    sums.append(rest_sum + matrix[candidate])
+        if not moves:
+            break
+        scores = _valid_scores(combination_stats(np.vstack(sums), start_capital), max_drawdown)
+        best_move = int(np.argmax(scores))
+        if scores[best_move] <= best_score:
+            break
+        best_score = float(scores[best_move])
+        members = tuple(sorted(moves[best_move]))
+        # Neu summieren statt fortschreiben, damit sich keine Rundungsfehler aufaddieren
+        pnl_sum = matrix[list(members)].sum(axis=0)
+    return best_score, members
+
+
+def search_portfolio(curves, start_capital, max_drawdown=100.0, groups=None, beam_width=DEFAULT_BEAM_WIDTH, top_n=1):
+    """
+    Beam-Search plus lokale Suche über Equity-Kurven (dict Name -> pd.Series).
+    groups: optional dict Name -> Gruppe (pro Gruppe höchstens ein Mitglied).
+    Returns: Liste der top_n besten Teams als dicts (members, score, total_pnl_pct, max_drawdown_pct,
+    equity als pd.Series), absteigend nach Score; leer, wenn kein Team die Bedingungen erfüllt.
+    """
+    names, timestamps, matrix = build_pnl_matrix(curves, start_capital)
+    group_list = [groups[name] for name in names] if groups else None
+    ranked = beam_search(matrix, start_capital, max_drawdown, group_list, beam_width)
+    if not ranked:
+        return []
+
+    # Die besten Beam-Teams per lokaler Suche nachschärfen; Duplikate entfernen
+    teams = {}
+    for _, team in ranked[:max(beam_width, top_n)]:
+        score, improved = local_search(matrix, team, start_capital, max_drawdown, group_list)
+        teams.setdefault(improved, score)
+    for score, team in ranked:
+        if len(teams) >= top_n:
+            break
+        teams.setdefault(team, score)
+
+    results = []
+    for members, score in sorted(teams.items(), key=lambda item: -item[1])[:top_n]:
+        pnl_sum = matrix[list(members)].sum(axis=0)
+        stats = combination_stats(pnl_sum, start_capital)
+        results.append({'members': [names[k] for k in members], 'score': float(stats['score'][0]),
+                        'total_pnl_pct': float(stats['total_pnl_pct'][0]),
+                        'max_drawdown_pct': float(stats['max_drawdown_pct'][0]),
+                        'equity': pd.Series(start_capital + pnl_sum, index=timestamps, name='equity')})
+    return results
@@ -1,9 +1,10 @@
 # src/jaegerbot/analysis/portfolio_simulator.py (Version 9 - SuperTrend-Filter & PnL-Cap-Fix)
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
 import os
 import sys
+import pickle
+import hashlib
 from datetime import datetime
 import math # Import für math.ceil
 
@@ -12,7 +13,10 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
 from kbot.utils.ann_model import prepare_data_for_ann, create_ann_features
+from kbot.utils.feature_engine import FEATURE_COLUMNS, FEATURE_CODE_VERSION
+from kbot.utils.artifact_cache import get_artifact_cache, make_key, candles_hash
 from kbot.analysis.backtester import load_data, calculate_supertrend_direction # NEU: Importiere ST-Funktion
+from kbot.utils.supertrend_indicator import SUPERTREND_CODE_VERSION
 # --- ENDE PFAD-DEFINITION ---
 
 
@@ -24,375 +28,385 @@ def get_higher_timeframe(tf):
 # --- ENDE HELPER-FUNKTIONEN ---
 
 
-def run_portfolio_simulation(start_capital, strategies_data, start_date, end_date):
+# --- Konstanten der Portfolio-Simulation ---
+FEE_PCT = 0.05 / 100
+MAX_ALLOWED_EFFECTIVE_LEVERAGE = 10
+ABSOLUTE_MAX_NOTIONAL_VALUE = 1000000
+MIN_NOTIONAL = 5.0 # Bitget Minimum Notional Value
+
+
+def strategy_prediction_arrays(strat):
     """
-    Führt eine chronologische Portfolio-Simulation mit mehreren Strategien durch.
+    SuperTrend-Richtung und ANN-Vorhersagen einer Strategie, positionsgleich zu strat['data']
+    (NaN, wo keine Feature-Zeile bzw. keine ST-Richtung existiert). Returns: (prediction, st_direction) oder None.
     """
-    print("\n--- Starte Portfolio-Simulation... ---")
+    data = strat['data']
+    model = strat['model']
+    scaler = strat['scaler']
+    if data.empty: return None
+    st_direction = calculate_supertrend_direction(data.copy())
+
+    # Führe Indikator-Berechnung durch
+    data_with_features = create_ann_features(data.copy())
+    data_with_features.dropna(inplace=True)
+    if data_with_features.empty: return None
+
+    # Feature-Spalten definieren (MUSS EXAKT mit ann_model.py übereinstimmen!)
+    base_feature_cols = FEATURE_COLUMNS
+
+    # Modell-Eingangsgröße ermitteln
+    model_input_dim = None
+    try:
+        model_input_dim = model.input_shape[-1]
+    except Exception:
+        pass
+    if model_input_dim is None:
+        print("WARNUNG: Konnte Input-Shape des Modells nicht bestimmen. Überspringe Strategie.")
+        return None
+    if model_input_dim != len(base_feature_cols):
+        print(f"WARNUNG: Modell erwartet {model_input_dim} Features, Basis-Liste hat {len(base_feature_cols)}. Überspringe Strategie.")
+        return None
+
+    # Scaler-Feature-Namen nutzen, falls vorhanden; ansonsten Basisliste
+    scaler_feature_cols = getattr(scaler, 'feature_names_in_', None)
+    scaler_cols = list(scaler_feature_cols) if scaler_feature_cols is not None and len(scaler_feature_cols) > 0 else base_feature_cols
+
+    # Fehlende Spalten für den Scaler auffüllen
+    for col in scaler_cols:
+        if col not in data_with_features.columns:
+            data_with_features[col] = 0.0
+
+    # Transformieren mit den Spalten, die der Scaler kennt
+    scaled_partial = scaler.transform(data_with_features[scaler_cols])
+
+    # Auf Modell-Feature-Reihenfolge (base_feature_cols) abbilden und fehlende mit 0 lassen
+    features_scaled = np.zeros((len(data_with_features), model_input_dim))
+    for idx, col in enumerate(scaler_cols):
+        if col in base_feature_cols:
+            target_idx = base_feature_cols.index(col)
+            features_scaled[:, target_idx] = scaled_partial[:, idx]
+
+    prediction = np.full(len(data), np.nan)
+    prediction[data.index.get_indexer(data_with_features.index)] = model.predict(features_scaled, verbose=0).flatten()
+    return prediction, st_direction.to_numpy(dtype=np.float64)
+
+
+def _model_fingerprint(model, scaler):
+    """Hash über Modell-Gewichte und Scaler (die Objekte haben keinen Dateipfad), None wenn nicht möglich."""
+    try:
+        hasher = hashlib.sha256(str(model.input_shape).encode())
+        for weights in model.get_weights():
+            hasher.update(np.ascontiguousarray(weights).tobytes())
+        hasher.update(pickle.dumps(scaler))
+    except Exception:
+        return None
+    return hasher.hexdigest()
+
+
+def cached_prediction_arrays(strat):
+    """
+    strategy_prediction_arrays über den Artefakt-Cache (Schlüssel: Kerzen, Feature-Version, Modell/Scaler).
+    Der Threshold ist nicht Teil des Schlüssels, die Signale werden daraus erst in prepare_strategy_book gebildet.
+    """
+    fingerprint = _model_fingerprint(strat['model'], strat['scaler'])
+    if fingerprint is None or strat['data'].empty:
+        return strategy_prediction_arrays(strat)
 
-    all_signals = []
-
-    # --- START: SuperTrend Trenddaten laden und generieren ---
-    print("1/4: Trenddaten (SuperTrend) laden und generieren...")
-    st_data_cache = {}
-    for key, strat in strategies_data.items():
-        data_with_features = strat['data'].copy()
-        if not data_with_features.empty:
-            st_direction = calculate_supertrend_direction(data_with_features)
-            st_data_cache[key] = st_direction
-    # --- ENDE SuperTrend Trenddaten laden ---
-
-    print("2/4: Generiere Handelssignale für alle Strategien...")
-    for key, strat in strategies_data.items():
-        data = strat['data']
-        model = strat['model']
-        scaler = strat['scaler']
-        params = strat['params']
-        timeframe = strat['timeframe']
-        symbol = strat['symbol']
-        
-        # Risk/Reward Ratio für die Simulation speichern
-        rr_ratio = params.get('risk_reward_ratio', 2.0)
-
-        # Führe Indikator-Berechnung durch
-        data_with_features = create_ann_features(data.copy())
-        data_with_features.dropna(inplace=True)
-        if data_with_features.empty: continue
-
-        # Feature-Spalten definieren (MUSS EXAKT mit ann_model.py übereinstimmen!)
-        base_feature_cols = [
-            # Basis-Features
-            'bb_width', 'bb_pband', 'obv', 'rsi', 'macd_diff', 'macd', 
-            'atr_normalized', 'adx', 'adx_pos', 'adx_neg',
-
-            # Volume-Features
-            'volume_ratio', 'mfi', 'cmf',
-
-            # Trend-Features
-            'price_to_ema20', 'price_to_ema50',
-
-            # Momentum-Features
-            'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
-
-            # Support/Resistance
-            'price_to_resistance', 'price_to_support',
-
-            # Price Action
-            'high_low_range', 'close_to_high', 'close_to_low',
-
-            # Zeitliche Features
-            'day_of_week', 'hour_of_day',
-
-            # Returns & Volatilität
-            'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility',
-
-            # Adaptive Trend Finder
-            'atf_pearson_r', 'atf_trend_strength', 'atf_slope',
-            'atf_std_dev', 'atf_upper_channel_dist', 'atf_lower_channel_dist',
-            'atf_price_to_trend'
-        ]
-
-        # Modell-Eingangsgröße ermitteln
-        model_input_dim = None
-        try:
-            model_input_dim = model.input_shape[-1]
-        except Exception:
-            pass
-        if model_input_dim is None:
-            print("WARNUNG: Konnte Input-Shape des Modells nicht bestimmen. Überspringe Strategie.")
-            continue
-        if model_input_dim != len(base_feature_cols):
-            print(f"WARNUNG: Modell erwartet {model_input_dim} Features, Basis-Liste hat {len(base_feature_cols)}. Überspringe Strategie.")
-            continue
-
-        # Scaler-Feature-Namen nutzen, falls vorhanden; ansonsten Basisliste
-        scaler_feature_cols = getattr(scaler, 'feature_names_in_', None)
-        scaler_cols = list(scaler_feature_cols) if scaler_feature_cols is not None and len(scaler_feature_cols) > 0 else base_feature_cols
-
-        # Fehlende Spalten für den Scaler auffüllen
-        for col in scaler_cols:
-            if col not in data_with_features.columns:
-                data_with_features[col] = 0.0
-
-        # Transformieren mit den Spalten, die der Scaler kennt
-        scaled_partial = scaler.transform(data_with_features[scaler_cols])
-
-        # Auf Modell-Feature-Reihenfolge (base_feature_cols) abbilden und fehlende mit 0 lassen
-        features_scaled = np.zeros((len(data_with_features), model_input_dim))
-        for idx, col in enumerate(scaler_cols):
-            if col in base_feature_cols:
-                target_idx = base_feature_cols.index(col)
-                features_scaled[:, target_idx] = scaled_partial[:, idx]
-        predictions = model.predict(features_scaled, verbose=0).flatten()
-        data_with_features['prediction'] = predictions
-        
-        # SuperTrend Direction für den Filter hinzufügen
-        st_direction_series = st_data_cache.get(key)
-        if st_direction_series is None or st_direction_series.empty: continue
-
-        data_with_features['st_direction'] = st_direction_series
-        data_with_features.dropna(subset=['st_direction'], inplace=True) 
-
-        pred_threshold = params.get('prediction_threshold', 0.65)
-
-        # Wende SuperTrend-Filter an: Nur Longs im Long-Trend (1.0), nur Shorts im Short-Trend (-1.0)
-        long_signals_filtered = data_with_features[(predictions >= pred_threshold) & (data_with_features['st_direction'] == 1.0)]
-        short_signals_filtered = data_with_features[(predictions <= (1 - pred_threshold)) & (data_with_features['st_direction'] == -1.0)]
-
-        # Sammle alle Signale
-        # Speichere RR-Ratio für den Exit-PnL-Cap
-        for index, row in long_signals_filtered.iterrows():
-            all_signals.append({'timestamp': index, 'symbol': symbol, 'symbol_key': key, 'timeframe': timeframe, 'side': 'long', 'entry_price': row['close'], 'params': params, 'config_key': key, 'risk_per_trade_pct': params.get('risk_per_trade_pct', 1.0) / 100, 'risk_reward_ratio': rr_ratio})
-        for index, row in short_signals_filtered.iterrows():
-            all_signals.append({'timestamp': index, 'symbol': symbol, 'symbol_key': key, 'timeframe': timeframe, 'side': 'short', 'entry_price': row['close'], 'params': params, 'config_key': key, 'risk_per_trade_pct': params.get('risk_per_trade_pct', 1.0) / 100, 'risk_reward_ratio': rr_ratio})
-
-    if not all_signals:
-        print("Keine Handelssignale im gewählten Zeitraum gefunden.")
-        return {
-            "start_capital": start_capital, "end_capital": start_capital, "total_pnl_pct": 0.0,
-            "trade_count": 0, "win_rate": 0.0, "max_drawdown_pct": 0.0,
-            "max_drawdown_date": None, "min_equity": start_capital, "liquidation_date": None,
-            "equity_curve": pd.DataFrame({'timestamp': [datetime.strptime(start_date, "%Y-%m-%d")], 'equity': [start_capital], 'drawdown_pct': [0.0]})
-        }
+    def compute():
+        arrays = strategy_prediction_arrays(strat)
+        if arrays is None:
+            return {}, {'skipped': True}
+        return {'prediction': arrays[0], 'st_direction': arrays[1]}, {}
+
+    key = make_key(kind='portfolio_predictions', candles=candles_hash(strat['data']), feature_version=FEATURE_CODE_VERSION,
+                   supertrend_version=SUPERTREND_CODE_VERSION, model=fingerprint)
+    arrays, meta = get_artifact_cache().load_or_compute(key, compute)
+    if meta.get('skipped'):
+        return None
+    return np.asarray(arrays['prediction']), np.asarray(arrays['st_direction'])
+
+
+def signals_from_predictions(prediction, st_direction, pred_threshold):
+    """Wende SuperTrend-Filter an: Nur Longs im Long-Trend (1.0), nur Shorts im Short-Trend (-1.0). NaN ergibt kein Signal."""
+    long_signal = (prediction >= pred_threshold) & (st_direction == 1.0)
+    short_signal = (prediction <= (1 - pred_threshold)) & (st_direction == -1.0)
+    return long_signal, short_signal
 
-    all_signals.sort(key=lambda x: x['timestamp'])
 
-    # Kombiniere alle Timeframes für die Equity Curve
-    all_timestamps = set()
-    for key, strat in strategies_data.items():
-        all_timestamps.update(strat['data'].index)
-    sorted_timestamps = sorted(list(all_timestamps))
+def prepare_strategy_book(key, strat, use_cache=True):
+    """
+    Vollständiges Strategie-Buch (Kerzen, Signale, Risiko-Parameter) für simulate_portfolio.
+    Teure Schritte (Features, SuperTrend, model.predict) laufen pro Strategie nur einmal bzw. kommen aus dem Cache;
+    Team-Bewertungen verwenden die fertigen Bücher wieder.
+    """
+    arrays = cached_prediction_arrays(strat) if use_cache else strategy_prediction_arrays(strat)
+    if arrays is None:
+        return build_strategy_book(key, strat)
+    return build_strategy_book(key, strat, *signals_from_predictions(*arrays, strat['params'].get('prediction_threshold', 0.65)))
+
+
+def build_strategy_book(key, strat, long_signal=None, short_signal=None):
+    """Kerzen-Arrays, Signale und Risiko-Parameter einer Strategie für simulate_portfolio."""
+    data = strat['data']
+    params = strat['params']
+    risk_params = params.get('risk', {})
+    n = len(data)
+    return {
+        'key': key,
+        'timestamps': pd.DatetimeIndex(data.index).as_unit('ns').asi8,
+        'tz': pd.DatetimeIndex(data.index).tz,
+        'high': data['high'].to_numpy(dtype=np.float64).tolist(),
+        'low': data['low'].to_numpy(dtype=np.float64).tolist(),
+        'close': data['close'].to_numpy(dtype=np.float64).tolist(),
+        'long_signal': (long_signal if long_signal is not None else np.zeros(n, dtype=bool)).tolist(),
+        'short_signal': (short_signal if short_signal is not None else np.zeros(n, dtype=bool)).tolist(),
+        'risk_per_trade_pct': params.get('risk_per_trade_pct', 1.0) / 100,
+        'risk_reward_ratio': params.get('risk_reward_ratio', 2.0),
+        'initial_sl_pct': risk_params.get('initial_sl_pct', 1.0) / 100.0,
+        'leverage': risk_params.get('leverage', 10),
+        'activation_rr': risk_params.get('trailing_stop_activation_rr', 2.0),
+        'callback_rate': risk_params.get('trailing_stop_callback_rate_pct', 1.0) / 100.0,
+        'signal_count': int(np.count_nonzero(long_signal)) + int(np.count_nonzero(short_signal)) if long_signal is not None else 0,
+    }
 
-    # --- 3. Chronologische Simulation (mit TitanBot TSL-Logik) ---
-    print("3/4: Führe chronologische Backtests durch...")
+
+def merge_bar_events(books):
+    """
+    Führt die Kerzen aller Strategien chronologisch zusammen (k-Wege-Merge über einen stabilen Sort).
+    Returns: (Zeitstempel je Ereignisgruppe, Gruppengrenzen, Strategie-Index und Kerzen-Position je Ereignis).
+    Innerhalb eines Zeitstempels sind die Ereignisse nach Strategie-Reihenfolge sortiert.
+    """
+    timestamps = np.concatenate([book['timestamps'] for book in books]) if books else np.empty(0, dtype=np.int64)
+    strategy = np.concatenate([np.full(len(book['timestamps']), k, dtype=np.int64) for k, book in enumerate(books)]) if books else np.empty(0, dtype=np.int64)
+    bar = np.concatenate([np.arange(len(book['timestamps']), dtype=np.int64) for book in books]) if books else np.empty(0, dtype=np.int64)
+    order = np.lexsort((strategy, timestamps))
+    timestamps, strategy, bar = timestamps[order], strategy[order], bar[order]
+    starts = np.flatnonzero(np.diff(timestamps, prepend=timestamps[:1] - 1)) if len(timestamps) else np.empty(0, dtype=np.int64)
+    bounds = np.append(starts, len(timestamps))
+    return timestamps[starts], bounds, strategy, bar
+
+
+def simulate_portfolio(start_capital, books):
+    """
+    Ereignisgesteuerte chronologische Portfolio-Simulation (TitanBot TSL-Logik).
+
+    Pro Zeitstempel (Vereinigung aller Kerzen) werden zuerst die offenen Positionen der Strategien
+    mit einer Kerze verwaltet, dann neue Signale in Strategie-Reihenfolge eröffnet. Positionen liegen
+    als Spalten-Listen pro Strategie vor (höchstens eine offene Position je Strategie), die belegte
+    Margin wird laufend mitgeführt. Equity (realisiert + unrealisiert der Strategien mit Kerze),
+    Drawdown und Liquidation wie bisher.
+    """
+    n = len(books)
+    side_long = [True] * n
+    entry_price = [0.0] * n
+    stop_loss = [0.0] * n
+    take_profit = [0.0] * n
+    activation_price = [0.0] * n
+    peak_price = [0.0] * n
+    trailing_active = [False] * n
+    notional = [0.0] * n
+    margin = [0.0] * n
+    is_open = [False] * n
+    open_order = []  # offene Strategien in Eröffnungsreihenfolge
+    total_margin = 0.0
 
     equity = start_capital
     peak_equity = start_capital
     max_drawdown_pct = 0.0
-    max_drawdown_date = None
+    max_drawdown_ts = None
     min_equity_ever = start_capital
-    liquidation_date = None
-
-    open_positions = {}
-    trade_history = []
-    equity_curve = []
-
-    fee_pct = 0.05 / 100
-    max_allowed_effective_leverage = 10
-    absolute_max_notional_value = 1000000
-    min_notional = 5.0 # Bitget Minimum Notional Value
-
-    signal_idx = 0
-    # Wir iterieren über die kombinierten Timestamps für die Positionsbewertung
-    for ts in tqdm(sorted_timestamps, desc="Simuliere Portfolio"):
-        if liquidation_date: break
-
-        current_total_equity = equity
-        unrealized_pnl = 0
-
-        # --- 3a. Offene Positionen managen (Trailing-Stop-Logik wie in backtester.py) ---
-        positions_to_close = []
-        for key in list(open_positions.keys()):
-            pos = open_positions[key]
-            # Hier müssen wir über den Symbol-Key auf die Strategie zugreifen
-            strat_data = strategies_data.get(pos['symbol_key'])
-            if not strat_data or ts not in strat_data['data'].index: continue
-
-            current_candle = strat_data['data'].loc[ts]
-            pos['last_known_price'] = current_candle['close']
-            exit_price = None
-
-            if pos['side'] == 'long':
-                # 1. TSL-Aktivierung prüfen
-                if not pos['trailing_active'] and current_candle['high'] >= pos['activation_price']:
-                    pos['trailing_active'] = True
-
-                # 2. TSL aktiv: Trailing Stop-Loss anheben
-                if pos['trailing_active']:
-                    pos['peak_price'] = max(pos['peak_price'], current_candle['high'])
-                    trailing_sl = pos['peak_price'] * (1 - pos['callback_rate'])
-                    pos['stop_loss'] = max(pos['stop_loss'], trailing_sl)
-
-                # 3. Exit prüfen (Stop-Loss oder Take-Profit)
-                if current_candle['low'] <= pos['stop_loss']: exit_price = pos['stop_loss']
-                elif not pos['trailing_active'] and current_candle['high'] >= pos['take_profit']: exit_price = pos['take_profit']
-
-            elif pos['side'] == 'short':
-                # 1. TSL-Aktivierung prüfen
-                if not pos['trailing_active'] and current_candle['low'] <= pos['activation_price']:
-                    pos['trailing_active'] = True
-
-                # 2. TSL aktiv: Trailing Stop-Loss anheben
-                if pos['trailing_active']:
-                    pos['peak_price'] = min(pos['peak_price'], current_candle['low'])
-                    trailing_sl = pos['peak_price'] * (1 + pos['callback_rate'])
-                    pos['stop_loss'] = min(pos['stop_loss'], trailing_sl)
-
-                # 3. Exit prüfen (Stop-Loss oder Take-Profit)
-                if current_candle['high'] >= pos['stop_loss']: exit_price = pos['stop_loss']
-                elif not pos['trailing_active'] and current_candle['low'] <= pos['take_profit']: exit_price = pos['take_profit']
-
-
-            if exit_price:
-                pnl_pct = (exit_price / pos['entry_price'] - 1) if pos['side'] == 'long' else (1 - exit_price / pos['entry_price'])
-                pnl_usd = pos['notional_value'] * pnl_pct
-                total_fees = pos['notional_value'] * fee_pct * 2
-                
-                # --- KORREKTUR: Begrenzung des maximalen Verlusts und Gewinns ---
-                # Dies verhindert PnL-Überläufe in der Simulation
-                risk_per_trade_pct = pos['risk_per_trade_pct']
-                risk_amount_usd = start_capital * risk_per_trade_pct
-                
-                net_pnl = pnl_usd - total_fees
-                
-                # 1. Max. Verlust ist der riskierte Betrag pro Trade
-                if net_pnl < -risk_amount_usd:
-                    net_pnl = -risk_amount_usd
-                    
-                # 2. Max. Gewinn ist der riskierte Betrag * Risk/Reward Ratio
-                risk_reward_ratio = pos['risk_reward_ratio']
-                max_profit_usd = risk_amount_usd * risk_reward_ratio
-
-                if net_pnl > max_profit_usd:
-                    net_pnl = max_profit_usd
-                # --- ENDE KORREKTUR ---
-                    
-                equity += net_pnl
-                
-                # Speichere den Config-Key für die Gruppierung
-                trade_history.append({'config_key': pos['config_key'], 'pnl': net_pnl})
-                
-                positions_to_close.append(key)
-            else:
-                pnl_mult = 1 if pos['side'] == 'long' else -1
-                unrealized_pnl += pos['notional_value'] * (current_candle['close'] / pos['entry_price'] -1) * pnl_mult
-
-        for key in positions_to_close:
-            del open_positions[key]
-
-        # --- 3b. Neue Signale prüfen und Positionen eröffnen ---
-        while signal_idx < len(all_signals) and all_signals[signal_idx]['timestamp'] == ts:
-            signal = all_signals[signal_idx]
-            symbol_key = signal['symbol_key']
-            config_key = signal['config_key']
-            
-            # Schlüssel für die offene Position
-            pos_key = f"{symbol_key}_{signal['timeframe']}"
-
-            # Prüfe, ob die Strategie bereits eine offene Position hat
-            if pos_key in open_positions:
-                signal_idx += 1
-                continue
-
-            # Die SuperTrend-Filterung ist bereits in Schritt 2/4 erfolgt (long_signals_filtered)
-            trade_allowed = True
-            
-            if equity <= 0: # Kein Kapital mehr
-                signal_idx += 1
-                continue
-
-            # Risiko- und Positionsberechnung
-            params = signal['params']
-            risk_params = params.get('risk', {})
-
-            risk_per_trade_pct = signal.get('risk_per_trade_pct', 1.0)
-            risk_reward_ratio = signal.get('risk_reward_ratio', 2.0) # Nutze den Wert, den wir im Signal gespeichert haben
-            initial_sl_pct = risk_params.get('initial_sl_pct', 1.0) / 100.0
-            leverage = risk_params.get('leverage', 10)
-            activation_rr = risk_params.get('trailing_stop_activation_rr', 2.0)
-            callback_rate = risk_params.get('trailing_stop_callback_rate_pct', 1.0) / 100.0
-            
-            entry_price = signal['entry_price']
-            risk_amount_usd = equity * risk_per_trade_pct
-
-            # SL-Distanz basierend auf initial_sl_pct (wie KBot-Logik)
-            sl_distance = entry_price * initial_sl_pct
-            if sl_distance <= 0:
-                signal_idx += 1
-                continue
-
-            # Berechnung der Positionsgröße (unverändert)
-            notional_value = risk_amount_usd / initial_sl_pct 
-            
-            max_notional_by_leverage = equity * max_allowed_effective_leverage
-            final_notional_value = min(notional_value, max_notional_by_leverage, absolute_max_notional_value)
-
-            if final_notional_value < min_notional:
-                signal_idx += 1
-                continue
-
-            margin_used = final_notional_value / leverage
-            current_total_margin = sum(p['margin_used'] for p in open_positions.values())
-            if current_total_margin + margin_used > equity:
-                signal_idx += 1
-                continue
-
-            # Berechnung der Preislevel
-            if signal['side'] == 'long':
-                stop_loss = entry_price - sl_distance
-                take_profit = entry_price + sl_distance * risk_reward_ratio
-                activation_price = entry_price + sl_distance * activation_rr
-            else: # short
-                stop_loss = entry_price + sl_distance
-                take_profit = entry_price - sl_distance * risk_reward_ratio
-                activation_price = entry_price - sl_distance * activation_rr
-
-            open_positions[pos_key] = {
-                'side': signal['side'], 'entry_price': entry_price,
-                'stop_loss': stop_loss, 'take_profit': take_profit,
-                'notional_value': final_notional_value, 'margin_used': margin_used,
-                'trailing_active': False, 'activation_price': activation_price,
-                'peak_price': entry_price, 'callback_rate': callback_rate,
-                'last_known_price': entry_price, 
-                'symbol_key': symbol_key, 
-                'config_key': config_key, 
-                'risk_per_trade_pct': risk_per_trade_pct,
-                'risk_reward_ratio': risk_reward_ratio # Speichere RR Ratio
-            }
-
-            signal_idx += 1
-
-        # --- 3c. Equity Curve und Drawdown aktualisieren ---
+    liquidation_ts = None
+    trade_keys, trade_pnls = [], []
+    curve_ts, curve_equity = [], []
+
+    group_ts, bounds, strategy, bar = merge_bar_events(books)
+    # Nur Ereignisse mit Long- oder Short-Signal durchlaufen die Eröffnungs-Logik
+    offsets = np.cumsum([0] + [len(book['timestamps']) for book in books])
+    has_signal = np.concatenate([np.asarray(book['long_signal'], dtype=bool) | np.asarray(book['short_signal'], dtype=bool)
+                                 for book in books]) if books else np.empty(0, dtype=bool)
+    signal_events = np.flatnonzero(has_signal[offsets[:-1][strategy] + bar]).tolist() + [len(strategy)]
+    group_ts, bounds, strategy, bar = group_ts.tolist(), bounds.tolist(), strategy.tolist(), bar.tolist()
+    next_signal = 0
+
+    for g, ts in enumerate(group_ts):
+        if liquidation_ts is not None: break
+        lo, hi = bounds[g], bounds[g + 1]
+        unrealized_pnl = 0.0
+
+        # --- Offene Positionen managen (Trailing-Stop-Logik wie in backtester.py) ---
+        if open_order:
+            bars_at_ts = dict(zip(strategy[lo:hi], bar[lo:hi]))
+            still_open = []
+            for k in open_order:
+                i = bars_at_ts.get(k)
+                if i is None:
+                    still_open.append(k)
+                    continue
+                book = books[k]
+                high, low, close = book['high'][i], book['low'][i], book['close'][i]
+                exit_price = None
+                if side_long[k]:
+                    if not trailing_active[k] and high >= activation_price[k]:
+                        trailing_active[k] = True
+                    if trailing_active[k]:
+                        if high > peak_price[k]: peak_price[k] = high
+                        trailing_sl = peak_price[k] * (1 - book['callback_rate'])
+                        if trailing_sl > stop_loss[k]: stop_loss[k] = trailing_sl
+                    if low <= stop_loss[k]: exit_price = stop_loss[k]
+                    elif not trailing_active[k] and high >= take_profit[k]: exit_price = take_profit[k]
+                else:
+                    if not trailing_active[k] and low <= activation_price[k]:
+                        trailing_active[k] = True
+                    if trailing_active[k]:
+                        if low < peak_price[k]: peak_price[k] = low
+                        trailing_sl = peak_price[k] * (1 + book['callback_rate'])
+                        if trailing_sl < stop_loss[k]: stop_loss[k] = trailing_sl
+                    if high >= stop_loss[k]: exit_price = stop_loss[k]
+                    elif not trailing_active[k] and low <= take_profit[k]: exit_price = take_profit[k]
+
+                if exit_price:
+                    pnl_pct = (exit_price / entry_price[k] - 1) if side_long[k] else (1 - exit_price / entry_price[k])
+                    net_pnl = notional[k] * pnl_pct - notional[k] * FEE_PCT * 2
+                    # Verlust auf den riskierten Betrag, Gewinn auf Risiko * RR begrenzen (gegen PnL-Überläufe)
+                    risk_amount_usd = start_capital * book['risk_per_trade_pct']
+                    if net_pnl < -risk_amount_usd:
+                        net_pnl = -risk_amount_usd
+                    max_profit_usd = risk_amount_usd * book['risk_reward_ratio']
+                    if net_pnl > max_profit_usd:
+                        net_pnl = max_profit_usd
+                    equity += net_pnl
+                    trade_keys.append(k)
+                    trade_pnls.append(net_pnl)
+                    is_open[k] = False
+                    total_margin -= margin[k]
+                else:
+                    pnl_mult = 1 if side_long[k] else -1
+                    unrealized_pnl += notional[k] * (close / entry_price[k] - 1) * pnl_mult
+                    still_open.append(k)
+            open_order = still_open
+            if not open_order:
+                total_margin = 0.0
+
+        # --- Neue Signale prüfen und Positionen eröffnen (Long vor Short, Strategie-Reihenfolge) ---
+        while signal_events[next_signal] < hi:
+            j = signal_events[next_signal]
+            next_signal += 1
+            k, i = strategy[j], bar[j]
+            book = books[k]
+            for wants_long, has_signal in ((True, book['long_signal'][i]), (False, book['short_signal'][i])):
+                if not has_signal or is_open[k] or equity <= 0:
+                    continue
+                price = book['close'][i]
+                sl_distance = price * book['initial_sl_pct']
+                if sl_distance <= 0:
+                    continue
+                notional_value = equity * book['risk_per_trade_pct'] / book['initial_sl_pct']
+                final_notional_value = min(notional_value, equity * MAX_ALLOWED_EFFECTIVE_LEVERAGE, ABSOLUTE_MAX_NOTIONAL_VALUE)
+                if final_notional_value < MIN_NOTIONAL:
+                    continue
+                margin_used = final_notional_value / book['leverage']
+                if total_margin + margin_used > equity:
+                    continue
+
+                side_long[k] = wants_long
+                entry_price[k] = price
+                if wants_long:
+                    stop_loss[k] = price - sl_distance
+                    take_profit[k] = price + sl_distance * book['risk_reward_ratio']
+                    activation_price[k] = price + sl_distance * book['activation_rr']
+                else:
+                    stop_loss[k] = price + sl_distance
+                    take_profit[k] = price - sl_distance * book['risk_reward_ratio']
+                    activation_price[k] = price - sl_distance * book['activation_rr']
+                peak_price[k] = price
+                trailing_active[k] = False
+                notional[k] = final_notional_value
+                margin[k] = margin_used
+                is_open[k] = True
+                open_order.append(k)
+                total_margin += margin_used
+
+        # --- Equity Curve und Drawdown aktualisieren ---
         current_total_equity = equity + unrealized_pnl
-        equity_curve.append({'timestamp': ts, 'equity': current_total_equity})
+        curve_ts.append(ts)
+        curve_equity.append(current_total_equity)
 
-        peak_equity = max(peak_equity, current_total_equity)
+        if current_total_equity > peak_equity: peak_equity = current_total_equity
         drawdown = (peak_equity - current_total_equity) / peak_equity if peak_equity > 0 else 0
         if drawdown > max_drawdown_pct:
             max_drawdown_pct = drawdown
-            max_drawdown_date = ts
+            max_drawdown_ts = ts
+
+        if current_total_equity < min_equity_ever: min_equity_ever = current_total_equity
+        if current_total_equity <= 0 and liquidation_ts is None:
+            liquidation_ts = ts
 
-        min_equity_ever = min(min_equity_ever, current_total_equity)
-        if current_total_equity <= 0 and not liquidation_date:
-            liquidation_date = ts
+    tz = books[0]['tz'] if books else None
+    to_timestamp = lambda value: pd.Timestamp(value, tz='UTC').tz_convert(tz) if tz is not None else pd.Timestamp(value)
 
-    # 4/4: Ergebnisse vorbereiten
-    print("4/4: Bereite Analyse-Ergebnisse vor...")
-    final_equity = equity_curve[-1]['equity'] if equity_curve else start_capital
+    final_equity = curve_equity[-1] if curve_equity else start_capital
     total_pnl_pct = (final_equity / start_capital - 1) * 100 if start_capital > 0 else 0
-    wins = sum(1 for t in trade_history if t['pnl'] > 0)
-    trade_count = len(trade_history)
+    trade_count = len(trade_pnls)
+    wins = sum(1 for pnl in trade_pnls if pnl > 0)
     win_rate = (wins / trade_count * 100) if trade_count else 0
 
-    trade_df = pd.DataFrame(trade_history)
-    strategy_key_col = 'config_key' 
-
+    trade_df = pd.DataFrame({'config_key': [books[k]['key'] for k in trade_keys], 'pnl': trade_pnls})
+    strategy_key_col = 'config_key'
     pnl_per_strategy = trade_df.groupby(strategy_key_col)['pnl'].sum().reset_index() if not trade_df.empty else pd.DataFrame(columns=[strategy_key_col, 'pnl'])
     trades_per_strategy = trade_df.groupby(strategy_key_col).size().reset_index(name='trades') if not trade_df.empty else pd.DataFrame(columns=[strategy_key_col, 'trades'])
 
-    equity_df = pd.DataFrame(equity_curve)
-    if not equity_df.empty:
+    if curve_ts:
+        index = pd.DatetimeIndex(np.asarray(curve_ts, dtype='datetime64[ns]'))
+        index = index.tz_localize('UTC').tz_convert(tz) if tz is not None else index
+        equity_df = pd.DataFrame({'timestamp': index, 'equity': curve_equity})
         equity_df['peak'] = equity_df['equity'].cummax()
         equity_df['drawdown_pct'] = ((equity_df['peak'] - equity_df['equity']) / equity_df['peak'].replace(0, np.nan)).fillna(0)
-        equity_df['timestamp'] = pd.to_datetime(equity_df['timestamp'])
         equity_df.set_index('timestamp', inplace=True, drop=False)
-
-    print("Analyse abgeschlossen.")
+    else:
+        equity_df = pd.DataFrame()
 
     return {
         "start_capital": start_capital, "end_capital": final_equity, "total_pnl_pct": total_pnl_pct,
         "trade_count": trade_count, "win_rate": win_rate, "max_drawdown_pct": max_drawdown_pct * 100,
-        "max_drawdown_date": max_drawdown_date, "min_equity": min_equity_ever, "liquidation_date": liquidation_date,
+        "max_drawdown_date": to_timestamp(max_drawdown_ts) if max_drawdown_ts is not None else None,
+        "min_equity": min_equity_ever,
+        "liquidation_date": to_timestamp(liquidation_ts) if liquidation_ts is not None else None,
         "pnl_per_strategy": pnl_per_strategy, "trades_per_strategy": trades_per_strategy,
         "equity_curve": equity_df
     }
+
+
+def empty_simulation_result(start_capital, start_date):
+    """Ergebnis ohne Handelssignale."""
+    return {
+        "start_capital": start_capital, "end_capital": start_capital, "total_pnl_pct": 0.0,
+        "trade_count": 0, "win_rate": 0.0, "max_drawdown_pct": 0.0,
+        "max_drawdown_date": None, "min_equity": start_capital, "liquidation_date": None,
+        "equity_curve": pd.DataFrame({'timestamp': [datetime.strptime(start_date, "%Y-%m-%d")], 'equity': [start_capital], 'drawdown_pct': [0.0]})
+    }
+
+
+def simulate_books(start_capital, books, start_date):
+    """Portfolio-Simulation auf vorbereiteten Strategie-Büchern (ohne Signal-Berechnung)."""
+    if not any(book['signal_count'] for book in books):
+        return empty_simulation_result(start_capital, start_date)
+    return simulate_portfolio(start_capital, books)
+
+
+def run_portfolio_simulation(start_capital, strategies_data, start_date, end_date):
+    """
+    Führt eine chronologische Portfolio-Simulation mit mehreren Strategien durch.
+    """
+    print("\n--- Starte Portfolio-Simulation... ---")
+
+    print("1/3: Generiere Handelssignale für alle Strategien (SuperTrend + ANN, mit Cache)...")
+    books = [prepare_strategy_book(key, strat) for key, strat in strategies_data.items()]
+
+    if not any(book['signal_count'] for book in books):
+        print("Keine Handelssignale im gewählten Zeitraum gefunden.")
+        return empty_simulation_result(start_capital, start_date)
+
+    print("2/3: Führe chronologische Backtests durch...")
+    result = simulate_portfolio(start_capital, books)
+    print("3/3: Analyse abgeschlossen.")
+    return result
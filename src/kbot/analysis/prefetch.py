@@ -0,0 +1,169 @@
+# src/kbot/analysis/prefetch.py
+"""
+Paralleler Vorab-Download historischer Kerzen für eine ganze Aufgaben-Matrix (Symbole x Timeframes).
+
+Für jede Aufgabe werden (offline) die fehlenden Abschnitte im OHLCV-Speicher ermittelt und in
+Seitenfenster zerlegt. Alle Seiten aller Aufgaben laufen dann über einen gemeinsamen Thread-Pool;
+ein gemeinsamer Token-Bucket begrenzt die Anfragen pro Sekunde. Jede Aufgabe wird übernommen,
+sobald alle ihre Seiten geladen sind.
+
+Beispiel:
+    python3 src/kbot/analysis/prefetch.py --symbols "BTC ETH" --timeframes "1h 4h" --start_date 2024-01-01 --end_date 2025-01-01
+    python3 src/kbot/analysis/prefetch.py --tasks "BTC:1h:2024-01-01:2025-01-01 ETH:4h:2023-01-01:2025-01-01"
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ccxt
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.data_store import get_data_store, to_ms
+from kbot.utils.exchange import create_public_client
+from kbot.utils.market_cache import get_market_cache
+from kbot.utils.ohlcv_sync import PAGE_LIMIT, plan_sync, page_windows, fetch_segment, commit_segments
+from kbot.utils.rate_limiter import TokenBucket, RateLimitedClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 10.0  # Anfragen pro Sekunde (Bitget erlaubt 20/s für Marktdaten)
+MAX_RETRIES = 3
+
+
+def build_tasks(symbols, timeframes, start_date, end_date):
+    return [{'symbol': f"{s}/USDT:USDT", 'timeframe': tf, 'start': start_date, 'end': end_date}
+            for s in symbols for tf in timeframes]
+
+
+def parse_task_list(task_string):
+    """'BTC:1h:2024-01-01:2025-01-01 ETH:4h:...' -> Aufgaben-Liste."""
+    tasks = []
+    for item in task_string.split():
+        coin, timeframe, start, end = item.split(':')
+        tasks.append({'symbol': f"{coin}/USDT:USDT", 'timeframe': timeframe, 'start': start, 'end': end})
+    return tasks
+
+
+def _fetch_with_retry(client, symbol, timeframe, since, until, page_limit):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return fetch_segment(client, symbol, timeframe, since, until, page_limit)
+        except (ccxt.NetworkError, ccxt.RateLimitExceeded) as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            wait = 2 ** attempt
+            logger.warning(f"Seite {symbol} ({timeframe}) ab {since} fehlgeschlagen ({e}), neuer Versuch in {wait}s")
+            time.sleep(wait)
+
+
+def prefetch(tasks, store=None, client_factory=None, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+             page_limit=PAGE_LIMIT, now_ms=None, verbose=True):
+    """
+    Lädt alle fehlenden Kerzen der Aufgaben parallel.
+
+    Args:
+        client_factory: Funktion ohne Argumente, die einen ccxt-kompatiblen Client liefert
+                        (wird pro Worker-Thread einmal aufgerufen, ccxt-Clients sind nicht thread-sicher).
+    Returns:
+        dict mit 'tasks', 'pages', 'candles', 'seconds', 'failed'
+    """
+    store = store or get_data_store()
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    if client_factory is None:
+        markets = get_market_cache().apply(create_public_client())
+        client_factory = lambda: create_public_client(markets=markets, enable_rate_limit=False)
+
+    bucket = TokenBucket(rate)
+    local = threading.local()
+
+    def get_client():
+        if not hasattr(local, 'client'):
+            local.client = RateLimitedClient(client_factory(), bucket)
+        return local.client
+
+    # Seitenfenster aller Aufgaben planen (ohne Netzwerk)
+    jobs, plans = [], []
+    for task_no, task in enumerate(tasks):
+        segments = plan_sync(store, task['symbol'], task['timeframe'], to_ms(task['start']), to_ms(task['end']), now_ms=now_ms)
+        plans.append({'task': task, 'segments': [(s, e, is_gap, []) for s, e, is_gap in segments], 'open_pages': 0, 'failed': False})
+        for seg_no, (seg_start, seg_end, _) in enumerate(segments):
+            for since, until in page_windows(seg_start, seg_end, task['timeframe'], page_limit):
+                jobs.append((task_no, seg_no, since, until))
+                plans[task_no]['open_pages'] += 1
+
+    stats = {'tasks': len(tasks), 'pages': 0, 'candles': 0, 'seconds': 0.0, 'failed': []}
+    if verbose:
+        print(f"Prefetch: {len(tasks)} Aufgaben, {len(jobs)} Seitenfenster, {workers} Worker, max. {rate:g} Anfragen/s")
+    started = time.monotonic()
+
+    def run_job(job):
+        task_no, _, since, until = job
+        task = plans[task_no]['task']
+        return _fetch_with_retry(get_client(), task['symbol'], task['timeframe'], since, until, page_limit)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            task_no, seg_no, _, _ = futures[future]
+            plan = plans[task_no]
+            plan['open_pages'] -= 1
+            try:
+                rows, pages = future.result()
+            except Exception as e:
+                plan['failed'] = True
+                logger.error(f"Download für {plan['task']['symbol']} ({plan['task']['timeframe']}) fehlgeschlagen: {e}")
+                continue
+            plan['segments'][seg_no][3].extend(rows)
+            stats['pages'] += pages
+            if plan['open_pages'] == 0 and not plan['failed']:
+                task = plan['task']
+                candles = commit_segments(store, task['symbol'], task['timeframe'], plan['segments'], now_ms=now_ms)
+                stats['candles'] += candles
+                if verbose:
+                    print(f"✔ {task['symbol']} ({task['timeframe']}): {candles} Kerzen übernommen")
+
+    for plan in plans:
+        if plan['failed']:
+            stats['failed'].append(f"{plan['task']['symbol']} ({plan['task']['timeframe']})")
+
+    stats['seconds'] = time.monotonic() - started
+    if verbose:
+        seconds = max(stats['seconds'], 1e-9)
+        print(f"Prefetch abgeschlossen: {stats['pages']} Seiten, {stats['candles']} Kerzen in {stats['seconds']:.1f}s "
+              f"({stats['pages'] / seconds:.1f} Seiten/s, {stats['candles'] / seconds:.0f} Kerzen/s)")
+        if stats['failed']:
+            print(f"❌ Fehlgeschlagen: {', '.join(stats['failed'])}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paralleler Vorab-Download historischer Kerzen für KBot")
+    parser.add_argument('--symbols', type=str, help="z.B. 'BTC ETH SOL'")
+    parser.add_argument('--timeframes', type=str, help="z.B. '1h 4h'")
+    parser.add_argument('--start_date', type=str)
+    parser.add_argument('--end_date', type=str)
+    parser.add_argument('--tasks', type=str, help="Alternativ: 'COIN:TF:START:ENDE ...' mit eigenem Zeitraum pro Aufgabe")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Max. Anfragen pro Sekunde (gemeinsam für alle Worker)")
+    args = parser.parse_args()
+
+    if args.tasks:
+        tasks = parse_task_list(args.tasks)
+    elif args.symbols and args.timeframes and args.start_date and args.end_date:
+        tasks = build_tasks(args.symbols.split(), args.timeframes.split(), args.start_date, args.end_date)
+    else:
+        parser.error("Entweder --tasks oder --symbols/--timeframes/--start_date/--end_date angeben.")
+
+    stats = prefetch(tasks, workers=args.workers, rate=args.rate)
+    sys.exit(1 if stats['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
 
 from kbot.strategy.run import load_ohlcv, fibonacci_bollinger_bands, fib_backtest
+from kbot.analysis.portfolio_search import equity_from_trades, search_portfolio
 
 
 def load_optimal_config(symbol, timeframe):
@@ -281,8 +282,8 @@ def mode_2_manual_input():
 
 
 def run_portfolio_optimizer(start_capital, start_date, end_date, max_drawdown, configs):
-    """Findet die beste Kombination von Strategien (Greedy-Algorithmus wie JaegerBot)
-    Wichtig: Jeder Coin wird nur EINMAL verwendet (beste Timeframe wird automatisch gewählt)"""
+    """Findet die beste Kombination von Strategien (Beam-Search + lokale Suche über die Equity-Kurven)
+    Wichtig: Jeder Coin wird nur EINMAL verwendet (die Suche wählt die beste Timeframe pro Coin)"""
     print("\n1/3: Analysiere Einzel-Performance jeder Strategie...")
     
     all_results = []
@@ -312,93 +313,28 @@ def run_portfolio_optimizer(start_capital, start_date, end_date, max_drawdown, c
     if not all_results:
         return None
     
-    # WICHTIG: Gruppiere nach Symbol und wähle für jeden Coin die beste Timeframe
+    # WICHTIG: Gruppiere nach Symbol, pro Coin darf nur eine Timeframe ins Portfolio
     # Normalisiere Symbole: BTCUSDT -> BTC, ETHUSDT -> ETH, etc.
-    symbol_groups = {}
+    curves, groups, by_name = {}, {}, {}
     for res in all_results:
-        symbol = res['symbol']
+        name = f"{res['symbol']}_{res['timeframe']}"
         # Entferne USDT, USD, BUSD Suffixe für die Grouping
-        normalized_symbol = symbol.replace('USDT', '').replace('USD', '').replace('BUSD', '')
-        
-        if normalized_symbol not in symbol_groups:
-            symbol_groups[normalized_symbol] = []
-        symbol_groups[normalized_symbol].append(res)
-    
-    # Wähle für jeden Symbol nur die beste Timeframe
-    single_results = []
-    for normalized_symbol, candidates in symbol_groups.items():
-        # Sortiere nach Score und nehme den besten
-        candidates.sort(key=lambda x: x['score'], reverse=True)
-        best_for_symbol = candidates[0]
-        single_results.append(best_for_symbol)
-        print(f"  • {best_for_symbol['symbol']}: {best_for_symbol['timeframe']} (Score: {best_for_symbol['score']:.2f})")
-    
-    # Sortiere alle besten nach Score
-    single_results.sort(key=lambda x: x['score'], reverse=True)
-    
-    # Star-Spieler (beste Einzelstrategie)
-    best_portfolio = [single_results[0]]
-    best_score = single_results[0]['score']
-    
-    print(f"\n2/3: Star-Spieler gefunden: {single_results[0]['symbol']} ({single_results[0]['timeframe']}) (Score: {best_score:.2f})")
-    print("3/3: Suche die besten Team-Kollegen...")
-    
-    # Kandidaten-Pool (ohne Star-Spieler)
-    candidates = single_results[1:]
-    
-    # Greedy: Füge schrittweise Strategien hinzu
-    while candidates:
-        best_addition = None
-        best_new_score = best_score
-        
-        for candidate in candidates:
-            # Teste Portfolio mit dieser zusätzlichen Strategie
-            test_portfolio = best_portfolio + [candidate]
-            
-            # Simuliere kombiniertes Portfolio
-            combined_capital = start_capital
-            combined_trades = 0
-            combined_dd = 0.0
-            
-            for strat in test_portfolio:
-                res = strat['result']
-                combined_capital += (res['end_capital'] - start_capital)
-                combined_trades += res['num_trades']
-                combined_dd = min(combined_dd, res['max_dd'])
-            
-            # Prüfe DD-Limit
-            if abs(combined_dd) > max_drawdown:
-                continue
-            
-            # Berechne Score
-            combined_return = ((combined_capital - start_capital) / start_capital) * 100
-            dd_abs = abs(combined_dd)
-            score = combined_return / dd_abs if dd_abs > 0 else combined_return
-            
-            if score > best_new_score:
-                best_new_score = score
-                best_addition = candidate
-        
-        if best_addition:
-            print(f"-> Füge hinzu: {best_addition['symbol']} ({best_addition['timeframe']}) (Neuer Score: {best_new_score:.2f})")
-            best_portfolio.append(best_addition)
-            best_score = best_new_score
-            candidates.remove(best_addition)
-        else:
-            print("Keine weitere Verbesserung möglich. Optimierung beendet.")
-            break
-    
-    # Berechne finale Performance
-    final_capital = start_capital
-    final_trades = 0
-    final_dd = 0.0
-    
-    for strat in best_portfolio:
-        res = strat['result']
-        final_capital += (res['end_capital'] - start_capital)
-        final_trades += res['num_trades']
-        final_dd = min(final_dd, res['max_dd'])
+        groups[name] = res['symbol'].replace('USDT', '').replace('USD', '').replace('BUSD', '')
+        curves[name] = equity_from_trades(res['result']['trades'], start_capital)
+        by_name[name] = res
+        print(f"  • {res['symbol']}: {res['timeframe']} (Score: {res['score']:.2f})")
+    
+    # Kombinierte Equity = Startkapital + Summe der Einzel-PnL-Kurven; Drawdown auf der kombinierten Kurve
+    print("\n2/3: Beam-Search über alle Kombinationen (echter Portfolio-Drawdown)...")
+    found = search_portfolio(curves, start_capital, max_drawdown, groups)
+    if not found:
+        return None
+    best = found[0]
+    print(f"3/3: Lokale Suche abgeschlossen (Score: {best['score']:.2f})")
     
+    best_portfolio = [by_name[name] for name in best['members']]
+    final_capital = float(best['equity'].iloc[-1]) if len(best['equity']) else start_capital
+    final_trades = sum(strat['result']['num_trades'] for strat in best_portfolio)
     final_pnl = final_capital - start_capital
     final_pnl_pct = (final_pnl / start_capital) * 100
     
@@ -408,7 +344,7 @@ def run_portfolio_optimizer(start_capital, start_date, end_date, max_drawdown, c
         'total_pnl': final_pnl,
         'total_pnl_pct': final_pnl_pct,
         'trade_count': final_trades,
-        'max_dd': final_dd
+        'max_dd': -best['max_drawdown_pct']
     }
 
 
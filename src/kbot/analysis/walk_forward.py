@@ -0,0 +1,312 @@
+# src/kbot/analysis/walk_forward.py
+"""
+Walk-Forward-Optimierung mit rollierenden Trainings-/Test-Fenstern.
+
+Der Zeitraum wird in Folds zerlegt: Jeder Fold trainiert ein Modell auf den train_days vor seinem
+Testfenster (oder nutzt das vorhandene Modell, --model reuse) und sagt das anschließende Testfenster
+vorher, das damit außerhalb der Trainingsdaten liegt. Auf jedem Testfenster läuft die Optuna-Suche
+des Optimizers (gebündelter Backtest-Kernel). Die zusammengesetzte Equity-Kurve handelt Fold k mit
+den Parametern aus Fold k-1, ist also für Modell UND Risiko-Parameter out-of-sample; der erste Fold
+dient nur der Parameter-Suche.
+
+Performance:
+- Fold-Modelle, Datensätze und Vorhersagen liegen im Artefakt-Cache (artifacts/cache); ein erneuter
+  Lauf trainiert und rechnet nur Folds mit geänderten Kerzen neu.
+- Training und Vorhersage (TensorFlow) laufen im Hauptprozess strikt nacheinander (eine gemeinsame
+  Scheduler-Stufe 'model' mit einem Slot), die Optimierungen der Folds parallel in Worker-Prozessen
+  (Arrays per Memory-Map) und überlappend mit dem Training der folgenden Folds (DagScheduler aus pipeline.py).
+
+Beispiel:
+    python3 src/kbot/analysis/walk_forward.py --symbol BTC --timeframe 4h --start_date 2021-01-01 --end_date 2025-01-01 \\
+        --folds 12 --train_days 365 --trials 200 --threshold 0.65
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import optuna
+from sklearn.preprocessing import StandardScaler
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis import optimizer
+from kbot.analysis.backtester import load_data, prepare_ann_backtest_data
+from kbot.analysis.backtest_kernel import save_backtest_arrays, load_backtest_arrays, run_backtest_arrays, backtest_equity_curve
+from kbot.analysis.pipeline import DagScheduler, StageFailed
+from kbot.utils import ann_model
+from kbot.utils.artifact_cache import get_artifact_cache, make_key, candles_hash
+from kbot.utils.feature_engine import FEATURE_CODE_VERSION
+
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'walk_forward')
+# Kerzen vor dem Testfenster für Indikatoren und Fib-Bänder (fib_length bis 300)
+WARMUP_BARS = 1000
+MIN_TRAIN_SAMPLES = 200
+MODEL_FILE, SCALER_FILE = 'model.h5', 'scaler.joblib'
+
+
+def walk_forward_folds(start_date, end_date, n_folds, train_days):
+    """
+    Rollierende Folds: der Bereich nach den ersten train_days wird in n_folds gleich lange Testfenster
+    geteilt, jedes Trainingsfenster umfasst die train_days direkt davor.
+    Returns: Liste von dicts mit fold, train_start, test_start (= Ende des Trainings) und test_end (UTC).
+    """
+    start, end = pd.Timestamp(start_date, tz='UTC'), pd.Timestamp(end_date, tz='UTC')
+    first_test = start + pd.Timedelta(days=train_days)
+    if n_folds < 1 or first_test >= end:
+        raise ValueError(f"Zeitraum {start_date}..{end_date} zu kurz für {train_days} Trainingstage")
+    bounds = pd.date_range(first_test, end, periods=n_folds + 1)
+    return [{'fold': k, 'train_start': bounds[k] - pd.Timedelta(days=train_days), 'test_start': bounds[k], 'test_end': bounds[k + 1]}
+            for k in range(n_folds)]
+
+
+def fold_model(train_data, timeframe):
+    """
+    Modell/Scaler für ein Trainingsfenster aus dem Artefakt-Cache bzw. neu trainiert
+    (gesamtes Fenster; bewertet wird out-of-sample auf dem Testfenster). Returns: model_paths-dict.
+    """
+    lookahead, volatility_multiplier = ann_model.get_label_params(timeframe)
+    key = make_key(kind='fold_model', candles=candles_hash(train_data), feature_version=FEATURE_CODE_VERSION,
+                   lookahead=lookahead, volatility_multiplier=volatility_multiplier)
+    cache = get_artifact_cache()
+    entry_dir = cache.lookup(key)
+    if entry_dir is None:
+        X, y = ann_model.prepare_data_for_ann(train_data, timeframe, verbose=False)
+        if len(X) < MIN_TRAIN_SAMPLES:
+            raise StageFailed(f"Nur {len(X)} Trainings-Samples im Fold")
+        scaler = StandardScaler().fit(X)
+        model = ann_model.build_and_train_model(scaler.transform(X), y)
+
+        def write(directory):
+            ann_model.save_model_and_scaler(model, scaler, os.path.join(directory, MODEL_FILE), os.path.join(directory, SCALER_FILE))
+        entry_dir = cache.store(key, write)
+    return {'model': os.path.join(entry_dir, MODEL_FILE), 'scaler': os.path.join(entry_dir, SCALER_FILE)}
+
+
+def fold_test_arrays(data, fold, model_paths, timeframe):
+    """
+    Backtest-Arrays für das Testfenster eines Folds. Indikatoren laufen mit WARMUP_BARS Vorlauf;
+    vor test_start sind die Vorhersagen NaN, dort entsteht also kein Einstieg.
+    """
+    first = int(data.index.searchsorted(fold['test_start']))
+    last = int(data.index.searchsorted(fold['test_end']))
+    window = data.iloc[max(0, first - WARMUP_BARS):last]
+    arrays = dict(prepare_ann_backtest_data(window, model_paths, timeframe))
+    prediction = np.array(arrays['prediction'], dtype=np.float64)
+    prediction[arrays['index'] < fold['test_start']] = np.nan
+    arrays['prediction'] = prediction
+    arrays['fib_components'] = {}
+    return arrays
+
+
+def oos_accuracy(data, fold, model_paths, timeframe):
+    """Trefferquote des Fold-Modells auf den klaren Signalen des Testfensters (None ohne Signale)."""
+    first = int(data.index.searchsorted(fold['test_start']))
+    last = int(data.index.searchsorted(fold['test_end']))
+    X, y = ann_model.prepare_data_for_ann(data.iloc[max(0, first - WARMUP_BARS):last], timeframe, verbose=False)
+    if X.empty:
+        return None
+    in_window = X.index >= fold['test_start']
+    if not in_window.any():
+        return None
+    predictions = ann_model.predict_with_cache(model_paths['model'], model_paths['scaler'], X[in_window])
+    return float(np.mean((predictions >= 0.5) == (y[in_window].to_numpy() == 1)) * 100)
+
+
+def optimize_fold(arrays_dir, n_trials, batch_size, settings, seed):
+    """
+    Läuft in einem Worker-Prozess: Optuna-Suche des Optimizers auf dem Testfenster eines Folds.
+    Returns: dict mit params, score und dem Backtest-Ergebnis im Fenster, oder None ohne gültigen Trial.
+    """
+    vars(optimizer).update(settings)
+    optimizer.HISTORICAL_DATA = None
+    optimizer.PREPARED_DATA = load_backtest_arrays(arrays_dir)
+    study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=seed))
+    optimizer.optimize_in_batches(study, n_trials, max(1, batch_size), show_progress=False)
+
+    valid_trials = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+    if not valid_trials:
+        return None
+    best_trial = max(valid_trials, key=lambda t: t.value)
+    params = dict(best_trial.params, prediction_threshold=settings['FIXED_THRESHOLD'])
+    return {'params': params, 'score': best_trial.value,
+            'in_window': run_backtest_arrays(optimizer.PREPARED_DATA, params, settings['START_CAPITAL'])}
+
+
+def stitch_equity(fold_arrays, fold_params, start_capital):
+    """
+    Setzt die Equity-Kurven der Testfenster zusammen: Fold k handelt mit fold_params[k] und startet mit
+    dem Endkapital von Fold k-1. Folds ohne Parameter bleiben flach.
+    Returns: (pd.Series Kapital nach jedem Trade, Liste der Endkapitale pro Fold).
+    """
+    capital = start_capital
+    segments, end_capitals = [], []
+    for arrays, params in zip(fold_arrays, fold_params):
+        if params is not None:
+            segment = backtest_equity_curve(arrays, params, capital)
+            if not segment.empty:
+                segments.append(segment)
+                capital = float(segment.iloc[-1])
+        end_capitals.append(capital)
+    equity = pd.concat(segments) if segments else pd.Series(dtype=np.float64, name='capital')
+    return equity, end_capitals
+
+
+def equity_stats(equity, start_capital):
+    """Gesamt-PnL und maximaler Drawdown (in %) einer Equity-Kurve inkl. Startkapital."""
+    values = np.concatenate(([start_capital], equity.to_numpy(dtype=np.float64)))
+    peaks = np.maximum.accumulate(values)
+    drawdown = np.max((peaks - values) / peaks) if len(values) else 0.0
+    return {'total_pnl_pct': (values[-1] / start_capital - 1) * 100, 'max_drawdown_pct': float(drawdown) * 100,
+            'trades_count': len(equity)}
+
+
+def run_walk_forward(symbol, timeframe, start_date, end_date, n_folds=12, train_days=365, n_trials=200,
+                     batch_size=32, n_jobs=-1, settings=None, model_mode='fold'):
+    """
+    Führt die Walk-Forward-Optimierung aus (siehe Modul-Docstring).
+    settings: Optimizer-Einstellungen (Namen aus optimizer.WORKER_SETTINGS, fehlende aus optimizer).
+    Returns: dict mit folds, equity (pd.Series) und stats, oder None ohne Daten.
+    """
+    settings = {name: getattr(optimizer, name) for name in optimizer.WORKER_SETTINGS} | dict(settings or {})
+    settings['CURRENT_TIMEFRAME'] = timeframe
+    start_capital = settings['START_CAPITAL']
+    folds = walk_forward_folds(start_date, end_date, n_folds, train_days)
+    data = load_data(symbol, timeframe, start_date, end_date)
+    if data.empty:
+        print(f"❌ Keine Daten für {symbol} ({timeframe})")
+        return None
+
+    safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
+    models_dir = os.path.join(PROJECT_ROOT, 'artifacts', 'models')
+    existing_model = {'model': os.path.join(models_dir, f'ann_predictor_{safe_filename}.h5'),
+                      'scaler': os.path.join(models_dir, f'ann_scaler_{safe_filename}.joblib')}
+    n_workers = max(1, min(os.cpu_count() if n_jobs < 1 else n_jobs, n_folds))
+    # 'fork' wie im Optimizer; die Worker entstehen beim ersten submit, also vor dem ersten Training
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    arrays_root = tempfile.mkdtemp(prefix='kbot_walk_forward_')
+
+    def train(fold):
+        def stage(deps):
+            if model_mode == 'reuse':
+                return existing_model
+            train_data = data[(data.index >= fold['train_start']) & (data.index < fold['test_start'])]
+            return fold_model(train_data, timeframe)
+        return stage
+
+    def predict(fold):
+        def stage(deps):
+            model_paths = deps[f"{fold['fold']}|train"]
+            arrays = fold_test_arrays(data, fold, model_paths, timeframe)
+            if not np.isfinite(arrays['prediction']).any():
+                raise StageFailed(f"Fold {fold['fold']}: keine Kerzen im Testfenster")
+            arrays_dir = os.path.join(arrays_root, f"fold_{fold['fold']}")
+            save_backtest_arrays(arrays, arrays_dir)
+            return {'arrays_dir': arrays_dir, 'oos_accuracy': oos_accuracy(data, fold, model_paths, timeframe)}
+        return stage
+
+    def optimize(fold):
+        def stage(deps):
+            arrays_dir = deps[f"{fold['fold']}|predict"]['arrays_dir']
+            return pool.submit(optimize_fold, arrays_dir, n_trials, batch_size, settings, fold['fold']).result()
+        return stage
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool:
+            pool.submit(int).result()
+            # Training und Vorhersage teilen sich einen Slot: nie zwei TensorFlow-Stufen gleichzeitig
+            scheduler = DagScheduler({'model': 1, 'optimize': n_workers})
+            for fold in folds:
+                k = fold['fold']
+                scheduler.add(f'{k}|train', 'model', train(fold))
+                scheduler.add(f'{k}|predict', 'model', predict(fold), deps=[f'{k}|train'])
+                scheduler.add(f'{k}|optimize', 'optimize', optimize(fold), deps=[f'{k}|predict'])
+            status = scheduler.run()
+
+        results = scheduler.results
+        traded_folds, fold_arrays, fold_params = [], [], []
+        for fold in folds:
+            k = fold['fold']
+            predicted = results.get(f'{k}|predict')
+            optimized = results.get(f'{k}|optimize')
+            fold['status'] = status[f'{k}|optimize']
+            fold['oos_accuracy'] = predicted['oos_accuracy'] if predicted else None
+            fold['best'] = optimized
+            # Fold k handelt mit den Parametern des vorherigen Folds
+            if k > 0 and predicted:
+                previous = folds[k - 1].get('best')
+                traded_folds.append(fold)
+                fold_arrays.append(load_backtest_arrays(predicted['arrays_dir']))
+                fold_params.append(previous['params'] if previous else None)
+        equity, end_capitals = stitch_equity(fold_arrays, fold_params, start_capital)
+        for fold, end_capital in zip(traded_folds, end_capitals):
+            fold['oos_end_capital'] = end_capital
+    finally:
+        shutil.rmtree(arrays_root, ignore_errors=True)
+
+    stats = equity_stats(equity, start_capital)
+    save_report(safe_filename, folds, equity, stats)
+    print_report(symbol, timeframe, folds, stats)
+    return {'folds': folds, 'equity': equity, 'stats': stats}
+
+
+def save_report(safe_filename, folds, equity, stats):
+    """Speichert Fold-Übersicht (JSON) und zusammengesetzte Equity-Kurve (CSV) unter artifacts/walk_forward."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    summary = {'stats': stats, 'folds': [{key: (str(value) if isinstance(value, pd.Timestamp) else value)
+                                          for key, value in fold.items()} for fold in folds]}
+    with open(os.path.join(OUTPUT_DIR, f'walk_forward_{safe_filename}.json'), 'w') as f:
+        json.dump(summary, f, indent=4, default=float)
+    equity.to_csv(os.path.join(OUTPUT_DIR, f'walk_forward_equity_{safe_filename}.csv'), header=True)
+
+
+def print_report(symbol, timeframe, folds, stats):
+    print(f"\n===== Walk-Forward: {symbol} ({timeframe}), {len(folds)} Folds =====")
+    for fold in folds:
+        best = fold.get('best')
+        in_window = f"{best['in_window']['total_pnl_pct']:8.2f}%" if best else "       -"
+        accuracy = f"{fold['oos_accuracy']:.1f}%" if fold.get('oos_accuracy') is not None else "-"
+        print(f"Fold {fold['fold']:2d}: Test {fold['test_start'].date()} bis {fold['test_end'].date()} | "
+              f"OOS-Genauigkeit {accuracy:>6} | PnL im Fenster (optimiert) {in_window} | {fold['status']}")
+    print(f"\nOut-of-Sample (Parameter aus dem Vorgänger-Fold): PnL {stats['total_pnl_pct']:.2f}%, "
+          f"Max Drawdown {stats['max_drawdown_pct']:.2f}%, Trades {stats['trades_count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-Forward-Optimierung für KBot")
+    parser.add_argument('--symbol', required=True, type=str)
+    parser.add_argument('--timeframe', required=True, type=str)
+    parser.add_argument('--start_date', required=True, type=str)
+    parser.add_argument('--end_date', required=True, type=str)
+    parser.add_argument('--folds', type=int, default=12)
+    parser.add_argument('--train_days', type=int, default=365)
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallele Fold-Optimierungen (-1 = alle Kerne)")
+    parser.add_argument('--threshold', type=float, default=0.65)
+    parser.add_argument('--mode', type=str, default='strict')
+    parser.add_argument('--max_drawdown', type=float, default=30.0)
+    parser.add_argument('--min_win_rate', type=float, default=55.0)
+    parser.add_argument('--min_pnl', type=float, default=0.0)
+    parser.add_argument('--start_capital', type=float, default=1000)
+    parser.add_argument('--model', choices=['fold', 'reuse'], default='fold', help="'reuse' = vorhandenes Modell statt Training pro Fold")
+    args = parser.parse_args()
+
+    settings = {'FIXED_THRESHOLD': args.threshold, 'MAX_DRAWDOWN_CONSTRAINT': args.max_drawdown / 100.0,
+                'MIN_WIN_RATE_CONSTRAINT': args.min_win_rate, 'MIN_PNL_CONSTRAINT': args.min_pnl,
+                'START_CAPITAL': args.start_capital, 'OPTIM_MODE': args.mode}
+    run_walk_forward(f"{args.symbol}/USDT:USDT", args.timeframe, args.start_date, args.end_date, args.folds, args.train_days,
+                     args.trials, args.batch_size, args.jobs, settings, args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# src/kbot/strategy/engine.py
+"""
+Live-Engine: ein langlebiger Prozess für alle aktiven Strategien.
+
+Statt pro Strategie einen eigenen Python-Prozess zu starten (jeweils TensorFlow/ccxt importieren,
+load_markets aufrufen und das Modell laden), teilen sich alle Strategien einen Exchange-Client
+(inkl. der einmal geladenen Markt-Metadaten) und einen Modell-Pool. Jede Strategie läuft als
+Task auf einer asyncio-Schleife; der blockierende Handelszyklus (ccxt, model.predict) wird in
+Worker-Threads ausgeführt, begrenzt durch max_concurrent_cycles.
+
+Die Zyklen laufen kerzengetaktet: die Engine kennt den Timeframe jeder Strategie, wacht kurz nach
+jedem Kerzenschluss auf (Börsenzeit über den gemessenen Uhren-Offset) und führt alle Strategien,
+deren Kerze zum selben Zeitpunkt schließt, gemeinsam aus. Zyklen ohne neue Kerze entfallen.
+
+Pro Takt holt die Engine optional einen Konto-Snapshot (Positionen, Kontostand, Ticker aller Symbole
+der Gruppe in je einer Abfrage); die Zyklen lesen daraus statt einzeln (siehe account_snapshot.py).
+"""
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.ann_model import load_model_and_scaler
+from kbot.utils.trade_manager import full_trade_cycle
+from kbot.utils.data_store import timeframe_to_ms
+from kbot.utils.account_snapshot import AccountView, fetch_account_snapshot
+
+CONFIG_DIR = os.path.join(PROJECT_ROOT, 'src', 'kbot', 'strategy', 'configs')
+MODELS_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'models')
+LOG_DIR = os.path.join(PROJECT_ROOT, 'logs')
+DEFAULT_MAX_CONCURRENT_CYCLES = 4
+CANDLE_CLOSE_DELAY_MS = 300  # Abstand nach dem Kerzenschluss, bis die Börse die Kerze abgeschlossen hat
+TIME_SYNC_INTERVAL_SECONDS = 60 * 60  # Uhren-Offset zur Börse stündlich neu messen
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000  # Wochenkerzen öffnen montags, der Unix-Epoch ist ein Donnerstag
+
+logger = logging.getLogger(__name__)
+
+
+def create_safe_filename(symbol, timeframe):
+    return f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
+
+
+def get_model_paths(symbol, timeframe):
+    safe_filename = create_safe_filename(symbol, timeframe)
+    return (os.path.join(MODELS_DIR, f'ann_predictor_{safe_filename}.h5'),
+            os.path.join(MODELS_DIR, f'ann_scaler_{safe_filename}.joblib'))
+
+
+def next_candle_close_ms(timeframe, now_ms):
+    """Nächster Kerzenschluss (= Öffnung der folgenden Kerze) strikt nach now_ms, in UTC-Millisekunden."""
+    if timeframe == '1M':
+        month_start = pd.Timestamp(now_ms, unit='ms', tz='UTC').normalize().replace(day=1)
+        return int((month_start + pd.DateOffset(months=1)).value // 1_000_000)
+    timeframe_ms = timeframe_to_ms(timeframe)
+    offset = WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    return ((now_ms - offset) // timeframe_ms + 1) * timeframe_ms + offset
+
+
+def select_strategies(settings, config_dir=CONFIG_DIR):
+    """
+    Bestimmt die aktiven Strategien wie bisher der Master Runner:
+    Autopilot = alle config_*.json aus config_dir, sonst live_trading_settings.active_strategies.
+    Returns: Liste von dicts {'symbol', 'timeframe', 'use_macd'}.
+    """
+    live_settings = settings.get('live_trading_settings', {})
+    use_autopilot = live_settings.get('use_auto_optimizer_results', False)
+
+    strategy_list = []
+    if use_autopilot:
+        print("Modus: Autopilot. Lese Strategien aus optimierten Konfigurationen...")
+        if os.path.exists(config_dir):
+            for config_file in sorted(os.listdir(config_dir)):
+                if config_file.startswith('config_') and config_file.endswith('.json'):
+                    try:
+                        with open(os.path.join(config_dir, config_file), 'r') as f:
+                            market = json.load(f).get('market', {})
+                        if market.get('symbol') and market.get('timeframe'):
+                            strategy_list.append({'symbol': market['symbol'], 'timeframe': market['timeframe'],
+                                                  'active': True, 'use_macd_filter': False})
+                            print(f"  ✓ Geladen: {market['symbol']} ({market['timeframe']})")
+                    except Exception as e:
+                        print(f"  ✗ Fehler beim Laden von {config_file}: {e}")
+        else:
+            print(f"  ⚠ Konfigurationsverzeichnis nicht gefunden: {config_dir}")
+            print(f"    Bitte führe zuerst das Pipeline-Script aus: ./run_pipeline.sh")
+    else:
+        print("Modus: Manuell. Lese Strategien aus den manuellen Einstellungen...")
+        strategy_list = live_settings.get('active_strategies', [])
+
+    strategies = []
+    for strategy_info in strategy_list:
+        if isinstance(strategy_info, dict) and not strategy_info.get("active", True):
+            print(f"--- Überspringe inaktive Strategie: {strategy_info.get('symbol', 'N/A')} ({strategy_info.get('timeframe', 'N/A')}) ---")
+            continue
+
+        symbol, timeframe, use_macd = None, None, None
+        if use_autopilot and isinstance(strategy_info, str):
+            try:
+                use_macd = '_macd' in strategy_info
+                base_name = strategy_info.replace('config_', '').replace('.json', '').replace('_macd', '')
+                parts = base_name.split('_')
+                timeframe = parts[-1]
+                symbol = f"{parts[0].replace('USDTUSDT', '')}/USDT:USDT"
+            except Exception as e:
+                print(f"Warnung: Konnte Autopilot-Strategie '{strategy_info}' nicht verarbeiten. Fehler: {e}")
+                continue
+        elif isinstance(strategy_info, dict):
+            symbol = strategy_info.get('symbol')
+            timeframe = strategy_info.get('timeframe')
+            use_macd = strategy_info.get('use_macd_filter', False)
+
+        if not all([symbol, timeframe, use_macd is not None]):
+            print(f"Warnung: Unvollständige Strategie-Info: {strategy_info}. Überspringe.")
+            continue
+        strategies.append({'symbol': symbol, 'timeframe': timeframe, 'use_macd': use_macd})
+    return strategies
+
+
+def load_strategy_params(symbol, timeframe, config_dir=CONFIG_DIR):
+    """Lädt config_<symbol>_<timeframe>.json; None, wenn keine Konfiguration existiert."""
+    config_path = os.path.join(config_dir, f'config_{create_safe_filename(symbol, timeframe)}.json')
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, 'r') as f:
+        return json.load(f)
+
+
+class _SharedModel:
+    """Modell aus dem Pool: predict wird serialisiert, da Keras-Modelle nicht für parallele Aufrufe aus Threads gedacht sind."""
+
+    def __init__(self, model, lock):
+        self._model = model
+        self._lock = lock
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self._model.predict(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class ModelPool:
+    """Gemeinsamer Modell-Pool des Prozesses: jedes Modell/Scaler-Paar wird genau einmal geladen."""
+
+    def __init__(self, loader=load_model_and_scaler):
+        self._loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+
+    def get(self, model_path, scaler_path):
+        """Returns: (model, scaler) oder (None, None), wenn das Laden fehlschlägt (nicht gecacht)."""
+        key = (model_path, scaler_path)
+        with self._lock:
+            if key not in self._entries:
+                model, scaler = self._loader(model_path, scaler_path)
+                if model is None or scaler is None:
+                    return None, None
+                self._entries[key] = (_SharedModel(model, self._predict_lock), scaler)
+            return self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MODEL_POOL = None
+
+
+def get_model_pool():
+    global _MODEL_POOL
+    if _MODEL_POOL is None:
+        _MODEL_POOL = ModelPool()
+    return _MODEL_POOL
+
+
+def setup_strategy_logger(strategy_id):
+    """Logger pro Strategie (logs/kbot_<id>.log); Ausgaben laufen zusätzlich in das Prozess-Log."""
+    strategy_logger = logging.getLogger(f'kbot.{strategy_id}')
+    if not strategy_logger.handlers:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        handler = logging.FileHandler(os.path.join(LOG_DIR, f'kbot_{strategy_id}.log'))
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        strategy_logger.addHandler(handler)
+        strategy_logger.setLevel(logging.INFO)
+    return strategy_logger
+
+
+class LiveEngine:
+    """Hostet alle aktiven Strategien in einem Prozess (ein Exchange-Client, ein Modell-Pool, eine asyncio-Schleife)."""
+
+    def __init__(self, exchange, strategies, telegram_config, model_pool=None,
+                 max_concurrent_cycles=DEFAULT_MAX_CONCURRENT_CYCLES, close_delay_ms=CANDLE_CLOSE_DELAY_MS,
+                 clock=time.time, account_snapshots=False):
+        """account_snapshots: pro Takt einen gemeinsamen Konto-Snapshot für alle Zyklen der Gruppe holen."""
+        self.exchange = exchange
+        self.strategies = strategies
+        self.telegram_config = telegram_config
+        self.model_pool = model_pool if model_pool is not None else get_model_pool()
+        self.max_concurrent_cycles = max_concurrent_cycles
+        self.close_delay_ms = close_delay_ms
+        self.clock = clock
+        self.account_snapshots = account_snapshots
+        self.time_offset_ms = 0
+        self._last_time_sync = None
+        self.cycle_counts = {}
+
+    def prepare(self):
+        """Lädt Konfigurationen und Modelle einmalig; Duplikate und Strategien ohne Konfiguration/Modell werden entfernt."""
+        ready, seen = [], set()
+        for strategy in self.strategies:
+            symbol, timeframe = strategy['symbol'], strategy['timeframe']
+            strategy_id = create_safe_filename(symbol, timeframe)
+            if strategy_id in seen:
+                logger.warning(f"{symbol} ({timeframe}) ist mehrfach aktiv, wird nur einmal gestartet.")
+                continue
+            seen.add(strategy_id)
+            params = strategy.get('params') or load_strategy_params(symbol, timeframe)
+            if params is None:
+                logger.error(f"Keine Konfiguration für {symbol} ({timeframe}) gefunden. Überspringe.")
+                continue
+            model, scaler = self.model_pool.get(*get_model_paths(symbol, timeframe))
+            if model is None:
+                logger.error(f"Modell/Scaler für {symbol} ({timeframe}) konnte nicht geladen werden. Überspringe.")
+                continue
+            ready.append(dict(strategy, id=strategy_id, params=params, model=model, scaler=scaler,
+                              logger=setup_strategy_logger(strategy_id)))
+        self.strategies = ready
+        return ready
+
+    def sync_clock(self):
+        """Misst den Offset Börsenzeit - lokale Zeit; bei einem Fehler bleibt der letzte Wert gültig."""
+        try:
+            self.time_offset_ms = self.exchange.fetch_time_offset_ms()
+            logger.info(f"Uhren-Offset zur Börse: {self.time_offset_ms} ms")
+        except Exception as e:
+            logger.warning(f"Börsenzeit konnte nicht abgefragt werden ({e}), nutze Offset {self.time_offset_ms} ms.")
+        self._last_time_sync = self.clock()
+
+    def server_now_ms(self):
+        return int(self.clock() * 1000) + self.time_offset_ms
+
+    def take_snapshot(self, group):
+        """Konto-Snapshot für alle Symbole eines Takts (None, wenn abgeschaltet)."""
+        if not self.account_snapshots:
+            return None
+        return fetch_account_snapshot(self.exchange, [strategy['symbol'] for strategy in group])
+
+    def run_cycle_blocking(self, strategy, candle_close_ms=None, snapshot=None):
+        """Ein Handelszyklus (läuft in einem Worker-Thread)."""
+        # Frische Kopie: der Zyklus verändert params (z.B. halbiertes Risiko durch den Circuit Breaker),
+        # im langlebigen Prozess darf sich das nicht über die Zyklen aufsummieren
+        params = copy.deepcopy(strategy['params'])
+        exchange = AccountView(self.exchange, snapshot) if snapshot is not None else self.exchange
+        full_trade_cycle(exchange, strategy['model'], strategy['scaler'], params, self.telegram_config, strategy['logger'],
+                         candle_close_ms=candle_close_ms)
+        self.cycle_counts[strategy['id']] = self.cycle_counts.get(strategy['id'], 0) + 1
+
+    async def run_cycle(self, strategy, semaphore, candle_close_ms=None, snapshot=None):
+        async with semaphore:
+            try:
+                await asyncio.to_thread(self.run_cycle_blocking, strategy, candle_close_ms, snapshot)
+            except Exception as e:
+                strategy['logger'].error(f"Unerwarteter Fehler im Zyklus von {strategy['id']}: {e}", exc_info=True)
+
+    def _advance(self, strategy, close_ms, now_ms):
+        """Nächster Kerzenschluss nach close_ms; bei Verspätung über mehrere Kerzen nur den jüngsten nachholen."""
+        next_close = next_candle_close_ms(strategy['timeframe'], close_ms)
+        while next_candle_close_ms(strategy['timeframe'], next_close) <= now_ms:
+            next_close = next_candle_close_ms(strategy['timeframe'], next_close)
+        return next_close
+
+    async def run(self, once=False, max_boundaries=None):
+        """
+        Startet den Kerzenschluss-Takt für alle Strategien.
+        once=True: genau ein Zyklus pro Strategie ohne Warten (z.B. für Cron).
+        max_boundaries: Anzahl der Kerzenschlüsse, nach denen die Engine endet (None = dauerhaft).
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_cycles)
+        if once:
+            snapshot = await asyncio.to_thread(self.take_snapshot, self.strategies)
+            await asyncio.gather(*(self.run_cycle(strategy, semaphore, snapshot=snapshot) for strategy in self.strategies))
+            return
+
+        await asyncio.to_thread(self.sync_clock)
+        now_ms = self.server_now_ms()
+        next_close = {strategy['id']: next_candle_close_ms(strategy['timeframe'], now_ms) for strategy in self.strategies}
+        boundaries = 0
+        while self.strategies and (max_boundaries is None or boundaries < max_boundaries):
+            if self.clock() - self._last_time_sync >= TIME_SYNC_INTERVAL_SECONDS:
+                await asyncio.to_thread(self.sync_clock)
+            close_ms = min(next_close.values())
+            # Alle Strategien, deren Kerze zu diesem Zeitpunkt schließt, laufen gemeinsam
+            group = [strategy for strategy in self.strategies if next_close[strategy['id']] == close_ms]
+            await asyncio.sleep(max(0.0, (close_ms + self.close_delay_ms - self.server_now_ms()) / 1000))
+
+            logger.info(f"Kerzenschluss {pd.Timestamp(close_ms, unit='ms', tz='UTC')}: {', '.join(s['id'] for s in group)}")
+            snapshot = await asyncio.to_thread(self.take_snapshot, group)
+            await asyncio.gather(*(self.run_cycle(strategy, semaphore, close_ms, snapshot) for strategy in group))
+            now_ms = self.server_now_ms()
+            for strategy in group:
+                next_close[strategy['id']] = self._advance(strategy, close_ms, now_ms)
+            boundaries += 1
+
+
+def run_engine(settings, account_config, telegram_config, once=False):
+    """Erzeugt den gemeinsamen Exchange-Client und startet die Engine für alle aktiven Strategien."""
+    from kbot.utils.exchange import Exchange
+
+    strategies = select_strategies(settings)
+    if not strategies:
+        print("Keine aktiven Strategien zum Ausführen gefunden.")
+        return None
+
+    live_settings = settings.get('live_trading_settings', {})
+    start = time.time()
+    # Optional: Kerzen, Positionen und Kontostand per WebSocket statt REST (nur im Dauerbetrieb sinnvoll)
+    streaming = live_settings.get('streaming', False) and not once
+    if streaming:
+        from kbot.utils.stream import StreamingExchange
+        exchange = StreamingExchange(account_config, [(strategy['symbol'], strategy['timeframe']) for strategy in strategies])
+        exchange.start()
+    else:
+        exchange = Exchange(account_config, symbols=sorted({strategy['symbol'] for strategy in strategies}))
+    engine = LiveEngine(exchange, strategies, telegram_config,
+                        max_concurrent_cycles=live_settings.get('max_concurrent_cycles', DEFAULT_MAX_CONCURRENT_CYCLES),
+                        close_delay_ms=live_settings.get('candle_close_delay_ms', CANDLE_CLOSE_DELAY_MS),
+                        # Mit Streaming kommen diese Daten ohnehin ohne REST-Abfrage aus dem Stream
+                        account_snapshots=live_settings.get('account_snapshot', True) and not streaming)
+    ready = engine.prepare()
+    print(f"{len(ready)}/{len(strategies)} Strategien bereit ({len(engine.model_pool)} Modelle geladen, {time.time() - start:.1f}s).")
+    for strategy in ready:
+        print(f"  - {strategy['symbol']} ({strategy['timeframe']}) | MACD-Filter: {'JA' if strategy['use_macd'] else 'NEIN'}")
+    try:
+        if ready:
+            asyncio.run(engine.run(once=once))
+    finally:
+        if hasattr(exchange, 'stop'):
+            exchange.stop()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KBot Live-Engine (alle Strategien in einem Prozess)")
+    parser.add_argument('--once', action='store_true', help="Genau einen Zyklus pro Strategie ausführen und beenden")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    with open(os.path.join(PROJECT_ROOT, 'settings.json'), 'r') as f:
+        settings = json.load(f)
+    with open(os.path.join(PROJECT_ROOT, 'secret.json'), 'r') as f:
+        secrets = json.load(f)
+    if not secrets.get('kbot'):
+        print("Fehler: Kein 'kbot'-Account in secret.json gefunden.")
+        return
+    run_engine(settings, secrets['kbot'][0], secrets.get('telegram', {}), once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,17 @@ import argparse
 import pandas as pd
 import numpy as np
 import datetime
-import ccxt
+import os
 
-# --- Hilfsfunktion: Kursdaten laden (Bitget via ccxt) ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.data_store import get_data_store, to_ms
+from kbot.utils.ohlcv_sync import plan_sync, sync_ohlcv
+from kbot.utils.exchange import get_public_client
+
+# --- Hilfsfunktion: Kursdaten laden (OHLCV-Speicher, fehlende Abschnitte via Bitget) ---
 def load_ohlcv(symbol, start, end, timeframe):
-    exchange = ccxt.bitget()
     # Bitget-Symbole sind z.B. BTC/USDT:USDT
     # Konvertiere Input (z.B. BTCUSDT oder BTC) zum richtigen Format
     if '/' not in symbol:
@@ -23,32 +29,27 @@ def load_ohlcv(symbol, start, end, timeframe):
         symbol = symbol.upper() + '/USDT:USDT'
     elif not symbol.endswith(':USDT'):
         symbol = symbol + ':USDT'
-    
-    since = int(pd.Timestamp(start).timestamp() * 1000)
-    end_ts = int(pd.Timestamp(end).timestamp() * 1000)
+
+    since = to_ms(start)
+    end_ts = to_ms(end)
     tf_map = {'1d':'1d','4h':'4h','1h':'1h','6h':'6h','30m':'30m','15m':'15m','5m':'5m','10m':'10m','2h':'2h'}
     tf = tf_map.get(timeframe, '1d')
-    
-    # TitanBot's überlegene Logik: parse_timeframe() für korrekte Zeitberechnung
-    timeframe_duration_in_ms = exchange.parse_timeframe(tf) * 1000
-    
-    all_ohlcv = []
-    limit = 500
-    while since < end_ts:
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=limit)
-        if not ohlcv:
-            break
-        all_ohlcv += ohlcv
-        last = ohlcv[-1][0]
-        # Fix: Nutze parse_timeframe() statt +1ms (TitanBot's Method)
-        since = last + timeframe_duration_in_ms
-        # Entfernt: if len(ohlcv) < limit: break
-        # Bitget gibt manchmal weniger als limit zurück, auch wenn mehr Daten da sind!
-    if not all_ohlcv:
+
+    # Gleicher Speicher wie backtester.load_data: nur fehlende Abschnitte werden von der Börse geladen,
+    # über einen gemeinsamen Client mit einmalig geladenen Märkten
+    store = get_data_store()
+    if plan_sync(store, symbol, tf, since, end_ts):
+        try:
+            sync_ohlcv(store, get_public_client(), symbol, tf, since, end_ts)
+        except Exception as e:
+            if not store.covers(symbol, tf, since, end_ts):
+                raise Exception(f"Keine Daten von Bitget für {symbol} im Zeitraum {start} bis {end}: {e}")
+
+    df = store.read(symbol, tf, since, end_ts)
+    if df.empty:
         raise Exception(f"Keine Daten von Bitget für {symbol} im Zeitraum {start} bis {end}")
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp','open','high','low','close','volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df = df.set_index('timestamp')
+    # Wie bisher mit zeitzonenlosem Index
+    df.index = df.index.tz_localize(None)
     return df[['open','high','low','close','volume']]
 
 
@@ -0,0 +1,118 @@
+# src/kbot/utils/account_snapshot.py
+"""
+Konto-Snapshot pro Takt der Live-Engine.
+
+Ein Handelszyklus fragt Positionen bis zu viermal, den Kontostand zweimal und den Ticker einmal ab –
+für jede Strategie einzeln. Die Engine holt stattdessen zu jedem Kerzenschluss einmalig alle Positionen,
+den Kontostand und die Ticker der beteiligten Symbole (je eine Sammelabfrage) und gibt jedem Zyklus
+eine AccountView: eine konsistente, schreibgeschützte Sicht auf diesen Stand, die sich sonst wie der
+Exchange verhält.
+
+Eigene Orders verändern das Konto: danach liest die View des Symbols die Positionen wieder live, und
+der Kontostand wird für alle Views des Takts live gelesen. Fehlt ein Teil des Snapshots (Fehler bei
+der Sammelabfrage), wird ebenfalls live abgefragt.
+"""
+import copy
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TICKER_MAX_AGE_SECONDS = 10  # ältere Ticker aus dem Snapshot werden nicht für den Einstiegspreis genutzt
+
+
+class AccountSnapshot:
+    def __init__(self, positions=None, balance=None, tickers=None, fetched_at=None, clock=time.time):
+        """positions: {symbol: [positionen]}, balance: freie USDT, tickers: {symbol: ticker}; None = nicht verfügbar."""
+        self.clock = clock
+        self.fetched_at = fetched_at if fetched_at is not None else clock()
+        self._positions = positions
+        self._balance = balance
+        self._tickers = tickers
+        self._lock = threading.Lock()
+        self._stale_symbols = set()
+        self._balance_stale = False
+
+    def positions(self, symbol):
+        with self._lock:
+            if self._positions is None or symbol not in self._positions or symbol in self._stale_symbols:
+                return None
+            return copy.deepcopy(self._positions[symbol])
+
+    def balance(self):
+        with self._lock:
+            return None if self._balance_stale else self._balance
+
+    def ticker(self, symbol):
+        if self._tickers is None or symbol not in self._tickers:
+            return None
+        if self.clock() - self.fetched_at > TICKER_MAX_AGE_SECONDS:
+            return None
+        return copy.deepcopy(self._tickers[symbol])
+
+    def mark_order(self, symbol):
+        """Nach einer Order: Positionen des Symbols und der Kontostand sind nicht mehr aktuell."""
+        with self._lock:
+            self._stale_symbols.add(symbol)
+            self._balance_stale = True
+
+
+def fetch_account_snapshot(exchange, symbols, clock=time.time):
+    """Je eine Sammelabfrage für Positionen, Kontostand und Ticker aller symbols."""
+    symbols = sorted(set(symbols))
+    fetched_at = clock()
+    positions = balance = tickers = None
+    try:
+        positions = exchange.fetch_positions_by_symbol(symbols)
+    except Exception as e:
+        logger.warning(f"Konto-Snapshot: Positionen nicht verfügbar ({e}), Zyklen fragen einzeln ab.")
+    try:
+        balance = exchange.fetch_balance_usdt(raise_errors=True)
+    except Exception as e:
+        logger.warning(f"Konto-Snapshot: Kontostand nicht verfügbar ({e}), Zyklen fragen einzeln ab.")
+    try:
+        tickers = exchange.fetch_tickers(symbols)
+    except Exception as e:
+        logger.warning(f"Konto-Snapshot: Ticker nicht verfügbar ({e}), Zyklen fragen einzeln ab.")
+    return AccountSnapshot(positions, balance, tickers, fetched_at=fetched_at, clock=clock)
+
+
+class AccountView:
+    """Sicht eines Zyklus: Lesezugriffe aus dem Snapshot, alles andere (Orders, Präzision, ...) vom Exchange."""
+
+    def __init__(self, exchange, snapshot):
+        self._exchange = exchange
+        self.snapshot = snapshot
+
+    def __getattr__(self, name):
+        return getattr(self._exchange, name)
+
+    def fetch_open_positions(self, symbol):
+        positions = self.snapshot.positions(symbol)
+        return positions if positions is not None else self._exchange.fetch_open_positions(symbol)
+
+    def fetch_balance_usdt(self, raise_errors=False):
+        balance = self.snapshot.balance()
+        return balance if balance is not None else self._exchange.fetch_balance_usdt(raise_errors=raise_errors)
+
+    def fetch_ticker(self, symbol):
+        return self.snapshot.ticker(symbol) or self._exchange.fetch_ticker(symbol)
+
+    def create_market_order(self, symbol, side, amount, params={}):
+        try:
+            return self._exchange.create_market_order(symbol, side, amount, params)
+        finally:
+            self.snapshot.mark_order(symbol)
+
+    def place_trigger_market_order(self, symbol, side, amount, trigger_price, params={}):
+        try:
+            return self._exchange.place_trigger_market_order(symbol, side, amount, trigger_price, params)
+        finally:
+            self.snapshot.mark_order(symbol)
+
+    def place_trailing_stop_order(self, symbol, side, amount, activation_price, callback_rate_decimal, params={}):
+        try:
+            return self._exchange.place_trailing_stop_order(symbol, side, amount, activation_price, callback_rate_decimal, params)
+        finally:
+            self.snapshot.mark_order(symbol)
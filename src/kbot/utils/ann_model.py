@@ -4,9 +4,14 @@ import numpy as np
 import tensorflow as tf
 import joblib
 import logging
-import ta
 import os
 
+from kbot.utils.feature_engine import (
+    FEATURE_CODE_VERSION, FEATURE_COLUMNS, OUTPUT_COLUMNS, COLUMN_INDEX, ATF_COLUMNS,
+    compute_feature_matrix, rolling_adaptive_trend_matrix
+)
+from kbot.utils.artifact_cache import CANDLE_COLUMNS, get_artifact_cache, make_key, candles_hash, array_hash, file_hash
+
 logger = logging.getLogger(__name__)
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
@@ -162,141 +167,60 @@ def calculate_adaptive_trend_features(df, use_long_term=False):
         'atf_price_to_trend': (current_price - predicted_price) / predicted_price  # Abweichung von der Trendlinie
     }
 
-def create_ann_features(df):
-    # Bestehende Features
-    bollinger = ta.volatility.BollingerBands(close=df['close'], window=20, window_dev=2)
-    df['bb_width'] = bollinger.bollinger_wband()
-    df['bb_pband'] = bollinger.bollinger_pband()  # Position innerhalb der Bänder
-    df['bb_hband'] = bollinger.bollinger_hband()
-    df['bb_lband'] = bollinger.bollinger_lband()
-    
-    if 'volume' in df.columns and df['volume'].sum() > 0:
-        df['obv'] = ta.volume.on_balance_volume(close=df['close'], volume=df['volume'])
-        # NEU: Volume-Features
-        df['volume_sma'] = df['volume'].rolling(window=20).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_sma']
-        df['mfi'] = ta.volume.money_flow_index(df['high'], df['low'], df['close'], df['volume'], window=14)
-        df['cmf'] = ta.volume.chaikin_money_flow(df['high'], df['low'], df['close'], df['volume'], window=20)
-        df['vwap'] = ta.volume.volume_weighted_average_price(df['high'], df['low'], df['close'], df['volume'], window=14)
-    else:
-        df['obv'] = 0
-        df['volume_sma'] = 0
-        df['volume_ratio'] = 1
-        df['mfi'] = 50
-        df['cmf'] = 0
-        df['vwap'] = df['close']
-    
-    df['rsi'] = ta.momentum.rsi(df['close'], window=14)
-    
-    # MACD Features
-    macd = ta.trend.MACD(df['close'], window_slow=26, window_fast=12, window_sign=9)
-    df['macd_diff'] = macd.macd_diff()
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    
-    # ATR
-    atr_indicator = ta.volatility.AverageTrueRange(high=df['high'], low=df['low'], close=df['close'], window=14)
-    df['atr'] = atr_indicator.average_true_range()
-    df['atr_normalized'] = (df['atr'] / df['close']) * 100
-
-    # *** ADX WIEDER HINZUGEFÜGT (KRITISCH!) ***
-    df['adx'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-    df['adx_pos'] = ta.trend.adx_pos(df['high'], df['low'], df['close'], window=14)
-    df['adx_neg'] = ta.trend.adx_neg(df['high'], df['low'], df['close'], window=14)
+def calculate_rolling_adaptive_trend_features(df, use_long_term=False):
+    """
+    Rollierende Variante von calculate_adaptive_trend_features: liefert für JEDE Kerze die
+    ATF-Features, berechnet nur aus den bis dahin bekannten Schlusskursen
+    (siehe feature_engine.rolling_adaptive_trend_matrix).
+    Kerzen, für die noch nicht genug Historie für die längste Periode vorliegt, erhalten NaN.
 
-    # NEU: EMA Trend-Features
-    df['ema20'] = ta.trend.ema_indicator(df['close'], window=20)
-    df['ema50'] = ta.trend.ema_indicator(df['close'], window=50)
-    df['ema200'] = ta.trend.ema_indicator(df['close'], window=200)
-    df['price_to_ema20'] = (df['close'] - df['ema20']) / df['ema20']
-    df['price_to_ema50'] = (df['close'] - df['ema50']) / df['ema50']
-    
-    # NEU: Momentum-Features
-    df['stoch_k'] = ta.momentum.stoch(df['high'], df['low'], df['close'], window=14, smooth_window=3)
-    df['stoch_d'] = ta.momentum.stoch_signal(df['high'], df['low'], df['close'], window=14, smooth_window=3)
-    df['williams_r'] = ta.momentum.williams_r(df['high'], df['low'], df['close'], lbp=14)
-    df['roc'] = ta.momentum.roc(df['close'], window=12)
-    df['cci'] = ta.trend.cci(df['high'], df['low'], df['close'], window=20)
-    
-    # NEU: Volatilität-Features
-    df['keltner_channel_hband'] = ta.volatility.keltner_channel_hband(df['high'], df['low'], df['close'], window=20)
-    df['keltner_channel_lband'] = ta.volatility.keltner_channel_lband(df['high'], df['low'], df['close'], window=20)
-    df['donchian_channel_hband'] = ta.volatility.donchian_channel_hband(df['high'], df['low'], df['close'], window=20)
-    df['donchian_channel_lband'] = ta.volatility.donchian_channel_lband(df['high'], df['low'], df['close'], window=20)
-    
-    # NEU: Support/Resistance Features
-    df['resistance'] = df['high'].rolling(window=20).max()
-    df['support'] = df['low'].rolling(window=20).min()
-    df['price_to_resistance'] = (df['resistance'] - df['close']) / df['close']
-    df['price_to_support'] = (df['close'] - df['support']) / df['close']
-    
-    # NEU: Price Action Features
-    df['high_low_range'] = (df['high'] - df['low']) / df['close']
-    df['close_to_high'] = (df['high'] - df['close']) / (df['high'] - df['low'] + 0.0001)
-    df['close_to_low'] = (df['close'] - df['low']) / (df['high'] - df['low'] + 0.0001)
-    
-    # Zeitliche Features
-    df['day_of_week'] = df.index.dayofweek
-    df['hour_of_day'] = df.index.hour if hasattr(df.index, 'hour') else 0
-    
-    # Returns
-    df['returns_lag1'] = df['close'].pct_change().shift(1)
-    df['returns_lag2'] = df['close'].pct_change().shift(2)
-    df['returns_lag3'] = df['close'].pct_change().shift(3)
-    
-    # NEU: Historical Volatility
-    df['hist_volatility'] = df['close'].pct_change().rolling(window=20).std() * np.sqrt(252)
-    
-    # *** ADAPTIVE TREND FINDER FEATURES ***
-    # Berechne Short-Term Trend Features
-    atf_features = calculate_adaptive_trend_features(df, use_long_term=False)
-    for key, value in atf_features.items():
-        df[key] = value
-    
-    return df
+    Returns:
+        DataFrame (Index wie df) mit denselben Spalten wie calculate_adaptive_trend_features.
+    """
+    values = rolling_adaptive_trend_matrix(df['close'].to_numpy(dtype=np.float64), use_long_term=use_long_term)
+    return pd.DataFrame(values, index=df.index, columns=ATF_COLUMNS)
 
-def prepare_data_for_ann(df, timeframe: str, verbose: bool = True):
+def create_ann_features(df):
     """
-    Definiert ein "gutes Signal" basierend auf einem dynamischen Threshold,
-    der sich an der Volatilität (ATR) des jeweiligen Datensatzes orientiert.
+    Hängt alle Indikator-Features (inkl. rollierendem Adaptive Trend Finder) an df an.
+    Die Berechnung läuft in einem Durchlauf über feature_engine.compute_feature_matrix;
+    die Werte entsprechen den bisherigen ta-Aufrufen.
     """
-    df_with_features = create_ann_features(df.copy())
-    df_with_features.dropna(inplace=True)
-    if df_with_features.empty:
-        return pd.DataFrame(), pd.Series()
+    matrix = compute_feature_matrix(df)
+    order = [COLUMN_INDEX[name] for name in OUTPUT_COLUMNS]
+    df[OUTPUT_COLUMNS] = matrix[:, order]
+    return df
 
-    # Adaptive 'lookahead' und 'volatility_multiplier' je nach Zeitfenster definieren
+def get_label_params(timeframe: str):
+    """Adaptive 'lookahead' und 'volatility_multiplier' je nach Zeitfenster. Returns: (lookahead, volatility_multiplier)"""
     if 'm' in timeframe:
-        lookahead = 12
-        volatility_multiplier = 2.5
+        return 12, 2.5
     elif 'h' in timeframe:
         try:
             tf_num = int(timeframe.replace('h', ''))
             if tf_num == 1:
-                lookahead = 8
-                volatility_multiplier = 2.0
+                return 8, 2.0
             elif tf_num <= 4:
-                lookahead = 5
-                volatility_multiplier = 1.75
+                return 5, 1.75
             else: # 6h, 12h etc.
-                lookahead = 4
-                volatility_multiplier = 1.75
+                return 4, 1.75
         except ValueError:
-            lookahead = 5
-            volatility_multiplier = 1.75
+            return 5, 1.75
     elif 'd' in timeframe:
-        lookahead = 5
-        volatility_multiplier = 1.5
+        return 5, 1.5
     else: # Fallback
-        lookahead = 5
-        volatility_multiplier = 2.0
+        return 5, 2.0
+
+def _build_ann_dataset(df, lookahead, volatility_multiplier):
+    """Features und Lernziele ohne Cache. Returns: (X, y, threshold) bzw. (None, None, None) ohne Feature-Zeilen."""
+    df_with_features = create_ann_features(df.copy())
+    df_with_features.dropna(inplace=True)
+    if df_with_features.empty:
+        return None, None, None
 
     avg_atr_pct = df_with_features['atr_normalized'].mean()
     threshold = (avg_atr_pct * volatility_multiplier) / 100
 
-    if verbose:
-        print(f"INFO: Verwende adaptive Lernziele für {timeframe}: lookahead={lookahead}, threshold={threshold*100:.2f}% (dynamisch berechnet)")
-
     future_returns = df_with_features['close'].pct_change(periods=lookahead).shift(-lookahead)
     df_with_features['target'] = 0
     df_with_features.loc[future_returns > threshold, 'target'] = 1
@@ -304,46 +228,77 @@ def prepare_data_for_ann(df, timeframe: str, verbose: bool = True):
     df_with_features = df_with_features[df_with_features['target'] != 0].copy()
     df_with_features['target'] = df_with_features['target'].replace(-1, 0)
 
-    # *** ERWEITERTE FEATURE-LISTE MIT ALLEN NEUEN FEATURES ***
     # Feature 'ema_cross_20_50' entfernt aufgrund durchgehend niedriger Wichtigkeit (<0.2%)
-    feature_cols = [
-        # Basis-Features
-        'bb_width', 'bb_pband', 'obv', 'rsi', 'macd_diff', 'macd', 
-        'atr_normalized', 'adx', 'adx_pos', 'adx_neg',
-        
-        # Volume-Features
-        'volume_ratio', 'mfi', 'cmf',
-        
-        # Trend-Features
-        'price_to_ema20', 'price_to_ema50',
-        
-        # Momentum-Features
-        'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
-        
-        # Support/Resistance
-        'price_to_resistance', 'price_to_support',
-        
-        # Price Action
-        'high_low_range', 'close_to_high', 'close_to_low',
-        
-        # Zeitliche Features
-        'day_of_week', 'hour_of_day',
-        
-        # Returns & Volatilität
-        'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility',
-        
-        # *** ADAPTIVE TREND FINDER FEATURES ***
-        'atf_pearson_r', 'atf_trend_strength', 'atf_slope', 
-        'atf_std_dev', 'atf_upper_channel_dist', 'atf_lower_channel_dist', 
-        'atf_price_to_trend'
-    ]
-    # ---
+    feature_cols = FEATURE_COLUMNS
 
     X = df_with_features[feature_cols]
     y = df_with_features['target']
+    return X, y, threshold
+
+def _ann_dataset_key(df, lookahead, volatility_multiplier):
+    """Cache-Schlüssel: Kerzen-Hash, Feature-Code-Version und Label-Parameter."""
+    # Zusatzspalten beeinflussen das Ergebnis nur über ihre NaN-Zeilen (dropna)
+    extra_cols = [col for col in df.columns if col not in CANDLE_COLUMNS]
+    extra_nan = array_hash(df[extra_cols].isna().any(axis=1).to_numpy()) if extra_cols else None
+    return make_key(kind='ann_dataset', candles=candles_hash(df), extra_nan=extra_nan, feature_version=FEATURE_CODE_VERSION,
+                    lookahead=lookahead, volatility_multiplier=volatility_multiplier)
+
+def prepare_data_for_ann(df, timeframe: str, verbose: bool = True, use_cache: bool = True):
+    """
+    Definiert ein "gutes Signal" basierend auf einem dynamischen Threshold,
+    der sich an der Volatilität (ATR) des jeweiligen Datensatzes orientiert.
+    Mit use_cache werden Features und Lernziele im Artefakt-Cache (artifacts/cache) abgelegt
+    bzw. von dort gelesen, damit Trainer, Threshold-Suche und Evaluator sie nur einmal berechnen.
+    """
+    lookahead, volatility_multiplier = get_label_params(timeframe)
+    if use_cache:
+        def compute():
+            X, y, threshold = _build_ann_dataset(df, lookahead, volatility_multiplier)
+            if X is None:
+                return {}, {'empty': True}
+            index = pd.DatetimeIndex(X.index)
+            meta = {'threshold': threshold, 'index_unit': index.unit, 'index_tz': str(index.tz) if index.tz else None,
+                    'index_name': index.name}
+            return {'X': X.to_numpy(dtype=np.float64), 'y': y.to_numpy(dtype=np.int64), 'index': index.asi8}, meta
+
+        arrays, meta = get_artifact_cache().load_or_compute(_ann_dataset_key(df, lookahead, volatility_multiplier), compute)
+        if meta.get('empty'):
+            return pd.DataFrame(), pd.Series()
+        index = pd.DatetimeIndex(np.asarray(arrays['index']).astype(f"datetime64[{meta['index_unit']}]"), name=meta['index_name'])
+        if meta['index_tz']:
+            index = index.tz_localize('UTC').tz_convert(meta['index_tz'])
+        X = pd.DataFrame(np.asarray(arrays['X']), index=index, columns=FEATURE_COLUMNS)
+        y = pd.Series(np.asarray(arrays['y']), index=index, name='target')
+        threshold = meta['threshold']
+    else:
+        X, y, threshold = _build_ann_dataset(df, lookahead, volatility_multiplier)
+        if X is None:
+            return pd.DataFrame(), pd.Series()
+
+    if verbose:
+        print(f"INFO: Verwende adaptive Lernziele für {timeframe}: lookahead={lookahead}, threshold={threshold*100:.2f}% (dynamisch berechnet)")
 
     return X, y
 
+def predict_with_cache(model_path, scaler_path, X, model=None, scaler=None):
+    """
+    Modell-Vorhersagen für die Feature-Matrix X über den Artefakt-Cache
+    (Schlüssel: Hash von X sowie der Modell- und Scaler-Datei).
+    Modell und Scaler werden nur bei einem Cache-Fehlschlag geladen, falls sie nicht übergeben wurden.
+    """
+    key = make_key(kind='predictions', features=array_hash(X.to_numpy(dtype=np.float64)),
+                   model=file_hash(model_path), scaler=file_hash(scaler_path))
+
+    def compute():
+        nonlocal model, scaler
+        if model is None or scaler is None:
+            model, scaler = load_model_and_scaler(model_path, scaler_path)
+            if not model or not scaler: raise Exception("Modell/Scaler nicht gefunden!")
+        return {'predictions': model.predict(scaler.transform(X), verbose=0).flatten()}, {}
+
+    arrays, _ = get_artifact_cache().load_or_compute(key, compute)
+    return np.asarray(arrays['predictions'])
+
 def build_and_train_model(X_train, y_train):
     """
     Verbessertes Modell mit mehr Kapazität für die erweiterten Features.
@@ -0,0 +1,200 @@
+# src/kbot/utils/artifact_cache.py
+"""
+Inhaltsadressierter Artefakt-Cache für Features, Lernziele und Modell-Vorhersagen.
+
+Ein Eintrag ist ein Verzeichnis unter artifacts/cache/<schlüssel>/ mit .npy-Dateien (per Memory-Map
+lesbar) und meta.json. Der Schlüssel ist ein SHA-256 über alle Eingaben (Hash der Kerzen, Version
+des Feature-Codes, Label-Parameter, Hash von Modell/Scaler ...). Gleiche Eingaben ergeben damit
+denselben Eintrag, egal welches Skript (trainer.py, find_best_threshold.py, evaluator, Backtester)
+ihn zuerst berechnet hat.
+
+Einträge werden atomar geschrieben (temporäres Verzeichnis + rename). Überschreitet der Cache
+max_bytes, werden die am längsten nicht genutzten Einträge gelöscht (LRU über die Änderungszeit
+von meta.json, die bei jedem Treffer aktualisiert wird). Verdrängt ein anderer Prozess einen Eintrag,
+während er gelesen wird, gilt das als Fehltreffer: der Leser berechnet ihn neu.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'cache')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+META_FILE = 'meta.json'
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+_FILE_HASH_CACHE = {}
+
+
+def file_hash(path):
+    """SHA-256 einer Datei, zwischengespeichert anhand von Pfad, Änderungszeit und Größe."""
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _FILE_HASH_CACHE.get(signature)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _FILE_HASH_CACHE[signature] = digest
+    return digest
+
+
+def candles_hash(df):
+    """SHA-256 über Zeitstempel (ms) und OHLCV-Spalten; weitere Spalten des DataFrames spielen keine Rolle."""
+    hasher = hashlib.sha256()
+    index = pd.DatetimeIndex(df.index)
+    hasher.update(np.ascontiguousarray(index.as_unit('ms').asi8).tobytes())
+    for col in CANDLE_COLUMNS:
+        hasher.update(np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)).tobytes())
+    return hasher.hexdigest()
+
+
+def array_hash(values):
+    return hashlib.sha256(np.ascontiguousarray(values).tobytes()).hexdigest()
+
+
+def make_key(**parts):
+    """Cache-Schlüssel aus benannten Eingaben (JSON-serialisierbar)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_arrays(directory, arrays, meta=None):
+    """Schreibt ein dict von Arrays als .npy-Dateien plus meta.json."""
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(values))
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta or {}, f)
+
+
+def read_arrays(directory):
+    """Liest einen mit write_arrays geschriebenen Eintrag. Returns: (dict von Memory-Maps, meta)."""
+    arrays = {}
+    for filename in os.listdir(directory):
+        name, ext = os.path.splitext(filename)
+        if ext == '.npy':
+            arrays[name] = np.load(os.path.join(directory, filename), mmap_mode='r')
+    with open(os.path.join(directory, META_FILE), 'r') as f:
+        meta = json.load(f)
+    return arrays, meta
+
+
+class ArtifactCache:
+    """Verzeichnis-basierter Cache mit größenbasierter LRU-Verdrängung."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def lookup(self, key):
+        """Verzeichnis des Eintrags oder None. Ein Treffer zählt als Nutzung (LRU)."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        try:
+            os.utime(meta_path)
+        except FileNotFoundError:
+            return None
+        return entry_dir
+
+    def store(self, key, write):
+        """
+        Legt einen Eintrag an; write(verzeichnis) schreibt den Inhalt (z.B. über write_arrays, ein
+        fehlendes meta.json wird leer angelegt). Existiert der Eintrag bereits (paralleler Prozess),
+        bleibt er erhalten. Returns: Verzeichnis des Eintrags.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = os.path.join(self.root, f'.tmp_{key}_{os.getpid()}_{time.monotonic_ns()}')
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            write(tmp_dir)
+            meta_path = os.path.join(tmp_dir, META_FILE)
+            if not os.path.exists(meta_path):
+                with open(meta_path, 'w') as f:
+                    json.dump({}, f)
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Ein anderer Prozess war schneller; dessen Eintrag ist inhaltlich identisch
+            if not os.path.exists(os.path.join(entry_dir, META_FILE)):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict(keep=key)
+        return entry_dir
+
+    def entries(self):
+        """Liste von (letzte Nutzung, Größe in Bytes, Schlüssel) aller vollständigen Einträge."""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for key in os.listdir(self.root):
+            entry_dir = self._entry_dir(key)
+            try:
+                last_used = os.stat(os.path.join(entry_dir, META_FILE)).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            except FileNotFoundError:
+                continue
+            result.append((last_used, size, key))
+        return result
+
+    def evict(self, keep=None):
+        """Löscht die am längsten nicht genutzten Einträge, bis der Cache höchstens max_bytes belegt."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            logger.info(f"Artefakt-Cache: Eintrag {key[:12]} verdrängt ({size / 1e6:.1f} MB)")
+
+    def read(self, key, reader=read_arrays):
+        """
+        Liest einen Eintrag mit reader(verzeichnis). Returns: Ergebnis von reader oder None, wenn der
+        Eintrag fehlt oder während des Lesens verdrängt wurde (evict eines parallelen Prozesses).
+        """
+        entry_dir = self.lookup(key)
+        if entry_dir is None:
+            return None
+        try:
+            return reader(entry_dir)
+        except FileNotFoundError:
+            logger.info(f"Artefakt-Cache: Eintrag {key[:12]} wurde beim Lesen verdrängt, berechne neu")
+            return None
+
+    def load_or_compute(self, key, compute):
+        """
+        Liefert (arrays, meta) aus dem Cache oder berechnet sie: compute() -> (dict von Arrays, meta-dict).
+        Die zurückgegebenen Arrays sind schreibgeschützte Memory-Maps (außer der neue Eintrag wurde
+        sofort wieder verdrängt; dann die berechneten Arrays).
+        """
+        result = self.read(key)
+        if result is None:
+            arrays, meta = compute()
+            self.store(key, lambda directory: write_arrays(directory, arrays, meta))
+            result = self.read(key) or (arrays, meta)
+        return result
+
+
+_DEFAULT_CACHE = None
+
+
+def get_artifact_cache():
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = ArtifactCache()
+    return _DEFAULT_CACHE
@@ -7,12 +7,15 @@ Stoppt Trading automatisch bei zu hohen Verlusten.
 import os
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 CIRCUIT_BREAKER_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'circuit_breaker.json')
+# Alle Strategien der Live-Engine teilen sich die Datei (Zyklen in mehreren Threads)
+_STATUS_LOCK = threading.Lock()
 
 
 def get_circuit_breaker_status():
@@ -41,6 +44,11 @@ def update_circuit_breaker(current_equity, peak_equity=None):
     Returns:
         str: 'OK', 'REDUCE_SIZE', 'STOP_ALL_TRADING'
     """
+    with _STATUS_LOCK:
+        return _update_circuit_breaker(current_equity, peak_equity)
+
+
+def _update_circuit_breaker(current_equity, peak_equity):
     status = get_circuit_breaker_status()
     
     # Update Peak Equity
@@ -0,0 +1,308 @@
+# src/kbot/utils/data_store.py
+"""
+Spaltenbasierter OHLCV-Speicher (ersetzt den CSV-Cache in data/cache).
+
+Pro Symbol/Timeframe liegt unter data/store/<SYMBOL>_<tf>/ eine Generation von
+.npy-Dateien (eine pro Spalte, Zeitstempel als int64 in Millisekunden) sowie eine
+meta.json mit der aktuellen Generation und den abgedeckten Zeiträumen.
+
+- Lesen erfolgt per Memory-Map; ein Datums-Ausschnitt wird per Binärsuche auf den
+  Zeitstempeln bestimmt, es werden nur die benötigten Zeilen gelesen.
+- Schreiben erzeugt immer eine neue Generation und ersetzt meta.json atomar
+  (os.replace), laufende Leser sehen also entweder den alten oder den neuen Stand.
+  Hat ein Leser noch die alte meta.json gelesen, deren Generation der Schreiber bereits
+  gelöscht hat, liest er mit der neuen meta.json erneut.
+- Vorhandene CSV-Dateien aus data/cache werden beim ersten Zugriff einmalig importiert.
+"""
+import os
+import json
+import shutil
+import fcntl
+import logging
+import threading
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DEFAULT_STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'store')
+LEGACY_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', 'cache')
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+META_FILE = 'meta.json'
+DAY_MS = 24 * 60 * 60 * 1000
+READ_ATTEMPTS = 5  # Leseversuche, falls parallele Schreiber die gelesene Generation entfernen
+
+logger = logging.getLogger(__name__)
+
+
+def symbol_key(symbol, timeframe):
+    """Dateiname für Symbol/Timeframe (identisch zur Benennung des alten CSV-Caches)."""
+    return f"{symbol.replace('/', '-').replace(':', '-')}_{timeframe}"
+
+
+def timeframe_to_ms(timeframe):
+    return int(ccxt.Exchange.parse_timeframe(timeframe) * 1000)
+
+
+def to_ms(value):
+    """
+    Wandelt Datum-String, datetime oder Timestamp in UTC-Millisekunden um (naive Werte gelten als UTC).
+    Ganzzahlen werden bereits als Millisekunden interpretiert.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return int(ts.value // 1_000_000)
+
+
+def end_to_ms(value):
+    """
+    Inklusives Ende eines Zeitraums in Millisekunden.
+    Reine Datumsangaben ('2025-01-31') schließen - wie df.loc[start:end] - den ganzen Tag ein.
+    """
+    if isinstance(value, str) and len(value.strip()) <= 10:
+        return to_ms(value) + DAY_MS - 1
+    return to_ms(value)
+
+
+def merge_ranges(ranges, tolerance_ms=0):
+    """Vereinigt überlappende (bzw. bis auf tolerance_ms aneinandergrenzende) Zeiträume [start, end]."""
+    merged = []
+    for start, end in sorted((int(s), int(e)) for s, e in ranges):
+        if merged and start <= merged[-1][1] + tolerance_ms:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class OHLCVStore:
+    def __init__(self, root=DEFAULT_STORE_DIR, legacy_dir=LEGACY_CACHE_DIR):
+        self.root = root
+        self.legacy_dir = legacy_dir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    # --- Pfade & Sperren ---
+    def _key_dir(self, symbol, timeframe):
+        return os.path.join(self.root, symbol_key(symbol, timeframe))
+
+    def _thread_lock(self, key_dir):
+        with self._locks_guard:
+            return self._locks.setdefault(key_dir, threading.Lock())
+
+    class _KeyLock:
+        """Sperre pro Symbol/Timeframe: Thread-Lock plus flock gegen parallele Prozesse."""
+        def __init__(self, thread_lock, lock_path):
+            self.thread_lock = thread_lock
+            self.lock_path = lock_path
+            self.handle = None
+
+        def __enter__(self):
+            self.thread_lock.acquire()
+            try:
+                os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+                self.handle = open(self.lock_path, 'a')
+                fcntl.flock(self.handle, fcntl.LOCK_EX)
+            except Exception:
+                self.thread_lock.release()
+                raise
+            return self
+
+        def __exit__(self, *exc):
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+                self.handle.close()
+            finally:
+                self.thread_lock.release()
+
+    def lock(self, symbol, timeframe):
+        key_dir = self._key_dir(symbol, timeframe)
+        return self._KeyLock(self._thread_lock(key_dir), os.path.join(key_dir, '.lock'))
+
+    # --- Metadaten ---
+    def _read_meta_file(self, key_dir):
+        try:
+            with open(os.path.join(key_dir, META_FILE), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read_meta(self, symbol, timeframe):
+        """Metadaten (Generation, Zeilen, abgedeckte Zeiträume) oder None, falls nichts gespeichert ist."""
+        key_dir = self._key_dir(symbol, timeframe)
+        meta = self._read_meta_file(key_dir)
+        if meta is None and self._import_legacy_csv(symbol, timeframe):
+            meta = self._read_meta_file(key_dir)
+        return meta
+
+    def covered_ranges(self, symbol, timeframe):
+        meta = self.read_meta(symbol, timeframe)
+        return [tuple(r) for r in meta['ranges']] if meta else []
+
+    def confirmed_gaps(self, symbol, timeframe):
+        meta = self.read_meta(symbol, timeframe)
+        return [tuple(g) for g in meta.get('confirmed_gaps', [])] if meta else []
+
+    def covers(self, symbol, timeframe, start, end):
+        """True, wenn [start, end] (ms oder Datum) vollständig in einem abgedeckten Zeitraum liegt."""
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        return any(r_start <= start_ms and r_end >= end_ms for r_start, r_end in self.covered_ranges(symbol, timeframe))
+
+    # --- Lesen ---
+    def load_arrays(self, symbol, timeframe):
+        """
+        Memory-Maps aller Spalten der aktuellen Generation (oder None).
+        Verschwindet die Generation zwischen meta.json und np.load (paralleler Schreiber), wird neu gelesen.
+        """
+        for attempt in range(READ_ATTEMPTS):
+            meta = self.read_meta(symbol, timeframe)
+            if not meta or not meta.get('rows'):
+                return None
+            gen_dir = os.path.join(self._key_dir(symbol, timeframe), meta['generation'])
+            try:
+                return {col: np.load(os.path.join(gen_dir, f'{col}.npy'), mmap_mode='r') for col in ['timestamp'] + OHLCV_COLUMNS}
+            except FileNotFoundError:
+                if attempt == READ_ATTEMPTS - 1:
+                    raise
+                logger.debug(f"{symbol} ({timeframe}): {meta['generation']} wurde ersetzt, lese neue Generation")
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        """
+        Liest die Kerzen im Zeitraum [start, end] als DataFrame (UTC-Index 'timestamp').
+        Reine Datumsangaben für 'end' schließen den ganzen Tag ein.
+        """
+        arrays = self.load_arrays(symbol, timeframe)
+        if arrays is None:
+            return pd.DataFrame()
+        timestamps = arrays['timestamp']
+        lo = int(np.searchsorted(timestamps, to_ms(start), side='left')) if start is not None else 0
+        hi = int(np.searchsorted(timestamps, end_to_ms(end), side='right')) if end is not None else len(timestamps)
+        return self._to_frame(arrays, lo, max(lo, hi))
+
+    @staticmethod
+    def _to_frame(arrays, lo, hi):
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(arrays['timestamp'][lo:hi]), unit='ms', utc=True), name='timestamp')
+        return pd.DataFrame({col: np.asarray(arrays[col][lo:hi]) for col in OHLCV_COLUMNS}, index=index)
+
+    # --- Schreiben ---
+    @staticmethod
+    def _frame_to_arrays(df):
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        index = pd.DatetimeIndex(df.index)
+        index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+        arrays = {'timestamp': index.as_unit('ms').asi8.astype(np.int64)}
+        for col in OHLCV_COLUMNS:
+            arrays[col] = df[col].to_numpy(dtype=np.float64)
+        return arrays
+
+    def _write_generation(self, symbol, timeframe, arrays, ranges, confirmed_gaps=None):
+        """Schreibt eine neue Generation und schaltet meta.json atomar darauf um. Aufrufer hält die Sperre."""
+        key_dir = self._key_dir(symbol, timeframe)
+        os.makedirs(key_dir, exist_ok=True)
+        old_meta = self._read_meta_file(key_dir)
+        generation_no = (old_meta or {}).get('generation_no', 0) + 1
+        generation = f'gen_{generation_no:06d}'
+        gen_dir = os.path.join(key_dir, generation)
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        os.makedirs(gen_dir)
+        for col, values in arrays.items():
+            np.save(os.path.join(gen_dir, f'{col}.npy'), np.ascontiguousarray(values))
+
+        timestamps = arrays['timestamp']
+        meta = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'generation': generation,
+            'generation_no': generation_no,
+            'rows': int(len(timestamps)),
+            'first_ts': int(timestamps[0]) if len(timestamps) else None,
+            'last_ts': int(timestamps[-1]) if len(timestamps) else None,
+            'ranges': merge_ranges(ranges, timeframe_to_ms(timeframe)),
+            'confirmed_gaps': merge_ranges(confirmed_gaps or []),
+        }
+        tmp_path = os.path.join(key_dir, META_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(key_dir, META_FILE))
+
+        # Alte Generationen entfernen (offene Memory-Maps bleiben unter Linux gültig)
+        for entry in os.listdir(key_dir):
+            if entry.startswith('gen_') and entry != generation:
+                shutil.rmtree(os.path.join(key_dir, entry), ignore_errors=True)
+        return meta
+
+    def write(self, symbol, timeframe, df, ranges=None):
+        """Ersetzt den gespeicherten Bestand vollständig durch df."""
+        arrays = self._frame_to_arrays(df)
+        if ranges is None:
+            ranges = [[int(arrays['timestamp'][0]), int(arrays['timestamp'][-1])]] if len(arrays['timestamp']) else []
+        with self.lock(symbol, timeframe):
+            return self._write_generation(symbol, timeframe, arrays, ranges)
+
+    def merge(self, symbol, timeframe, df, covered_ranges=None, confirmed_gaps=None):
+        """
+        Fügt neue Kerzen in den Bestand ein (neue Werte überschreiben vorhandene Kerzen mit gleichem
+        Zeitstempel, z.B. eine zuvor noch offene letzte Kerze) und vermerkt die abgedeckten Zeiträume.
+        confirmed_gaps: Lücken [start, end], für die die Börse nachweislich keine Kerzen liefert.
+        """
+        new_arrays = self._frame_to_arrays(df) if df is not None and not df.empty else None
+        self.read_meta(symbol, timeframe)  # ggf. CSV-Import vor dem Sperren auslösen
+        with self.lock(symbol, timeframe):
+            meta = self._read_meta_file(self._key_dir(symbol, timeframe))
+            ranges = [list(r) for r in meta['ranges']] if meta else []
+            if covered_ranges is not None:
+                ranges.extend([int(start), int(end)] for start, end in covered_ranges)
+            elif new_arrays is not None:
+                ranges.append([int(new_arrays['timestamp'][0]), int(new_arrays['timestamp'][-1])])
+
+            old_arrays = self.load_arrays(symbol, timeframe) if meta else None
+            if old_arrays is None:
+                arrays = new_arrays or {col: np.empty(0, dtype=np.int64 if col == 'timestamp' else np.float64) for col in ['timestamp'] + OHLCV_COLUMNS}
+            elif new_arrays is None:
+                arrays = {col: np.asarray(values) for col, values in old_arrays.items()}
+            else:
+                # Vorhandene Zeilen mit gleichem Zeitstempel werden durch die neuen ersetzt
+                keep = ~np.isin(old_arrays['timestamp'], new_arrays['timestamp'])
+                timestamps = np.concatenate([np.asarray(old_arrays['timestamp'])[keep], new_arrays['timestamp']])
+                order = np.argsort(timestamps, kind='stable')
+                arrays = {col: np.concatenate([np.asarray(old_arrays[col])[keep], new_arrays[col]])[order]
+                          for col in ['timestamp'] + OHLCV_COLUMNS}
+            gaps = [list(g) for g in meta.get('confirmed_gaps', [])] if meta else []
+            gaps.extend([int(start), int(end)] for start, end in (confirmed_gaps or []))
+            return self._write_generation(symbol, timeframe, arrays, ranges, gaps)
+
+    # --- Migration ---
+    def _import_legacy_csv(self, symbol, timeframe):
+        """Importiert einmalig eine vorhandene CSV-Datei aus dem alten Cache."""
+        csv_path = os.path.join(self.legacy_dir, f"{symbol_key(symbol, timeframe)}.csv") if self.legacy_dir else None
+        if not csv_path or not os.path.exists(csv_path):
+            return False
+        with self.lock(symbol, timeframe):
+            if self._read_meta_file(self._key_dir(symbol, timeframe)) is not None:
+                return True
+            try:
+                df = pd.read_csv(csv_path, index_col='timestamp', parse_dates=True)
+                arrays = self._frame_to_arrays(df)
+                ranges = [[int(arrays['timestamp'][0]), int(arrays['timestamp'][-1])]] if len(arrays['timestamp']) else []
+                self._write_generation(symbol, timeframe, arrays, ranges)
+                logger.info(f"CSV-Cache importiert: {csv_path} ({len(df)} Kerzen)")
+                return True
+            except Exception as e:
+                logger.warning(f"CSV-Cache {csv_path} konnte nicht importiert werden: {e}")
+                return False
+
+
+_DEFAULT_STORE = None
+
+def get_data_store():
+    """Gemeinsamer Speicher unter data/store (mit Import aus data/cache)."""
+    global _DEFAULT_STORE
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = OHLCVStore()
+    return _DEFAULT_STORE
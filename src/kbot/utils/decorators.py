@@ -23,9 +23,9 @@ def run_with_guardian_checks(func):
         symbol = params['market']['symbol']
         
         try:
-            # Die Exchange-Instanz wird hier nur für den Guardian erstellt
+            # Die Exchange-Instanz wird hier nur für den Guardian erstellt (Märkte aus dem Markt-Cache, nur dieses Symbol)
             from .exchange import Exchange
-            exchange = Exchange(account)
+            exchange = Exchange(account, symbols=[symbol])
 
             # 1. Der Guardian wird aufgerufen - der unbestechliche Bodyguard
             guardian = Guardian(exchange, params, model_path, scaler_path, logger)
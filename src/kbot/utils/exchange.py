@@ -4,15 +4,50 @@ import pandas as pd
 from datetime import datetime, timezone
 import logging
 import time # Hinzugefügt: Import der time Bibliothek für sleep
+import threading
+from kbot.utils.ohlcv_sync import fetch_segment
+from kbot.utils.market_cache import get_market_cache
 
 # NEU: Logger für diese Datei holen
 logger = logging.getLogger(__name__)
 
+def create_public_client(markets=None, enable_rate_limit=True):
+    """
+    Bitget-Client ohne API-Schlüssel für öffentliche Marktdaten (OHLCV).
+    Bereits geladene Märkte können übergeben werden, damit load_markets nicht erneut die Börse abfragt.
+    """
+    client = ccxt.bitget({
+        'options': {
+            'defaultType': 'swap',
+        },
+        'enableRateLimit': enable_rate_limit,
+    })
+    if markets:
+        client.set_markets(markets)
+    return client
+
+_PUBLIC_CLIENT = None
+_PUBLIC_CLIENT_LOCK = threading.Lock()
+
+def get_public_client():
+    """Gemeinsamer öffentlicher Bitget-Client des Prozesses; Märkte kommen aus dem Markt-Cache."""
+    global _PUBLIC_CLIENT
+    with _PUBLIC_CLIENT_LOCK:
+        if _PUBLIC_CLIENT is None:
+            client = create_public_client()
+            get_market_cache().apply(client)
+            _PUBLIC_CLIENT = client
+        return _PUBLIC_CLIENT
+
 class Exchange:
     # Unterstützte Timeframes von Bitget
     SUPPORTED_TIMEFRAMES = ['1m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '12h', '1d', '1w', '1M']
     
-    def __init__(self, account_config):
+    def __init__(self, account_config, symbols=None):
+        """
+        symbols: optional nur diese Märkte laden (Lazy-Modus); die Metadaten kommen aus dem
+        gemeinsamen Markt-Cache (Datei mit TTL), load_markets läuft nur bei abgelaufenem Cache.
+        """
         self.account = account_config
         self.exchange = getattr(ccxt, 'bitget')({
             'apiKey': self.account.get('apiKey'),
@@ -24,7 +59,7 @@ class Exchange:
             'enableRateLimit': True, # Neu hinzugefügt
         })
         try:
-            self.markets = self.exchange.load_markets()
+            self.markets = get_market_cache().apply(self.exchange, symbols)
             logger.info("Bitget Märkte erfolgreich geladen.")
         except ccxt.AuthenticationError as e:
             logger.critical(f"FATAL: Bitget Authentifizierungsfehler: {e}. Bitte API-Schlüssel prüfen.")
@@ -56,17 +91,10 @@ class Exchange:
             return pd.DataFrame()
 
     def fetch_historical_ohlcv(self, symbol, timeframe, start_date_str, end_date_str):
-        # ... (Unveränderter Code von Zeile 52 bis 109)
+        # Seitenweise und lückenlos (siehe ohlcv_sync.PAGE_LIMIT)
         start_ts = int(self.exchange.parse8601(start_date_str + 'T00:00:00Z'))
         end_ts = int(self.exchange.parse8601(end_date_str + 'T00:00:00Z'))
-        all_ohlcv = []
-
-        while start_ts < end_ts:
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, since=start_ts, limit=1000)
-            if not ohlcv:
-                break
-            all_ohlcv.extend(ohlcv)
-            start_ts = ohlcv[-1][0] + 1
+        all_ohlcv, _ = fetch_segment(self.exchange, symbol, timeframe, start_ts, end_ts)
 
         if not all_ohlcv:
             return pd.DataFrame()
@@ -76,6 +104,13 @@ class Exchange:
         df.set_index('timestamp', inplace=True)
         return df[~df.index.duplicated(keep='first')].sort_index()
 
+    def fetch_time_offset_ms(self):
+        """Offset Börsenzeit - lokale Zeit in ms (Mitte der Anfrage als lokale Referenz)."""
+        before = time.time() * 1000
+        server_ms = self.exchange.fetch_time()
+        after = time.time() * 1000
+        return int(server_ms - (before + after) / 2)
+
     def fetch_ticker(self, symbol):
         return self.exchange.fetch_ticker(symbol)
 
@@ -120,11 +155,24 @@ class Exchange:
         open_positions = [p for p in positions if p.get('contracts', 0.0) > 0.0]
         return open_positions
 
+    def fetch_positions_by_symbol(self, symbols):
+        """Offene Positionen mehrerer Symbole mit einer Abfrage: {symbol: [positionen]}."""
+        positions = self.exchange.fetch_positions(list(symbols))
+        by_symbol = {symbol: [] for symbol in symbols}
+        for position in positions:
+            if (position.get('contracts') or 0.0) > 0.0 and position.get('symbol') in by_symbol:
+                by_symbol[position['symbol']].append(position)
+        return by_symbol
+
+    def fetch_tickers(self, symbols):
+        """Ticker mehrerer Symbole mit einer Abfrage."""
+        return self.exchange.fetch_tickers(list(symbols))
+
     def fetch_open_trigger_orders(self, symbol):
         return self.exchange.fetch_open_orders(symbol, params={'stop': True})
 
-    def fetch_balance_usdt(self):
-        # ... (Unveränderter Code von Zeile 219 bis 242)
+    def fetch_balance_usdt(self, raise_errors=False):
+        # raise_errors: Fehler weitergeben statt 0 zurückzugeben (Konto-Snapshot soll keinen Fehlerwert cachen)
         try:
             balance = self.exchange.fetch_balance()
             if 'USDT' in balance:
@@ -144,6 +192,8 @@ class Exchange:
                             return float(asset_info['equity'])
             return 0
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Fehler beim Abrufen des Kontostandes: {e}")
             return 0
 
@@ -0,0 +1,461 @@
+# src/kbot/utils/feature_engine.py
+"""
+Fusionierte Feature-Berechnung für das ANN-Modell.
+
+Ersetzt die rund 30 einzelnen ta-Aufrufe aus create_ann_features: gemeinsame Zwischenwerte
+(True Range, EMAs, rollierende Hochs/Tiefs, typischer Preis) werden einmal auf float64-Arrays
+berechnet und direkt in eine vorab angelegte 2-D Feature-Matrix geschrieben. Die ersten
+Spalten entsprechen exakt der Reihenfolge, die der Scaler erwartet (FEATURE_COLUMNS).
+
+Die Formeln bilden die ta-Bibliothek (0.11) nach, inklusive ihrer Eigenheiten
+(z.B. ATR/ADX mit 0 statt NaN in der Anlaufphase).
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+# Bei jeder Änderung an den Feature- oder Label-Berechnungen erhöhen: macht alle Einträge
+# im Artefakt-Cache (artifacts/cache) ungültig
+FEATURE_CODE_VERSION = 1
+
+# Reihenfolge der Modell-Eingabe (Scaler-Feature-Reihenfolge!)
+FEATURE_COLUMNS = [
+    # Basis-Features
+    'bb_width', 'bb_pband', 'obv', 'rsi', 'macd_diff', 'macd',
+    'atr_normalized', 'adx', 'adx_pos', 'adx_neg',
+
+    # Volume-Features
+    'volume_ratio', 'mfi', 'cmf',
+
+    # Trend-Features
+    'price_to_ema20', 'price_to_ema50',
+
+    # Momentum-Features
+    'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
+
+    # Support/Resistance
+    'price_to_resistance', 'price_to_support',
+
+    # Price Action
+    'high_low_range', 'close_to_high', 'close_to_low',
+
+    # Zeitliche Features
+    'day_of_week', 'hour_of_day',
+
+    # Returns & Volatilität
+    'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility',
+
+    # Adaptive Trend Finder
+    'atf_pearson_r', 'atf_trend_strength', 'atf_slope',
+    'atf_std_dev', 'atf_upper_channel_dist', 'atf_lower_channel_dist',
+    'atf_price_to_trend'
+]
+
+# Zusätzliche Spalten, die create_ann_features ebenfalls liefert (Filter, Anzeige, Lernziel)
+EXTRA_COLUMNS = [
+    'bb_hband', 'bb_lband', 'volume_sma', 'vwap', 'macd_signal', 'atr',
+    'ema20', 'ema50', 'ema200',
+    'keltner_channel_hband', 'keltner_channel_lband', 'donchian_channel_hband', 'donchian_channel_lband',
+    'resistance', 'support', 'atf_detected_period'
+]
+
+MATRIX_COLUMNS = FEATURE_COLUMNS + EXTRA_COLUMNS
+COLUMN_INDEX = {name: i for i, name in enumerate(MATRIX_COLUMNS)}
+
+# Spalten-Reihenfolge, in der create_ann_features die Spalten an den DataFrame anhängt
+OUTPUT_COLUMNS = [
+    'bb_width', 'bb_pband', 'bb_hband', 'bb_lband',
+    'obv', 'volume_sma', 'volume_ratio', 'mfi', 'cmf', 'vwap',
+    'rsi', 'macd_diff', 'macd', 'macd_signal', 'atr', 'atr_normalized',
+    'adx', 'adx_pos', 'adx_neg',
+    'ema20', 'ema50', 'ema200', 'price_to_ema20', 'price_to_ema50',
+    'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
+    'keltner_channel_hband', 'keltner_channel_lband', 'donchian_channel_hband', 'donchian_channel_lband',
+    'resistance', 'support', 'price_to_resistance', 'price_to_support',
+    'high_low_range', 'close_to_high', 'close_to_low',
+    'day_of_week', 'hour_of_day',
+    'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility',
+    'atf_pearson_r', 'atf_trend_strength', 'atf_detected_period', 'atf_slope', 'atf_std_dev',
+    'atf_upper_channel_dist', 'atf_lower_channel_dist', 'atf_price_to_trend'
+]
+
+ATF_COLUMNS = ['atf_pearson_r', 'atf_trend_strength', 'atf_detected_period', 'atf_slope', 'atf_std_dev',
+               'atf_upper_channel_dist', 'atf_lower_channel_dist', 'atf_price_to_trend']
+ATF_SHORT_TERM_PERIODS = [20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120, 130, 140, 150, 160, 170, 180, 190, 200]
+ATF_LONG_TERM_PERIODS = [300, 350, 400, 450, 500, 550, 600, 650, 700, 750, 800, 850, 900, 950, 1000, 1050, 1100, 1150, 1200]
+ATF_STRENGTH_BINS = np.array([0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.92, 0.94, 0.96, 0.98])
+ATF_STRENGTH_VALUES = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 1.0])
+
+
+# --- Array-Bausteine ---
+
+def shift(values, periods):
+    """Wie pandas.Series.shift für 1-D Arrays (aufgefüllt mit NaN)."""
+    out = np.full(len(values), np.nan)
+    if periods < len(values):
+        out[periods:] = values[:len(values) - periods]
+    return out
+
+
+def _rolling(values, window, reducer):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = reducer(sliding_window_view(values, window), axis=1)
+    return out
+
+
+def rolling_sum(values, window):
+    return _rolling(values, window, np.sum)
+
+
+def rolling_mean(values, window):
+    return _rolling(values, window, np.mean)
+
+
+def rolling_max(values, window):
+    return _rolling(values, window, np.max)
+
+
+def rolling_min(values, window):
+    return _rolling(values, window, np.min)
+
+
+def rolling_std(values, window, ddof=1):
+    return _rolling(values, window, lambda w, axis: np.std(w, axis=axis, ddof=ddof))
+
+
+def rolling_mean_partial(values, window):
+    """Rollierender Mittelwert mit min_periods=0 (Anlaufphase als wachsendes Fenster)."""
+    out = np.empty(len(values))
+    head = min(window - 1, len(values))
+    out[:head] = np.cumsum(values[:head]) / np.arange(1, head + 1)
+    out[head:] = rolling_mean(values, window)[head:]
+    return out
+
+
+def ewm_mean(values, alpha, min_periods):
+    """
+    Wie pandas ewm(alpha=..., adjust=False, min_periods=...).mean() für Reihen,
+    die höchstens am Anfang NaN enthalten.
+    """
+    out = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    x = values[first:]
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], x, zi=[(1.0 - alpha) * x[0]])
+    out[first:] = smoothed
+    out[:first + max(min_periods, 1) - 1] = np.nan
+    return out
+
+
+def ema(values, window):
+    """ta.trend.ema_indicator (span=window, min_periods=window)."""
+    return ewm_mean(values, 2.0 / (window + 1.0), window)
+
+
+def wilder_recursion(first_value, increments, keep):
+    """r[0] = first_value; r[i] = r[i-1] * keep + increments[i-1] (linearer Filter statt Python-Schleife)."""
+    if len(increments) == 0:
+        return np.array([first_value], dtype=np.float64)
+    rest, _ = lfilter([1.0], [1.0, -keep], increments, zi=[keep * first_value])
+    return np.concatenate(([first_value], rest))
+
+
+def safe_divide(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator / denominator
+
+
+# --- Indikatoren mit geteilten Zwischenwerten ---
+
+def true_range(high, low, prev_close):
+    """ta IndicatorMixin._true_range (NaN der ersten Kerze wird wie bei DataFrame.max übersprungen)."""
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def average_true_range(tr, window=14):
+    """ta.volatility.AverageTrueRange (0 in der Anlaufphase)."""
+    atr = np.zeros(len(tr))
+    if len(tr) < window:
+        return atr
+    atr[window - 1] = tr[:window].mean()
+    keep = (window - 1) / float(window)
+    atr[window - 1:] = wilder_recursion(atr[window - 1], tr[window:] / float(window), keep)
+    return atr
+
+
+def adx_components(high, low, prev_close, prev_high, prev_low, window=14):
+    """ta.trend.ADXIndicator: liefert (adx, adx_pos, adx_neg) inkl. der Index-Eigenheiten der Bibliothek."""
+    n = len(high)
+    adx = np.zeros(n)
+    adx_pos = np.zeros(n)
+    adx_neg = np.zeros(n)
+    length = n - (window - 1)
+    if length <= window:
+        return adx, adx_pos, adx_neg
+
+    keep = 1.0 - 1.0 / float(window)
+    diff_dm = np.fmax(high, prev_close) - np.fmin(low, prev_close)
+    diff_dm[np.isnan(prev_close)] = np.nan
+    diff_up = high - prev_high
+    diff_down = prev_low - low
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), np.abs(diff_up), 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), np.abs(diff_down), 0.0)
+    pos[0] = neg[0] = np.nan
+
+    def smoothed(series):
+        # [0] = Summe der ersten 'window' gültigen Werte, [1..length-2] rekursiv, [length-1] bleibt 0
+        out = np.zeros(length)
+        first = series[~np.isnan(series)][:window].sum()
+        out[:length - 1] = wilder_recursion(first, series[window + 1:window + length - 1], keep)
+        return out
+
+    trs, dip, din = smoothed(diff_dm), smoothed(pos), smoothed(neg)
+    nonzero = trs != 0
+    di_pos = np.where(nonzero, 100 * safe_divide(dip, trs), 0.0)
+    di_neg = np.where(nonzero, 100 * safe_divide(din, trs), 0.0)
+    di_sum = di_pos + di_neg
+    dx = np.where(di_sum != 0, 100 * np.abs(safe_divide(di_pos - di_neg, di_sum)), 0.0)
+
+    adx_series = np.zeros(length)
+    adx_series[window] = dx[:window].mean()
+    adx_series[window:] = wilder_recursion(adx_series[window], dx[window:length - 1] / float(window), keep)
+    adx[window - 1:] = adx_series
+
+    adx_pos[window + 1:window + length - 1] = di_pos[1:length - 1]
+    adx_neg[window + 1:window + length - 1] = di_neg[1:length - 1]
+    return adx, adx_pos, adx_neg
+
+
+def rolling_adaptive_trend_matrix(close, use_long_term=False):
+    """
+    Rollierender Adaptive Trend Finder auf einem Schlusskurs-Array.
+
+    Die Fenster-Summen Σy, Σxy und Σy² aller Perioden werden über kumulative Summen in O(1)
+    pro Kerze und Periode bestimmt (2-D: Kerzen x Perioden).
+
+    Returns:
+        Matrix (len(close) x 8) in der Spalten-Reihenfolge von ATF_COLUMNS; NaN ohne ausreichende Historie.
+    """
+    periods = np.array(ATF_LONG_TERM_PERIODS if use_long_term else ATF_SHORT_TERM_PERIODS)
+    close_prices = np.asarray(close, dtype=np.float64)
+    n = len(close_prices)
+    result = np.full((n, len(ATF_COLUMNS)), np.nan)
+    max_period = periods.max()
+    if n < max_period:
+        return result
+
+    # Log-Preise um einen festen Wert verschieben, damit die kumulativen Summen klein bleiben
+    # (Slope und Pearson-R sind verschiebungsinvariant, der Intercept wird unten korrigiert)
+    log_prices = np.log(close_prices)
+    offset = log_prices[0]
+    y = log_prices - offset
+    idx = np.arange(n, dtype=np.float64)
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    cum_iy = np.concatenate(([0.0], np.cumsum(idx * y)))
+    cum_yy = np.concatenate(([0.0], np.cumsum(y * y)))
+
+    ends = np.arange(max_period - 1, n)                 # Kerzen mit vollständiger Historie
+    lengths = periods[np.newaxis, :].astype(np.float64)  # (1, P)
+    starts = ends[:, np.newaxis] - periods[np.newaxis, :] + 1  # (T, P)
+    end_plus = ends[:, np.newaxis] + 1
+
+    sum_y = cum_y[end_plus] - cum_y[starts]
+    sum_yy = cum_yy[end_plus] - cum_yy[starts]
+    # x läuft innerhalb des Fensters von 1 bis length: x = i - start + 1
+    sum_yx = (cum_iy[end_plus] - cum_iy[starts]) - (starts - 1) * sum_y
+    sum_x = lengths * (lengths + 1) / 2
+    sum_xx = lengths * (lengths + 1) * (2 * lengths + 1) / 6
+
+    slope = (lengths * sum_yx - sum_x * sum_y) / (lengths * sum_xx - sum_x * sum_x)
+    average = sum_y / lengths
+    intercept = average - slope * sum_x / lengths + slope
+
+    # Residuen-Quadratsumme der Fit-Geraden fitted = (intercept - slope) + slope * x
+    alpha = intercept - slope
+    ssr = (sum_yy - 2 * alpha * sum_y - 2 * slope * sum_yx + lengths * alpha * alpha
+           + 2 * alpha * slope * sum_x + slope * slope * sum_xx)
+    std_dev = np.sqrt(np.maximum(ssr, 0.0) / (lengths - 1))
+
+    # Pearson-R zwischen Log-Preisen und Fit-Geraden
+    sum_dxx = np.maximum(sum_yy - sum_y * sum_y / lengths, 0.0)
+    sum_dyy = slope * slope * (sum_xx - sum_x * sum_x / lengths)
+    sum_dyx = slope * (sum_yx - sum_x * sum_y / lengths)
+    divisor = sum_dxx * sum_dyy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pearson_r = np.where(divisor > 0, np.abs(sum_dyx / np.sqrt(divisor)), 0.0)
+
+    # Beste Periode je Kerze (bei Gleichstand die erste, wie in der Einzel-Berechnung)
+    best = np.argmax(pearson_r, axis=1)
+    rows = np.arange(len(ends))
+    best_pearson_r = pearson_r[rows, best]
+    best_slope = slope[rows, best]
+    best_std_dev = std_dev[rows, best]
+    best_intercept = intercept[rows, best] + offset
+
+    trend_strength = ATF_STRENGTH_VALUES[np.digitize(best_pearson_r, ATF_STRENGTH_BINS)]
+    trend_direction = np.where(best_slope > 0, 1.0, -1.0)
+
+    current_price = close_prices[ends]
+    predicted_price = np.exp(best_intercept)
+    dev_multiplier = 2.0
+    upper_bound = predicted_price * np.exp(dev_multiplier * best_std_dev)
+    lower_bound = predicted_price / np.exp(dev_multiplier * best_std_dev)
+
+    result[max_period - 1:] = np.column_stack([
+        best_pearson_r,
+        trend_strength * trend_direction,
+        periods[best].astype(np.float64),
+        best_slope,
+        best_std_dev,
+        (upper_bound - current_price) / current_price,
+        (current_price - lower_bound) / current_price,
+        (current_price - predicted_price) / predicted_price,
+    ])
+    return result
+
+
+# --- Feature-Matrix ---
+
+def compute_feature_matrix(df):
+    """
+    Berechnet alle Features von create_ann_features in einem Durchlauf.
+
+    Args:
+        df: DataFrame mit 'open', 'high', 'low', 'close', 'volume' und DatetimeIndex
+    Returns:
+        float64-Matrix (len(df) x len(MATRIX_COLUMNS)); die ersten len(FEATURE_COLUMNS) Spalten
+        sind die Modell-Eingabe in Scaler-Reihenfolge.
+    """
+    n = len(df)
+    out = np.empty((n, len(MATRIX_COLUMNS)), dtype=np.float64)
+
+    def put(name, values):
+        out[:, COLUMN_INDEX[name]] = values
+
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    prev_close, prev_high, prev_low = shift(close, 1), shift(high, 1), shift(low, 1)
+    typical_price = (high + low + close) / 3.0
+    price_range = high - low
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Bollinger-Bänder (20, 2)
+        bb_mavg = rolling_mean(close, 20)
+        bb_std = rolling_std(close, 20, ddof=0)
+        bb_hband = bb_mavg + 2 * bb_std
+        bb_lband = bb_mavg - 2 * bb_std
+        put('bb_width', (bb_hband - bb_lband) / bb_mavg * 100)
+        put('bb_pband', (close - bb_lband) / np.where(bb_hband != bb_lband, bb_hband - bb_lband, np.nan))
+        put('bb_hband', bb_hband)
+        put('bb_lband', bb_lband)
+
+        # Volumen-Features
+        volume = df['volume'].to_numpy(dtype=np.float64) if 'volume' in df.columns else None
+        if volume is not None and volume.sum() > 0:
+            put('obv', np.cumsum(np.where(close < prev_close, -volume, volume)))
+            volume_sma = rolling_mean(volume, 20)
+            put('volume_sma', volume_sma)
+            put('volume_ratio', volume / volume_sma)
+
+            prev_tp = shift(typical_price, 1)
+            up_down = np.where(typical_price > prev_tp, 1, np.where(typical_price < prev_tp, -1, 0))
+            money_flow = typical_price * volume * up_down
+            positive_flow = rolling_sum(np.where(money_flow >= 0.0, money_flow, 0.0), 14)
+            negative_flow = np.abs(rolling_sum(np.where(money_flow < 0.0, money_flow, 0.0), 14))
+            put('mfi', 100 - (100 / (1 + positive_flow / negative_flow)))
+
+            mfv = ((close - low) - (high - close)) / price_range
+            mfv = np.where(np.isnan(mfv), 0.0, mfv) * volume
+            put('cmf', rolling_sum(mfv, 20) / rolling_sum(volume, 20))
+            put('vwap', rolling_sum(typical_price * volume, 14) / rolling_sum(volume, 14))
+        else:
+            put('obv', 0.0)
+            put('volume_sma', 0.0)
+            put('volume_ratio', 1.0)
+            put('mfi', 50.0)
+            put('cmf', 0.0)
+            put('vwap', close)
+
+        # RSI (14): Wilder-Glättung der Auf-/Ab-Bewegungen
+        diff = close - prev_close
+        up = np.where(diff > 0, diff, 0.0)
+        down = -np.where(diff < 0, diff, 0.0)
+        ema_up = ewm_mean(up, 1.0 / 14, 14)
+        ema_down = ewm_mean(down, 1.0 / 14, 14)
+        put('rsi', np.where(ema_down == 0, 100.0, 100 - (100 / (1 + ema_up / ema_down))))
+
+        # MACD (12, 26, 9)
+        macd = ema(close, 12) - ema(close, 26)
+        macd_signal = ema(macd, 9)
+        put('macd', macd)
+        put('macd_signal', macd_signal)
+        put('macd_diff', macd - macd_signal)
+
+        # ATR (14) und ADX (14) teilen sich die Vorkerzen-Werte
+        atr = average_true_range(true_range(high, low, prev_close), 14)
+        put('atr', atr)
+        put('atr_normalized', atr / close * 100)
+        adx, adx_pos, adx_neg = adx_components(high, low, prev_close, prev_high, prev_low, 14)
+        put('adx', adx)
+        put('adx_pos', adx_pos)
+        put('adx_neg', adx_neg)
+
+        # EMA-Trend
+        ema20, ema50 = ema(close, 20), ema(close, 50)
+        put('ema20', ema20)
+        put('ema50', ema50)
+        put('ema200', ema(close, 200))
+        put('price_to_ema20', (close - ema20) / ema20)
+        put('price_to_ema50', (close - ema50) / ema50)
+
+        # Momentum: Stochastik und Williams %R teilen sich Hoch/Tief über 14 Kerzen
+        highest_14, lowest_14 = rolling_max(high, 14), rolling_min(low, 14)
+        stoch_k = 100 * (close - lowest_14) / (highest_14 - lowest_14)
+        put('stoch_k', stoch_k)
+        put('stoch_d', rolling_mean(stoch_k, 3))
+        put('williams_r', -100 * (highest_14 - close) / (highest_14 - lowest_14))
+        close_12 = shift(close, 12)
+        put('roc', (close - close_12) / close_12 * 100)
+        tp_windows = sliding_window_view(typical_price, 20) if n >= 20 else None
+        tp_mean = rolling_mean(typical_price, 20)
+        mean_deviation = np.full(n, np.nan)
+        if tp_windows is not None:
+            mean_deviation[19:] = np.mean(np.abs(tp_windows - tp_windows.mean(axis=1, keepdims=True)), axis=1)
+        put('cci', (typical_price - tp_mean) / (0.015 * mean_deviation))
+
+        # Keltner (Originalversion), Donchian und Support/Resistance (Hoch/Tief über 20 Kerzen)
+        put('keltner_channel_hband', rolling_mean_partial((4 * high - 2 * low + close) / 3.0, 20))
+        put('keltner_channel_lband', rolling_mean_partial((-2 * high + 4 * low + close) / 3.0, 20))
+        highest_20, lowest_20 = rolling_max(high, 20), rolling_min(low, 20)
+        put('donchian_channel_hband', highest_20)
+        put('donchian_channel_lband', lowest_20)
+        put('resistance', highest_20)
+        put('support', lowest_20)
+        put('price_to_resistance', (highest_20 - close) / close)
+        put('price_to_support', (close - lowest_20) / close)
+
+        # Price Action
+        put('high_low_range', price_range / close)
+        put('close_to_high', (high - close) / (price_range + 0.0001))
+        put('close_to_low', (close - low) / (price_range + 0.0001))
+
+        # Zeitliche Features
+        put('day_of_week', df.index.dayofweek)
+        put('hour_of_day', df.index.hour if hasattr(df.index, 'hour') else 0)
+
+        # Returns & historische Volatilität
+        returns = close / prev_close - 1
+        put('returns_lag1', shift(returns, 1))
+        put('returns_lag2', shift(returns, 2))
+        put('returns_lag3', shift(returns, 3))
+        put('hist_volatility', rolling_std(returns, 20, ddof=1) * np.sqrt(252))
+
+    # Adaptive Trend Finder (rollierend, Short-Term Perioden)
+    atf = rolling_adaptive_trend_matrix(close, use_long_term=False)
+    for i, name in enumerate(ATF_COLUMNS):
+        put(name, atf[:, i])
+    return out
@@ -0,0 +1,401 @@
+# src/kbot/utils/feature_state.py
+"""
+Inkrementeller Feature-Zustand für den Live-Handel.
+
+Statt bei jedem Zyklus 500 Kerzen zu laden und alle Indikatoren neu zu berechnen, nimmt
+StreamingFeatureState jeweils eine abgeschlossene Kerze auf und liefert die neue Feature-Zeile.
+EMA/RSI/ATR/ADX/OBV/SuperTrend laufen als Rekursionen, rollierende Fenster als Ringpuffer.
+Die Werte entsprechen Zeile für Zeile feature_engine.compute_feature_matrix (inkl. der
+ta-Eigenheiten in der Anlaufphase), sofern der Zustand ab derselben ersten Kerze aufgebaut wurde.
+
+Der Zustand wird als JSON gespeichert, damit ein Neustart keine Anlaufphase benötigt. In einem
+langlebigen Prozess (Live-Engine) bleibt er zusätzlich im Speicher und wird nicht bei jedem Zyklus
+von der Platte gelesen.
+"""
+import os
+import json
+import math
+import logging
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from kbot.utils.data_store import to_ms
+from kbot.utils.feature_engine import ATF_COLUMNS, ATF_SHORT_TERM_PERIODS, rolling_adaptive_trend_matrix
+from kbot.utils.supertrend_indicator import SuperTrendState
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+FEATURE_STATE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'feature_state')
+
+STATE_VERSION = 2
+NAN = float('nan')
+
+# Länge der Ringpuffer
+_WINDOWS = {
+    'close_20': 20, 'volume_20': 20, 'volume_14': 14, 'high_14': 14, 'low_14': 14, 'high_20': 20, 'low_20': 20,
+    'tp_20': 20, 'money_flow_14': 14, 'mfv_20': 20, 'tp_volume_14': 14, 'keltner_high_20': 20, 'keltner_low_20': 20,
+    'stoch_k_3': 3, 'returns_20': 20, 'closes_roc': 13, 'atr_normalized_50': 50,
+    'closes_atf': max(ATF_SHORT_TERM_PERIODS),
+}
+# EMA-Zustände: Name -> (alpha, min_periods)
+_EMAS = {
+    'ema12': (2.0 / 13, 12), 'ema26': (2.0 / 27, 26), 'macd_signal': (2.0 / 10, 9),
+    'ema20': (2.0 / 21, 20), 'ema50': (2.0 / 51, 50), 'ema200': (2.0 / 201, 200),
+    'rsi_up': (1.0 / 14, 14), 'rsi_down': (1.0 / 14, 14),
+}
+ADX_WINDOW = 14
+ATR_WINDOW = 14
+SUPERTREND_WINDOW = 10
+SUPERTREND_MULTIPLIER = 3.0
+
+
+def _div(numerator, denominator):
+    """Division mit NumPy-Semantik (inf/NaN statt ZeroDivisionError)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(numerator) / np.float64(denominator))
+
+
+def _window_mean(values, window):
+    return math.fsum(values) / window if len(values) == window else NAN
+
+
+def _window_sum(values, window):
+    return math.fsum(values) if len(values) == window else NAN
+
+
+class StreamingFeatureState:
+    """Feature-Zustand einer Strategie (Symbol/Timeframe); update() nimmt eine abgeschlossene Kerze auf."""
+
+    def __init__(self, symbol=None, timeframe=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.bars = 0
+        self.last_timestamp = None
+        self.last_row = None
+        self.prev = None  # Vorkerze: dict mit high, low, close, tp
+        self.buffers = {name: deque(maxlen=size) for name, size in _WINDOWS.items()}
+        self.emas = {name: {'value': None, 'count': 0} for name in _EMAS}
+        self.obv = 0.0
+        self.atr = {'sum': 0.0, 'value': 0.0}
+        self.adx = {'trs': 0.0, 'dip': 0.0, 'din': 0.0, 'dx_sum': 0.0, 'value': 0.0}
+        self.supertrend = SuperTrendState(SUPERTREND_WINDOW, SUPERTREND_MULTIPLIER)
+
+    # --- Rekursionen ---
+
+    def _ema(self, name, x):
+        """pandas ewm(adjust=False): Start beim ersten gültigen Wert, NaN bis min_periods erreicht."""
+        alpha, min_periods = _EMAS[name]
+        state = self.emas[name]
+        if not math.isnan(x):
+            state['value'] = x if state['value'] is None else (1.0 - alpha) * state['value'] + alpha * x
+            state['count'] += 1
+        return state['value'] if state['count'] >= min_periods else NAN
+
+    def _update_atr(self, tr, t):
+        """ta AverageTrueRange(14): 0 bis Kerze 13, dann Mittelwert und Wilder-Glättung."""
+        state = self.atr
+        if t < ATR_WINDOW - 1:
+            state['sum'] += tr
+        elif t == ATR_WINDOW - 1:
+            state['sum'] += tr
+            state['value'] = state['sum'] / ATR_WINDOW
+        else:
+            state['value'] = state['value'] * ((ATR_WINDOW - 1) / ATR_WINDOW) + tr / ATR_WINDOW
+        return state['value'] if t >= ATR_WINDOW - 1 else 0.0
+
+    def _update_adx(self, high, low, t):
+        """ta ADXIndicator(14) mit den Index-Eigenheiten der Bibliothek (siehe feature_engine.adx_components)."""
+        state, window = self.adx, ADX_WINDOW
+        if t == 0:
+            return 0.0, 0.0, 0.0
+        prev = self.prev
+        dm = max(high, prev['close']) - min(low, prev['close'])
+        diff_up, diff_down = high - prev['high'], prev['low'] - low
+        pos = abs(diff_up) if (diff_up > diff_down and diff_up > 0) else 0.0
+        neg = abs(diff_down) if (diff_down > diff_up and diff_down > 0) else 0.0
+
+        keep = 1.0 - 1.0 / window
+        if t <= window:
+            state['trs'] += dm
+            state['dip'] += pos
+            state['din'] += neg
+        else:
+            state['trs'] = state['trs'] * keep + dm
+            state['dip'] = state['dip'] * keep + pos
+            state['din'] = state['din'] * keep + neg
+        if t < window:
+            return 0.0, 0.0, 0.0
+
+        di_pos = 100 * state['dip'] / state['trs'] if state['trs'] != 0 else 0.0
+        di_neg = 100 * state['din'] / state['trs'] if state['trs'] != 0 else 0.0
+        dx = 100 * abs((di_pos - di_neg) / (di_pos + di_neg)) if di_pos + di_neg != 0 else 0.0
+
+        first_adx_bar = 2 * window - 1
+        if t < first_adx_bar:
+            state['dx_sum'] += dx
+        elif t == first_adx_bar:
+            state['dx_sum'] += dx
+            state['value'] = state['dx_sum'] / window
+        else:
+            state['value'] = state['value'] * keep + dx / window
+        adx = state['value'] if t >= first_adx_bar else 0.0
+        if t == window:
+            return adx, 0.0, 0.0
+        return adx, di_pos, di_neg
+
+    # --- Öffentliche API ---
+
+    def update(self, timestamp, open_, high, low, close, volume):
+        """
+        Nimmt eine abgeschlossene Kerze auf und liefert ihre Feature-Zeile.
+
+        Args:
+            timestamp: Kerzen-Zeitstempel (ms oder pandas.Timestamp)
+        Returns:
+            dict mit allen Spalten von create_ann_features sowie 'supertrend_direction' und 'atr_normalized_sma50'.
+        """
+        timestamp = to_ms(timestamp)
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            raise ValueError(f"Kerze {timestamp} ist nicht neuer als die zuletzt aufgenommene ({self.last_timestamp}).")
+
+        high, low, close, volume = float(high), float(low), float(close), float(volume)
+        t = self.bars
+        buf = self.buffers
+        prev = self.prev
+        prev_close = prev['close'] if prev else NAN
+        tp = (high + low + close) / 3.0
+        row = {}
+
+        # Bollinger-Bänder (20, 2)
+        buf['close_20'].append(close)
+        if len(buf['close_20']) == 20:
+            window = np.array(buf['close_20'])
+            mavg = float(window.mean())
+            std = float(window.std())
+            hband, lband = mavg + 2 * std, mavg - 2 * std
+        else:
+            mavg = hband = lband = NAN
+        row['bb_width'] = _div(hband - lband, mavg) * 100
+        row['bb_pband'] = _div(close - lband, hband - lband) if hband != lband else NAN
+        row['bb_hband'], row['bb_lband'] = hband, lband
+
+        # Volumen-Features
+        self.obv += -volume if (prev and close < prev_close) else volume
+        row['obv'] = self.obv
+        buf['volume_20'].append(volume)
+        buf['volume_14'].append(volume)
+        row['volume_sma'] = _window_mean(buf['volume_20'], 20)
+        row['volume_ratio'] = _div(volume, row['volume_sma'])
+        up_down = 0
+        if prev:
+            up_down = 1 if tp > prev['tp'] else (-1 if tp < prev['tp'] else 0)
+        buf['money_flow_14'].append(tp * volume * up_down)
+        if len(buf['money_flow_14']) == 14:
+            positive = math.fsum(x for x in buf['money_flow_14'] if x >= 0.0)
+            negative = abs(math.fsum(x for x in buf['money_flow_14'] if x < 0.0))
+            row['mfi'] = 100 - _div(100, 1 + _div(positive, negative))
+        else:
+            row['mfi'] = NAN
+        mfv = _div((close - low) - (high - close), high - low)
+        buf['mfv_20'].append((0.0 if math.isnan(mfv) else mfv) * volume)
+        row['cmf'] = _div(_window_sum(buf['mfv_20'], 20), _window_sum(buf['volume_20'], 20))
+        buf['tp_volume_14'].append(tp * volume)
+        row['vwap'] = _div(_window_sum(buf['tp_volume_14'], 14), _window_sum(buf['volume_14'], 14))
+
+        # RSI (14)
+        diff = close - prev_close
+        ema_up = self._ema('rsi_up', diff if diff > 0 else 0.0)
+        ema_down = self._ema('rsi_down', -diff if diff < 0 else 0.0)
+        row['rsi'] = 100.0 if ema_down == 0 else 100 - _div(100, 1 + _div(ema_up, ema_down))
+
+        # MACD (12, 26, 9)
+        macd = self._ema('ema12', close) - self._ema('ema26', close)
+        macd_signal = self._ema('macd_signal', macd)
+        row['macd_diff'], row['macd'], row['macd_signal'] = macd - macd_signal, macd, macd_signal
+
+        # ATR (14)
+        tr = high - low if not prev else max(high - low, abs(high - prev_close), abs(low - prev_close))
+        row['atr'] = self._update_atr(tr, t)
+        row['atr_normalized'] = _div(row['atr'], close) * 100
+
+        # ADX (14)
+        row['adx'], row['adx_pos'], row['adx_neg'] = self._update_adx(high, low, t)
+
+        # EMA-Trend
+        row['ema20'], row['ema50'], row['ema200'] = self._ema('ema20', close), self._ema('ema50', close), self._ema('ema200', close)
+        row['price_to_ema20'] = _div(close - row['ema20'], row['ema20'])
+        row['price_to_ema50'] = _div(close - row['ema50'], row['ema50'])
+
+        # Momentum
+        buf['high_14'].append(high)
+        buf['low_14'].append(low)
+        if len(buf['high_14']) == 14:
+            highest_14, lowest_14 = max(buf['high_14']), min(buf['low_14'])
+        else:
+            highest_14 = lowest_14 = NAN
+        row['stoch_k'] = _div(100 * (close - lowest_14), highest_14 - lowest_14)
+        buf['stoch_k_3'].append(row['stoch_k'])
+        row['stoch_d'] = _window_mean(buf['stoch_k_3'], 3) if not any(math.isnan(k) for k in buf['stoch_k_3']) else NAN
+        row['williams_r'] = _div(-100 * (highest_14 - close), highest_14 - lowest_14)
+        buf['closes_roc'].append(close)
+        close_12 = buf['closes_roc'][0] if len(buf['closes_roc']) == 13 else NAN
+        row['roc'] = _div(close - close_12, close_12) * 100
+        buf['tp_20'].append(tp)
+        if len(buf['tp_20']) == 20:
+            window = np.array(buf['tp_20'])
+            tp_mean = float(window.mean())
+            row['cci'] = _div(tp - tp_mean, 0.015 * float(np.mean(np.abs(window - tp_mean))))
+        else:
+            row['cci'] = NAN
+
+        # Keltner (Originalversion, min_periods=0), Donchian, Support/Resistance
+        buf['keltner_high_20'].append((4 * high - 2 * low + close) / 3.0)
+        buf['keltner_low_20'].append((-2 * high + 4 * low + close) / 3.0)
+        row['keltner_channel_hband'] = math.fsum(buf['keltner_high_20']) / len(buf['keltner_high_20'])
+        row['keltner_channel_lband'] = math.fsum(buf['keltner_low_20']) / len(buf['keltner_low_20'])
+        buf['high_20'].append(high)
+        buf['low_20'].append(low)
+        if len(buf['high_20']) == 20:
+            highest_20, lowest_20 = max(buf['high_20']), min(buf['low_20'])
+        else:
+            highest_20 = lowest_20 = NAN
+        row['donchian_channel_hband'] = row['resistance'] = highest_20
+        row['donchian_channel_lband'] = row['support'] = lowest_20
+        row['price_to_resistance'] = _div(highest_20 - close, close)
+        row['price_to_support'] = _div(close - lowest_20, close)
+
+        # Price Action
+        row['high_low_range'] = _div(high - low, close)
+        row['close_to_high'] = _div(high - close, high - low + 0.0001)
+        row['close_to_low'] = _div(close - low, high - low + 0.0001)
+
+        # Zeitliche Features
+        ts = pd.Timestamp(timestamp, unit='ms', tz='UTC')
+        row['day_of_week'] = float(ts.dayofweek)
+        row['hour_of_day'] = float(ts.hour)
+
+        # Returns & historische Volatilität
+        returns = buf['returns_20']
+        lags = list(returns)[-3:]
+        lags = [NAN] * (3 - len(lags)) + lags
+        row['returns_lag1'], row['returns_lag2'], row['returns_lag3'] = lags[2], lags[1], lags[0]
+        returns.append(_div(close, prev_close) - 1)
+        if len(returns) == 20 and not any(math.isnan(r) for r in returns):
+            row['hist_volatility'] = float(np.std(np.array(returns), ddof=1)) * np.sqrt(252)
+        else:
+            row['hist_volatility'] = NAN
+
+        # Adaptive Trend Finder (rollierend über die letzten 200 Schlusskurse)
+        buf['closes_atf'].append(close)
+        if len(buf['closes_atf']) == buf['closes_atf'].maxlen:
+            atf = rolling_adaptive_trend_matrix(np.array(buf['closes_atf']))[-1]
+        else:
+            atf = [NAN] * len(ATF_COLUMNS)
+        row.update({name: float(value) for name, value in zip(ATF_COLUMNS, atf)})
+
+        # Filter-Werte für den Live-Handel
+        _, row['supertrend_direction'] = self.supertrend.update(high, low, close)
+        buf['atr_normalized_50'].append(row['atr_normalized'])
+        row['atr_normalized_sma50'] = _window_mean(buf['atr_normalized_50'], 50)
+        row.update({'timestamp': timestamp, 'open': float(open_), 'high': high, 'low': low, 'close': close, 'volume': volume})
+
+        self.prev = {'high': high, 'low': low, 'close': close, 'tp': tp}
+        self.bars += 1
+        self.last_timestamp = timestamp
+        self.last_row = row
+        return row
+
+    def update_from_dataframe(self, df):
+        """Nimmt alle Kerzen eines OHLCV-DataFrames auf, die neuer als der aktuelle Stand sind. Returns: Anzahl."""
+        count = 0
+        for ts, candle in zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False, name=None)):
+            ts_ms = to_ms(ts)
+            if self.last_timestamp is not None and ts_ms <= self.last_timestamp:
+                continue
+            self.update(ts_ms, *candle)
+            count += 1
+        return count
+
+    @classmethod
+    def from_dataframe(cls, df, symbol=None, timeframe=None):
+        """Baut den Zustand aus historischen Kerzen auf (einmalige Anlaufphase)."""
+        state = cls(symbol, timeframe)
+        state.update_from_dataframe(df)
+        return state
+
+    def latest_features(self, columns):
+        """Feature-Zeile der zuletzt aufgenommenen Kerze als einzeiliger DataFrame (z.B. für den Scaler)."""
+        if self.last_row is None:
+            return pd.DataFrame(columns=columns)
+        index = pd.DatetimeIndex([pd.Timestamp(self.last_timestamp, unit='ms', tz='UTC')])
+        return pd.DataFrame([[self.last_row[c] for c in columns]], index=index, columns=columns)
+
+    # --- Checkpoint ---
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION, 'symbol': self.symbol, 'timeframe': self.timeframe,
+            'bars': self.bars, 'last_timestamp': self.last_timestamp, 'last_row': self.last_row, 'prev': self.prev,
+            'buffers': {name: list(values) for name, values in self.buffers.items()},
+            'emas': self.emas, 'obv': self.obv, 'atr': self.atr, 'adx': self.adx, 'supertrend': self.supertrend.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f"Unbekannte Version des Feature-Zustands: {data.get('version')}")
+        state = cls(data['symbol'], data['timeframe'])
+        state.bars, state.last_timestamp = data['bars'], data['last_timestamp']
+        state.last_row, state.prev = data['last_row'], data['prev']
+        for name, values in data['buffers'].items():
+            state.buffers[name].extend(values)
+        state.emas, state.obv = data['emas'], data['obv']
+        state.atr, state.adx = data['atr'], data['adx']
+        state.supertrend = SuperTrendState.from_dict(data['supertrend'])
+        return state
+
+    def save(self, path):
+        """Schreibt den Zustand atomar (temporäre Datei + os.replace)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+def get_feature_state_path(strategy_id):
+    return os.path.join(FEATURE_STATE_DIR, f"{strategy_id}.json")
+
+
+# Zuletzt geladene/gespeicherte Zustände des Prozesses (strategy_id -> StreamingFeatureState)
+_LOADED_STATES = {}
+
+
+def load_feature_state(strategy_id):
+    """Lädt den Zustand einer Strategie (aus dem Speicher oder der Datei); None, wenn keiner existiert oder er unlesbar ist."""
+    if strategy_id in _LOADED_STATES:
+        return _LOADED_STATES[strategy_id]
+    path = get_feature_state_path(strategy_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        state = StreamingFeatureState.load(path)
+    except (ValueError, KeyError, json.JSONDecodeError) as e:
+        logger.warning(f"Feature-Zustand {path} unbrauchbar ({e}), wird neu aufgebaut.")
+        return None
+    _LOADED_STATES[strategy_id] = state
+    return state
+
+
+def save_feature_state(strategy_id, state):
+    state.save(get_feature_state_path(strategy_id))
+    _LOADED_STATES[strategy_id] = state
+
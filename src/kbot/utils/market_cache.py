@@ -0,0 +1,120 @@
+# src/kbot/utils/market_cache.py
+"""
+Persistenter Cache der Bitget-Swap-Markt-Metadaten.
+
+load_markets lädt bei jedem Aufruf die komplette Marktliste (plus Währungen) von der Börse. Der Cache
+hält das Ergebnis im Prozess und unter artifacts/db/markets_bitget_swap.json; jeder neue Client
+bekommt die Märkte per set_markets, ohne REST-Aufruf. Nach Ablauf der TTL wird neu geladen; ist die
+Börse dann nicht erreichbar, bleibt der alte Stand gültig.
+
+Im Lazy-Modus (symbols=[...]) erhält der Client nur die tatsächlich genutzten Märkte. Fehlt ein Symbol
+im Cache (z.B. neu gelistet), wird neu geladen (höchstens alle MIN_REFRESH_SECONDS).
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+MARKET_CACHE_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'markets_bitget_swap.json')
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+MIN_REFRESH_SECONDS = 10 * 60  # unbekannte Symbole lösen höchstens so oft ein Neuladen aus
+
+
+class MarketCache:
+    def __init__(self, path=MARKET_CACHE_FILE, ttl=DEFAULT_TTL_SECONDS, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, data):
+        return data is not None and self.clock() - data['fetched_at'] < self.ttl
+
+    def _read_disk(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if {'fetched_at', 'markets', 'currencies'} <= set(data) else None
+        except (ValueError, OSError) as e:
+            logger.warning(f"Markt-Cache {self.path} unlesbar ({e}), lade neu.")
+            return None
+
+    def _write_disk(self, data):
+        """
+        Schreibt atomar (temporäre Datei + os.replace). Die temporäre Datei ist pro Prozess eindeutig,
+        da Live-Engine, Prefetch und Backtester den Cache gleichzeitig erneuern können.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp_{os.getpid()}_{time.monotonic_ns()}"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, client, refresh=False):
+        """
+        Markt-Metadaten aus Speicher, Datei oder (abgelaufen/refresh) über client.load_markets.
+        Returns: dict mit 'fetched_at', 'markets', 'currencies'.
+        """
+        with self._lock:
+            if not refresh and self._is_fresh(self._data):
+                return self._data
+            stale = self._data
+            if not refresh:
+                disk = self._read_disk()
+                if self._is_fresh(disk):
+                    self._data = disk
+                    return disk
+                stale = stale or disk
+            try:
+                client.load_markets(reload=True)
+            except Exception as e:
+                if stale is None:
+                    raise
+                logger.warning(f"Märkte konnten nicht geladen werden ({e}), nutze Cache-Stand vom "
+                               f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(stale['fetched_at']))} UTC.")
+                self._data = stale
+                return stale
+            data = {'fetched_at': self.clock(), 'markets': client.markets, 'currencies': client.currencies}
+            self._write_disk(data)
+            self._data = data
+            return data
+
+    def apply(self, client, symbols=None):
+        """
+        Setzt die Märkte auf dem Client (bei einem Cache-Treffer ohne REST-Aufruf).
+        symbols: nur diese Märkte übernehmen (Lazy-Modus). Returns: client.markets.
+        """
+        data = self.get(client)
+        markets = data['markets']
+        if symbols is not None:
+            missing = [symbol for symbol in symbols if symbol not in markets]
+            if missing and self.clock() - data['fetched_at'] >= MIN_REFRESH_SECONDS:
+                logger.info(f"Unbekannte Märkte {missing}, lade Marktliste neu.")
+                data = self.get(client, refresh=True)
+                markets = data['markets']
+            markets = {symbol: markets[symbol] for symbol in symbols if symbol in markets}
+        client.set_markets(markets, data['currencies'])
+        return client.markets
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_market_cache():
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = MarketCache()
+        return _DEFAULT_CACHE
@@ -0,0 +1,168 @@
+# src/kbot/utils/ohlcv_sync.py
+"""
+Inkrementeller Abgleich des OHLCV-Speichers mit der Börse.
+
+Statt bei jeder Bereichserweiterung den kompletten Zeitraum neu zu laden, werden nur
+- fehlende Abschnitte vor/nach den bereits abgedeckten Zeiträumen und
+- Lücken innerhalb der gespeicherten Kerzen
+seitenweise nachgeladen und in einem einzigen, atomaren Schritt in den Speicher übernommen.
+
+Als 'client' dient ein ccxt-kompatibles Objekt mit fetch_ohlcv(symbol, timeframe, since, limit).
+"""
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+from kbot.utils.data_store import OHLCV_COLUMNS, to_ms, timeframe_to_ms
+
+# Bitget liefert für ältere Kerzen (History-Endpunkt) höchstens 200 Kerzen pro Anfrage und richtet
+# das Fenster am Ende aus. Mit limit=1000 fehlen daher pro Seite 800 Kerzen - 200 ist lückenlos.
+PAGE_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+
+def subtract_ranges(start_ms, end_ms, ranges):
+    """Teile von [start_ms, end_ms], die von keinem der Zeiträume abgedeckt sind."""
+    missing = []
+    cursor = start_ms
+    for r_start, r_end in sorted(ranges):
+        if r_end < cursor:
+            continue
+        if r_start > end_ms:
+            break
+        if r_start > cursor:
+            missing.append([cursor, r_start - 1])
+        cursor = max(cursor, r_end + 1)
+        if cursor > end_ms:
+            break
+    if cursor <= end_ms:
+        missing.append([cursor, end_ms])
+    return missing
+
+
+def find_interior_gaps(timestamps, start_ms, end_ms, timeframe_ms):
+    """Lücken [start, end] zwischen aufeinanderfolgenden gespeicherten Kerzen innerhalb von [start_ms, end_ms]."""
+    if timestamps is None or len(timestamps) < 2:
+        return []
+    lo = int(np.searchsorted(timestamps, start_ms, side='left'))
+    hi = int(np.searchsorted(timestamps, end_ms, side='right'))
+    window = np.asarray(timestamps[lo:hi])
+    if len(window) < 2:
+        return []
+    positions = np.flatnonzero(np.diff(window) > timeframe_ms)
+    return [[int(window[i]) + timeframe_ms, int(window[i + 1]) - timeframe_ms] for i in positions]
+
+
+def plan_sync(store, symbol, timeframe, start, end, now_ms=None):
+    """
+    Ermittelt die nachzuladenden Abschnitte, ohne die Börse zu kontaktieren.
+
+    Returns:
+        Liste von (start_ms, end_ms, is_gap); is_gap kennzeichnet Lücken innerhalb der gespeicherten Kerzen.
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    start_ms, end_ms = to_ms(start), min(to_ms(end), now_ms)
+    if start_ms > end_ms:
+        return []
+
+    segments = [(s, e, False) for s, e in subtract_ranges(start_ms, end_ms, store.covered_ranges(symbol, timeframe))]
+
+    # Monatskerzen haben keinen festen Abstand, dort wird nicht nach Lücken gesucht
+    if not timeframe.endswith('M'):
+        arrays = store.load_arrays(symbol, timeframe)
+        confirmed = store.confirmed_gaps(symbol, timeframe)
+        for gap_start, gap_end in find_interior_gaps(arrays['timestamp'] if arrays else None, start_ms, end_ms, timeframe_to_ms(timeframe)):
+            if any(c_start <= gap_start and c_end >= gap_end for c_start, c_end in confirmed):
+                continue
+            if any(s <= gap_start and e >= gap_end for s, e, _ in segments):
+                continue
+            segments.append((gap_start, gap_end, True))
+    return sorted(segments)
+
+
+def fetch_segment(client, symbol, timeframe, start_ms, end_ms, page_limit=PAGE_LIMIT):
+    """Lädt alle Kerzen in [start_ms, end_ms] seitenweise. Returns (kerzen, anzahl_seiten)."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    rows, pages = [], 0
+    since = start_ms
+    while since <= end_ms:
+        page = client.fetch_ohlcv(symbol, timeframe, since=since, limit=page_limit)
+        pages += 1
+        if not page:
+            break
+        rows.extend(candle for candle in page if start_ms <= candle[0] <= end_ms)
+        last_ts = page[-1][0]
+        if last_ts >= end_ms or last_ts < since:
+            break
+        since = last_ts + timeframe_ms
+    return rows, pages
+
+
+def page_windows(start_ms, end_ms, timeframe, page_limit=PAGE_LIMIT):
+    """Zerlegt [start_ms, end_ms] in unabhängige Seitenfenster, die parallel geladen werden können."""
+    step = page_limit * timeframe_to_ms(timeframe)
+    return [(since, min(since + step - 1, end_ms)) for since in range(start_ms, end_ms + 1, step)]
+
+
+def commit_segments(store, symbol, timeframe, fetched, now_ms=None):
+    """
+    Übernimmt geladene Abschnitte in einem einzigen, atomaren Schritt in den Speicher.
+
+    Args:
+        fetched: Liste von (start_ms, end_ms, is_gap, kerzen)
+    Returns:
+        Anzahl übernommener Kerzen.
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    timeframe_ms = timeframe_to_ms(timeframe)
+    all_rows, covered, confirmed_gaps = [], [], []
+    for seg_start, seg_end, is_gap, rows in fetched:
+        all_rows.extend(rows)
+        if is_gap:
+            if not rows:
+                # Die Börse hat für diesen Zeitraum keine Kerzen -> nicht erneut anfragen
+                confirmed_gaps.append((seg_start, seg_end))
+            continue
+        # Nur abgeschlossene Kerzen gelten als abgedeckt; die laufende Kerze wird beim nächsten Mal erneut geladen
+        covered_end = min(seg_end, now_ms - timeframe_ms)
+        if covered_end >= seg_start:
+            covered.append((seg_start, covered_end))
+
+    if not all_rows and not covered and not confirmed_gaps:
+        return 0
+
+    df = None
+    if all_rows:
+        df = pd.DataFrame(all_rows, columns=['timestamp'] + OHLCV_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+        df.set_index('timestamp', inplace=True)
+
+    store.merge(symbol, timeframe, df, covered_ranges=covered, confirmed_gaps=confirmed_gaps)
+    return int(df.index.nunique()) if df is not None else 0
+
+
+def sync_ohlcv(store, client, symbol, timeframe, start, end, page_limit=PAGE_LIMIT, now_ms=None):
+    """
+    Bringt den Speicher für [start, end] auf den aktuellen Stand und lädt dabei nur fehlende Abschnitte.
+
+    Returns:
+        dict mit 'segments', 'pages' und 'candles' (Anzahl nachgeladener Kerzen).
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    segments = plan_sync(store, symbol, timeframe, start, end, now_ms=now_ms)
+    stats = {'segments': len(segments), 'pages': 0, 'candles': 0}
+    if not segments:
+        return stats
+
+    fetched = []
+    for seg_start, seg_end, is_gap in segments:
+        rows, pages = fetch_segment(client, symbol, timeframe, seg_start, seg_end, page_limit)
+        stats['pages'] += pages
+        fetched.append((seg_start, seg_end, is_gap, rows))
+
+    stats['candles'] = commit_segments(store, symbol, timeframe, fetched, now_ms=now_ms)
+    logger.info(f"OHLCV-Sync {symbol} ({timeframe}): {stats['segments']} Abschnitte, {stats['pages']} Seiten, {stats['candles']} Kerzen")
+    return stats
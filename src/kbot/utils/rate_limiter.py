@@ -0,0 +1,47 @@
+# src/kbot/utils/rate_limiter.py
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket: erlaubt im Mittel 'rate' Anfragen pro Sekunde
+    mit Bursts bis 'capacity'. Wird von mehreren Börsen-Clients gemeinsam genutzt.
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate muss größer als 0 sein")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1.0):
+        """Blockiert, bis 'tokens' verfügbar sind."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedClient:
+    """Leitet fetch_ohlcv an einen ccxt-Client weiter und holt vorher ein Token aus dem gemeinsamen Bucket."""
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None, params=None):
+        self.bucket.acquire()
+        if params:
+            return self.client.fetch_ohlcv(symbol, timeframe, since=since, limit=limit, params=params)
+        return self.client.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
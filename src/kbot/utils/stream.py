@@ -0,0 +1,379 @@
+# src/kbot/utils/stream.py
+"""
+Optionales WebSocket-Streaming-Backend (ccxt.pro) hinter der Exchange-Schnittstelle.
+
+Ein Hintergrund-Thread abonniert watch_ohlcv für jede (Symbol, Timeframe)-Kombination sowie – mit
+API-Schlüsseln – watch_positions und watch_balance. Die Daten landen in einem StreamState
+(Kerzen-Ringpuffer, Positionen, Kontostand); StreamingExchange beantwortet fetch_recent_ohlcv,
+fetch_ticker, fetch_open_positions und fetch_balance_usdt daraus ohne Netzwerkaufruf.
+
+Ist der Stream (noch) nicht verfügbar, veraltet oder lückenhaft, wird wie bisher per REST abgefragt.
+Nach eigenen Orders gelten Positionen und Kontostand so lange als ungültig, bis ein neuer Snapshot
+über den Stream eintrifft.
+"""
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+import ccxt.pro
+import pandas as pd
+from ccxt.async_support.base.ws.aiohttp_client import AiohttpClient
+
+from kbot.utils.data_store import timeframe_to_ms
+from kbot.utils.exchange import Exchange
+
+logger = logging.getLogger(__name__)
+
+RING_BUFFER_CANDLES = 1000  # entspricht FEATURE_BOOTSTRAP_CANDLES im trade_manager
+STREAM_STALE_SECONDS = 60  # ohne Kerzen-Update gilt ein Kanal als veraltet
+TICKER_MAX_AGE_SECONDS = 5
+RECONNECT_DELAY_SECONDS = 5
+STARTUP_TIMEOUT_SECONDS = 15
+# Bitget-WebSocket-Intervalle (weichen von den REST-Timeframes ab; 2h und 1M gibt es nicht als Kanal)
+WS_INTERVALS = {'1m': '1m', '5m': '5m', '15m': '15m', '30m': '30m', '1h': '1H', '4h': '4H',
+                '6h': '6H', '12h': '12H', '1d': '1D', '1w': '1W'}
+
+
+class _BitgetStream(ccxt.pro.bitget):
+    """
+    Bitget schickt im positions-Kanal immer den vollständigen Snapshot. ccxt verwirft einen leeren
+    Snapshot (alle Positionen geschlossen); hier wird er als leere Liste weitergereicht.
+    """
+
+    def client(self, url):
+        client = super().client(url)
+        # Der FastClient von ccxt 4.3 patcht aiohttp-Interna (parse_frame), die neuere aiohttp-Versionen
+        # nicht mehr haben; der einfache aiohttp-Client reicht für die wenigen Kanäle aus.
+        if type(client) is not AiohttpClient:
+            client.__class__ = AiohttpClient
+        return client
+
+    def handle_positions(self, client, message):
+        if not message.get('data'):
+            inst_type = message.get('arg', {}).get('instType', '')
+            client.resolve([], inst_type + ':positions')
+            return
+        super().handle_positions(client, message)
+
+
+class StreamState:
+    """Threadsicherer Zustand aus dem Stream: Kerzen-Ringpuffer, Positionen, Kontostand."""
+
+    def __init__(self, ring_size=RING_BUFFER_CANDLES, clock=time.monotonic):
+        self.ring_size = ring_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._candles = {}  # (symbol, timeframe) -> deque [ts, o, h, l, c, v]
+        self._candles_updated = {}
+        self._needs_seed = set()  # Puffer ohne (lückenlose) Historie -> einmal per REST auffüllen
+        self._last_price = {}  # symbol -> (Preis, Zeitstempel der Kerze, Empfangszeit)
+        self._positions = None
+        self._positions_updated = None
+        self._balance = None
+        self._balance_updated = None
+        self._account_invalidated = None
+
+    # --- Kerzen ---
+    def register(self, symbol, timeframe):
+        with self._lock:
+            self._candles.setdefault((symbol, timeframe), deque(maxlen=self.ring_size))
+            self._needs_seed.add((symbol, timeframe))
+
+    def is_subscribed(self, symbol, timeframe):
+        return (symbol, timeframe) in self._candles
+
+    def has_candles(self, symbol, timeframe):
+        return (symbol, timeframe) in self._candles_updated
+
+    def update_candles(self, symbol, timeframe, rows):
+        """Nimmt Kerzen aus dem Stream auf (laufende Kerze wird überschrieben, Lücken markiert)."""
+        key = (symbol, timeframe)
+        timeframe_ms = timeframe_to_ms(timeframe)
+        with self._lock:
+            buffer = self._candles.get(key)
+            if buffer is None or not rows:
+                return
+            for row in rows:
+                row = [int(row[0])] + [float(value) for value in row[1:6]]
+                if not buffer or row[0] > buffer[-1][0]:
+                    if buffer and row[0] - buffer[-1][0] > timeframe_ms:
+                        self._needs_seed.add(key)
+                    buffer.append(row)
+                elif row[0] == buffer[-1][0]:
+                    buffer[-1] = row
+                else:
+                    for i in range(len(buffer) - 1, -1, -1):
+                        if buffer[i][0] == row[0]:
+                            buffer[i] = row
+                            break
+            now = self.clock()
+            self._candles_updated[key] = now
+            last = buffer[-1]
+            if last[0] >= self._last_price.get(symbol, (None, -1, None))[1]:
+                self._last_price[symbol] = (last[4], last[0], now)
+
+    def seed(self, symbol, timeframe, df):
+        """Füllt den Puffer mit REST-Historie; vorhandene Stream-Kerzen haben Vorrang."""
+        key = (symbol, timeframe)
+        rows = [[int(ts.value // 1_000_000)] + [float(v) for v in values]
+                for ts, values in zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].to_numpy())]
+        with self._lock:
+            buffer = self._candles.get(key)
+            if buffer is None:
+                return
+            merged = {row[0]: row for row in rows}
+            merged.update({row[0]: row for row in buffer})
+            buffer.clear()
+            buffer.extend(merged[ts] for ts in sorted(merged)[-self.ring_size:])
+            self._needs_seed.discard(key)
+
+    def mark_gap(self, symbol, timeframe):
+        """Nach einem Verbindungsabbruch fehlen eventuell Kerzen."""
+        with self._lock:
+            self._needs_seed.add((symbol, timeframe))
+            self._candles_updated.pop((symbol, timeframe), None)
+
+    def ohlcv(self, symbol, timeframe, limit):
+        """Letzte limit Kerzen wie Exchange.fetch_recent_ohlcv, oder None (-> REST)."""
+        key = (symbol, timeframe)
+        with self._lock:
+            buffer = self._candles.get(key)
+            updated = self._candles_updated.get(key)
+            if buffer is None or key in self._needs_seed or updated is None:
+                return None
+            # Nach dem Auffüllen enthält der Puffer die gesamte verfügbare Historie (bis ring_size)
+            if self.clock() - updated > STREAM_STALE_SECONDS or limit > self.ring_size:
+                return None
+            rows = list(buffer)[-limit:]
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+        return df.set_index('timestamp')
+
+    def ticker(self, symbol):
+        """Letzter Preis aus dem Kerzen-Stream (nur ticker['last'] wird im Zyklus genutzt)."""
+        with self._lock:
+            price = self._last_price.get(symbol)
+        if price is None or self.clock() - price[2] > TICKER_MAX_AGE_SECONDS:
+            return None
+        return {'symbol': symbol, 'last': price[0], 'close': price[0], 'timestamp': price[1]}
+
+    # --- Konto ---
+    def _account_valid(self, updated):
+        return updated is not None and (self._account_invalidated is None or updated > self._account_invalidated)
+
+    def set_positions(self, positions):
+        """positions: vollständiger Snapshot (ccxt-Positionen)."""
+        open_positions = {}
+        for position in positions:
+            if (position.get('contracts') or 0.0) > 0.0:
+                open_positions.setdefault(position['symbol'], []).append(position)
+        with self._lock:
+            self._positions = open_positions
+            self._positions_updated = self.clock()
+
+    def positions(self, symbol):
+        with self._lock:
+            if not self._account_valid(self._positions_updated):
+                return None
+            return list(self._positions.get(symbol, []))
+
+    def set_balance(self, free_usdt):
+        with self._lock:
+            self._balance = free_usdt
+            self._balance_updated = self.clock()
+
+    def balance(self):
+        with self._lock:
+            return self._balance if self._account_valid(self._balance_updated) else None
+
+    def invalidate_account(self):
+        """Nach eigenen Orders oder Verbindungsabbrüchen: bis zum nächsten Snapshot per REST lesen."""
+        with self._lock:
+            self._account_invalidated = self.clock()
+
+
+class MarketStream:
+    """Betreibt die ccxt.pro-Abonnements in einem eigenen Event-Loop (Hintergrund-Thread)."""
+
+    def __init__(self, account_config, subscriptions, state, markets, currencies=None, ws_urls=None):
+        self.account = account_config
+        self.state = state
+        self.markets = markets
+        self.currencies = currencies
+        self.ws_urls = ws_urls
+        self.client = None
+        self.subscriptions = []
+        for symbol, timeframe in subscriptions:
+            if timeframe not in WS_INTERVALS:
+                logger.warning(f"Kein WebSocket-Kanal für {timeframe}, {symbol} ({timeframe}) bleibt bei REST.")
+                continue
+            if (symbol, timeframe) not in self.subscriptions:
+                self.subscriptions.append((symbol, timeframe))
+                state.register(symbol, timeframe)
+        self.private = all(account_config.get(key) for key in ('apiKey', 'secret', 'password'))
+        self._loop = None
+        self._thread = None
+        self._main_task = None
+        self._started = threading.Event()
+
+    def _create_client(self):
+        client = _BitgetStream({
+            'apiKey': self.account.get('apiKey'),
+            'secret': self.account.get('secret'),
+            'password': self.account.get('password'),
+            'options': {'defaultType': 'swap'},
+        })
+        if self.ws_urls:
+            client.urls['api']['ws'] = dict(self.ws_urls)
+        client.set_markets(self.markets, self.currencies)
+        return client
+
+    async def _watch_candles(self, symbol, timeframe):
+        while True:
+            try:
+                candles = await self.client.watch_ohlcv(symbol, timeframe)
+                self.state.update_candles(symbol, timeframe, candles)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Kerzen-Stream {symbol} ({timeframe}) unterbrochen: {e}")
+                self.state.mark_gap(symbol, timeframe)
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _watch_positions(self):
+        while True:
+            try:
+                self.state.set_positions(await self.client.watch_positions())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Positions-Stream unterbrochen: {e}")
+                self.state.invalidate_account()
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _watch_balance(self):
+        while True:
+            try:
+                balance = await self.client.watch_balance()
+                free = balance.get('USDT', {}).get('free')
+                if free is not None:
+                    self.state.set_balance(float(free))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Kontostand-Stream unterbrochen: {e}")
+                self.state.invalidate_account()
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _main(self):
+        self.client = self._create_client()
+        watchers = [self._watch_candles(symbol, timeframe) for symbol, timeframe in self.subscriptions]
+        if self.private:
+            watchers += [self._watch_positions(), self._watch_balance()]
+        self._main_task = asyncio.current_task()
+        self._started.set()
+        try:
+            await asyncio.gather(*watchers)
+        finally:
+            await self.client.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self, timeout=STARTUP_TIMEOUT_SECONDS):
+        """Startet den Stream und wartet (höchstens timeout) auf die ersten Kerzen aller Abonnements."""
+        self._thread = threading.Thread(target=self._run, name='kbot-market-stream', daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=timeout)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self.state.has_candles(symbol, timeframe) for symbol, timeframe in self.subscriptions):
+                return True
+            time.sleep(0.05)
+        logger.warning("Stream liefert noch nicht für alle Märkte Daten, diese werden vorerst per REST gelesen.")
+        return False
+
+    def stop(self):
+        if self._main_task is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._main_task.cancel)
+            self._thread.join(timeout=10)
+
+
+class StreamingExchange(Exchange):
+    """
+    Exchange mit Streaming-Backend: Lesezugriffe des Handelszyklus kommen aus dem StreamState,
+    Orders und alles Übrige laufen unverändert per REST.
+    """
+
+    def __init__(self, account_config, subscriptions, ws_urls=None, ring_size=RING_BUFFER_CANDLES):
+        """subscriptions: Liste von (symbol, timeframe); ws_urls: {'public': ..., 'private': ...} (z.B. Stand-in)."""
+        subscriptions = list(subscriptions)
+        super().__init__(account_config, symbols=sorted({symbol for symbol, _ in subscriptions}))
+        self.state = StreamState(ring_size)
+        self.stream = MarketStream(account_config, subscriptions, self.state, self.markets or {},
+                                   self.exchange.currencies, ws_urls)
+
+    def start(self, timeout=STARTUP_TIMEOUT_SECONDS):
+        return self.stream.start(timeout)
+
+    def stop(self):
+        self.stream.stop()
+
+    def fetch_recent_ohlcv(self, symbol, timeframe, limit=100):
+        df = self.state.ohlcv(symbol, timeframe, limit)
+        if df is not None:
+            return df
+        if not self.state.is_subscribed(symbol, timeframe) or limit > self.state.ring_size:
+            return super().fetch_recent_ohlcv(symbol, timeframe, limit)
+        # Puffer einmalig (bzw. nach einer Lücke) per REST auffüllen
+        df = super().fetch_recent_ohlcv(symbol, timeframe, limit=self.state.ring_size)
+        if df.empty:
+            return df
+        self.state.seed(symbol, timeframe, df)
+        merged = self.state.ohlcv(symbol, timeframe, limit)
+        return merged if merged is not None else df.iloc[-limit:]
+
+    def fetch_ticker(self, symbol):
+        return self.state.ticker(symbol) or super().fetch_ticker(symbol)
+
+    def fetch_open_positions(self, symbol):
+        positions = self.state.positions(symbol)
+        return positions if positions is not None else super().fetch_open_positions(symbol)
+
+    def fetch_balance_usdt(self, raise_errors=False):
+        balance = self.state.balance()
+        return balance if balance is not None else super().fetch_balance_usdt(raise_errors=raise_errors)
+
+    # Orders verändern Positionen und Kontostand: bis zum nächsten Stream-Snapshot per REST lesen
+    def create_market_order(self, symbol, side, amount, params={}):
+        try:
+            return super().create_market_order(symbol, side, amount, params)
+        finally:
+            self.state.invalidate_account()
+
+    def place_trigger_market_order(self, symbol, side, amount, trigger_price, params={}):
+        try:
+            return super().place_trigger_market_order(symbol, side, amount, trigger_price, params)
+        finally:
+            self.state.invalidate_account()
+
+    def place_trailing_stop_order(self, symbol, side, amount, activation_price, callback_rate_decimal, params={}):
+        try:
+            return super().place_trailing_stop_order(symbol, side, amount, activation_price, callback_rate_decimal, params)
+        finally:
+            self.state.invalidate_account()
+
+    def cleanup_all_open_orders(self, symbol):
+        try:
+            return super().cleanup_all_open_orders(symbol)
+        finally:
+            self.state.invalidate_account()
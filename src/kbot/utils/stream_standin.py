@@ -0,0 +1,230 @@
+# src/kbot/utils/stream_standin.py
+"""
+Lokaler WebSocket-Stand-in für die Bitget-v2-Streams (Offline-Tests des Streaming-Backends).
+
+Der Server spricht das Protokoll, das ccxt.pro (bitget) erwartet: 'ping'/'pong', login, subscribe.
+Kerzen-Kanäle erhalten zuerst einen Snapshot der aufgezeichneten Historie, danach werden die
+restlichen Kerzen einzeln im Abstand interval_seconds als Update abgespielt. Die privaten Kanäle
+(positions, account) liefern den aktuellen Stand; push_positions/push_balance senden neue Snapshots.
+
+Nutzung:
+    with StandinServer({('BTC/USDT:USDT', '1m'): df}) as server:
+        StreamingExchange(account, [('BTC/USDT:USDT', '1m')], ws_urls=server.urls)
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from aiohttp import web, WSMsgType
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.data_store import get_data_store
+from kbot.utils.stream import WS_INTERVALS
+
+INST_TYPE = 'USDT-FUTURES'
+DEFAULT_SNAPSHOT_CANDLES = 200
+
+
+def market_id(symbol):
+    """'BTC/USDT:USDT' -> 'BTCUSDT' (Bitget-instId der USDT-Futures)."""
+    return symbol.split(':')[0].replace('/', '')
+
+
+def raw_candle(timestamp, row):
+    """Kerze im Bitget-Format: [ts, open, high, low, close, baseVol, quoteVol, usdtVol] als Strings."""
+    quote_volume = row['volume'] * row['close']
+    return [str(int(timestamp.value // 1_000_000)), str(row['open']), str(row['high']), str(row['low']),
+            str(row['close']), str(row['volume']), str(quote_volume), str(quote_volume)]
+
+
+def raw_position(symbol, side, contracts, entry_price, leverage=10):
+    """Position im Format des Bitget-positions-Kanals."""
+    return {'posId': f"{market_id(symbol)}-{side}", 'instId': market_id(symbol), 'marginCoin': 'USDT',
+            'marginMode': 'isolated', 'holdSide': side, 'posMode': 'one_way_mode', 'total': str(contracts),
+            'available': str(contracts), 'frozen': '0', 'openPriceAvg': str(entry_price), 'leverage': leverage,
+            'marginSize': str(contracts * entry_price / leverage), 'unrealizedPL': '0', 'achievedProfits': '0'}
+
+
+class StandinServer:
+    def __init__(self, candles, snapshot_candles=DEFAULT_SNAPSHOT_CANDLES, interval_seconds=0.05,
+                 positions=None, balance=1000.0, host='127.0.0.1', port=0):
+        """
+        candles: {(symbol, timeframe): DataFrame mit open/high/low/close/volume, Index = Kerzen-Öffnungszeit}
+        snapshot_candles: so viele Kerzen gehen im Snapshot nach dem subscribe raus, der Rest wird abgespielt
+        positions: Liste roher Positionen (siehe raw_position); balance: verfügbare USDT
+        """
+        self.channels = {}
+        for (symbol, timeframe), df in candles.items():
+            rows = [raw_candle(timestamp, row) for timestamp, row in df.iterrows()]
+            self.channels[(market_id(symbol), 'candle' + WS_INTERVALS[timeframe])] = rows
+        self.snapshot_candles = snapshot_candles
+        self.interval_seconds = interval_seconds
+        self.positions = list(positions or [])
+        self.balance = balance
+        self.host = host
+        self.port = port
+        self.logins = 0
+        self.subscriptions = []
+        self._private_clients = {}  # ws -> abonnierte private Kanäle
+        self._tasks = set()
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._ready = threading.Event()
+
+    @property
+    def urls(self):
+        return {'public': f"ws://{self.host}:{self.port}/v2/ws/public",
+                'private': f"ws://{self.host}:{self.port}/v2/ws/private"}
+
+    # ------------------------------------------------------------------ #
+    # Protokoll
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _message(action, arg, data):
+        return json.dumps({'action': action, 'arg': arg, 'data': data,
+                           'ts': int(time.time() * 1000)})
+
+    def _account_data(self):
+        balance = str(self.balance)
+        return [{'marginCoin': 'USDT', 'available': balance, 'maxTransferOut': balance, 'frozen': '0',
+                 'equity': balance, 'usdtEquity': balance}]
+
+    async def _replay(self, ws, arg, rows):
+        snapshot, updates = rows[:self.snapshot_candles], rows[self.snapshot_candles:]
+        await ws.send_str(self._message('snapshot', arg, snapshot))
+        for row in updates:
+            await asyncio.sleep(self.interval_seconds)
+            if ws.closed:
+                return
+            await ws.send_str(self._message('update', arg, [row]))
+
+    async def _send_private(self, ws, channel):
+        arg = {'instType': INST_TYPE, 'channel': channel,
+               **({'instId': 'default'} if channel == 'positions' else {'coin': 'default'})}
+        data = self.positions if channel == 'positions' else self._account_data()
+        await ws.send_str(self._message('snapshot', arg, data))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        private = request.path.endswith('/private')
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            if message.data == 'ping':
+                await ws.send_str('pong')
+                continue
+            request_data = json.loads(message.data)
+            if request_data.get('op') == 'login':
+                self.logins += 1
+                await ws.send_str(json.dumps({'event': 'login', 'code': 0}))
+                continue
+            if request_data.get('op') != 'subscribe':
+                continue
+            for arg in request_data.get('args', []):
+                self.subscriptions.append(arg)
+                await ws.send_str(json.dumps({'event': 'subscribe', 'arg': arg}))
+                channel = arg.get('channel')
+                if private:
+                    self._private_clients.setdefault(ws, set()).add(channel)
+                    await self._send_private(ws, channel)
+                else:
+                    rows = self.channels.get((arg.get('instId'), channel))
+                    if rows is None:
+                        await ws.send_str(json.dumps({'event': 'error', 'code': 30001, 'msg': f"{arg} doesn't exist"}))
+                    else:
+                        self._spawn(self._replay(ws, arg, rows))
+        self._private_clients.pop(ws, None)
+        return ws
+
+    async def _broadcast(self, channel):
+        for ws, channels in list(self._private_clients.items()):
+            if channel in channels and not ws.closed:
+                await self._send_private(ws, channel)
+
+    def push_positions(self, positions):
+        """Neuer Positions-Snapshot an alle Abonnenten (threadsicher)."""
+        self.positions = list(positions)
+        asyncio.run_coroutine_threadsafe(self._broadcast('positions'), self._loop).result(timeout=5)
+
+    def push_balance(self, balance):
+        self.balance = balance
+        asyncio.run_coroutine_threadsafe(self._broadcast('account'), self._loop).result(timeout=5)
+
+    # ------------------------------------------------------------------ #
+    # Lebenszyklus (eigener Event-Loop in einem Hintergrund-Thread)
+    # ------------------------------------------------------------------ #
+    async def _start_site(self):
+        app = web.Application()
+        app.router.add_get('/v2/ws/public', self._handle)
+        app.router.add_get('/v2/ws/private', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start_site())
+        self._ready.set()
+        self._loop.run_forever()
+        for task in list(self._tasks):
+            task.cancel()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name='kbot-stream-standin', daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=10):
+            raise RuntimeError("Stand-in-Server konnte nicht gestartet werden.")
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler Bitget-WebSocket-Stand-in (spielt gespeicherte Kerzen ab)")
+    parser.add_argument('--symbol', required=True, help="z.B. BTC/USDT:USDT")
+    parser.add_argument('--timeframe', required=True)
+    parser.add_argument('--start', help="Startdatum der Wiedergabe (YYYY-MM-DD)")
+    parser.add_argument('--interval', type=float, default=1.0, help="Sekunden zwischen zwei abgespielten Kerzen")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    df = get_data_store().read(args.symbol, args.timeframe, start=args.start)
+    if df is None or df.empty:
+        print(f"Keine gespeicherten Kerzen für {args.symbol} ({args.timeframe}) gefunden.")
+        return
+    server = StandinServer({(args.symbol, args.timeframe): df}, interval_seconds=args.interval, port=args.port).start()
+    print(f"Stand-in läuft: {server.urls['public']} ({len(df)} Kerzen). Beenden mit Strg+C.")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,132 @@
-# src/jaegerbot/utils/supertrend_indicator.py (FINALE KORREKTUR V6.1: Import 'ta')
+# src/kbot/utils/supertrend_indicator.py
+import math
+
 import pandas as pd
 import numpy as np
-import ta # NEU: Das fehlende Modul importieren
 
-# Implementierung der SuperTrend Logik aus ta-lib, da der Import fehlschlägt.
+from kbot.utils.feature_engine import shift, true_range, average_true_range
+
+# Bei jeder Änderung an der SuperTrend-Berechnung erhöhen: macht gecachte Backtest-/Portfolio-Arrays ungültig
+SUPERTREND_CODE_VERSION = 1
+
+# SuperTrend als Array-Kernel (Batch) und als Zustand mit update() (Streaming).
+# Die aktive Band-Seite wird explizit über die Richtung verfolgt statt über Float-Vergleiche
+# von SuperTrend-Wert und Band. ATR wie ta.volatility.average_true_range (0 in der Anlaufphase).
+
+
+def supertrend_arrays(high, low, close, window=10, multiplier=3.0):
+    """
+    Berechnet SuperTrend auf float64-Arrays.
+
+    Returns:
+        dict mit 'supertrend', 'direction' (1.0 = Up, -1.0 = Down), 'upper', 'lower', 'atr', 'true_range'
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    tr = true_range(high, low, shift(close, 1))
+    atr = average_true_range(tr, window)
+    hl2 = (high + low) / 2
+    basic_upper = (hl2 + multiplier * atr).tolist()
+    basic_lower = (hl2 - multiplier * atr).tolist()
+    closes = close.tolist()
+
+    final_upper, final_lower, direction = basic_upper[:1], basic_lower[:1], [-1.0] * min(n, 1)
+    if n:
+        add_upper, add_lower, add_direction = final_upper.append, final_lower.append, direction.append
+        # Erste Kerze: Standardmäßig Short-Trend am oberen Band
+        upper, lower, trend = basic_upper[0], basic_lower[0], -1.0
+        prev_close = closes[0]
+        for b_upper, b_lower, c in zip(basic_upper[1:], basic_lower[1:], closes[1:]):
+            if b_upper < upper or prev_close > upper:
+                upper = b_upper
+            if b_lower > lower or prev_close < lower:
+                lower = b_lower
+            if trend < 0:
+                if c > upper:
+                    trend = 1.0
+            elif c < lower:
+                trend = -1.0
+            add_upper(upper)
+            add_lower(lower)
+            add_direction(trend)
+            prev_close = c
+
+    final_upper = np.array(final_upper, dtype=np.float64)
+    final_lower = np.array(final_lower, dtype=np.float64)
+    direction = np.array(direction, dtype=np.float64)
+    return {'supertrend': np.where(direction < 0, final_upper, final_lower), 'direction': direction,
+            'upper': final_upper, 'lower': final_lower, 'atr': atr, 'true_range': tr}
+
+
+class SuperTrendState:
+    """Streaming-Zustand des SuperTrend: update() verarbeitet eine neue Kerze in O(1)."""
+
+    def __init__(self, window=10, multiplier=3.0):
+        self.window = window
+        self.multiplier = multiplier
+        self.bars = 0
+        self.tr_sum = 0.0  # Summe der True Ranges bis zur ersten ATR
+        self.atr = 0.0
+        self.close = math.nan
+        self.upper = math.nan
+        self.lower = math.nan
+        self.direction = math.nan
+
+    @property
+    def supertrend(self):
+        return self.upper if self.direction < 0 else self.lower
+
+    def update(self, high, low, close):
+        """Nimmt eine Kerze auf. Returns: (supertrend, direction)."""
+        high, low, close = float(high), float(low), float(close)
+        window, t = self.window, self.bars
+        tr = high - low if t == 0 else max(high - low, abs(high - self.close), abs(low - self.close))
+        if t < window - 1:
+            self.tr_sum += tr
+        elif t == window - 1:
+            self.tr_sum += tr
+            self.atr = self.tr_sum / window
+        else:
+            self.atr = (self.atr * (window - 1) + tr) / float(window)
+        atr = self.atr if t >= window - 1 else 0.0
+
+        hl2 = (high + low) / 2
+        basic_upper = hl2 + self.multiplier * atr
+        basic_lower = hl2 - self.multiplier * atr
+        if t == 0:
+            self.upper, self.lower, self.direction = basic_upper, basic_lower, -1.0
+        else:
+            if basic_upper < self.upper or self.close > self.upper:
+                self.upper = basic_upper
+            if basic_lower > self.lower or self.close < self.lower:
+                self.lower = basic_lower
+            if self.direction < 0:
+                self.direction = -1.0 if close <= self.upper else 1.0
+            else:
+                self.direction = 1.0 if close >= self.lower else -1.0
+        self.close = close
+        self.bars += 1
+        return self.supertrend, self.direction
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['window'], data['multiplier'])
+        state.__dict__.update(data)
+        return state
+
 
 class SuperTrendLocal:
     """
     SuperTrend Indicator implementation.
     Reference: https://www.tradingview.com/script/hlfVjS8F-SuperTrend/
+
+    Nach der Batch-Berechnung können mit update(high, low, close) weitere Kerzen
+    verarbeitet werden (die Series-Attribute werden dabei nicht verlängert).
     """
     def __init__(self, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10, multiplier: float = 3.0, fillna: bool = False):
         self._high = high
@@ -20,77 +138,32 @@ class SuperTrendLocal:
         self._run()
 
     def _run(self):
-        # KORRIGIERT: ta.volatility.average_true_range wird jetzt korrekt aufgerufen
-        # Muss als Series erstellt werden, um den Index zu behalten
-        atr_indicator = pd.Series(ta.volatility.average_true_range(self._high, self._low, self._close, window=self._window, fillna=self._fillna))
-
-        # Calculate HL2 (Midpoint)
-        hl2 = (self._high + self._low) / 2
-
-        # Calculate Basic Upper/Lower Bands
-        basic_upper_band = hl2 + self._multiplier * atr_indicator
-        basic_lower_band = hl2 - self._multiplier * atr_indicator
-
-        # Initialisiere Arrays (die Indizes müssen mit denen der Series übereinstimmen)
-        final_upper_band = np.zeros(len(self._close))
-        final_lower_band = np.zeros(len(self._close))
-        supertrend_series = np.zeros(len(self._close))
-        supertrend_direction = np.zeros(len(self._close)) # 1.0 = Up, -1.0 = Down
-
-        # Initialer Wert für die erste Kerze, wo ATR nicht NaN ist
-        first_valid_idx = atr_indicator.first_valid_index()
-        if first_valid_idx is None:
+        if len(self._close) == 0:
             # Kann passieren, wenn zu wenige Daten vorhanden sind
             self.supertrend = pd.Series(np.nan, index=self._close.index)
             self.supertrend_direction = pd.Series(np.nan, index=self._close.index)
+            self._state = SuperTrendState(self._window, self._multiplier)
             return
 
-        first_i = self._close.index.get_loc(first_valid_idx)
-        final_upper_band[first_i] = basic_upper_band.iloc[first_i]
-        final_lower_band[first_i] = basic_lower_band.iloc[first_i]
-        # Initialisiere Supertrend für den ersten validen Punkt
-        supertrend_series[first_i] = final_upper_band[first_i]
-        supertrend_direction[first_i] = -1.0 # Standardmäßig short
-
-        for i in range(first_i + 1, len(self._close)):
-            # Update Final Upper Band
-            if basic_upper_band.iloc[i] < final_upper_band[i-1] or self._close.iloc[i-1] > final_upper_band[i-1]:
-                final_upper_band[i] = basic_upper_band.iloc[i]
-            else:
-                final_upper_band[i] = final_upper_band[i-1]
+        result = supertrend_arrays(self._high, self._low, self._close, self._window, self._multiplier)
+        self.supertrend = pd.Series(result['supertrend'], index=self._close.index)
+        self.supertrend_direction = pd.Series(result['direction'], index=self._close.index)
 
-            # Update Final Lower Band
-            if basic_lower_band.iloc[i] > final_lower_band[i-1] or self._close.iloc[i-1] < final_lower_band[i-1]:
-                final_lower_band[i] = basic_lower_band.iloc[i]
-            else:
-                final_lower_band[i] = final_lower_band[i-1]
-
-            # Determine Supertrend Value and Direction
-            if supertrend_series[i-1] == final_upper_band[i-1]:
-                if self._close.iloc[i] <= final_upper_band[i]:
-                    supertrend_series[i] = final_upper_band[i]
-                    supertrend_direction[i] = -1.0 # Down
-                else:
-                    supertrend_series[i] = final_lower_band[i]
-                    supertrend_direction[i] = 1.0 # Up
-            elif supertrend_series[i-1] == final_lower_band[i-1]:
-                if self._close.iloc[i] >= final_lower_band[i]:
-                    supertrend_series[i] = final_lower_band[i]
-                    supertrend_direction[i] = 1.0 # Up
-                else:
-                    supertrend_series[i] = final_upper_band[i]
-                    supertrend_direction[i] = -1.0 # Down
-            
-            # Sollte aufgrund der Initialisierung selten passieren, ist aber eine Sicherung
-            elif self._close.iloc[i] > supertrend_series[i-1]:
-                 supertrend_series[i] = final_lower_band[i]
-                 supertrend_direction[i] = 1.0
-            else:
-                 supertrend_series[i] = final_upper_band[i]
-                 supertrend_direction[i] = -1.0
+        # Streaming-Zustand nach der letzten Kerze
+        n = len(self._close)
+        state = SuperTrendState(self._window, self._multiplier)
+        state.bars = n
+        state.tr_sum = float(result['true_range'][:self._window].sum())
+        state.atr = float(result['atr'][-1])
+        state.close = float(self._close.iloc[-1])
+        state.upper = float(result['upper'][-1])
+        state.lower = float(result['lower'][-1])
+        state.direction = float(result['direction'][-1])
+        self._state = state
 
-        self.supertrend = pd.Series(supertrend_series, index=self._close.index)
-        self.supertrend_direction = pd.Series(supertrend_direction, index=self._close.index)
+    def update(self, high, low, close):
+        """Verarbeitet eine neue Kerze. Returns: (supertrend, direction)."""
+        return self._state.update(high, low, close)
 
     def get_supertrend_direction(self) -> pd.Series:
         return self.supertrend_direction
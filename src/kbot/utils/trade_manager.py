@@ -7,16 +7,21 @@ import json
 import pandas as pd
 import ta
 import math
+import threading
 
 from kbot.utils.telegram import send_message
-from kbot.utils.ann_model import create_ann_features
+from kbot.utils.feature_engine import FEATURE_COLUMNS
+from kbot.utils.feature_state import StreamingFeatureState, load_feature_state, save_feature_state
+from kbot.utils.data_store import timeframe_to_ms
 from kbot.utils.exchange import Exchange
-from kbot.utils.supertrend_indicator import SuperTrendLocal
 from kbot.utils.circuit_breaker import is_trading_allowed, update_circuit_breaker
 
 # Pfade für die Lock-Datei definieren
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 LOCK_FILE_PATH = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'trade_lock.json')
+FEATURE_BOOTSTRAP_CANDLES = 1000  # Anlaufphase, falls kein gespeicherter Feature-Zustand existiert
+# Die Live-Engine führt Zyklen in mehreren Threads aus: Lesen-Ändern-Schreiben der Lock-Datei serialisieren
+_LOCK_FILE_MUTEX = threading.Lock()
 
 # --------------------------------------------------------------------------- #
 # Trade-Lock-Hilfsfunktionen (Unverändert)
@@ -36,17 +41,18 @@ def get_trade_lock(strategy_id):
 def set_trade_lock(strategy_id, candle_timestamp):
     """Setzt eine Sperre für eine Strategie, um erneutes Handeln auf derselben Kerze zu verhindern."""
     os.makedirs(os.path.dirname(LOCK_FILE_PATH), exist_ok=True)
-    locks = {}
-    if os.path.exists(LOCK_FILE_PATH):
-        try:
-            with open(LOCK_FILE_PATH, 'r') as f:
-                locks = json.load(f)
-        except json.JSONDecodeError:
-            locks = {}
-    # Speichere nur den Zeitstempel der Kerze
-    locks[strategy_id] = candle_timestamp.strftime('%Y-%m-%d %H:%M:%S')
-    with open(LOCK_FILE_PATH, 'w') as f:
-        json.dump(locks, f, indent=4)
+    with _LOCK_FILE_MUTEX:
+        locks = {}
+        if os.path.exists(LOCK_FILE_PATH):
+            try:
+                with open(LOCK_FILE_PATH, 'r') as f:
+                    locks = json.load(f)
+            except json.JSONDecodeError:
+                locks = {}
+        # Speichere nur den Zeitstempel der Kerze
+        locks[strategy_id] = candle_timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        with open(LOCK_FILE_PATH, 'w') as f:
+            json.dump(locks, f, indent=4)
 
 
 # --------------------------------------------------------------------------- #
@@ -94,7 +100,55 @@ def housekeeper_routine(exchange, symbol, logger):
 # --------------------------------------------------------------------------- #
 # Hauptfunktion: Trade öffnen (mit dynamischem SL)
 # --------------------------------------------------------------------------- #
-def check_and_open_new_position(exchange: Exchange, model, scaler, params, telegram_config, logger):
+def closed_candles(data, candle_close_ms=None):
+    """
+    Abgeschlossene Kerzen eines frisch geladenen OHLCV-Blocks.
+    Ohne candle_close_ms gilt die letzte Zeile als laufende Kerze; mit candle_close_ms (Schließzeitpunkt
+    der zuletzt abgeschlossenen Kerze, vom Scheduler) zählen alle Kerzen, die vor diesem Zeitpunkt öffneten,
+    auch wenn die Börse die neue Kerze noch nicht liefert.
+    """
+    if candle_close_ms is None:
+        return data.iloc[:-1] if len(data) > 1 else data.iloc[0:0]
+    return data[data.index < pd.Timestamp(candle_close_ms, unit='ms', tz='UTC')]
+
+
+def update_feature_state(exchange: Exchange, symbol, timeframe, strategy_id, logger, feature_state=None, candle_close_ms=None):
+    """
+    Bringt den Feature-Zustand der Strategie auf die zuletzt abgeschlossene Kerze.
+
+    Es werden nur die seit dem letzten Zyklus neu abgeschlossenen Kerzen geladen und aufgenommen;
+    ohne gespeicherten Zustand (oder bei einer Lücke) wird er einmalig aus der Historie aufgebaut.
+    Der Zustand wird danach gespeichert (artifacts/db/feature_state/).
+    """
+    if feature_state is None:
+        feature_state = load_feature_state(strategy_id)
+
+    if feature_state is not None and feature_state.last_timestamp is not None:
+        timeframe_ms = timeframe_to_ms(timeframe)
+        missing = (int(time.time() * 1000) - feature_state.last_timestamp) // timeframe_ms
+        if missing <= FEATURE_BOOTSTRAP_CANDLES - 2:
+            data = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=max(3, missing + 2))
+            closed = closed_candles(data, candle_close_ms)
+            new_candles = closed[closed.index > pd.Timestamp(feature_state.last_timestamp, unit='ms', tz='UTC')]
+            if new_candles.empty and not closed.empty:
+                return feature_state
+            if not new_candles.empty and new_candles.index[0] == pd.Timestamp(feature_state.last_timestamp + timeframe_ms, unit='ms', tz='UTC'):
+                feature_state.update_from_dataframe(new_candles)
+                save_feature_state(strategy_id, feature_state)
+                return feature_state
+        logger.info(f"Feature-Zustand für {strategy_id} ist veraltet, baue ihn neu auf.")
+
+    data = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=FEATURE_BOOTSTRAP_CANDLES)
+    # Die laufende Kerze wird nicht aufgenommen
+    data = closed_candles(data, candle_close_ms)
+    if len(data) < 1:
+        return None
+    feature_state = StreamingFeatureState.from_dataframe(data, symbol, timeframe)
+    save_feature_state(strategy_id, feature_state)
+    return feature_state
+
+
+def check_and_open_new_position(exchange: Exchange, model, scaler, params, telegram_config, logger, feature_state=None, candle_close_ms=None):
 
     symbol = params['market']['symbol']
     timeframe = params['market']['timeframe']
@@ -121,42 +175,23 @@ def check_and_open_new_position(exchange: Exchange, model, scaler, params, teleg
     # *** ENDE CIRCUIT BREAKER CHECK ***
 
     logger.info("Suche nach neuen Signalen...")
-    data = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=500)
-
-    if len(data) < 2:
+    feature_state = update_feature_state(exchange, symbol, timeframe, strategy_id, logger, feature_state, candle_close_ms)
+    if feature_state is None or feature_state.last_row is None:
         logger.warning("Nicht genug Daten geladen. Überspringe.")
         return
 
-    last_candle_timestamp = data.index[-2]
+    # Feature-Zeile der zuletzt abgeschlossenen Kerze (inkl. SuperTrend-Richtung dieser Kerze)
+    last_candle = feature_state.last_row
+    last_candle_timestamp = pd.Timestamp(feature_state.last_timestamp, unit='ms', tz='UTC')
     last_trade_timestamp_str = get_trade_lock(strategy_id)
     if last_trade_timestamp_str and last_trade_timestamp_str == last_candle_timestamp.strftime('%Y-%m-%d %H:%M:%S'):
         logger.info(f"Signal für Kerze {last_candle_timestamp} wurde bereits gehandelt. Überspringe bis zur nächsten Kerze.")
         return
 
-    data_with_features = create_ann_features(data.copy())
-
-    # --- SuperTrend Richtung hinzufügen ---
-    st_indicator = SuperTrendLocal(data_with_features['high'], data_with_features['low'], data_with_features['close'], window=10, multiplier=3.0)
-    # Verwende die Richtung der VORHERIGEN Kerze
-    st_direction = st_indicator.get_supertrend_direction().iloc[-2]
-    # ---
-
-    # *** ERWEITERTE FEATURE-LISTE ***
-    # Feature 'ema_cross_20_50' entfernt (konsistent mit ann_model.py)
-    feature_cols = [
-        'bb_width', 'bb_pband', 'obv', 'rsi', 'macd_diff', 'macd', 
-        'atr_normalized', 'adx', 'adx_pos', 'adx_neg',
-        'volume_ratio', 'mfi', 'cmf',
-        'price_to_ema20', 'price_to_ema50',
-        'stoch_k', 'stoch_d', 'williams_r', 'roc', 'cci',
-        'price_to_resistance', 'price_to_support',
-        'high_low_range', 'close_to_high', 'close_to_low',
-        'day_of_week', 'hour_of_day',
-        'returns_lag1', 'returns_lag2', 'returns_lag3', 'hist_volatility'
-    ]
-    # ---
-
-    latest_features = data_with_features.iloc[-2:-1][feature_cols]
+    st_direction = last_candle['supertrend_direction']
+
+    # Gleiche Spalten und Reihenfolge wie beim Training (Scaler-Feature-Reihenfolge!)
+    latest_features = feature_state.latest_features(FEATURE_COLUMNS)
 
     if latest_features.isnull().values.any():
         logger.warning("Neueste Feature-Daten sind unvollständig, überspringe diesen Zyklus.")
@@ -189,8 +224,6 @@ def check_and_open_new_position(exchange: Exchange, model, scaler, params, teleg
     
     # *** NEUE FILTER: ADX & VOLUME ***
     if side and trade_allowed:
-        last_candle = data_with_features.iloc[-2]
-        
         # ADX-Filter: Nur bei ausreichender Trendstärke traden
         current_adx = last_candle.get('adx', 0)
         if current_adx < 20:
@@ -198,16 +231,16 @@ def check_and_open_new_position(exchange: Exchange, model, scaler, params, teleg
             logger.info(f"Signal abgelehnt: ADX zu niedrig ({current_adx:.1f} < 20). Kein klarer Trend.")
         
         # Volume-Filter: Mindestens 80% des Average Volume
-        if 'volume' in data_with_features.columns:
+        if 'volume' in last_candle:
             current_volume = last_candle['volume']
-            avg_volume = data_with_features['volume'].rolling(20).mean().iloc[-2]
+            avg_volume = last_candle['volume_sma']
             if current_volume < avg_volume * 0.8:
                 trade_allowed = False
                 logger.info(f"Signal abgelehnt: Volume zu niedrig ({current_volume:.0f} < {avg_volume*0.8:.0f}).")
         
         # Volatilitäts-Filter: Keine extremen Spikes
         current_atr_norm = last_candle.get('atr_normalized', 0)
-        avg_atr_norm = data_with_features['atr_normalized'].rolling(50).mean().iloc[-2]
+        avg_atr_norm = last_candle['atr_normalized_sma50']
         if current_atr_norm > avg_atr_norm * 2.0:
             trade_allowed = False
             logger.info(f"Signal abgelehnt: Extreme Volatilität erkannt (ATR {current_atr_norm:.2f}% > {avg_atr_norm*2:.2f}%).")
@@ -237,7 +270,6 @@ def check_and_open_new_position(exchange: Exchange, model, scaler, params, teleg
         entry_price = ticker['last']
         
         # --- NEU: DYNAMISCHE SL-DISTANZ-BERECHNUNG (wie TitanBot) ---
-        last_candle = data_with_features.iloc[-2] # Nimm die abgeschlossene Kerze
         current_atr = last_candle.get('atr', 0.0)
         
         if current_atr <= 0:
@@ -333,8 +365,11 @@ def check_and_open_new_position(exchange: Exchange, model, scaler, params, teleg
                 logger.info("Keine Position nach Fehler gefunden. Alles geschlossen.")
 
 
-def full_trade_cycle(exchange, model, scaler, params, telegram_config, logger):
-    """Der Haupt-Handelszyklus für eine einzelne Strategie."""
+def full_trade_cycle(exchange, model, scaler, params, telegram_config, logger, candle_close_ms=None):
+    """
+    Der Haupt-Handelszyklus für eine einzelne Strategie.
+    candle_close_ms: Schließzeitpunkt der gerade abgeschlossenen Kerze (Candle-Close-Scheduler der Live-Engine).
+    """
     symbol = params['market']['symbol']
     try:
         position = exchange.fetch_open_positions(symbol)
@@ -344,7 +379,7 @@ def full_trade_cycle(exchange, model, scaler, params, telegram_config, logger):
             if not housekeeper_routine(exchange, symbol, logger):
                 logger.error("Housekeeper konnte die Umgebung nicht säubern. Breche ab.")
                 return
-            check_and_open_new_position(exchange, model, scaler, params, telegram_config, logger)
+            check_and_open_new_position(exchange, model, scaler, params, telegram_config, logger, candle_close_ms=candle_close_ms)
         else:
             logger.info(f"Offene Position für {symbol} gefunden. Warte auf SL/TSL/TP-Trigger.")
 
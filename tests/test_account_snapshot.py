@@ -0,0 +1,94 @@
+# tests/test_account_snapshot.py
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.account_snapshot import AccountView, fetch_account_snapshot, TICKER_MAX_AGE_SECONDS
+
+
+class CountingExchange:
+    """Zählt die Abfragen wie die REST-Methoden von Exchange."""
+
+    def __init__(self, fail=()):
+        self.calls = {}
+        self.fail = set(fail)
+        self.open = {'BTC/USDT:USDT': [{'symbol': 'BTC/USDT:USDT', 'contracts': 0.1, 'side': 'long'}]}
+        self.account = {'name': 'Test'}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if name in self.fail:
+            raise RuntimeError('rate limit')
+
+    def fetch_positions_by_symbol(self, symbols):
+        self._count('positions_bulk')
+        return {symbol: list(self.open.get(symbol, [])) for symbol in symbols}
+
+    def fetch_balance_usdt(self, raise_errors=False):
+        self._count('balance')
+        return 1000.0
+
+    def fetch_tickers(self, symbols):
+        self._count('tickers')
+        return {symbol: {'symbol': symbol, 'last': 2.0} for symbol in symbols}
+
+    def fetch_open_positions(self, symbol):
+        self._count('positions')
+        return list(self.open.get(symbol, []))
+
+    def fetch_ticker(self, symbol):
+        self._count('ticker')
+        return {'symbol': symbol, 'last': 3.0}
+
+    def create_market_order(self, symbol, side, amount, params={}):
+        self._count('order')
+        self.open[symbol] = [{'symbol': symbol, 'contracts': amount, 'side': 'long'}]
+
+
+def cycle_reads(view, symbol):
+    """Lesezugriffe eines Zyklus ohne Order (Position, Housekeeper, Circuit Breaker, Sizing, Einstieg)."""
+    view.fetch_open_positions(symbol)
+    view.fetch_open_positions(symbol)
+    view.fetch_balance_usdt()
+    view.fetch_balance_usdt()
+    return view.fetch_ticker(symbol)['last']
+
+
+def test_views_share_one_bulk_fetch_per_tick():
+    exchange = CountingExchange()
+    symbols = ['BTC/USDT:USDT', 'ETH/USDT:USDT', 'ADA/USDT:USDT']
+    snapshot = fetch_account_snapshot(exchange, symbols)
+
+    for symbol in symbols:
+        assert cycle_reads(AccountView(exchange, snapshot), symbol) == 2.0
+    assert exchange.calls == {'positions_bulk': 1, 'balance': 1, 'tickers': 1}
+
+    # Schreibgeschützt: Änderungen eines Zyklus wirken nicht auf andere Views
+    view = AccountView(exchange, snapshot)
+    view.fetch_open_positions('BTC/USDT:USDT')[0]['contracts'] = 99
+    assert AccountView(exchange, snapshot).fetch_open_positions('BTC/USDT:USDT')[0]['contracts'] == 0.1
+    assert view.account == {'name': 'Test'}
+
+
+def test_orders_and_failures_fall_back_to_live_reads():
+    exchange = CountingExchange(fail={'tickers'})
+    clock = [100.0]
+    snapshot = fetch_account_snapshot(exchange, ['ETH/USDT:USDT', 'ADA/USDT:USDT'], clock=lambda: clock[0])
+    eth, ada = AccountView(exchange, snapshot), AccountView(exchange, snapshot)
+
+    # Ticker-Sammelabfrage fehlgeschlagen -> Einzelabfrage
+    assert eth.fetch_ticker('ETH/USDT:USDT')['last'] == 3.0
+
+    assert eth.fetch_open_positions('ETH/USDT:USDT') == []
+    eth.create_market_order('ETH/USDT:USDT', 'buy', 0.5)
+    # Bestätigung der Order live, Kontostand für alle Views live, fremde Positionen weiter aus dem Snapshot
+    assert eth.fetch_open_positions('ETH/USDT:USDT')[0]['contracts'] == 0.5
+    ada.fetch_balance_usdt()
+    assert ada.fetch_open_positions('ADA/USDT:USDT') == []
+    assert exchange.calls['positions'] == 1 and exchange.calls['balance'] == 2
+
+    fresh = fetch_account_snapshot(CountingExchange(), ['ETH/USDT:USDT'], clock=lambda: clock[0])
+    clock[0] += TICKER_MAX_AGE_SECONDS + 1
+    assert AccountView(exchange, fresh).fetch_ticker('ETH/USDT:USDT')['last'] == 3.0
@@ -0,0 +1,64 @@
+# tests/test_artifact_cache.py
+import os
+import sys
+import shutil
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils import artifact_cache
+from kbot.utils.artifact_cache import ArtifactCache, make_key, write_arrays
+from kbot.utils.ann_model import prepare_data_for_ann
+from test_feature_engine import make_ohlcv
+
+
+def test_cached_dataset_matches_direct_computation(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path))
+    monkeypatch.setattr(artifact_cache, '_DEFAULT_CACHE', cache)
+    df = make_ohlcv(1200)
+
+    X_direct, y_direct = prepare_data_for_ann(df, '4h', verbose=False, use_cache=False)
+    prepare_data_for_ann(df, '4h', verbose=False)
+    X_cached, y_cached = prepare_data_for_ann(df, '4h', verbose=False)
+
+    assert len(cache.entries()) == 1
+    pd.testing.assert_frame_equal(X_cached, X_direct)
+    pd.testing.assert_series_equal(y_cached, y_direct)
+
+    # Andere Label-Parameter (Timeframe) oder andere Kerzen ergeben einen neuen Eintrag
+    prepare_data_for_ann(df, '15m', verbose=False)
+    prepare_data_for_ann(df.iloc[1:], '4h', verbose=False)
+    assert len(cache.entries()) == 3
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=3 * 8000 + 1000)
+    keys = [make_key(kind='test', n=n) for n in range(3)]
+    for n, key in enumerate(keys):
+        cache.store(key, lambda directory: write_arrays(directory, {'values': np.full(1000, float(n))}))
+        os.utime(os.path.join(cache.lookup(key), 'meta.json'), (n, n))
+
+    cache.lookup(keys[0])  # zuletzt genutzt
+    cache.store(make_key(kind='test', n=3), lambda directory: write_arrays(directory, {'values': np.zeros(1000)}))
+
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[0]) is not None and cache.lookup(keys[2]) is not None
+    arrays, _ = artifact_cache.read_arrays(cache.lookup(keys[2]))
+    assert isinstance(arrays['values'], np.memmap) and arrays['values'][0] == 2.0
+
+
+def test_entry_evicted_while_reading_is_a_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    key = make_key(kind='test', n=0)
+    cache.store(key, lambda directory: write_arrays(directory, {'values': np.ones(10)}))
+
+    def evicted_reader(directory):
+        shutil.rmtree(directory)  # evict eines anderen Prozesses zwischen lookup und np.load
+        return artifact_cache.read_arrays(directory)
+
+    assert cache.read(key, evicted_reader) is None
+    computed = []
+    arrays, _ = cache.load_or_compute(key, lambda: computed.append(key) or ({'values': np.zeros(10)}, {}))
+    assert computed == [key] and arrays['values'][0] == 0.0
@@ -0,0 +1,172 @@
+# tests/test_backtest_kernel.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.backtest_kernel import (extract_backtest_arrays, run_backtest_arrays, run_backtest_batch_arrays,
+                                           save_backtest_arrays, load_backtest_arrays)
+from kbot.strategy.run import fibonacci_bollinger_bands
+
+
+def make_synthetic_data(n=3000, seed=7):
+    """Erzeugt Rohdaten und einen 'data_with_features'-Frame mit zufälligen Signalen."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    high = close * (1 + rng.uniform(0, 0.015, n))
+    low = close * (1 - rng.uniform(0, 0.015, n))
+    index = pd.date_range('2024-01-01', periods=n, freq='1h', tz='UTC')
+    data = pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(500, 1500, n)}, index=index)
+
+    # Wie nach dropna: die ersten Zeilen fehlen in data_with_features
+    features = data.iloc[150:].copy()
+    m = len(features)
+    features['prediction'] = rng.uniform(0, 1, m)
+    features['supertrend_direction'] = rng.choice([1.0, -1.0], m)
+    features['adx'] = rng.uniform(10, 40, m)
+    features['volume_ratio'] = rng.uniform(0.5, 1.5, m)
+    features['atr_normalized'] = rng.uniform(0.5, 1.5, m)
+    return data, features
+
+
+def reference_backtest(data, data_with_features, params, start_capital=1000):
+    """Die ursprüngliche Zeilen-Schleife aus run_ann_backtest (Referenz-Implementierung)."""
+    bands = fibonacci_bollinger_bands(data.copy(), length=params.get('fib_length', 200), mult=params.get('fib_mult', 3.0))
+    pred_threshold = params.get('prediction_threshold', 0.6)
+    risk_reward_ratio = params.get('risk_reward_ratio', 1.5)
+    risk_per_trade_pct = params.get('risk_per_trade_pct', 1.0) / 100
+    activation_rr = params.get('trailing_stop_activation_rr', 2.0)
+    callback_rate = params.get('trailing_stop_callback_rate_pct', 1.0) / 100
+    initial_sl_pct = params.get('initial_sl_pct', 1.0) / 100.0
+    leverage = params.get('leverage', 10)
+    fee_pct = 0.05 / 100
+
+    current_capital, trades_count, wins_count = start_capital, 0, 0
+    peak_capital, max_drawdown_pct = start_capital, 0.0
+    position = None
+
+    for i in range(len(data_with_features)):
+        current = data_with_features.iloc[i]
+        if position:
+            exit_price = None
+            if position['side'] == 'long':
+                if not position['trailing_active'] and current['high'] >= position['activation_price']:
+                    position['trailing_active'] = True
+                if position['trailing_active']:
+                    position['peak_price'] = max(position['peak_price'], current['high'])
+                    position['stop_loss'] = max(position['stop_loss'], position['peak_price'] * (1 - callback_rate))
+                if current['low'] <= position['stop_loss']: exit_price = position['stop_loss']
+                elif not position['trailing_active'] and current['high'] >= position['take_profit']: exit_price = position['take_profit']
+            else:
+                if not position['trailing_active'] and current['low'] <= position['activation_price']:
+                    position['trailing_active'] = True
+                if position['trailing_active']:
+                    position['peak_price'] = min(position['peak_price'], current['low'])
+                    position['stop_loss'] = min(position['stop_loss'], position['peak_price'] * (1 + callback_rate))
+                if current['high'] >= position['stop_loss']: exit_price = position['stop_loss']
+                elif not position['trailing_active'] and current['low'] <= position['take_profit']: exit_price = position['take_profit']
+
+            if exit_price:
+                pnl_pct = (exit_price / position['entry_price'] - 1) if position['side'] == 'long' else (1 - exit_price / position['entry_price'])
+                notional_value = position['margin_used'] * leverage
+                net_pnl = notional_value * pnl_pct - notional_value * fee_pct * 2
+                if net_pnl < -start_capital * risk_per_trade_pct:
+                    net_pnl = -start_capital * risk_per_trade_pct
+                current_capital += net_pnl
+                if net_pnl > 0: wins_count += 1
+                trades_count += 1
+                position = None
+                peak_capital = max(peak_capital, current_capital)
+                if peak_capital > 0:
+                    max_drawdown_pct = max(max_drawdown_pct, (peak_capital - current_capital) / peak_capital)
+                if current_capital <= 0: break
+
+        if not position:
+            side = 'long' if current['prediction'] >= pred_threshold else 'short' if current['prediction'] <= (1 - pred_threshold) else None
+            if not side:
+                continue
+            trade_allowed = not ((current['supertrend_direction'] == 1.0 and side == 'short') or (current['supertrend_direction'] == -1.0 and side == 'long'))
+            if trade_allowed:
+                if current['adx'] < 20 or current['volume_ratio'] < 0.8:
+                    trade_allowed = False
+                if i >= 50 and current['atr_normalized'] > data_with_features['atr_normalized'].iloc[i-50:i].mean() * 2.0:
+                    trade_allowed = False
+                if i < len(bands):
+                    lower_6, upper_6 = bands['lower_6'].iloc[i], bands['upper_6'].iloc[i]
+                    if not pd.isna(lower_6) and not pd.isna(upper_6):
+                        if side == 'long' and current['close'] > lower_6 * 1.005: trade_allowed = False
+                        elif side == 'short' and current['close'] < upper_6 * 0.995: trade_allowed = False
+            if trade_allowed:
+                entry_price = current['close']
+                sl_distance = entry_price * initial_sl_pct
+                if sl_distance == 0: continue
+                notional_value = current_capital * risk_per_trade_pct / initial_sl_pct
+                margin_used = notional_value / leverage
+                if margin_used > current_capital: continue
+                stop_loss = entry_price - sl_distance if side == 'long' else entry_price + sl_distance
+                take_profit = entry_price + (entry_price - stop_loss) * risk_reward_ratio if side == 'long' else entry_price - (stop_loss - entry_price) * risk_reward_ratio
+                activation_price = entry_price + sl_distance * activation_rr if side == 'long' else entry_price - sl_distance * activation_rr
+                position = {'side': side, 'entry_price': entry_price, 'stop_loss': stop_loss, 'take_profit': take_profit,
+                            'margin_used': margin_used, 'trailing_active': False, 'activation_price': activation_price,
+                            'peak_price': entry_price}
+
+    win_rate = (wins_count / trades_count * 100) if trades_count > 0 else 0
+    final_pnl_pct = ((current_capital - start_capital) / start_capital) * 100
+    return {"total_pnl_pct": final_pnl_pct, "trades_count": trades_count, "win_rate": win_rate, "max_drawdown_pct": max_drawdown_pct, "end_capital": current_capital}
+
+
+@pytest.mark.parametrize("params", [
+    {'prediction_threshold': 0.6, 'risk_reward_ratio': 2.0, 'risk_per_trade_pct': 1.5, 'leverage': 10,
+     'trailing_stop_activation_rr': 1.5, 'trailing_stop_callback_rate_pct': 1.0, 'fib_length': 150, 'fib_mult': 1.0},
+    {'prediction_threshold': 0.52, 'risk_reward_ratio': 4.0, 'risk_per_trade_pct': 2.0, 'leverage': 20,
+     'trailing_stop_activation_rr': 3.0, 'trailing_stop_callback_rate_pct': 0.5, 'fib_length': 100, 'fib_mult': 0.5,
+     'initial_sl_pct': 0.5},
+    {'prediction_threshold': 0.55, 'fib_length': 300, 'fib_mult': 2.0, 'initial_sl_pct': 3.0, 'leverage': 1},
+])
+def test_kernel_matches_reference_loop(params):
+    data, data_with_features = make_synthetic_data()
+    expected = reference_backtest(data, data_with_features, params)
+    result = run_backtest_arrays(extract_backtest_arrays(data, data_with_features), params)
+
+    assert expected['trades_count'] > 0
+    assert result['trades_count'] == expected['trades_count']
+    assert result['win_rate'] == pytest.approx(expected['win_rate'])
+    assert result['end_capital'] == pytest.approx(expected['end_capital'], rel=1e-9)
+    assert result['max_drawdown_pct'] == pytest.approx(expected['max_drawdown_pct'], rel=1e-9)
+
+
+def test_batch_matches_single_runs():
+    data, data_with_features = make_synthetic_data(seed=11)
+    arrays = extract_backtest_arrays(data, data_with_features)
+    rng = np.random.default_rng(3)
+    param_grid = [{'prediction_threshold': rng.choice([0.52, 0.55, 0.6]), 'risk_reward_ratio': rng.uniform(1.0, 5.0),
+                   'risk_per_trade_pct': rng.uniform(0.5, 2.0), 'leverage': int(rng.integers(5, 26)),
+                   'trailing_stop_activation_rr': rng.uniform(1.0, 4.0), 'trailing_stop_callback_rate_pct': rng.uniform(0.5, 3.0),
+                   'fib_length': int(rng.choice([100, 200])), 'fib_mult': rng.uniform(0.5, 2.0)} for _ in range(40)]
+
+    batch_results = run_backtest_batch_arrays(arrays, param_grid)
+
+    assert len(batch_results) == len(param_grid)
+    for params, batch in zip(param_grid, batch_results):
+        single = run_backtest_arrays(arrays, params)
+        assert batch['trades_count'] == single['trades_count']
+        assert batch['win_rate'] == pytest.approx(single['win_rate'])
+        assert batch['end_capital'] == pytest.approx(single['end_capital'], rel=1e-12)
+        assert batch['max_drawdown_pct'] == pytest.approx(single['max_drawdown_pct'], rel=1e-12, abs=1e-15)
+
+
+def test_memory_mapped_arrays_give_same_results(tmp_path):
+    data, data_with_features = make_synthetic_data(seed=5)
+    arrays = extract_backtest_arrays(data, data_with_features)
+    save_backtest_arrays(arrays, str(tmp_path))
+    mapped = load_backtest_arrays(str(tmp_path))
+
+    assert isinstance(mapped['close'], np.memmap) and not mapped['close'].flags.writeable
+    assert mapped['index'].equals(arrays['index'])
+    params = {'prediction_threshold': 0.55, 'fib_length': 150, 'fib_mult': 1.0, 'leverage': 10}
+    assert run_backtest_arrays(mapped, params) == run_backtest_arrays(arrays, params)
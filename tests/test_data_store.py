@@ -0,0 +1,169 @@
+# tests/test_data_store.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.data_store import OHLCVStore, to_ms
+from kbot.utils.ohlcv_sync import plan_sync, sync_ohlcv
+from kbot.analysis.prefetch import prefetch
+
+SYMBOL = 'BTC/USDT:USDT'
+
+
+def make_candles(start, periods, freq='1h', seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq, tz='UTC', name='timestamp')
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    return pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                         'volume': rng.uniform(1, 10, periods)}, index=index)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OHLCVStore(root=str(tmp_path / 'store'), legacy_dir=str(tmp_path / 'cache'))
+
+
+def test_read_slice_matches_loc(store):
+    df = make_candles('2024-01-01', 24 * 60)
+    store.write(SYMBOL, '1h', df)
+
+    result = store.read(SYMBOL, '1h', '2024-01-10', '2024-01-20')
+    expected = df.loc['2024-01-10':'2024-01-20']
+
+    assert len(result) == len(expected) == 11 * 24
+    assert (result.index == expected.index).all()
+    np.testing.assert_array_equal(result['close'].to_numpy(), expected['close'].to_numpy())
+    assert store.covers(SYMBOL, '1h', '2024-01-10', '2024-01-20')
+    assert not store.covers(SYMBOL, '1h', '2023-12-31', '2024-01-20')
+
+
+def test_reader_retries_when_generation_is_replaced(store, monkeypatch):
+    store.write(SYMBOL, '1h', make_candles('2024-01-01', 48, seed=1))
+    stale_meta = store.read_meta(SYMBOL, '1h')
+    newer = make_candles('2024-01-01', 72, seed=2)
+    store.write(SYMBOL, '1h', newer)  # löscht die Generation aus stale_meta
+
+    # Der Leser hat meta.json noch vor dem Schreiben gelesen
+    read_meta = store.read_meta
+    metas = iter([stale_meta])
+    monkeypatch.setattr(store, 'read_meta', lambda symbol, timeframe: next(metas, None) or read_meta(symbol, timeframe))
+
+    result = store.read(SYMBOL, '1h')
+    assert len(result) == 72
+    np.testing.assert_array_equal(result['close'].to_numpy(), newer['close'].to_numpy())
+
+
+def test_legacy_csv_is_imported_once(store, tmp_path):
+    os.makedirs(tmp_path / 'cache')
+    df = make_candles('2024-03-01', 100, freq='4h')
+    df.to_csv(tmp_path / 'cache' / 'BTC-USDT-USDT_4h.csv')
+
+    result = store.read(SYMBOL, '4h')
+    meta = store.read_meta(SYMBOL, '4h')
+
+    assert len(result) == 100
+    np.testing.assert_allclose(result['volume'].to_numpy(), df['volume'].to_numpy())
+    assert meta['generation_no'] == 1
+    assert meta['ranges'] == [[to_ms(df.index[0]), to_ms(df.index[-1])]]
+
+
+def test_merge_overwrites_open_candle_and_joins_ranges(store):
+    df = make_candles('2024-01-01', 48)
+    store.write(SYMBOL, '1h', df.iloc[:24])
+
+    update = df.iloc[23:].copy()
+    update.loc[update.index[0], 'close'] = -1.0  # letzte Kerze war beim ersten Abruf noch offen
+    meta = store.merge(SYMBOL, '1h', update, covered_ranges=[(to_ms(update.index[0]), to_ms(update.index[-1]))])
+
+    result = store.read(SYMBOL, '1h')
+    assert len(result) == 48
+    assert result['close'].iloc[23] == -1.0
+    assert meta['ranges'] == [[to_ms(df.index[0]), to_ms(df.index[-1])]]
+    # Nur die aktuelle Generation bleibt auf der Platte
+    generations = [d for d in os.listdir(os.path.join(store.root, 'BTC-USDT-USDT_1h')) if d.startswith('gen_')]
+    assert generations == [meta['generation']]
+
+
+class FakeExchange:
+    """Offline-Börse: liefert lückenlose 1h-Kerzen (außer in 'outages') und zählt die Seitenabrufe."""
+    def __init__(self, first_ts, last_ts, timeframe_ms=3_600_000, outages=()):
+        self.timeframe_ms = timeframe_ms
+        self.timestamps = [ts for ts in range(first_ts, last_ts + 1, timeframe_ms)
+                           if not any(start <= ts <= end for start, end in outages)]
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=200):
+        self.calls += 1
+        candles = [ts for ts in self.timestamps if ts >= since][:min(limit, 200)]
+        return [[ts, 1.0, 2.0, 0.5, 1.5, 10.0] for ts in candles]
+
+
+def test_sync_only_fetches_missing_tail(store):
+    exchange = FakeExchange(to_ms('2023-01-01'), to_ms('2025-01-01'))
+    now_ms = to_ms('2025-01-01')
+
+    stats = sync_ohlcv(store, exchange, SYMBOL, '1h', '2024-01-01', '2024-12-30', now_ms=now_ms)
+    assert stats['candles'] == len(store.read(SYMBOL, '1h')) == 364 * 24 + 1
+    assert store.covers(SYMBOL, '1h', '2024-01-01', '2024-12-30')
+
+    # Einen Tag verlängern kostet genau eine Seite
+    exchange.calls = 0
+    stats = sync_ohlcv(store, exchange, SYMBOL, '1h', '2024-01-01', '2024-12-31', now_ms=now_ms)
+    assert exchange.calls == 1
+    assert stats['candles'] == 24
+    assert (np.diff(store.read(SYMBOL, '1h').index) == pd.Timedelta(hours=1)).all()
+
+    # Bereits abgedeckt -> keine Anfrage
+    exchange.calls = 0
+    assert sync_ohlcv(store, exchange, SYMBOL, '1h', '2024-03-01', '2024-06-01', now_ms=now_ms)['pages'] == 0
+    assert exchange.calls == 0
+
+
+def test_sync_fills_interior_gaps_and_remembers_outages(store):
+    outage = (to_ms('2024-01-05 10:00'), to_ms('2024-01-05 12:00'))
+    exchange = FakeExchange(to_ms('2024-01-01'), to_ms('2024-02-01'), outages=[outage])
+    now_ms = to_ms('2024-02-01')
+
+    # Bestand mit Lücke (z.B. aus einem alten CSV-Cache), der als vollständig abgedeckt gilt
+    df = make_candles('2024-01-01', 31 * 24)
+    holey = df.drop(df.loc['2024-01-10':'2024-01-12'].index)
+    holey = holey.drop(holey.loc['2024-01-05 10:00':'2024-01-05 12:00'].index)
+    store.write(SYMBOL, '1h', holey)
+
+    segments = plan_sync(store, SYMBOL, '1h', '2024-01-01', '2024-01-31', now_ms=now_ms)
+    assert [(s, e) for s, e, is_gap in segments if is_gap] == [outage, (to_ms('2024-01-10'), to_ms('2024-01-12 23:00'))]
+
+    sync_ohlcv(store, exchange, SYMBOL, '1h', '2024-01-01', '2024-01-31', now_ms=now_ms)
+    assert len(store.read(SYMBOL, '1h', '2024-01-10', '2024-01-12')) == 72
+    assert store.confirmed_gaps(SYMBOL, '1h') == [outage]
+
+    exchange.calls = 0
+    assert plan_sync(store, SYMBOL, '1h', '2024-01-01', '2024-01-31', now_ms=now_ms) == []
+    sync_ohlcv(store, exchange, SYMBOL, '1h', '2024-01-01', '2024-01-31', now_ms=now_ms)
+    assert exchange.calls == 0
+
+
+def test_prefetch_matches_sequential_sync(store, tmp_path):
+    now_ms = to_ms('2024-07-01')
+    exchanges = []
+
+    def client_factory():
+        exchanges.append(FakeExchange(to_ms('2024-01-01'), now_ms))
+        return exchanges[-1]
+
+    tasks = [{'symbol': f'{coin}/USDT:USDT', 'timeframe': '1h', 'start': '2024-01-01', 'end': '2024-06-30'} for coin in ('BTC', 'ETH', 'SOL')]
+    stats = prefetch(tasks, store=store, client_factory=client_factory, workers=4, rate=1000, now_ms=now_ms, verbose=False)
+
+    reference = OHLCVStore(root=str(tmp_path / 'reference'), legacy_dir=None)
+    sync_ohlcv(reference, FakeExchange(to_ms('2024-01-01'), now_ms), 'BTC/USDT:USDT', '1h', '2024-01-01', '2024-06-30', now_ms=now_ms)
+
+    assert stats['failed'] == []
+    assert stats['pages'] == sum(e.calls for e in exchanges)
+    for task in tasks:
+        assert store.covers(task['symbol'], '1h', '2024-01-01', '2024-06-30')
+        pd.testing.assert_frame_equal(store.read(task['symbol'], '1h'), reference.read('BTC/USDT:USDT', '1h'))
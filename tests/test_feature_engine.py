@@ -0,0 +1,110 @@
+# tests/test_feature_engine.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.feature_engine import FEATURE_COLUMNS, MATRIX_COLUMNS, COLUMN_INDEX, compute_feature_matrix
+from kbot.utils.feature_state import StreamingFeatureState
+from kbot.utils.supertrend_indicator import SuperTrendLocal
+
+
+def make_ohlcv(n=1500, seed=21):
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    index = pd.date_range('2024-03-01', periods=n, freq='1h', tz='UTC')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(100, 1000, n)}, index=index)
+
+
+def ta_reference(df):
+    h, l, c, v = df['high'], df['low'], df['close'], df['volume']
+    bollinger = ta.volatility.BollingerBands(close=c, window=20, window_dev=2)
+    macd = ta.trend.MACD(c, window_slow=26, window_fast=12, window_sign=9)
+    return {
+        'bb_width': bollinger.bollinger_wband(),
+        'bb_pband': bollinger.bollinger_pband(),
+        'obv': ta.volume.on_balance_volume(close=c, volume=v),
+        'mfi': ta.volume.money_flow_index(h, l, c, v, window=14),
+        'cmf': ta.volume.chaikin_money_flow(h, l, c, v, window=20),
+        'vwap': ta.volume.volume_weighted_average_price(h, l, c, v, window=14),
+        'rsi': ta.momentum.rsi(c, window=14),
+        'macd': macd.macd(),
+        'macd_diff': macd.macd_diff(),
+        'atr': ta.volatility.AverageTrueRange(high=h, low=l, close=c, window=14).average_true_range(),
+        'adx': ta.trend.adx(h, l, c, window=14),
+        'adx_pos': ta.trend.adx_pos(h, l, c, window=14),
+        'adx_neg': ta.trend.adx_neg(h, l, c, window=14),
+        'ema200': ta.trend.ema_indicator(c, window=200),
+        'stoch_k': ta.momentum.stoch(h, l, c, window=14, smooth_window=3),
+        'stoch_d': ta.momentum.stoch_signal(h, l, c, window=14, smooth_window=3),
+        'williams_r': ta.momentum.williams_r(h, l, c, lbp=14),
+        'roc': ta.momentum.roc(c, window=12),
+        'cci': ta.trend.cci(h, l, c, window=20),
+        'keltner_channel_hband': ta.volatility.keltner_channel_hband(h, l, c, window=20),
+        'keltner_channel_lband': ta.volatility.keltner_channel_lband(h, l, c, window=20),
+        'donchian_channel_lband': ta.volatility.donchian_channel_lband(h, l, c, window=20),
+    }
+
+
+def test_matrix_layout_starts_with_model_features():
+    assert MATRIX_COLUMNS[:len(FEATURE_COLUMNS)] == FEATURE_COLUMNS
+    assert len(FEATURE_COLUMNS) == 38
+    assert len(set(MATRIX_COLUMNS)) == len(MATRIX_COLUMNS)
+
+
+@pytest.mark.parametrize("name", list(ta_reference(make_ohlcv(60)).keys()))
+def test_fused_indicator_matches_ta(name):
+    df = make_ohlcv()
+    matrix = compute_feature_matrix(df)
+    expected = ta_reference(df)[name].to_numpy(dtype=np.float64)
+    result = matrix[:, COLUMN_INDEX[name]]
+
+    np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+    np.testing.assert_allclose(result, expected, rtol=1e-7, atol=1e-9, equal_nan=True)
+
+
+def test_streaming_state_matches_batch_rows():
+    df = make_ohlcv(600)
+    matrix = compute_feature_matrix(df)
+    direction = SuperTrendLocal(df['high'], df['low'], df['close'], window=10, multiplier=3.0).get_supertrend_direction().to_numpy()
+
+    state = StreamingFeatureState('BTC/USDT:USDT', '1h')
+    rows = [state.update(ts, *candle) for ts, candle in
+            zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False, name=None))]
+
+    for name in MATRIX_COLUMNS:
+        streamed = np.array([row[name] for row in rows])
+        np.testing.assert_allclose(streamed, matrix[:, COLUMN_INDEX[name]], rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=name)
+    np.testing.assert_array_equal([row['supertrend_direction'] for row in rows], direction)
+
+
+def test_streaming_state_checkpoint_roundtrip(tmp_path):
+    df = make_ohlcv(400)
+    path = str(tmp_path / 'state.json')
+    StreamingFeatureState.from_dataframe(df.iloc[:300]).save(path)
+
+    restored = StreamingFeatureState.load(path)
+    assert restored.update_from_dataframe(df) == 100
+    uninterrupted = StreamingFeatureState.from_dataframe(df)
+
+    assert restored.last_timestamp == uninterrupted.last_timestamp
+    pd.testing.assert_frame_equal(restored.latest_features(FEATURE_COLUMNS), uninterrupted.latest_features(FEATURE_COLUMNS))
+
+
+def test_supertrend_update_continues_batch():
+    df = make_ohlcv(500)
+    full = SuperTrendLocal(df['high'], df['low'], df['close'], window=10, multiplier=3.0)
+    head = SuperTrendLocal(df['high'][:300], df['low'][:300], df['close'][:300], window=10, multiplier=3.0)
+    streamed = [head.update(h, l, c) for h, l, c in df[['high', 'low', 'close']].iloc[300:].itertuples(index=False, name=None)]
+
+    np.testing.assert_array_equal([d for _, d in streamed], full.get_supertrend_direction().to_numpy()[300:])
+    np.testing.assert_allclose([v for v, _ in streamed], full.supertrend.to_numpy()[300:], rtol=1e-12)
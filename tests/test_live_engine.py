@@ -0,0 +1,196 @@
+# tests/test_live_engine.py
+import os
+import sys
+import json
+import asyncio
+import time
+import threading
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.strategy import engine
+from kbot.strategy.engine import LiveEngine, ModelPool, select_strategies, next_candle_close_ms
+from kbot.utils import feature_state
+
+
+class FakeExchange:
+    def __init__(self, offset_ms=0):
+        self.offset_ms = offset_ms
+
+    def fetch_time_offset_ms(self):
+        return self.offset_ms
+
+
+class SnapshotExchange(FakeExchange):
+    def __init__(self):
+        super().__init__()
+        self.bulk_calls = []
+
+    def fetch_positions_by_symbol(self, symbols):
+        self.bulk_calls.append(tuple(symbols))
+        return {symbol: [] for symbol in symbols}
+
+    def fetch_balance_usdt(self, raise_errors=False):
+        return 100.0
+
+    def fetch_tickers(self, symbols):
+        return {symbol: {'last': 1.0} for symbol in symbols}
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X, verbose=0):
+        self.calls += 1
+        return [[0.5]]
+
+
+def make_params(symbol, timeframe):
+    return {'market': {'symbol': symbol, 'timeframe': timeframe}, 'strategy': {'prediction_threshold': 0.7},
+            'risk': {'risk_per_trade_pct': 1.0, 'leverage': 5}}
+
+
+@pytest.fixture
+def engine_env(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, 'LOG_DIR', str(tmp_path / 'logs'))
+    loads = []
+
+    def loader(model_path, scaler_path):
+        loads.append(model_path)
+        return FakeModel(), object()
+
+    cycles = []
+    lock = threading.Lock()
+
+    def fake_cycle(exchange, model, scaler, params, telegram_config, logger, candle_close_ms=None):
+        with lock:
+            cycles.append((exchange, params['market']['symbol'], params['risk']['risk_per_trade_pct'], candle_close_ms))
+        # Wie der Circuit Breaker in check_and_open_new_position: params werden im Zyklus verändert
+        params['risk']['risk_per_trade_pct'] *= 0.5
+
+    monkeypatch.setattr(engine, 'full_trade_cycle', fake_cycle)
+    return ModelPool(loader=loader), loads, cycles
+
+
+def make_engine(model_pool, markets=(('BTC', '4h'), ('ETH', '1h'), ('BTC', '4h')), exchange=None, **kwargs):
+    strategies = [{'symbol': f'{coin}/USDT:USDT', 'timeframe': tf, 'use_macd': False,
+                   'params': make_params(f'{coin}/USDT:USDT', tf)} for coin, tf in markets]
+    return LiveEngine(exchange or FakeExchange(), strategies, {}, model_pool=model_pool, **kwargs)
+
+
+def test_model_pool_loads_each_model_once(engine_env):
+    model_pool, loads, cycles = engine_env
+    live = make_engine(model_pool)
+    ready = live.prepare()
+
+    # BTC 4h ist doppelt eingetragen und wird nur einmal gestartet
+    assert [s['id'] for s in ready] == ['BTCUSDTUSDT_4h', 'ETHUSDTUSDT_1h']
+    assert len(loads) == 2 and len(model_pool) == 2
+    assert model_pool.get(*engine.get_model_paths('BTC/USDT:USDT', '4h'))[0] is ready[0]['model']
+    assert len(loads) == 2
+    assert ready[0]['model'].predict([[0.0]]) == [[0.5]]
+
+    failing = ModelPool(loader=lambda m, s: (None, None))
+    assert failing.get('a.h5', 'a.joblib') == (None, None) and len(failing) == 0
+
+
+def test_single_pass_shares_exchange_and_copies_params(engine_env):
+    model_pool, loads, cycles = engine_env
+    live = make_engine(model_pool)
+    live.prepare()
+
+    asyncio.run(live.run(once=True))
+    asyncio.run(live.run(once=True))
+
+    assert len(cycles) == 4
+    assert {exchange for exchange, _, _, _ in cycles} == {live.exchange}
+    # Das im Zyklus halbierte Risiko summiert sich nicht über die Zyklen auf
+    assert {risk for _, _, risk, _ in cycles} == {1.0}
+    assert all(s['params']['risk']['risk_per_trade_pct'] == 1.0 for s in live.strategies)
+
+
+def test_next_candle_close():
+    ms = lambda value: int(pd.Timestamp(value, tz='UTC').value // 1_000_000)
+    assert next_candle_close_ms('4h', ms('2024-03-05 09:59:59')) == ms('2024-03-05 12:00')
+    assert next_candle_close_ms('4h', ms('2024-03-05 12:00')) == ms('2024-03-05 16:00')
+    assert next_candle_close_ms('1d', ms('2024-03-05 23:00')) == ms('2024-03-06')
+    assert next_candle_close_ms('1w', ms('2024-03-05 12:00')) == ms('2024-03-11')  # Montag
+    assert next_candle_close_ms('1M', ms('2024-02-29 12:00')) == ms('2024-03-01')
+
+
+def test_scheduler_groups_strategies_closing_together(engine_env):
+    model_pool, loads, cycles = engine_env
+    boundary = int(pd.Timestamp('2024-03-05 12:05', tz='UTC').value // 1_000_000)
+    offset_ms = 10_000
+    # Lokale Uhr 10s hinter der Börse, 40ms vor dem Kerzenschluss (Börsenzeit)
+    started = time.time()
+    clock = lambda: (boundary - offset_ms - 40) / 1000 + (time.time() - started)
+    live = make_engine(model_pool, markets=(('BTC', '1m'), ('ETH', '5m'), ('ADA', '4h')),
+                       exchange=FakeExchange(offset_ms), clock=clock, close_delay_ms=20)
+    live.prepare()
+
+    asyncio.run(live.run(max_boundaries=1))
+
+    assert live.time_offset_ms == offset_ms
+    assert sorted((symbol, close) for _, symbol, _, close in cycles) == [('BTC/USDT:USDT', boundary), ('ETH/USDT:USDT', boundary)]
+    assert time.time() - started >= 0.05  # erst nach Kerzenschluss + Verzögerung gestartet
+    # Nach einer langen Pause wird nur der jüngste verpasste Kerzenschluss (sofort) nachgeholt
+    minute = 60_000
+    assert live._advance(live.strategies[0], boundary, boundary + 10) == boundary + minute
+    assert live._advance(live.strategies[0], boundary, boundary + 5 * minute + 10) == boundary + 5 * minute
+
+
+def test_select_strategies_autopilot_and_manual(tmp_path):
+    (tmp_path / 'config_BTCUSDTUSDT_4h.json').write_text('{"market": {"symbol": "BTC/USDT:USDT", "timeframe": "4h"}}')
+    (tmp_path / 'notes.json').write_text('{}')
+    autopilot = select_strategies({'live_trading_settings': {'use_auto_optimizer_results': True}}, str(tmp_path))
+    assert autopilot == [{'symbol': 'BTC/USDT:USDT', 'timeframe': '4h', 'use_macd': False}]
+
+    manual = select_strategies({'live_trading_settings': {'active_strategies': [
+        {'symbol': 'ETH/USDT:USDT', 'timeframe': '1h', 'active': True},
+        {'symbol': 'ADA/USDT:USDT', 'timeframe': '4h', 'active': False}]}}, str(tmp_path))
+    assert manual == [{'symbol': 'ETH/USDT:USDT', 'timeframe': '1h', 'use_macd': False}]
+
+
+def test_feature_state_stays_in_memory(monkeypatch, tmp_path):
+    monkeypatch.setattr(feature_state, 'FEATURE_STATE_DIR', str(tmp_path))
+    monkeypatch.setattr(feature_state, '_LOADED_STATES', {})
+    state = feature_state.StreamingFeatureState('BTC/USDT:USDT', '4h')
+
+    feature_state.save_feature_state('BTCUSDTUSDT_4h', state)
+
+    assert feature_state.load_feature_state('BTCUSDTUSDT_4h') is state
+    monkeypatch.setattr(feature_state, '_LOADED_STATES', {})
+    reloaded = feature_state.load_feature_state('BTCUSDTUSDT_4h')
+    assert reloaded is not state and json.dumps(reloaded.to_dict()) == json.dumps(state.to_dict())
+
+
+def test_closed_candles_uses_scheduler_close_time():
+    from kbot.utils.trade_manager import closed_candles
+    index = pd.date_range('2024-03-05 08:00', periods=3, freq='4h', tz='UTC')
+    data = pd.DataFrame({'close': [1.0, 2.0, 3.0]}, index=index)
+    # Ohne Schließzeitpunkt gilt die letzte Zeile als laufende Kerze
+    assert list(closed_candles(data).index) == list(index[:2])
+    # Liefert die Börse die neue Kerze noch nicht, zählt die gerade geschlossene trotzdem
+    close_ms = int(pd.Timestamp('2024-03-05 20:00', tz='UTC').value // 1_000_000)
+    assert list(closed_candles(data, close_ms).index) == list(index)
+    assert list(closed_candles(data, close_ms - 4 * 3600 * 1000).index) == list(index[:2])
+
+
+def test_one_account_snapshot_per_tick(engine_env, monkeypatch):
+    model_pool, loads, cycles = engine_env
+    views = []
+    monkeypatch.setattr(engine, 'full_trade_cycle', lambda exchange, *args, **kwargs: views.append(exchange))
+    exchange = SnapshotExchange()
+    live = make_engine(model_pool, markets=(('BTC', '4h'), ('ETH', '1h')), exchange=exchange, account_snapshots=True)
+    live.prepare()
+
+    asyncio.run(live.run(once=True))
+
+    assert exchange.bulk_calls == [('BTC/USDT:USDT', 'ETH/USDT:USDT')]
+    assert len(views) == 2 and views[0].snapshot is views[1].snapshot
+    assert views[0].fetch_balance_usdt() == 100.0 and views[1].fetch_open_positions('ETH/USDT:USDT') == []
@@ -0,0 +1,116 @@
+# tests/test_market_cache.py
+import os
+import sys
+import ccxt
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils import market_cache
+from kbot.utils.market_cache import MarketCache, DEFAULT_TTL_SECONDS, MIN_REFRESH_SECONDS
+
+
+def swap_market(base, amount_step, price_step):
+    return {'id': f'{base}USDT', 'symbol': f'{base}/USDT:USDT', 'base': base, 'quote': 'USDT', 'settle': 'USDT',
+            'baseId': base, 'quoteId': 'USDT', 'settleId': 'USDT', 'type': 'swap', 'spot': False, 'margin': False,
+            'swap': True, 'future': False, 'option': False, 'active': True, 'contract': True, 'linear': True,
+            'inverse': False, 'contractSize': 1.0, 'precision': {'amount': amount_step, 'price': price_step},
+            'limits': {'amount': {'min': amount_step, 'max': None}}, 'info': {}}
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_bitget(monkeypatch):
+    """Echter ccxt-Client, dessen Netzwerk-Abfragen der Märkte gezählt und ersetzt werden."""
+    calls = {'markets': 0, 'fail': False}
+    listed = [swap_market('BTC', 0.001, 0.1), swap_market('ETH', 0.01, 0.01), swap_market('DOGE', 1.0, 0.00001)]
+
+    def fetch_markets(self, params={}):
+        calls['markets'] += 1
+        if calls['fail']:
+            raise ccxt.NetworkError('offline')
+        return [dict(m) for m in listed]
+
+    monkeypatch.setattr(ccxt.bitget, 'fetch_markets', fetch_markets)
+    monkeypatch.setattr(ccxt.bitget, 'fetch_currencies', lambda self, params={}: {})
+    return calls, listed
+
+
+def new_client():
+    return ccxt.bitget({'options': {'defaultType': 'swap'}})
+
+
+def test_disk_cache_shared_across_instances(fake_bitget, tmp_path):
+    calls, _ = fake_bitget
+    clock = Clock()
+    path = str(tmp_path / 'markets.json')
+
+    first = new_client()
+    MarketCache(path, clock=clock).apply(first)
+    # Neuer Prozess: eigener Cache, gleiche Datei -> kein REST-Aufruf
+    second = new_client()
+    markets = MarketCache(path, clock=clock).apply(second)
+
+    assert calls['markets'] == 1
+    assert set(markets) == {'BTC/USDT:USDT', 'ETH/USDT:USDT', 'DOGE/USDT:USDT'}
+    assert second.amount_to_precision('BTC/USDT:USDT', 0.12345) == first.amount_to_precision('BTC/USDT:USDT', 0.12345) == '0.123'
+    assert second.price_to_precision('DOGE/USDT:USDT', 0.1234567) == '0.12346'
+
+
+def test_ttl_expiry_and_stale_fallback(fake_bitget, tmp_path):
+    calls, _ = fake_bitget
+    clock = Clock()
+    cache = MarketCache(str(tmp_path / 'markets.json'), clock=clock)
+    cache.apply(new_client())
+
+    clock.now += DEFAULT_TTL_SECONDS - 1
+    cache.apply(new_client())
+    assert calls['markets'] == 1
+
+    clock.now += 2
+    cache.apply(new_client())
+    assert calls['markets'] == 2
+
+    # Börse nicht erreichbar: der abgelaufene Stand bleibt nutzbar
+    clock.now += DEFAULT_TTL_SECONDS
+    calls['fail'] = True
+    assert 'ETH/USDT:USDT' in cache.apply(new_client())
+    assert calls['markets'] == 3
+
+
+def test_lazy_mode_and_unknown_symbols(fake_bitget, tmp_path):
+    calls, listed = fake_bitget
+    clock = Clock()
+    cache = MarketCache(str(tmp_path / 'markets.json'), clock=clock)
+    cache.apply(new_client())
+
+    client = new_client()
+    assert set(cache.apply(client, symbols=['ETH/USDT:USDT'])) == {'ETH/USDT:USDT'}
+    assert client.amount_to_precision('ETH/USDT:USDT', 1.23456) == '1.23'
+
+    # Neu gelistet: erst nach MIN_REFRESH_SECONDS wird die Marktliste neu geladen
+    listed.append(swap_market('ADA', 1.0, 0.0001))
+    assert cache.apply(new_client(), symbols=['ADA/USDT:USDT']) == {}
+    assert calls['markets'] == 1
+    clock.now += MIN_REFRESH_SECONDS
+    assert set(cache.apply(new_client(), symbols=['ADA/USDT:USDT'])) == {'ADA/USDT:USDT'}
+    assert calls['markets'] == 2
+
+
+def test_exchange_construction_uses_cache(fake_bitget, tmp_path, monkeypatch):
+    from kbot.utils.exchange import Exchange
+    calls, _ = fake_bitget
+    monkeypatch.setattr(market_cache, '_DEFAULT_CACHE', MarketCache(str(tmp_path / 'markets.json'), clock=Clock()))
+
+    exchanges = [Exchange({'name': 'Test'}, symbols=['BTC/USDT:USDT']) for _ in range(3)]
+
+    assert calls['markets'] == 1
+    assert all(set(exchange.markets) == {'BTC/USDT:USDT'} for exchange in exchanges)
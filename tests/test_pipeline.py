@@ -0,0 +1,93 @@
+# tests/test_pipeline.py
+import os
+import sys
+import time
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.pipeline import (DagScheduler, PipelineState, StageFailed, attempt_window, run_script,
+                                   parse_accuracy, parse_threshold)
+
+
+def test_scheduler_respects_dependencies_and_stage_limits():
+    scheduler = DagScheduler({'fetch': 3, 'train': 2})
+    lock = threading.Lock()
+    active = {'train': 0, 'max_train': 0}
+
+    def fetch(deps):
+        return 1
+
+    def train(deps):
+        with lock:
+            active['train'] += 1
+            active['max_train'] = max(active['max_train'], active['train'])
+        time.sleep(0.02)
+        with lock:
+            active['train'] -= 1
+        return sum(deps.values()) + 1
+
+    for task in range(6):
+        scheduler.add(f'{task}|fetch', 'fetch', fetch)
+        scheduler.add(f'{task}|train', 'train', train, deps=[f'{task}|fetch'])
+    status = scheduler.run()
+
+    assert set(status.values()) == {'done'}
+    assert active['max_train'] == 2
+    assert all(scheduler.results[f'{task}|train'] == 2 for task in range(6))
+
+
+def test_failed_stage_skips_dependents_and_can_schedule_retry():
+    scheduler = DagScheduler({'train': 1, 'optimize': 1})
+
+    def train_first(deps):
+        scheduler.add('retry|train', 'train', lambda deps: 'ok')
+        scheduler.add('retry|optimize', 'optimize', lambda deps: deps['retry|train'], deps=['retry|train'])
+        raise StageFailed("Modell-Qualität unzureichend")
+
+    scheduler.add('first|train', 'train', train_first)
+    scheduler.add('first|optimize', 'optimize', lambda deps: 'never', deps=['first|train'])
+    status = scheduler.run()
+
+    assert status == {'first|train': 'failed', 'first|optimize': 'skipped', 'retry|train': 'done', 'retry|optimize': 'done'}
+    assert scheduler.results['retry|optimize'] == 'ok'
+
+
+def test_pipeline_state_resumes_only_with_existing_outputs(tmp_path):
+    model_path = tmp_path / 'model.h5'
+    model_path.write_text('x')
+    state = PipelineState(str(tmp_path / 'state.json'))
+    state.put('BTC|train', {'accuracy': 57.5}, outputs=[str(model_path)])
+    state.put('BTC|fetch', {'candles': 10})
+
+    resumed = PipelineState(str(tmp_path / 'state.json'))
+    assert resumed.get('BTC|train') == {'accuracy': 57.5}
+    assert resumed.get('BTC|fetch') == {'candles': 10}
+    model_path.unlink()
+    assert resumed.get('BTC|train') is None
+
+
+def test_attempt_window_matches_shell_pipeline():
+    assert attempt_window('4h', 1, 'a', None, today='2025-06-30') == ('2023-07-01', '2025-06-30')
+    assert attempt_window('4h', 2, 'a', None, today='2025-06-30') == ('2022-07-01', '2024-06-30')
+    assert attempt_window('1h', 3, '2024-01-01', '2025-01-01') == ('2022-01-01', '2023-01-01')
+
+
+def test_threshold_and_accuracy_are_parsed_from_stdout_only(tmp_path):
+    script = tmp_path / 'stage.py'
+    # Wie find_best_threshold.py: Warnungen auf stderr nach der letzten Zeile auf stdout
+    script.write_text("import sys\n"
+                      "print('Test-Genauigkeit: 61.25%')\n"
+                      "print('0.6543')\n"
+                      "sys.stdout.flush()\n"
+                      "sys.stderr.write('WARNING:absl:Compiled the loaded model, but the compiled metrics have yet to be built.\\n')\n")
+    log_path = tmp_path / 'logs' / 'stage.log'
+
+    stdout, stderr = run_script(str(script), [], str(log_path))
+
+    assert parse_threshold(stdout) == 0.6543
+    assert parse_accuracy(stdout) == 61.25
+    assert 'WARNING:absl' in stderr
+    log = log_path.read_text()
+    assert '0.6543' in log and 'WARNING:absl' in log
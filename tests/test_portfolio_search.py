@@ -0,0 +1,115 @@
+# tests/test_portfolio_search.py
+import os
+import sys
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.portfolio_search import (
+    equity_from_trades, build_pnl_matrix, combination_stats, beam_search, local_search, search_portfolio
+)
+
+START_CAPITAL = 1000.0
+
+
+def make_curves(n_strategies=9, seed=5):
+    """Equity-Kurven mit unterschiedlichen Zeitrastern (verschiedene Timeframes, unterschiedliche Starts)."""
+    rng = np.random.default_rng(seed)
+    curves = {}
+    for k in range(n_strategies):
+        index = pd.date_range('2024-01-01', periods=150, freq=['4h', '6h', '1D'][k % 3], tz='UTC')[k:]
+        returns = rng.normal(0.002 * (k % 4 - 1), 0.02, len(index))
+        curves[f"S{k}"] = pd.Series(START_CAPITAL * np.cumprod(1 + returns), index=index)
+    return curves
+
+
+def direct_stats(curves, members):
+    """Referenz: kombinierte Equity direkt über pandas (ohne Matrix/Inkremente)."""
+    frame = pd.concat({name: curves[name] - START_CAPITAL for name in members}, axis=1, sort=True).ffill().fillna(0)
+    equity = np.concatenate(([START_CAPITAL], START_CAPITAL + frame.sum(axis=1).to_numpy()))
+    peaks = np.maximum.accumulate(equity)
+    max_dd = ((peaks - equity) / peaks).max() * 100
+    total = (equity[-1] / START_CAPITAL - 1) * 100
+    return total, max_dd
+
+
+def test_incremental_combination_matches_direct_drawdown():
+    curves = make_curves()
+    names, _, matrix = build_pnl_matrix(curves, START_CAPITAL)
+    members = [1, 4, 6]
+    # Inkrementell: hinzufügen, ein weiteres Mitglied hinzufügen und wieder entfernen
+    pnl_sum = np.zeros(matrix.shape[1])
+    for k in members + [7]:
+        pnl_sum = pnl_sum + matrix[k]
+    pnl_sum = pnl_sum - matrix[7]
+
+    stats = combination_stats(pnl_sum, START_CAPITAL)
+    total, max_dd = direct_stats(curves, [names[k] for k in members])
+
+    assert stats['total_pnl_pct'][0] == pytest.approx(total, rel=1e-9)
+    assert stats['max_drawdown_pct'][0] == pytest.approx(max_dd, rel=1e-9)
+    # Der echte Drawdown ist nicht der schlechteste Einzel-Drawdown
+    singles = combination_stats(matrix[members], START_CAPITAL)['max_drawdown_pct']
+    assert stats['max_drawdown_pct'][0] != pytest.approx(singles.max())
+
+
+def test_search_finds_brute_force_optimum_and_respects_groups():
+    curves = make_curves()
+    names, _, matrix = build_pnl_matrix(curves, START_CAPITAL)
+    groups = {name: f"G{k // 2}" for k, name in enumerate(names)}
+    group_list = [groups[name] for name in names]
+    max_drawdown = 25.0
+
+    best_score, best_team = -np.inf, None
+    for size in range(1, len(names) + 1):
+        for team in itertools.combinations(range(len(names)), size):
+            if len({group_list[k] for k in team}) < size:
+                continue
+            stats = combination_stats(matrix[list(team)].sum(axis=0), START_CAPITAL)
+            if stats['max_drawdown_pct'][0] <= max_drawdown and stats['score'][0] > best_score:
+                best_score, best_team = stats['score'][0], team
+
+    found = search_portfolio(curves, START_CAPITAL, max_drawdown, groups, beam_width=4, top_n=3)
+
+    assert found[0]['members'] == [names[k] for k in best_team]
+    assert found[0]['score'] == pytest.approx(best_score)
+    for team in found:
+        assert team['max_drawdown_pct'] <= max_drawdown
+        assert len({groups[name] for name in team['members']}) == len(team['members'])
+    assert [team['score'] for team in found] == sorted((team['score'] for team in found), reverse=True)
+
+
+def test_beam_and_local_search_beat_greedy():
+    curves = make_curves(n_strategies=12, seed=8)
+    _, _, matrix = build_pnl_matrix(curves, START_CAPITAL)
+
+    # Greedy: ein Pfad, jeweils die beste Ergänzung
+    team, greedy_score = (), -np.inf
+    while True:
+        options = [tuple(sorted(team + (k,))) for k in range(len(matrix)) if k not in team]
+        scores = [combination_stats(matrix[list(t)].sum(axis=0), START_CAPITAL)['score'][0] for t in options]
+        if not options or max(scores) <= greedy_score:
+            break
+        greedy_score, team = max(scores), options[int(np.argmax(scores))]
+
+    beam_score, beam_team = beam_search(matrix, START_CAPITAL, beam_width=6)[0]
+    local_score, _ = local_search(matrix, beam_team, START_CAPITAL)
+
+    assert beam_score >= greedy_score - 1e-12
+    assert local_score >= beam_score
+
+
+def test_equity_from_trades_uses_exit_capital():
+    trades = [
+        {'type': 'BUY', 'date': pd.Timestamp('2024-01-01'), 'price': 10.0},
+        {'type': 'SELL', 'date': pd.Timestamp('2024-01-03'), 'price': 11.0, 'pnl': 100.0, 'capital': 1100.0},
+        {'type': 'SELL', 'date': pd.Timestamp('2024-01-04'), 'price': 11.0},
+        {'type': 'BUY (SL)', 'date': pd.Timestamp('2024-01-06'), 'price': 12.0, 'pnl': -99.0, 'capital': 1001.0},
+    ]
+    curve = equity_from_trades(trades, START_CAPITAL)
+    assert list(curve.index) == [pd.Timestamp('2024-01-03'), pd.Timestamp('2024-01-06')]
+    assert list(curve) == [1100.0, 1001.0]
@@ -0,0 +1,216 @@
+# tests/test_portfolio_simulator.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.portfolio_simulator import build_strategy_book, simulate_portfolio, simulate_books
+
+
+def make_strategies(n_strategies=6, days=240, seed=3, risk_pct=1.0):
+    """Zufällige Kerzen (gemischte Timeframes) und Signale je Strategie."""
+    rng = np.random.default_rng(seed)
+    strategies, signals = {}, {}
+    for k in range(n_strategies):
+        freq = ['4h', '6h', '1D'][k % 3]
+        index = pd.date_range('2024-01-01', periods=days * 24 // pd.Timedelta(freq).components.hours if freq != '1D' else days, freq=freq, tz='UTC')
+        n = len(index)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        data = pd.DataFrame({'open': close, 'high': close * (1 + rng.uniform(0, 0.02, n)),
+                             'low': close * (1 - rng.uniform(0, 0.02, n)), 'close': close, 'volume': 1.0}, index=index)
+        params = {'risk_per_trade_pct': risk_pct, 'risk_reward_ratio': 1.5 + k * 0.25,
+                  'risk': {'leverage': 5 + k, 'initial_sl_pct': 1.0 + 0.5 * k, 'trailing_stop_callback_rate_pct': 1.5}}
+        key = f'STRAT{k}_{freq}'
+        strategies[key] = {'data': data, 'params': params, 'timeframe': freq, 'symbol': f'STRAT{k}'}
+        signals[key] = (rng.uniform(0, 1, n) < 0.08, rng.uniform(0, 1, n) < 0.08)
+    return strategies, signals
+
+
+def reference_simulation(start_capital, strategies_data, signals):
+    """Die bisherige Zeitstempel-Schleife aus run_portfolio_simulation (Referenz-Implementierung)."""
+    all_signals = []
+    for key, strat in strategies_data.items():
+        params = strat['params']
+        data = strat['data']
+        long_signal, short_signal = signals[key]
+        for side, mask in (('long', long_signal), ('short', short_signal)):
+            for index, row in data[mask].iterrows():
+                all_signals.append({'timestamp': index, 'symbol_key': key, 'timeframe': strat['timeframe'], 'side': side,
+                                    'entry_price': row['close'], 'params': params, 'config_key': key,
+                                    'risk_per_trade_pct': params.get('risk_per_trade_pct', 1.0) / 100,
+                                    'risk_reward_ratio': params.get('risk_reward_ratio', 2.0)})
+    all_signals.sort(key=lambda x: x['timestamp'])
+    all_timestamps = set()
+    for strat in strategies_data.values():
+        all_timestamps.update(strat['data'].index)
+
+    equity = peak_equity = min_equity_ever = start_capital
+    max_drawdown_pct, max_drawdown_date, liquidation_date = 0.0, None, None
+    open_positions, trade_history, equity_curve = {}, [], []
+    signal_idx = 0
+    for ts in sorted(all_timestamps):
+        if liquidation_date: break
+        unrealized_pnl = 0
+        positions_to_close = []
+        for key in list(open_positions.keys()):
+            pos = open_positions[key]
+            strat_data = strategies_data.get(pos['symbol_key'])
+            if not strat_data or ts not in strat_data['data'].index: continue
+            current_candle = strat_data['data'].loc[ts]
+            exit_price = None
+            if pos['side'] == 'long':
+                if not pos['trailing_active'] and current_candle['high'] >= pos['activation_price']:
+                    pos['trailing_active'] = True
+                if pos['trailing_active']:
+                    pos['peak_price'] = max(pos['peak_price'], current_candle['high'])
+                    pos['stop_loss'] = max(pos['stop_loss'], pos['peak_price'] * (1 - pos['callback_rate']))
+                if current_candle['low'] <= pos['stop_loss']: exit_price = pos['stop_loss']
+                elif not pos['trailing_active'] and current_candle['high'] >= pos['take_profit']: exit_price = pos['take_profit']
+            else:
+                if not pos['trailing_active'] and current_candle['low'] <= pos['activation_price']:
+                    pos['trailing_active'] = True
+                if pos['trailing_active']:
+                    pos['peak_price'] = min(pos['peak_price'], current_candle['low'])
+                    pos['stop_loss'] = min(pos['stop_loss'], pos['peak_price'] * (1 + pos['callback_rate']))
+                if current_candle['high'] >= pos['stop_loss']: exit_price = pos['stop_loss']
+                elif not pos['trailing_active'] and current_candle['low'] <= pos['take_profit']: exit_price = pos['take_profit']
+            if exit_price:
+                pnl_pct = (exit_price / pos['entry_price'] - 1) if pos['side'] == 'long' else (1 - exit_price / pos['entry_price'])
+                net_pnl = pos['notional_value'] * pnl_pct - pos['notional_value'] * 0.05 / 100 * 2
+                risk_amount_usd = start_capital * pos['risk_per_trade_pct']
+                net_pnl = min(max(net_pnl, -risk_amount_usd), risk_amount_usd * pos['risk_reward_ratio'])
+                equity += net_pnl
+                trade_history.append({'config_key': pos['config_key'], 'pnl': net_pnl})
+                positions_to_close.append(key)
+            else:
+                pnl_mult = 1 if pos['side'] == 'long' else -1
+                unrealized_pnl += pos['notional_value'] * (current_candle['close'] / pos['entry_price'] - 1) * pnl_mult
+        for key in positions_to_close:
+            del open_positions[key]
+
+        while signal_idx < len(all_signals) and all_signals[signal_idx]['timestamp'] == ts:
+            signal = all_signals[signal_idx]
+            signal_idx += 1
+            pos_key = f"{signal['symbol_key']}_{signal['timeframe']}"
+            if pos_key in open_positions or equity <= 0: continue
+            risk_params = signal['params'].get('risk', {})
+            initial_sl_pct = risk_params.get('initial_sl_pct', 1.0) / 100.0
+            leverage = risk_params.get('leverage', 10)
+            activation_rr = risk_params.get('trailing_stop_activation_rr', 2.0)
+            entry_price = signal['entry_price']
+            sl_distance = entry_price * initial_sl_pct
+            if sl_distance <= 0: continue
+            notional_value = equity * signal['risk_per_trade_pct'] / initial_sl_pct
+            final_notional_value = min(notional_value, equity * 10, 1000000)
+            if final_notional_value < 5.0: continue
+            margin_used = final_notional_value / leverage
+            if sum(p['margin_used'] for p in open_positions.values()) + margin_used > equity: continue
+            sign = 1 if signal['side'] == 'long' else -1
+            open_positions[pos_key] = {
+                'side': signal['side'], 'entry_price': entry_price, 'stop_loss': entry_price - sign * sl_distance,
+                'take_profit': entry_price + sign * sl_distance * signal['risk_reward_ratio'],
+                'activation_price': entry_price + sign * sl_distance * activation_rr,
+                'notional_value': final_notional_value, 'margin_used': margin_used, 'trailing_active': False,
+                'peak_price': entry_price, 'callback_rate': risk_params.get('trailing_stop_callback_rate_pct', 1.0) / 100.0,
+                'symbol_key': signal['symbol_key'], 'config_key': signal['config_key'],
+                'risk_per_trade_pct': signal['risk_per_trade_pct'], 'risk_reward_ratio': signal['risk_reward_ratio']}
+
+        current_total_equity = equity + unrealized_pnl
+        equity_curve.append(current_total_equity)
+        peak_equity = max(peak_equity, current_total_equity)
+        drawdown = (peak_equity - current_total_equity) / peak_equity if peak_equity > 0 else 0
+        if drawdown > max_drawdown_pct:
+            max_drawdown_pct, max_drawdown_date = drawdown, ts
+        min_equity_ever = min(min_equity_ever, current_total_equity)
+        if current_total_equity <= 0 and not liquidation_date:
+            liquidation_date = ts
+    return {'end_capital': equity_curve[-1], 'trades': trade_history, 'equity_curve': equity_curve,
+            'max_drawdown_pct': max_drawdown_pct * 100, 'max_drawdown_date': max_drawdown_date,
+            'min_equity': min_equity_ever, 'liquidation_date': liquidation_date}
+
+
+@pytest.mark.parametrize('risk_pct', [1.0, 40.0])
+def test_event_engine_matches_timestamp_loop(risk_pct):
+    strategies, signals = make_strategies(risk_pct=risk_pct)
+    books = [build_strategy_book(key, strat, *signals[key]) for key, strat in strategies.items()]
+
+    result = simulate_portfolio(1000, books)
+    reference = reference_simulation(1000, strategies, signals)
+
+    assert result['trade_count'] == len(reference['trades']) > 0
+    assert result['equity_curve']['equity'].tolist() == pytest.approx(reference['equity_curve'], rel=1e-9)
+    assert result['end_capital'] == pytest.approx(reference['end_capital'], rel=1e-9)
+    assert result['max_drawdown_pct'] == pytest.approx(reference['max_drawdown_pct'], rel=1e-9)
+    assert result['max_drawdown_date'] == reference['max_drawdown_date']
+    assert result['liquidation_date'] == reference['liquidation_date']
+    assert result['min_equity'] == pytest.approx(reference['min_equity'], rel=1e-9)
+    pnl_reference = pd.DataFrame(reference['trades']).groupby('config_key')['pnl'].sum()
+    assert result['pnl_per_strategy'].set_index('config_key')['pnl'].to_dict() == pytest.approx(pnl_reference.to_dict(), rel=1e-9)
+
+
+def test_strategy_book_signals_are_cached_per_config(tmp_path, monkeypatch):
+    import tensorflow as tf
+    from sklearn.preprocessing import StandardScaler
+    from kbot.utils import artifact_cache
+    from kbot.utils.ann_model import create_ann_features
+    from kbot.utils.feature_engine import FEATURE_COLUMNS
+    from kbot.analysis import portfolio_simulator
+    from test_feature_engine import make_ohlcv
+
+    cache = artifact_cache.ArtifactCache(str(tmp_path))
+    monkeypatch.setattr(artifact_cache, '_DEFAULT_CACHE', cache)
+    data = make_ohlcv(1500)
+    features = create_ann_features(data.copy()).dropna()[FEATURE_COLUMNS]
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([tf.keras.Input(shape=(len(FEATURE_COLUMNS),)), tf.keras.layers.Dense(1, activation='sigmoid')])
+    strat = {'data': data, 'model': model, 'scaler': StandardScaler().fit(features), 'timeframe': '1h', 'symbol': 'TEST',
+             'params': {'prediction_threshold': 0.52, 'risk_per_trade_pct': 1.0}}
+
+    direct = portfolio_simulator.prepare_strategy_book('TEST', strat, use_cache=False)
+    cached = portfolio_simulator.prepare_strategy_book('TEST', strat)
+    calls = []
+    monkeypatch.setattr(portfolio_simulator, 'strategy_prediction_arrays', lambda s: calls.append(s))
+    from_cache = portfolio_simulator.prepare_strategy_book('TEST', dict(strat, params={'prediction_threshold': 0.55}))
+
+    assert direct['signal_count'] > 0
+    assert cached['long_signal'] == direct['long_signal'] and cached['short_signal'] == direct['short_signal']
+    # Anderer Threshold: gleiche Vorhersagen aus dem Cache, kein erneutes model.predict
+    assert not calls and len(cache.entries()) == 1
+    assert 0 < from_cache['signal_count'] <= direct['signal_count']
+
+
+def test_parallel_greedy_search_matches_serial(monkeypatch):
+    from kbot.analysis import portfolio_optimizer
+
+    strategies, signals = make_strategies(n_strategies=8, days=200, seed=11)
+    monkeypatch.setattr(portfolio_optimizer, 'prepare_strategy_book',
+                        lambda key, strat: build_strategy_book(key, strat, *signals[f"{strat['symbol']}_{strat['timeframe']}"]))
+
+    serial = portfolio_optimizer.run_portfolio_optimizer(1000, strategies, '2024-01-01', '2024-07-01', n_jobs=1)
+    parallel = portfolio_optimizer.run_portfolio_optimizer(1000, strategies, '2024-01-01', '2024-07-01', n_jobs=3)
+
+    assert serial is not None and len(serial['optimal_portfolio']) > 1
+    assert parallel['optimal_portfolio'] == serial['optimal_portfolio']
+    assert parallel['final_result']['end_capital'] == serial['final_result']['end_capital']
+
+
+def test_beam_method_returns_exactly_simulated_team(monkeypatch):
+    from kbot.analysis import portfolio_optimizer
+
+    strategies, signals = make_strategies(n_strategies=8, days=200, seed=11)
+    books = {key: build_strategy_book(key, strat, *signals[key]) for key, strat in strategies.items()}
+    monkeypatch.setattr(portfolio_optimizer, 'prepare_strategy_book', lambda key, strat: books[f"{strat['symbol']}_{strat['timeframe']}"])
+
+    beam = portfolio_optimizer.run_portfolio_optimizer(1000, strategies, '2024-01-01', '2024-07-01', n_jobs=1, method='beam')
+
+    # Das gemeldete Ergebnis ist die exakte Simulation des gewählten Teams (nicht die Vektor-Näherung)
+    exact = simulate_books(1000, [books[f] for f in beam['optimal_portfolio']], '2024-01-01')
+    assert beam['final_result']['end_capital'] == exact['end_capital']
+    # Mindestens so gut wie der beste Einzel-Spieler
+    score = portfolio_optimizer.score_result(beam['final_result'], 100.0)
+    singles = [portfolio_optimizer.score_result(simulate_books(1000, [book], '2024-01-01'), 100.0) for book in books.values()]
+    assert score >= max(s for s in singles if s is not None)
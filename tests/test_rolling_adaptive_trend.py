@@ -0,0 +1,42 @@
+# tests/test_rolling_adaptive_trend.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils.ann_model import calculate_adaptive_trend_features, calculate_rolling_adaptive_trend_features
+
+
+def make_prices(n, seed=5):
+    rng = np.random.default_rng(seed)
+    # Wechselnde Trend-Phasen, damit verschiedene Perioden gewinnen
+    drift = np.repeat(rng.normal(0, 0.002, n // 100 + 1), 100)[:n]
+    close = 20000 * np.exp(np.cumsum(drift + rng.normal(0, 0.004, n)))
+    index = pd.date_range('2024-01-01', periods=n, freq='15min', tz='UTC')
+    return pd.DataFrame({'close': close}, index=index)
+
+
+@pytest.mark.parametrize("use_long_term, n", [(False, 1500), (True, 3000)])
+def test_rolling_matches_single_bar_calculation(use_long_term, n):
+    df = make_prices(n)
+    rolling = calculate_rolling_adaptive_trend_features(df, use_long_term=use_long_term)
+    first = 1199 if use_long_term else 199
+
+    assert rolling.iloc[:first].isna().all().all()
+    assert rolling.iloc[first:].notna().all().all()
+
+    for end in [first, first + 1, n // 2, n - 7, n - 1]:
+        expected = calculate_adaptive_trend_features(df.iloc[:end + 1], use_long_term=use_long_term)
+        for key, value in expected.items():
+            assert rolling[key].iloc[end] == pytest.approx(value, rel=1e-6, abs=1e-9), (key, end)
+
+
+def test_rolling_uses_only_past_prices():
+    df = make_prices(800)
+    full = calculate_rolling_adaptive_trend_features(df)
+    truncated = calculate_rolling_adaptive_trend_features(df.iloc[:500])
+    pd.testing.assert_frame_equal(full.iloc[:500], truncated, rtol=1e-9)
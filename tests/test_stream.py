@@ -0,0 +1,127 @@
+# tests/test_stream.py
+import os
+import sys
+import time
+import ccxt
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.utils import market_cache
+from kbot.utils.market_cache import MarketCache
+from kbot.utils.stream import StreamState, StreamingExchange
+from kbot.utils.stream_standin import StandinServer, raw_position
+
+SYMBOL = 'BTC/USDT:USDT'
+ACCOUNT = {'name': 'Test', 'apiKey': 'key', 'secret': 'secret', 'password': 'pass'}
+
+
+def recorded_candles(n=300):
+    index = pd.date_range('2024-03-05', periods=n, freq='1min', tz='UTC', name='timestamp')
+    close = 40000 + np.cumsum(np.random.default_rng(7).normal(0, 10, n)).round(1)
+    return pd.DataFrame({'open': close - 1, 'high': close + 5, 'low': close - 5, 'close': close, 'volume': 1.5}, index=index)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def rest(monkeypatch, tmp_path):
+    """Zählt alle REST-Abfragen des synchronen ccxt-Clients; die Börse ist nicht erreichbar."""
+    calls = {'ohlcv': 0, 'positions': 0, 'balance': 0, 'ticker': 0, 'orders': 0}
+    history = recorded_candles()
+    market = {'id': 'BTCUSDT', 'symbol': SYMBOL, 'base': 'BTC', 'quote': 'USDT', 'settle': 'USDT', 'baseId': 'BTC',
+              'quoteId': 'USDT', 'settleId': 'USDT', 'type': 'swap', 'spot': False, 'margin': False, 'swap': True,
+              'future': False, 'option': False, 'active': True, 'contract': True, 'linear': True, 'inverse': False,
+              'contractSize': 1.0, 'precision': {'amount': 0.001, 'price': 0.1},
+              'limits': {'amount': {'min': 0.001, 'max': None}}, 'info': {}}
+
+    def count(name, result):
+        def method(self, *args, **kwargs):
+            calls[name] += 1
+            return result() if callable(result) else result
+        return method
+
+    # REST kennt die Historie bis 60 Kerzen vor dem Ende der Aufzeichnung
+    rest_rows = [[int(ts.value // 1_000_000), *row] for ts, row in zip(history.index[:240], history.to_numpy().tolist())]
+    monkeypatch.setattr(ccxt.bitget, 'fetch_markets', lambda self, params={}: [dict(market)])
+    monkeypatch.setattr(ccxt.bitget, 'fetch_currencies', lambda self, params={}: {})
+    monkeypatch.setattr(ccxt.bitget, 'fetch_ohlcv', count('ohlcv', lambda: rest_rows))
+    monkeypatch.setattr(ccxt.bitget, 'fetch_positions', count('positions', lambda: [{'symbol': SYMBOL, 'contracts': 0.5}]))
+    monkeypatch.setattr(ccxt.bitget, 'fetch_balance', count('balance', {'USDT': {'free': 1.0}}))
+    monkeypatch.setattr(ccxt.bitget, 'fetch_ticker', count('ticker', {'last': 1.0}))
+    monkeypatch.setattr(ccxt.bitget, 'create_order', count('orders', {'id': '1'}))
+    monkeypatch.setattr(market_cache, '_DEFAULT_CACHE', MarketCache(str(tmp_path / 'markets.json')))
+    return calls, history
+
+
+def test_streaming_exchange_serves_cycle_reads_from_stream(rest):
+    calls, history = rest
+    with StandinServer({(SYMBOL, '1m'): history}, snapshot_candles=200, interval_seconds=0.01, balance=500.0) as server:
+        exchange = StreamingExchange(ACCOUNT, [(SYMBOL, '1m')], ws_urls=server.urls)
+        try:
+            assert exchange.start(timeout=10)
+            last_ts = int(history.index[-1].value // 1_000_000)
+            assert wait_for(lambda: exchange.state.ticker(SYMBOL) and exchange.state.ticker(SYMBOL)['timestamp'] == last_ts)
+            assert wait_for(lambda: exchange.state.balance() is not None and exchange.state.positions(SYMBOL) is not None)
+
+            # Einmaliges Auffüllen des Ringpuffers per REST, danach nur noch der Stream
+            first = exchange.fetch_recent_ohlcv(SYMBOL, '1m', limit=1000)
+            assert calls['ohlcv'] == 1
+            assert list(first.index) == list(history.index)
+            assert np.array_equal(first.to_numpy(), history.to_numpy())
+            recent = exchange.fetch_recent_ohlcv(SYMBOL, '1m', limit=5)
+            assert list(recent['close']) == list(history['close'].iloc[-5:])
+            assert exchange.fetch_ticker(SYMBOL)['last'] == history['close'].iloc[-1]
+            assert exchange.fetch_balance_usdt() == 500.0
+            assert exchange.fetch_balance_usdt(raise_errors=True) == 500.0  # Aufruf aus fetch_account_snapshot
+            assert exchange.fetch_open_positions(SYMBOL) == []
+            assert calls == {'ohlcv': 1, 'positions': 0, 'balance': 0, 'ticker': 0, 'orders': 0}
+            assert server.logins == 1
+
+            # Nach einer eigenen Order: REST, bis der Stream einen neuen Snapshot liefert
+            exchange.create_market_order(SYMBOL, 'buy', 0.5)
+            assert exchange.fetch_open_positions(SYMBOL)[0]['contracts'] == 0.5
+            assert calls['positions'] == 1
+            server.push_positions([raw_position(SYMBOL, 'long', 0.5, 40000.0)])
+            assert wait_for(lambda: exchange.state.positions(SYMBOL) is not None)
+            assert exchange.fetch_open_positions(SYMBOL)[0]['contracts'] == 0.5
+            # Alle Positionen geschlossen: leerer Snapshot
+            server.push_positions([])
+            assert wait_for(lambda: exchange.fetch_open_positions(SYMBOL) == [])
+            assert calls['positions'] == 1
+        finally:
+            exchange.stop()
+
+
+def test_stream_state_gaps_and_staleness():
+    clock = [0.0]
+    state = StreamState(ring_size=10, clock=lambda: clock[0])
+    state.register(SYMBOL, '1m')
+    minute = 60_000
+    seed = pd.DataFrame({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': [1.0, 2.0, 3.0], 'volume': 1.0},
+                        index=pd.to_datetime([0, minute, 2 * minute], unit='ms', utc=True))
+
+    state.update_candles(SYMBOL, '1m', [[2 * minute, 3, 3, 3, 3.5, 1]])
+    assert state.ohlcv(SYMBOL, '1m', 3) is None  # noch nicht aufgefüllt
+    state.seed(SYMBOL, '1m', seed)
+    # Die laufende Kerze aus dem Stream hat Vorrang vor dem REST-Stand
+    assert list(state.ohlcv(SYMBOL, '1m', 3)['close']) == [1.0, 2.0, 3.5]
+    assert state.ohlcv(SYMBOL, '1m', 20) is None  # mehr Kerzen als gepuffert
+
+    state.update_candles(SYMBOL, '1m', [[5 * minute, 4, 4, 4, 4, 1]])  # zwei Kerzen fehlen
+    assert state.ohlcv(SYMBOL, '1m', 3) is None
+    state.seed(SYMBOL, '1m', seed)
+    assert state.ohlcv(SYMBOL, '1m', 3) is not None
+
+    clock[0] += 61
+    assert state.ohlcv(SYMBOL, '1m', 3) is None and state.ticker(SYMBOL) is None
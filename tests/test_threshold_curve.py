@@ -0,0 +1,63 @@
+# tests/test_threshold_curve.py
+import os
+import sys
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis.find_best_threshold import threshold_candidates, threshold_curve, pnl_curve, simplest_threshold
+from kbot.analysis.backtest_kernel import extract_backtest_arrays, run_backtest_arrays
+from test_backtest_kernel import make_synthetic_data
+
+
+def brute_force(predictions, y_true, threshold):
+    long_signals = predictions >= threshold
+    short_signals = predictions <= (1 - threshold)
+    signals = np.sum(long_signals) + np.sum(short_signals)
+    correct = np.sum(y_true[long_signals] == 1) + np.sum(y_true[short_signals] == 0)
+    return signals, correct
+
+
+def test_curve_matches_masking_at_every_threshold():
+    rng = np.random.default_rng(4)
+    predictions = rng.uniform(0, 1, 3000).astype(np.float32).astype(np.float64)
+    y_true = (rng.uniform(0, 1, 3000) < predictions).astype(int)
+    grid = np.round(np.arange(0.60, 0.96, 0.01), 2)
+    candidates = threshold_candidates(predictions)
+    thresholds = np.union1d(candidates, grid)
+
+    curve = threshold_curve(predictions, y_true, thresholds)
+
+    for row in curve.itertuples():
+        signals, correct = brute_force(predictions, y_true, row.threshold)
+        assert (row.signals, row.correct) == (signals, correct)
+        if signals:
+            assert row.score == pytest.approx((correct / signals - 0.5) * np.sqrt(signals))
+    # Die Kandidaten enthalten jede Änderung der Signalmenge: jeder Grid-Punkt gleicht dem nächsthöheren Kandidaten
+    for t in grid[grid <= candidates.max()]:
+        nxt = candidates[np.searchsorted(candidates, t, side='left')]
+        assert brute_force(predictions, y_true, t) == brute_force(predictions, y_true, nxt)
+
+
+def test_simplest_threshold_keeps_signal_set():
+    predictions = np.array([0.2, 0.35, 0.612345, 0.7, 0.9])
+    assert simplest_threshold(predictions, 0.612345) == 0.61
+    assert simplest_threshold(predictions, 0.7) == 0.7
+    assert brute_force(predictions, np.zeros(5), 0.61) == brute_force(predictions, np.zeros(5), 0.612345)
+
+
+def test_pnl_curve_matches_single_backtests():
+    data, data_with_features = make_synthetic_data(seed=9)
+    arrays = extract_backtest_arrays(data, data_with_features)
+    thresholds = threshold_candidates(arrays['prediction'])[::40]
+    params = {'fib_length': 150, 'fib_mult': 1.0, 'leverage': 10, 'risk_reward_ratio': 2.0}
+
+    curve = pnl_curve(arrays, thresholds, params)
+
+    assert len(curve) == len(thresholds)
+    for row in curve.itertuples():
+        single = run_backtest_arrays(arrays, dict(params, prediction_threshold=row.threshold))
+        assert row.pnl_trades == single['trades_count']
+        assert row.pnl_total_pct == pytest.approx(single['total_pnl_pct'], rel=1e-12, abs=1e-12)
@@ -0,0 +1,64 @@
+# tests/test_walk_forward.py
+import os
+import sys
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from kbot.analysis import optimizer
+from kbot.analysis.walk_forward import walk_forward_folds, stitch_equity, equity_stats, optimize_fold
+from kbot.analysis.backtest_kernel import extract_backtest_arrays, run_backtest_arrays, backtest_equity_curve, save_backtest_arrays
+from test_backtest_kernel import make_synthetic_data
+
+PARAMS = {'prediction_threshold': 0.6, 'fib_length': 150, 'fib_mult': 1.0, 'leverage': 10, 'risk_reward_ratio': 2.0}
+
+
+def test_folds_are_contiguous_rolling_windows():
+    folds = walk_forward_folds('2021-01-01', '2025-01-01', 12, 365)
+
+    assert len(folds) == 12
+    assert folds[0]['test_start'] == pd.Timestamp('2022-01-01', tz='UTC')
+    assert folds[-1]['test_end'] == pd.Timestamp('2025-01-01', tz='UTC')
+    for previous, fold in zip(folds, folds[1:]):
+        assert fold['test_start'] == previous['test_end']
+    assert all(fold['test_start'] - fold['train_start'] == pd.Timedelta(days=365) for fold in folds)
+    with pytest.raises(ValueError):
+        walk_forward_folds('2024-01-01', '2024-06-01', 4, 365)
+
+
+def test_equity_curve_and_stitching_match_backtests():
+    data, data_with_features = make_synthetic_data(seed=5)
+    first = extract_backtest_arrays(data.iloc[:1500], data_with_features.iloc[:1350])
+    second = extract_backtest_arrays(data.iloc[1500:], data_with_features.iloc[1350:])
+
+    curve = backtest_equity_curve(first, PARAMS, 1000)
+    single = run_backtest_arrays(first, PARAMS, 1000)
+    assert len(curve) == single['trades_count'] > 0
+    assert curve.iloc[-1] == pytest.approx(single['end_capital'])
+    assert curve.index.is_monotonic_increasing
+
+    equity, end_capitals = stitch_equity([first, second], [PARAMS, None], 1000)
+    assert end_capitals == [pytest.approx(single['end_capital'])] * 2
+    equity, end_capitals = stitch_equity([first, second], [PARAMS, PARAMS], 1000)
+    assert end_capitals[1] == pytest.approx(run_backtest_arrays(second, PARAMS, end_capitals[0])['end_capital'])
+    stats = equity_stats(equity, 1000)
+    assert stats['trades_count'] == len(equity)
+    assert stats['total_pnl_pct'] == pytest.approx((end_capitals[1] / 1000 - 1) * 100)
+
+
+def test_optimize_fold_returns_best_params_with_window_result(tmp_path, monkeypatch):
+    data, data_with_features = make_synthetic_data(seed=6)
+    arrays = extract_backtest_arrays(data, data_with_features)
+    save_backtest_arrays(arrays, str(tmp_path))
+    settings = {name: getattr(optimizer, name) for name in optimizer.WORKER_SETTINGS}
+    settings.update(FIXED_THRESHOLD=0.6, OPTIM_MODE='best_profit', MAX_DRAWDOWN_CONSTRAINT=1.0)
+    # optimize_fold setzt die Modul-Globals des Optimizers (sonst im Worker-Prozess)
+    for name in list(settings) + ['HISTORICAL_DATA', 'PREPARED_DATA']:
+        monkeypatch.setattr(optimizer, name, getattr(optimizer, name))
+
+    best = optimize_fold(str(tmp_path), 24, 8, settings, seed=1)
+
+    assert best is not None and best['params']['prediction_threshold'] == 0.6
+    assert best['in_window'] == run_backtest_arrays(arrays, best['params'], settings['START_CAPITAL'])
@@ -15,8 +15,8 @@ sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 # Korrekte Imports
 from kbot.utils.exchange import Exchange
 from kbot.utils.trade_manager import check_and_open_new_position, housekeeper_routine
-from kbot.utils.supertrend_indicator import SuperTrendLocal 
-from kbot.utils.ann_model import create_ann_features 
+from kbot.utils.feature_engine import FEATURE_COLUMNS
+from kbot.utils.feature_state import StreamingFeatureState
 
 # Definition der Pfade und Mocks
 
@@ -115,17 +115,6 @@ def test_setup():
     clear_lock_file()
 
 
-# NEUE KLASSE zum Mocken der SuperTrendLocal-Initialisierung
-class FakeSuperTrendLocal:
-    def __init__(self, high, low, close, window, multiplier):
-        self.size = len(high) 
-
-    def get_supertrend_direction(self):
-        # Gibt immer 1.0 (Long-Trend) zurück, um den Filter im trade_manager zu passieren
-        # Die Größe muss der Länge der gefakten OHLCV Daten (100) entsprechen
-        return pd.Series([1.0] * self.size)
-
-
 def test_full_kbot_workflow_on_bitget(test_setup):
     """
     Testet den gesamten Handelsablauf über den trade_manager auf dem konfigurierten Live-Konto.
@@ -134,55 +123,35 @@ def test_full_kbot_workflow_on_bitget(test_setup):
     logger = logging.getLogger("test-logger")
     
     # --- DEKLARATION DER MOCK DATEN ---
-    DATE_LEN = 100 
-    SAFE_LEN = 50 
     BTC_PRICE = 30000.0 # Realistischer BTC-Preis
-    
-    # 1. Mock Daten für fetch_recent_ohlcv (OHLCV)
-    start_dt = '2025-01-01 00:00:00'
-    date_range = pd.date_range(start=start_dt, periods=DATE_LEN, freq='15min')
-    # Anpassung des Preises auf BTC_PRICE
-    ohlcv_mock_data = {
-        'open': [BTC_PRICE] * DATE_LEN, 
-        'high': [BTC_PRICE + 300] * DATE_LEN, 
-        'low': [BTC_PRICE - 300] * DATE_LEN,
-        'close': [BTC_PRICE] * DATE_LEN, 
-        'volume': [1000] * DATE_LEN
-    }
-    mock_ohlcv_df = pd.DataFrame(ohlcv_mock_data, index=date_range)
-
-    # 2. Mock Daten für create_ann_features (Features + OHLCV + ATR)
-    model.return_value = [[0.9]] 
-    feature_cols = [
-        'bb_width', 'obv', 'rsi', 'macd_diff', 'day_of_week',
-        'returns_lag1', 'returns_lag2', 'atr_normalized', 'adx'
-    ]
-    fake_data = {col: [0.0] * SAFE_LEN for col in feature_cols}
-    fake_data['adx'] = [30.0] * SAFE_LEN
-    
-    # Anpassung des Preises auf BTC_PRICE
-    fake_data['high'] = [BTC_PRICE + 300] * SAFE_LEN
-    fake_data['low'] = [BTC_PRICE - 300] * SAFE_LEN
-    fake_data['close'] = [BTC_PRICE] * SAFE_LEN
-    # Setze einen realistischeren ATR für BTC (z.B. 1% des Preises = 300)
-    fake_data['atr'] = [300.0] * SAFE_LEN 
-
-    index_range = pd.date_range(start='2025-01-01', periods=SAFE_LEN, freq='15min')
-    fake_features_df = pd.DataFrame(fake_data, index=index_range)
-    
+
+    # Feature-Zustand der zuletzt abgeschlossenen Kerze (ersetzt update_feature_state)
+    model.return_value = [[0.9]]
+    feature_state = StreamingFeatureState(symbol, params['market']['timeframe'])
+    feature_state.last_timestamp = int(pd.Timestamp('2025-01-01 12:00:00', tz='UTC').value // 1_000_000)
+    feature_state.last_row = {col: 0.0 for col in FEATURE_COLUMNS}
+    feature_state.last_row.update({
+        'adx': 30.0,
+        # SuperTrend immer Long, damit der Filter im trade_manager passiert
+        'supertrend_direction': 1.0,
+        'high': BTC_PRICE + 300, 'low': BTC_PRICE - 300, 'close': BTC_PRICE,
+        'volume': 1000.0, 'volume_sma': 1000.0,
+        'atr_normalized': 1.0, 'atr_normalized_sma50': 1.0,
+        # Setze einen realistischeren ATR für BTC (z.B. 1% des Preises = 300)
+        'atr': 300.0,
+    })
+
     # --- ENDE DEKLARATION DER MOCK DATEN ---
 
     # --- WICHTIG: Mocken des REALEN Kontostandes ---
     # Setze den Mock auf den tatsächlichen Wert von 25 USDT
     USER_BALANCE = 25.0 
     with patch('kbot.utils.exchange.Exchange.fetch_balance_usdt', return_value=USER_BALANCE):
-        with patch('kbot.utils.trade_manager.create_ann_features', return_value=fake_features_df):
-            with patch('kbot.utils.exchange.Exchange.fetch_recent_ohlcv', return_value=mock_ohlcv_df):
-                with patch('kbot.utils.trade_manager.SuperTrendLocal', new=FakeSuperTrendLocal):
-                    
-                    print(f"\n[Schritt 1/3] Prüfe Trade-Eröffnung ({symbol}) mit {USER_BALANCE} USDT Kapital...")
-                    check_and_open_new_position(exchange, model, scaler, params, telegram_config, logger)
-                    time.sleep(5)
+        with patch('kbot.utils.trade_manager.update_feature_state', return_value=feature_state):
+
+            print(f"\n[Schritt 1/3] Prüfe Trade-Eröffnung ({symbol}) mit {USER_BALANCE} USDT Kapital...")
+            check_and_open_new_position(exchange, model, scaler, params, telegram_config, logger)
+            time.sleep(5)
 
     print("\n[Schritt 2/3] Überprüfe, ob die Position und Orders korrekt erstellt wurden...")
     position = exchange.fetch_open_positions(symbol)